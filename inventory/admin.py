@@ -1,5 +1,11 @@
 from django.contrib import admin
-from .models import Item, Transaction, Supplier, Customer
+from django.db import transaction
+from .models import (
+    Item, Transaction, Supplier, Customer, PurchaseOrder, PurchaseOrderLine, ProductImageCache,
+    OutboundEmail, PendingStockAlert, StockEvent, Notification, DailySales,
+)
+from .chatbot import chatbot_cache
+from .stock_counters import stock_counters
 
 @admin.register(Supplier)
 class SupplierAdmin(admin.ModelAdmin):
@@ -12,6 +18,9 @@ class SupplierAdmin(admin.ModelAdmin):
         ('Supplier Information', {
             'fields': ('name', 'email', 'phone', 'address', 'is_active')
         }),
+        ('Purchase Planning', {
+            'fields': ('lead_time_days', 'order_budget')
+        }),
         ('Audit Trail', {
             'fields': ('created_by', 'created_at', 'updated_at'),
             'classes': ('collapse',)
@@ -58,17 +67,21 @@ class CustomerAdmin(admin.ModelAdmin):
 @admin.register(Item)
 class ItemAdmin(admin.ModelAdmin):
     list_display = ('sku', 'name', 'quantity', 'price', 'cost_price', 'profit_per_unit_display', 'stock_status_display', 'is_active', 'created_at', 'created_by')
-    list_filter = ('quantity', 'is_active', 'created_at', 'updated_at')
+    list_filter = ('quantity', 'is_active', 'image_status', 'created_at', 'updated_at')
     search_fields = ('name', 'sku')
     ordering = ('name',)
-    readonly_fields = ('created_at', 'updated_at')
+    readonly_fields = ('created_at', 'updated_at', 'image_status', 'image_fetch_attempts', 'image_next_attempt_at', 'image_fetch_error')
     
     fieldsets = (
         ('Item Information', {
             'fields': ('name', 'sku', 'quantity', 'price', 'cost_price', 'image', 'is_active')
         }),
         ('Reorder Settings', {
-            'fields': ('reorder_level', 'lead_time_days')
+            'fields': ('reorder_level', 'lead_time_days', 'min_order_quantity')
+        }),
+        ('Image Fetching', {
+            'fields': ('image_status', 'image_fetch_attempts', 'image_next_attempt_at', 'image_fetch_error', 'image_variants_stale'),
+            'classes': ('collapse',)
         }),
         ('Audit Trail', {
             'fields': ('created_by', 'created_at', 'updated_at'),
@@ -118,7 +131,11 @@ class ItemAdmin(admin.ModelAdmin):
     
     def mark_as_low_stock(self, request, queryset):
         """Mark selected items as low stock (set quantity to 5)"""
-        updated = queryset.update(quantity=5)
+        with transaction.atomic():
+            updated = queryset.update(quantity=5)
+            # queryset.update() bypasses Item.save() and sends no save signals
+            stock_counters.rebuild()
+        chatbot_cache.bump()
         self.message_user(request, f'{updated} items marked as low stock.')
     mark_as_low_stock.short_description = "Mark selected items as low stock"
     
@@ -174,4 +191,67 @@ class TransactionAdmin(admin.ModelAdmin):
     def get_readonly_fields(self, request, obj=None):
         if obj:  # Editing existing transaction
             return self.readonly_fields + ('item', 'transaction_type', 'quantity', 'unit_price', 'performed_by')
-        return self.readonly_fields
\ No newline at end of file
+        return self.readonly_fields
+
+
+class PurchaseOrderLineInline(admin.TabularInline):
+    model = PurchaseOrderLine
+    extra = 0
+
+
+@admin.register(PurchaseOrder)
+class PurchaseOrderAdmin(admin.ModelAdmin):
+    list_display = ('id', 'supplier', 'status', 'total_cost', 'expected_delivery', 'created_by', 'created_at')
+    list_filter = ('status', 'supplier', 'created_at')
+    search_fields = ('supplier__name', 'lines__item__name')
+    readonly_fields = ('created_at', 'updated_at')
+    inlines = [PurchaseOrderLineInline]
+
+
+@admin.register(ProductImageCache)
+class ProductImageCacheAdmin(admin.ModelAdmin):
+    list_display = ('query', 'status', 'hits', 'expires_at', 'updated_at')
+    list_filter = ('status',)
+    search_fields = ('query', 'content_hash')
+    readonly_fields = ('created_at', 'updated_at')
+
+
+@admin.register(OutboundEmail)
+class OutboundEmailAdmin(admin.ModelAdmin):
+    list_display = ('subject', 'recipient', 'kind', 'status', 'attempts', 'created_at', 'sent_at')
+    list_filter = ('status', 'kind', 'created_at')
+    search_fields = ('recipient', 'subject')
+    readonly_fields = ('dedupe_key', 'created_at', 'sent_at')
+
+
+@admin.register(PendingStockAlert)
+class PendingStockAlertAdmin(admin.ModelAdmin):
+    list_display = ('item', 'recipient', 'occurrences', 'first_alerted_at', 'last_alerted_at')
+    search_fields = ('recipient', 'item__name')
+    readonly_fields = ('first_alerted_at', 'last_alerted_at')
+
+
+@admin.register(StockEvent)
+class StockEventAdmin(admin.ModelAdmin):
+    list_display = ('item', 'event_type', 'previous_quantity', 'quantity', 'reorder_level', 'created_at')
+    list_filter = ('event_type', 'created_at')
+    search_fields = ('item__name', 'item__sku')
+    readonly_fields = ('created_at',)
+
+
+@admin.register(Notification)
+class NotificationAdmin(admin.ModelAdmin):
+    list_display = ('message', 'item', 'event_type', 'level', 'superseded', 'created_at')
+    list_filter = ('level', 'event_type', 'superseded', 'created_at')
+    search_fields = ('message', 'item__name', 'item__sku')
+    readonly_fields = ('created_at',)
+
+
+@admin.register(DailySales)
+class DailySalesAdmin(admin.ModelAdmin):
+    list_display = ('day', 'item', 'customer', 'payment_method', 'units', 'revenue', 'sales_count')
+    list_filter = ('payment_method', 'day')
+    search_fields = ('item__name', 'item__sku', 'customer__name')
+    date_hierarchy = 'day'
+    # Maintained by sales_rollups.py; fix drift with rebuild_sales_rollups
+    readonly_fields = ('day', 'item', 'customer', 'payment_method', 'units', 'revenue', 'sales_count')
@@ -25,6 +25,7 @@ import base64
 from decimal import Decimal
 
 from .models import Item, Transaction
+from .metrics import CHART_RENDER_SECONDS
 from .ml_predictor import ml_predictor
 
 
@@ -82,6 +83,7 @@ class InventoryAnalytics:
         graphic = base64.b64encode(image_png)
         return graphic.decode('utf-8')
     
+    @CHART_RENDER_SECONDS.timed(chart='sales_trend')
     def generate_sales_trend_chart(self, days=30):
         """
         Generate sales trend analysis chart using historical transaction data
@@ -187,6 +189,7 @@ class InventoryAnalytics:
         
         return chart_data
     
+    @CHART_RENDER_SECONDS.timed(chart='actual_vs_predicted')
     def generate_actual_vs_predicted_chart(self, item_id=None, days=14):
         """
         Generate actual vs predicted demand comparison using AI predictions
@@ -332,6 +335,7 @@ class InventoryAnalytics:
         
         return chart_data
     
+    @CHART_RENDER_SECONDS.timed(chart='inventory_performance')
     def generate_inventory_performance_chart(self):
         """
         Generate inventory performance overview chart
@@ -406,6 +410,7 @@ class InventoryAnalytics:
         
         return chart_data
     
+    @CHART_RENDER_SECONDS.timed(chart='ai_model_performance')
     def generate_ai_model_performance_chart(self):
         """
         Generate AI model performance visualization
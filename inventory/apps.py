@@ -4,3 +4,18 @@ from django.apps import AppConfig
 class InventoryConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'inventory'
+
+    def ready(self):
+        # Register search index signal handlers
+        from . import search_index  # noqa: F401
+        # Register the built-in stock event subscribers
+        from . import stock_events  # noqa: F401
+        # Drop cached chatbot answers when items or transactions change
+        from . import chatbot  # noqa: F401
+        # Keep the daily sales rollups in step with every sale
+        from . import sales_rollups  # noqa: F401
+        # Subtract hard-deleted items from the catalogue counters
+        from . import stock_counters  # noqa: F401
+        # Count database queries per request for /metrics
+        from .metrics import install_query_counter
+        install_query_counter()
@@ -0,0 +1,417 @@
+"""
+Micro-benchmarks for the Hot Paths
+==================================
+
+Times the forecasting, reorder, chart, transaction, report, chatbot and
+CSV export functions on a fixed synthetic dataset, and stores the results
+as JSON so a regression between commits shows up as a number.
+
+How it works:
+1. `python manage.py run_benchmarks` creates a throwaway test database
+   (as `manage.py test` does) and fills it with seed_load_dataset using a
+   fixed seed and size, so every run measures the same data; the dataset
+   parameters are stored with the results
+2. Benchmarks are registered in BENCHMARKS with @benchmark, in run order.
+   Each gets a BenchmarkContext with the fixtures (a best-selling item, a
+   sparsely sold one, a logged-in Manager client, ...) and may have a
+   setup function that runs untimed before every round, e.g. to empty the
+   forecast caches for a cold measurement. Benchmarks that write rows are
+   registered last so they don't change the data the others read
+3. Forecast caches and trained models are reset before each benchmark;
+   it is then warmed up once and run for at least min_rounds rounds and
+   min_time seconds (at most max_time), timing each round on its own
+4. Results (min/median/mean/stddev/IQR/max per benchmark, plus commit,
+   machine and dataset) are written to BENCHMARK_DIR; compare() reports
+   each benchmark's median against an earlier file and flags changes
+   beyond the threshold
+"""
+
+import json
+import platform
+import statistics
+import subprocess
+import time
+from pathlib import Path
+
+import django
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import connection
+from django.db.models import Count
+from django.test import Client
+from django.urls import reverse
+from django.utils import timezone
+
+import logging
+logger = logging.getLogger(__name__)
+
+from .analytics import analytics
+from .chatbot import DATA_ANSWERS, chatbot_cache, get_chatbot_response, intent_router, sales_query_parser
+from .hierarchical_forecast import hierarchical_forecaster
+from .management.commands.seed_load_dataset import USER_PREFIX
+from .ml_predictor import get_ai_reorder_suggestions, ml_predictor
+from .models import Item, Transaction
+
+
+# Dataset every run is measured on (run_benchmarks --items/--days/--tx-per-day override it)
+DEFAULT_DATASET = {'items': 300, 'days': 90, 'tx_per_day': 150, 'seed': 1234}
+
+# Messages covering the chatbot's static, counting and aggregate answers
+CHATBOT_MESSAGES = {
+    'help': 'help',
+    'item_count': 'how many items are in stock?',
+    'low_stock': 'show low stock items',
+    'top_selling': 'top selling products',
+    'inventory_value': 'what is the inventory value?',
+    'monthly_report': 'monthly report',
+    'sales_by_supplier': 'revenue by supplier last month',
+    'item_units': 'units sold of LOAD-000001 in the last 90 days',
+    'how_to': 'how to record a purchase?',
+    'unknown': 'tell me a joke about penguins',
+}
+
+
+class Benchmark:
+    def __init__(self, name, func, setup=None):
+        self.name = name
+        self.func = func
+        self.setup = setup
+
+
+BENCHMARKS = {}
+
+
+def benchmark(name, setup=None):
+    """Register func(ctx) as a benchmark; setup(ctx) runs untimed before every round."""
+    def decorator(func):
+        BENCHMARKS[name] = Benchmark(name, func, setup)
+        return func
+    return decorator
+
+
+class BenchmarkContext:
+    """Fixtures shared by every benchmark; `state` carries values from a setup to its benchmark."""
+
+    def __init__(self, user, client, popular_item, sparse_item, save_item, today):
+        self.user = user
+        self.client = client
+        self.popular_item = popular_item
+        self.sparse_item = sparse_item
+        self.save_item = save_item
+        self.today = today
+        self.state = {}
+
+    @classmethod
+    def build(cls):
+        user = User.objects.filter(username__startswith=USER_PREFIX).order_by('id').first()
+        client = Client()
+        client.force_login(user)
+
+        by_sales = list(
+            Transaction.objects.filter(transaction_type='SALE', payment_status='PAID')
+            .values('item_id').annotate(sales=Count('id')).order_by('-sales', 'item_id')
+        )
+        popular_item = Item.objects.get(id=by_sales[0]['item_id'])
+        sparse_item = Item.objects.get(id=by_sales[-1]['item_id'])
+        save_item = Item.objects.create(
+            name='Benchmark Item', sku='BENCH-000001', quantity=10 ** 7, price=popular_item.price,
+            cost_price=popular_item.cost_price, reorder_level=10, supplier=popular_item.supplier,
+        )
+        return cls(user, client, popular_item, sparse_item, save_item, timezone.localdate())
+
+
+def reset_forecast_state():
+    """Forget trained models and cached forecasts so the next forecast is computed from scratch."""
+    ml_predictor.models.clear()
+    ml_predictor.scalers.clear()
+    ml_predictor.model_metrics.clear()
+    ml_predictor.invalidate_forecast()
+    hierarchical_forecaster.invalidate()
+
+
+def _forget_item(item):
+    ml_predictor.models.pop(item.id, None)
+    ml_predictor.scalers.pop(item.id, None)
+    ml_predictor.invalidate_forecast(item.id)
+
+
+# ----------------------------------------------------------------------
+# Forecasting and reorder
+# ----------------------------------------------------------------------
+
+@benchmark('ml.daily_sales_df')
+def bench_daily_sales_df(ctx):
+    ml_predictor._get_daily_sales_df(ctx.popular_item)
+
+
+@benchmark('ml.train_demand_model')
+def bench_train_demand_model(ctx):
+    ml_predictor.train_demand_model(ctx.popular_item)
+
+
+@benchmark('ml.predict_future_demand[cold]', setup=lambda ctx: _forget_item(ctx.popular_item))
+def bench_predict_cold(ctx):
+    ml_predictor.predict_future_demand(ctx.popular_item)
+
+
+@benchmark('ml.predict_future_demand[cached]')
+def bench_predict_cached(ctx):
+    ml_predictor.predict_future_demand(ctx.popular_item)
+
+
+@benchmark('ml.predict_future_demand[sparse]', setup=lambda ctx: _forget_item(ctx.sparse_item))
+def bench_predict_sparse(ctx):
+    """Too little history to train: served by the (warm) hierarchical forecast."""
+    ml_predictor.predict_future_demand(ctx.sparse_item)
+
+
+@benchmark('ml.calculate_reorder_recommendation[cold]', setup=lambda ctx: _forget_item(ctx.popular_item))
+def bench_reorder_recommendation_cold(ctx):
+    ml_predictor.calculate_reorder_recommendation(ctx.popular_item)
+
+
+@benchmark('ml.calculate_reorder_recommendation[cached]')
+def bench_reorder_recommendation_cached(ctx):
+    ml_predictor.calculate_reorder_recommendation(ctx.popular_item)
+
+
+@benchmark('ml.get_ai_reorder_suggestions[cold]', setup=lambda ctx: reset_forecast_state())
+def bench_reorder_suggestions_cold(ctx):
+    get_ai_reorder_suggestions()
+
+
+@benchmark('ml.get_ai_reorder_suggestions[cached]')
+def bench_reorder_suggestions_cached(ctx):
+    get_ai_reorder_suggestions()
+
+
+# ----------------------------------------------------------------------
+# Charts
+# ----------------------------------------------------------------------
+
+@benchmark('analytics.sales_trend_chart')
+def bench_sales_trend_chart(ctx):
+    analytics.generate_sales_trend_chart()
+
+
+@benchmark('analytics.actual_vs_predicted_chart')
+def bench_actual_vs_predicted_chart(ctx):
+    analytics.generate_actual_vs_predicted_chart(item_id=ctx.popular_item.id, days=14)
+
+
+@benchmark('analytics.inventory_performance_chart')
+def bench_inventory_performance_chart(ctx):
+    analytics.generate_inventory_performance_chart()
+
+
+@benchmark('analytics.ai_model_performance_chart')
+def bench_ai_model_performance_chart(ctx):
+    analytics.generate_ai_model_performance_chart()
+
+
+# ----------------------------------------------------------------------
+# Reports, chatbot and exports
+# ----------------------------------------------------------------------
+
+@benchmark('transaction.get_monthly_report')
+def bench_monthly_report(ctx):
+    Transaction.get_monthly_report(ctx.today.year, ctx.today.month)
+
+
+def _chatbot_benchmark(key, message):
+    def run(ctx):
+        get_chatbot_response(message)
+    benchmark(f'chatbot[{key}]')(run)
+    if sales_query_parser.parse(message) is not None or intent_router.route(message) in DATA_ANSWERS:
+        # Repeats are cached answers; also time the answer computed afresh
+        benchmark(f'chatbot[{key}:uncached]', setup=lambda ctx: chatbot_cache.bump())(run)
+
+
+for _key, _message in CHATBOT_MESSAGES.items():
+    _chatbot_benchmark(_key, _message)
+
+
+def _export_benchmark(name, url_name):
+    def run(ctx):
+        response = ctx.client.get(reverse(url_name))
+        if response.status_code != 200:
+            raise RuntimeError(f"{url_name} answered HTTP {response.status_code}")
+    benchmark(name)(run)
+
+
+_export_benchmark('export.items_csv', 'inventory:export_csv')
+_export_benchmark('export.transactions_csv', 'inventory:transaction_export_csv')
+
+
+# ----------------------------------------------------------------------
+# Writes (registered last: they add rows the benchmarks above would read)
+# ----------------------------------------------------------------------
+
+def _new_pending_sale(ctx):
+    ctx.state['pending'] = Transaction.objects.create(
+        item=ctx.save_item, transaction_type='SALE', quantity=1, unit_price=ctx.save_item.price,
+        payment_method='KHALTI', payment_status='PENDING', performed_by=ctx.user,
+    )
+
+
+@benchmark('transaction.save[cash_sale]')
+def bench_save_cash_sale(ctx):
+    Transaction.objects.create(
+        item=ctx.save_item, transaction_type='SALE', quantity=1, unit_price=ctx.save_item.price,
+        payment_method='CASH', payment_status='PAID', performed_by=ctx.user,
+    )
+
+
+@benchmark('transaction.save[mark_paid]', setup=_new_pending_sale)
+def bench_save_mark_paid(ctx):
+    txn = ctx.state['pending']
+    txn.payment_status = 'PAID'
+    txn.save()
+
+
+# ----------------------------------------------------------------------
+# Runner
+# ----------------------------------------------------------------------
+
+def time_benchmark(bench, ctx, min_rounds=5, min_time=0.5, max_time=10.0):
+    """
+    Warm up once, then time rounds until both min_rounds and min_time are
+    reached (or max_time has passed).
+
+    Returns:
+        dict: {'rounds', 'min', 'max', 'mean', 'median', 'stddev', 'iqr', 'ops'} in seconds
+    """
+    reset_forecast_state()
+    if bench.setup:
+        bench.setup(ctx)
+    bench.func(ctx)
+
+    timings = []
+    started = time.perf_counter()
+    while True:
+        if bench.setup:
+            bench.setup(ctx)
+        t0 = time.perf_counter()
+        bench.func(ctx)
+        timings.append(time.perf_counter() - t0)
+
+        elapsed = time.perf_counter() - started
+        if len(timings) >= min_rounds and elapsed >= min_time:
+            break
+        if elapsed >= max_time and len(timings) >= 2:
+            break
+
+    median = statistics.median(timings)
+    if len(timings) >= 4:
+        quartiles = statistics.quantiles(timings, n=4)
+        iqr = quartiles[2] - quartiles[0]
+    else:
+        iqr = max(timings) - min(timings)
+    return {
+        'rounds': len(timings),
+        'min': min(timings),
+        'max': max(timings),
+        'mean': statistics.fmean(timings),
+        'median': median,
+        'stddev': statistics.stdev(timings) if len(timings) > 1 else 0.0,
+        'iqr': iqr,
+        'ops': 1 / median if median else None,
+    }
+
+
+def select(patterns=None):
+    """Benchmarks whose name contains any of the patterns (all when none are given), in run order."""
+    if not patterns:
+        return list(BENCHMARKS.values())
+    return [bench for name, bench in BENCHMARKS.items() if any(p in name for p in patterns)]
+
+
+def _git(*args):
+    try:
+        return subprocess.run(
+            ['git', *args], cwd=settings.BASE_DIR, capture_output=True, text=True, timeout=10, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def environment():
+    """Commit and machine details stored with every result file."""
+    import numpy
+    import pandas
+    import sklearn
+
+    status = _git('status', '--porcelain', '--untracked-files=no')
+    return {
+        'commit': _git('rev-parse', 'HEAD'),
+        'branch': _git('rev-parse', '--abbrev-ref', 'HEAD'),
+        'dirty': bool(status) if status is not None else None,
+        'machine': {
+            'node': platform.node(),
+            'platform': platform.platform(),
+            'processor': platform.processor() or platform.machine(),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'numpy': numpy.__version__,
+            'pandas': pandas.__version__,
+            'sklearn': sklearn.__version__,
+            'database': connection.vendor,
+        },
+    }
+
+
+def result_path(results):
+    """BENCHMARK_DIR/<timestamp>-<commit>.json for a result document."""
+    directory = Path(getattr(settings, 'BENCHMARK_DIR', Path(settings.BASE_DIR) / 'benchmarks'))
+    stamp = timezone.localtime().strftime('%Y%m%d-%H%M%S')
+    commit = (results.get('commit') or 'nocommit')[:10]
+    return directory / f"{stamp}-{commit}{'-dirty' if results.get('dirty') else ''}.json"
+
+
+def latest_result(exclude=None):
+    """Path of the newest result file in BENCHMARK_DIR, or None."""
+    directory = Path(getattr(settings, 'BENCHMARK_DIR', Path(settings.BASE_DIR) / 'benchmarks'))
+    files = sorted(p for p in directory.glob('*.json') if p != exclude)
+    return files[-1] if files else None
+
+
+def save(results, path):
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(results, indent=2, default=str))
+    return path
+
+
+def load(path):
+    return json.loads(Path(path).read_text())
+
+
+def compare(current, baseline, threshold=0.25, names=None):
+    """
+    Median of each benchmark against a baseline result document, limited
+    to `names` when given (e.g. the benchmarks selected for this run).
+
+    Returns:
+        list[dict]: {'name', 'baseline', 'current', 'change', 'status'}; change is
+        the relative change of the median and status one of 'regression',
+        'improvement', 'unchanged', 'new' or 'removed'
+    """
+    rows = []
+    before = {name: stats for name, stats in baseline.get('benchmarks', {}).items() if names is None or name in names}
+    after = current.get('benchmarks', {})
+    for name in list(after) + [n for n in before if n not in after]:
+        old = before.get(name, {}).get('median')
+        new = after.get(name, {}).get('median')
+        if old is None or new is None:
+            rows.append({'name': name, 'baseline': old, 'current': new, 'change': None,
+                         'status': 'new' if old is None else 'removed'})
+            continue
+        change = (new - old) / old if old else 0.0
+        if change > threshold:
+            status = 'regression'
+        elif change < -threshold:
+            status = 'improvement'
+        else:
+            status = 'unchanged'
+        rows.append({'name': name, 'baseline': old, 'current': new, 'change': change, 'status': status})
+    return rows
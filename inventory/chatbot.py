@@ -1,447 +1,887 @@
 """
 Chatbot module for Inventory Management System
 Rule-based responses using Django ORM queries.
+
+How it works:
+1. INTENTS lists every intent in priority order with its trigger phrases.
+   IntentRouter compiles all phrases into one regex alternation and finds,
+   in a single scan of the lowercased message, the highest-priority intent
+   with a phrase anywhere in it (the first matching intent wins, so e.g.
+   "out of stock" is checked before "low stock")
+2. Static intents (help, how-to and explanations) are prebuilt replies
+3. Data intents answer with one aggregate query (plus at most two short
+   example lists) and are cached by chatbot_cache under the current data
+   version. Every Item or Transaction save or delete bumps the version once
+   committed, so repeated questions cost no queries until the data changes
+4. Entries also expire after CHATBOT_CACHE_SECONDS as a backstop. The
+   default cache is per process: with several worker processes configure
+   a shared CACHES backend so a bump reaches all of them
+5. Before the keyword intents, SalesQueryParser looks for an ad-hoc sales
+   question: a metric (units, revenue, profit) with a date range ("last
+   week", "March", "last 14 days"), a grouping ("by supplier") or an item
+   name or SKU ("for Wireless Mouse"). These are answered from the daily
+   sales rollups (sales_rollups.py) and cached like the data intents
 """
 
+import calendar
+import hashlib
+import re
+import uuid
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction as db_transaction
+from django.db.models import Count, F, Q, Sum
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
 from django.utils import timezone
-from django.db.models import Sum, F
-from datetime import date
 
+import logging
+logger = logging.getLogger(__name__)
+
+from .metrics import CACHE_REQUESTS
+from .models import Item, Transaction
+from .sales_rollups import clamp_range, sales_summary
+from .search_index import search_index
+from .stock_counters import stock_counters
+
+
+# Intents in priority order: the first one with a trigger phrase in the message answers
+INTENTS = [
+    ('help', ['help', 'what can you do', 'commands', 'options', 'hi', 'hello', 'hey', 'start', 'guide']),
+    ('item_count', ['how many items', 'total items', 'item count', 'items in stock', 'how many products', 'stock count']),
+    # Out of stock — must come BEFORE low stock
+    ('out_of_stock', ['out of stock', 'no stock', 'zero stock', 'empty stock', 'out-of-stock']),
+    ('low_stock', ['low stock', 'low inventory', 'need restock', 'running low', 'reorder']),
+    ('todays_sales', ["today's sales", 'sales today', 'today sales', 'daily sales']),
+    ('top_selling', ['top selling', 'best selling', 'most sold', 'popular products', 'top products']),
+    ('total_sales', ['total sales', 'total revenue', 'how much sales', 'sales amount', 'all sales']),
+    ('inventory_value', ['inventory value', 'stock value', 'total value', 'worth', 'asset value']),
+    ('monthly_report', ['monthly report', 'monthly sales', 'this month', 'month report', 'monthly summary']),
+    ('analytics', ['analytics', 'charts', 'graphs', 'dashboard analytics', 'sales chart', 'analytics page']),
+    ('add_item', ['how to add', 'add item', 'add product', 'new item', 'create item', 'adding item']),
+    ('edit_item', ['edit item', 'update item', 'change item', 'modify item', 'how to edit']),
+    ('delete_item', ['delete item', 'remove item', 'how to delete', 'soft delete']),
+    ('record_sale', ['record sale', 'how to sell', 'create sale', 'make a sale', 'sell item', 'how to record a sale']),
+    ('record_purchase', ['record purchase', 'how to purchase', 'create purchase', 'buy stock', 'restock item', 'how to record a purchase']),
+    ('transactions', ['view transactions', 'transaction list', 'sales history', 'purchase history', 'all transactions']),
+    ('payments', ['payment', 'khalti', 'esewa', 'how to pay', 'payment method', 'pay for transaction']),
+    ('sku', ['sku', 'stock keeping unit', 'what is sku', 'item code']),
+    ('reorder_level', ['reorder level', 'what is reorder', 'reorder threshold', 'minimum stock', 'reorder point']),
+    ('ai_reorder', ['ai reorder', 'ai system', 'how does ai work', 'machine learning', 'demand forecast', 'ai prediction', 'ai model']),
+    ('export', ['export', 'download', 'csv', 'export data', 'download report', 'export inventory']),
+    ('user_roles', ['user role', 'roles', 'permissions', 'access level', 'who can', 'staff access', 'manager access', 'admin access']),
+    ('manage_users', ['manage users', 'approve user', 'user management', 'add user', 'new user', 'register user', 'pending users']),
+    ('profit', ['profit', 'cost price', 'how is profit', 'profit calculation', 'margin']),
+    ('suppliers_customers', ['supplier', 'customer', 'vendor', 'buyer', 'who is supplier', 'who is customer']),
+    ('where_to_add', ['where to add', 'where is add', 'find add item', 'navigate to add']),
+    ('dashboard', ['dashboard', 'home page', 'main page', 'overview', 'go to dashboard']),
+]
+
+
+class IntentRouter:
+    """
+    Finds the first intent of `intents` with a trigger phrase anywhere in a
+    message, scanning the message once with one compiled regex.
+    """
 
-def get_chatbot_response(message):
+    def __init__(self, intents):
+        self.names = [name for name, _ in intents]
+        self.rank = {}
+        for rank, (_, phrases) in enumerate(intents):
+            for phrase in phrases:
+                self.rank.setdefault(phrase, rank)
+        # Phrases in priority order: where several start at the same position
+        # the alternation picks the highest-priority one, and each search
+        # resumes one character after the previous match so overlapping
+        # phrases are still found
+        self.pattern = re.compile('|'.join(re.escape(phrase) for phrase in self.rank))
+
+    def route(self, msg):
+        """Name of the matching intent for a lowercased message, or None."""
+        best = None
+        search = self.pattern.search
+        match = search(msg)
+        while match is not None:
+            rank = self.rank[match.group()]
+            if best is None or rank < best:
+                best = rank
+                if rank == 0:
+                    break
+            match = search(msg, match.start() + 1)
+        return None if best is None else self.names[best]
+
+
+class ChatbotCache:
     """
-    Process a user message and return a response dict.
-    Returns: { 'reply': str, 'links': list (optional) }
+    Data answers stored in Django's cache together with the data version
+    they were computed under.
     """
-    msg = message.lower().strip()
 
-    # Lazy imports to avoid circular issues
-    from .models import Item, Transaction
+    VERSION_KEY = 'inventory:chatbot:data-version'
 
-    # ── Help / greeting ───────────────────────────────────────────
-    if any(k in msg for k in ['help', 'what can you do', 'commands', 'options', 'hi', 'hello', 'hey', 'start', 'guide']):
-        return {
-            'reply': (
-                "Hi! I'm your Inventory Assistant. Here's what you can ask me:\n\n"
-                "📦 Inventory\n"
-                "• How many items are in stock?\n"
-                "• Show low stock items\n"
-                "• Show out of stock items\n"
-                "• What is the inventory value?\n\n"
-                "💰 Sales & Transactions\n"
-                "• Today's sales\n"
-                "• Top selling products\n"
-                "• Total sales revenue\n"
-                "• How to record a sale?\n"
-                "• How to record a purchase?\n\n"
-                "📊 Reports & Analytics\n"
-                "• This month's report\n"
-                "• What does the analytics page show?\n\n"
-                "⚙️ System Help\n"
-                "• How to add an item?\n"
-                "• How to edit an item?\n"
-                "• How to delete an item?\n"
-                "• How do payments work?\n"
-                "• What is SKU?\n"
-                "• What is reorder level?\n"
-                "• How does AI reorder work?\n"
-                "• How to manage users?\n"
-                "• How to export data?"
-            )
-        }
+    def __init__(self):
+        self.timeout = getattr(settings, 'CHATBOT_CACHE_SECONDS', 300)
 
-    # ── Total items ───────────────────────────────────────────────
-    if any(k in msg for k in ['how many items', 'total items', 'item count', 'items in stock', 'how many products', 'stock count']):
-        total = Item.objects.count()
-        out_of_stock = Item.objects.filter(quantity=0).count()
-        low_stock = Item.objects.filter(quantity__lte=F('reorder_level'), quantity__gt=0).count()
-        return {
-            'reply': (
-                f"There are {total} active items in inventory.\n"
-                f"• {low_stock} running low on stock\n"
-                f"• {out_of_stock} completely out of stock"
-            ),
-            'links': [{'label': 'View Inventory', 'url': '/inventory/'}]
-        }
+    def answer(self, intent, compute, scope=''):
+        """compute()'s response for `intent` (and `scope`, e.g. the day), reused until the data changes."""
+        entry_key = f"inventory:chatbot:{intent}:{scope}"
+        found = cache.get_many([self.VERSION_KEY, entry_key])
+        version = found.get(self.VERSION_KEY)
+        if version is None:
+            # No version yet (or it was evicted): start a new one, so no
+            # entry stored under an earlier version can match
+            version = self.bump()
+        entry = found.get(entry_key)
 
-    # ── Out of stock — must come BEFORE low stock ─────────────────
-    if any(k in msg for k in ['out of stock', 'no stock', 'zero stock', 'empty stock', 'out-of-stock']):
-        out_items = Item.objects.filter(quantity=0)
-        low_items = Item.objects.filter(quantity__lte=F('reorder_level'), quantity__gt=0)
-        if not out_items.exists():
-            reply = "No items are currently out of stock (quantity = 0)."
-            if low_items.exists():
-                names = [f"{i.name} (qty: {i.quantity})" for i in low_items[:5]]
-                reply += f"\nHowever, {low_items.count()} item(s) are running low:\n" + "\n".join(f"• {n}" for n in names)
-            return {
-                'reply': reply,
-                'links': [{'label': 'View Low Stock Items', 'url': '/inventory/?status=low-stock'}] if low_items.exists() else []
-            }
-        names = [i.name for i in out_items[:6]]
-        return {
-            'reply': f"{out_items.count()} item(s) are completely out of stock:\n" + "\n".join(f"• {n}" for n in names) + ("..." if out_items.count() > 6 else ""),
-            'links': [{'label': 'View Out of Stock', 'url': '/inventory/?status=out-of-stock'}]
-        }
+        if entry is not None and entry['version'] == version:
+            CACHE_REQUESTS.inc(cache='chatbot', result='hit')
+            return entry['response']
 
-    # ── Low stock ─────────────────────────────────────────────────
-    if any(k in msg for k in ['low stock', 'low inventory', 'need restock', 'running low', 'reorder']):
-        low_items = Item.objects.filter(quantity__lte=F('reorder_level'), quantity__gt=0)
-        out_items = Item.objects.filter(quantity=0)
-        parts = []
-        if low_items.exists():
-            names = [f"{i.name} (qty: {i.quantity}, reorder at: {i.reorder_level})" for i in low_items[:5]]
-            parts.append(
-                f"{low_items.count()} item(s) are low on stock:\n" +
-                "\n".join(f"• {n}" for n in names) +
-                ("\n..." if low_items.count() > 5 else "")
-            )
-        if out_items.exists():
-            out_names = [i.name for i in out_items[:3]]
-            parts.append(f"{out_items.count()} item(s) are completely out of stock: {', '.join(out_names)}.")
-        if not parts:
-            return {'reply': "Great news! All items are well stocked right now."}
-        return {
-            'reply': '\n\n'.join(parts),
-            'links': [{'label': 'View Low Stock Items', 'url': '/inventory/?status=low-stock'}]
-        }
+        CACHE_REQUESTS.inc(cache='chatbot', result='miss')
+        response = compute()
+        cache.set(entry_key, {'version': version, 'response': response}, self.timeout)
+        return response
 
-    # ── Today's sales ─────────────────────────────────────────────
-    if any(k in msg for k in ["today's sales", 'sales today', 'today sales', 'daily sales']):
-        today = date.today()
-        result = Transaction.objects.filter(
-            transaction_type='SALE', payment_status='PAID', timestamp__date=today
-        ).aggregate(total_qty=Sum('quantity'), total_amt=Sum('total_amount'))
-        qty = result['total_qty'] or 0
-        amt = result['total_amt'] or 0
-        return {
-            'reply': f"Today's sales ({today.strftime('%b %d, %Y')}):\n• {qty} unit(s) sold\n• Total: Rs. {amt:,.2f}",
-            'links': [{'label': 'View Transactions', 'url': '/inventory/transactions/'}]
-        }
+    def bump(self):
+        """Invalidate every cached answer."""
+        version = uuid.uuid4().hex
+        cache.set(self.VERSION_KEY, version, None)
+        return version
 
-    # ── Top selling products ──────────────────────────────────────
-    if any(k in msg for k in ['top selling', 'best selling', 'most sold', 'popular products', 'top products']):
-        top = (
-            Transaction.objects.filter(transaction_type='SALE', payment_status='PAID')
-            .values('item__name')
-            .annotate(total=Sum('quantity'))
-            .order_by('-total')[:5]
-        )
-        if not top:
-            return {'reply': "No sales recorded yet. Start adding transactions to see top products."}
-        lines = [f"{i+1}. {p['item__name']} — {p['total']} units" for i, p in enumerate(top)]
-        return {
-            'reply': "Top selling products:\n" + "\n".join(lines),
-            'links': [{'label': 'View Analytics', 'url': '/inventory/analytics/'}]
-        }
 
-    # ── Total sales amount ────────────────────────────────────────
-    if any(k in msg for k in ['total sales', 'total revenue', 'how much sales', 'sales amount', 'all sales']):
-        result = Transaction.objects.filter(
-            transaction_type='SALE', payment_status='PAID'
-        ).aggregate(total=Sum('total_amount'))
-        amt = result['total'] or 0
-        count = Transaction.objects.filter(transaction_type='SALE', payment_status='PAID').count()
-        return {
-            'reply': f"Total sales revenue (all time):\n• Rs. {amt:,.2f} from {count} paid transaction(s).",
-            'links': [{'label': 'View Transactions', 'url': '/inventory/transactions/'}]
-        }
+# Module-level singletons
+intent_router = IntentRouter(INTENTS)
+chatbot_cache = ChatbotCache()
 
-    # ── Inventory value ───────────────────────────────────────────
-    if any(k in msg for k in ['inventory value', 'stock value', 'total value', 'worth', 'asset value']):
-        total = sum(float(i.price) * i.quantity for i in Item.objects.all())
-        return {
-            'reply': f"The total current inventory value is Rs. {total:,.2f}.",
-            'links': [{'label': 'View Inventory', 'url': '/inventory/'}]
-        }
 
-    # ── Monthly report ────────────────────────────────────────────
-    if any(k in msg for k in ['monthly report', 'monthly sales', 'this month', 'month report', 'monthly summary']):
-        now = timezone.now()
-        sales = Transaction.total_sales_for_month(now.year, now.month)
-        purchases = Transaction.total_purchases_for_month(now.year, now.month)
-        profit = Transaction.total_profit_for_month(now.year, now.month)
-        return {
-            'reply': (
-                f"This month ({now.strftime('%B %Y')}):\n"
-                f"• Sales: Rs. {sales:,.2f}\n"
-                f"• Purchases: Rs. {purchases:,.2f}\n"
-                f"• Profit: Rs. {profit:,.2f}"
-            ),
-            'links': [{'label': 'Full Monthly Report', 'url': '/inventory/reports/monthly/'}]
-        }
+@receiver(post_save, sender=Item)
+@receiver(post_save, sender=Transaction)
+@receiver(post_delete, sender=Item)
+@receiver(post_delete, sender=Transaction)
+def _data_changed(sender, **kwargs):
+    # After commit, so a concurrent request cannot cache the old data under the new version
+    db_transaction.on_commit(chatbot_cache.bump)
 
-    # ── Analytics page ────────────────────────────────────────────
-    if any(k in msg for k in ['analytics', 'charts', 'graphs', 'dashboard analytics', 'sales chart', 'analytics page']):
-        return {
-            'reply': (
-                "The Analytics page shows 5 live charts:\n"
-                "• Sales Trend — units sold over last 30 days\n"
-                "• Top 5 Products — best sellers by quantity\n"
-                "• Monthly Revenue — revenue grouped by month\n"
-                "• Stock Distribution — current stock as a pie chart\n"
-                "• Purchase vs Sales — side-by-side comparison"
-            ),
-            'links': [{'label': 'Open Analytics', 'url': '/inventory/analytics/'}]
-        }
 
-    # ── How to add item ───────────────────────────────────────────
-    if any(k in msg for k in ['how to add', 'add item', 'add product', 'new item', 'create item', 'adding item']):
-        return {
-            'reply': (
-                "To add a new item:\n"
-                "1. Go to Inventory → click 'Add Item'\n"
-                "2. Enter the item name, quantity, and price\n"
-                "3. Set the reorder level (minimum stock before alert)\n"
-                "4. Set lead time (days needed to restock)\n"
-                "5. Optionally upload an image — or leave it blank to auto-fetch from Unsplash\n"
-                "6. Click 'Add Item' to save"
-            ),
-            'links': [{'label': 'Add Item', 'url': '/inventory/add/'}]
-        }
+# ── Data answers ──────────────────────────────────────────────────
+# intent -> (compute(), scope() or None); served through chatbot_cache
+DATA_ANSWERS = {}
 
-    # ── How to edit item ──────────────────────────────────────────
-    if any(k in msg for k in ['edit item', 'update item', 'change item', 'modify item', 'how to edit']):
-        return {
-            'reply': (
-                "To edit an item:\n"
-                "1. Go to Inventory and find the item\n"
-                "2. Click the edit (pencil) icon next to it\n"
-                "3. Update the fields you want to change\n"
-                "4. Click 'Update Item' to save\n\n"
-                "Note: Only Managers and Admins can edit items."
-            ),
-            'links': [{'label': 'View Inventory', 'url': '/inventory/'}]
-        }
 
-    # ── How to delete item ────────────────────────────────────────
-    if any(k in msg for k in ['delete item', 'remove item', 'how to delete', 'soft delete']):
-        return {
-            'reply': (
-                "To delete an item:\n"
-                "1. Go to Inventory and find the item\n"
-                "2. Click the delete (trash) icon\n"
-                "3. Confirm the deletion\n\n"
-                "Items are soft-deleted — they are marked inactive but not permanently removed. "
-                "Admins can restore them from the Admin panel."
-            ),
-            'links': [{'label': 'View Inventory', 'url': '/inventory/'}]
-        }
+def data_answer(intent, scope=None):
+    def decorator(compute):
+        DATA_ANSWERS[intent] = (compute, scope)
+        return compute
+    return decorator
 
-    # ── How to record a sale ──────────────────────────────────────
-    if any(k in msg for k in ['record sale', 'how to sell', 'create sale', 'make a sale', 'sell item', 'how to record a sale']):
-        return {
-            'reply': (
-                "To record a sale:\n"
-                "1. Go to Transactions → 'New Transaction'\n"
-                "2. Select the item from the dropdown\n"
-                "3. Set Transaction Type to 'Sale'\n"
-                "4. Enter quantity and unit price\n"
-                "5. Select a customer (optional)\n"
-                "6. Choose payment method (Cash, Khalti, eSewa, etc.)\n"
-                "7. Click 'Create Transaction'\n\n"
-                "Stock is automatically reduced when payment is marked as Paid."
-            ),
-            'links': [{'label': 'New Transaction', 'url': '/inventory/transactions/create/'}]
-        }
 
-    # ── How to record a purchase ──────────────────────────────────
-    if any(k in msg for k in ['record purchase', 'how to purchase', 'create purchase', 'buy stock', 'restock item', 'how to record a purchase']):
-        return {
-            'reply': (
-                "To record a purchase:\n"
-                "1. Go to Transactions → 'New Transaction'\n"
-                "2. Select the item from the dropdown\n"
-                "3. Set Transaction Type to 'Purchase'\n"
-                "4. Enter quantity and unit price\n"
-                "5. Select a supplier (optional)\n"
-                "6. Click 'Create Transaction'\n\n"
-                "Stock is automatically increased and the item's cost price is updated."
-            ),
-            'links': [{'label': 'New Transaction', 'url': '/inventory/transactions/create/'}]
-        }
+def _stock_counts():
+    """Active, low-stock and out-of-stock item counts from the StockCounters row."""
+    counters = stock_counters.read()
+    return {'total': counters.total_items, 'out_of_stock': counters.out_of_stock, 'low_stock': counters.low_stock}
 
-    # ── Transactions list ─────────────────────────────────────────
-    if any(k in msg for k in ['view transactions', 'transaction list', 'sales history', 'purchase history', 'all transactions']):
-        count = Transaction.objects.count()
-        paid = Transaction.objects.filter(payment_status='PAID').count()
-        pending = Transaction.objects.filter(payment_status='PENDING').count()
-        return {
-            'reply': (
-                f"Transaction summary:\n"
-                f"• Total: {count} transaction(s)\n"
-                f"• Paid: {paid}\n"
-                f"• Pending: {pending}"
-            ),
-            'links': [{'label': 'View Transactions', 'url': '/inventory/transactions/'}]
-        }
 
-    # ── Payments ──────────────────────────────────────────────────
-    if any(k in msg for k in ['payment', 'khalti', 'esewa', 'how to pay', 'payment method', 'pay for transaction']):
-        return {
-            'reply': (
-                "This system supports multiple payment methods:\n"
-                "• Cash — marked as Paid immediately\n"
-                "• Bank Transfer — marked as Paid immediately\n"
-                "• Khalti — digital wallet (Nepal)\n"
-                "• eSewa — digital wallet (Nepal)\n"
-                "• Credit — for deferred payments\n\n"
-                "For Khalti/eSewa, a payment simulation mode is available for testing. "
-                "After creating a transaction, open it and click 'Process Payment'."
-            ),
-            'links': [{'label': 'View Transactions', 'url': '/inventory/transactions/'}]
-        }
+def _low_items():
+    return Item.objects.filter(quantity__lte=F('reorder_level'), quantity__gt=0)
 
-    # ── SKU ───────────────────────────────────────────────────────
-    if any(k in msg for k in ['sku', 'stock keeping unit', 'what is sku', 'item code']):
-        return {
-            'reply': (
-                "SKU stands for Stock Keeping Unit — a unique code for each item.\n\n"
-                "• SKUs are auto-generated when you add a new item\n"
-                "• You can also set a custom SKU manually\n"
-                "• SKUs are visible in the Admin panel and item list\n"
-                "• They help identify items quickly without using the full name"
-            ),
-            'links': [{'label': 'View Inventory', 'url': '/inventory/'}]
-        }
 
-    # ── Reorder level ─────────────────────────────────────────────
-    if any(k in msg for k in ['reorder level', 'what is reorder', 'reorder threshold', 'minimum stock', 'reorder point']):
-        return {
-            'reply': (
-                "The Reorder Level is the minimum stock quantity before the system alerts you to restock.\n\n"
-                "Example: If an item has reorder level = 10 and current stock drops to 8, "
-                "it will appear as 'Low Stock'.\n\n"
-                "You can set the reorder level when adding or editing an item. "
-                "The AI Reorder system also uses this to suggest restocking quantities."
-            ),
-            'links': [{'label': 'View Reorder Suggestions', 'url': '/inventory/reorder-suggestions/'}]
-        }
+def _out_items():
+    return Item.objects.filter(quantity=0)
 
-    # ── AI reorder / AI system ────────────────────────────────────
-    if any(k in msg for k in ['ai reorder', 'ai system', 'how does ai work', 'machine learning', 'demand forecast', 'ai prediction', 'ai model']):
-        return {
-            'reply': (
-                "The AI Reorder system uses machine learning to predict future demand:\n\n"
-                "• It analyses past sales transactions for each item\n"
-                "• Predicts how much stock you'll need in the coming days\n"
-                "• Flags items as Critical, High, Medium, or Low priority\n"
-                "• Suggests a reorder quantity based on predicted demand\n\n"
-                "To train AI models, go to AI Models page. Items need at least 7 sales records to train."
-            ),
-            'links': [
-                {'label': 'AI Reorder Suggestions', 'url': '/inventory/reorder-suggestions/'},
-                {'label': 'AI Model Management', 'url': '/inventory/ai/models/'}
-            ]
-        }
 
-    # ── Export data ───────────────────────────────────────────────
-    if any(k in msg for k in ['export', 'download', 'csv', 'export data', 'download report', 'export inventory']):
-        return {
-            'reply': (
-                "You can export data as CSV files:\n\n"
-                "• Inventory Export — includes all items with AI insights\n"
-                "  Go to Inventory → 'Export CSV'\n\n"
-                "• Transaction Export — includes all transactions with payment details\n"
-                "  Go to Transactions → 'Export CSV'"
-            ),
-            'links': [
-                {'label': 'Export Inventory', 'url': '/inventory/export/csv/'},
-                {'label': 'Export Transactions', 'url': '/inventory/transactions/export/csv/'}
-            ]
-        }
+@data_answer('item_count')
+def _item_count():
+    counts = _stock_counts()
+    return {
+        'reply': (
+            f"There are {counts['total']} active items in inventory.\n"
+            f"• {counts['low_stock']} running low on stock\n"
+            f"• {counts['out_of_stock']} completely out of stock"
+        ),
+        'links': [{'label': 'View Inventory', 'url': '/inventory/'}]
+    }
 
-    # ── User roles / permissions ──────────────────────────────────
-    if any(k in msg for k in ['user role', 'roles', 'permissions', 'access level', 'who can', 'staff access', 'manager access', 'admin access']):
-        return {
-            'reply': (
-                "The system has 3 user roles:\n\n"
-                "👑 Admin\n"
-                "• Full access to everything\n"
-                "• Can approve/reject users and assign roles\n"
-                "• Can delete items and transactions\n\n"
-                "🔧 Manager\n"
-                "• Can add, edit items and create transactions\n"
-                "• Can view analytics and reports\n"
-                "• Cannot delete or manage users\n\n"
-                "👁 Staff\n"
-                "• Read-only access\n"
-                "• Can view inventory and transactions\n"
-                "• Cannot make changes"
-            )
-        }
 
-    # ── How to manage users ───────────────────────────────────────
-    if any(k in msg for k in ['manage users', 'approve user', 'user management', 'add user', 'new user', 'register user', 'pending users']):
+@data_answer('out_of_stock')
+def _out_of_stock():
+    counts = _stock_counts()
+    if not counts['out_of_stock']:
+        reply = "No items are currently out of stock (quantity = 0)."
+        if counts['low_stock']:
+            names = [f"{name} (qty: {qty})" for name, qty in _low_items().values_list('name', 'quantity')[:5]]
+            reply += f"\nHowever, {counts['low_stock']} item(s) are running low:\n" + "\n".join(f"• {n}" for n in names)
         return {
-            'reply': (
-                "User management (Admin only):\n\n"
-                "• New users register at /users/register/\n"
-                "• Their account starts as 'Pending'\n"
-                "• An Admin must approve them and assign a role (Manager or Staff)\n"
-                "• Go to Users → 'Manage Users' to see pending approvals\n\n"
-                "Only Admins can approve, reject, or change user roles."
-            ),
-            'links': [{'label': 'Manage Users', 'url': '/users/manage/'}]
+            'reply': reply,
+            'links': [{'label': 'View Low Stock Items', 'url': '/inventory/?status=low-stock'}] if counts['low_stock'] else []
         }
+    names = list(_out_items().values_list('name', flat=True)[:6])
+    return {
+        'reply': f"{counts['out_of_stock']} item(s) are completely out of stock:\n" + "\n".join(f"• {n}" for n in names) + ("..." if counts['out_of_stock'] > 6 else ""),
+        'links': [{'label': 'View Out of Stock', 'url': '/inventory/?status=out-of-stock'}]
+    }
 
-    # ── Profit / cost price ───────────────────────────────────────
-    if any(k in msg for k in ['profit', 'cost price', 'how is profit', 'profit calculation', 'margin']):
-        return {
-            'reply': (
-                "Profit is calculated as:\n"
-                "Profit = (Selling Price − Cost Price) × Quantity\n\n"
-                "• Cost price is automatically updated when you record a Purchase transaction\n"
-                "• Profit is shown per transaction in the Transactions list\n"
-                "• Monthly profit is shown in the Monthly Report\n\n"
-                "Make sure to record purchase transactions first so cost prices are accurate."
-            ),
-            'links': [{'label': 'View Transactions', 'url': '/inventory/transactions/'}]
-        }
 
-    # ── Supplier / Customer ───────────────────────────────────────
-    if any(k in msg for k in ['supplier', 'customer', 'vendor', 'buyer', 'who is supplier', 'who is customer']):
-        return {
-            'reply': (
-                "Suppliers and Customers can be linked to transactions:\n\n"
-                "• Supplier — linked to Purchase transactions (who you buy from)\n"
-                "• Customer — linked to Sale transactions (who you sell to)\n\n"
-                "When creating a transaction, select the relevant supplier or customer from the dropdown. "
-                "They can be managed from the Admin panel."
-            ),
-            'links': [{'label': 'New Transaction', 'url': '/inventory/transactions/create/'}]
-        }
+@data_answer('low_stock')
+def _low_stock():
+    counts = _stock_counts()
+    parts = []
+    if counts['low_stock']:
+        names = [
+            f"{name} (qty: {qty}, reorder at: {level})"
+            for name, qty, level in _low_items().values_list('name', 'quantity', 'reorder_level')[:5]
+        ]
+        parts.append(
+            f"{counts['low_stock']} item(s) are low on stock:\n" +
+            "\n".join(f"• {n}" for n in names) +
+            ("\n..." if counts['low_stock'] > 5 else "")
+        )
+    if counts['out_of_stock']:
+        out_names = list(_out_items().values_list('name', flat=True)[:3])
+        parts.append(f"{counts['out_of_stock']} item(s) are completely out of stock: {', '.join(out_names)}.")
+    if not parts:
+        return {'reply': "Great news! All items are well stocked right now."}
+    return {
+        'reply': '\n\n'.join(parts),
+        'links': [{'label': 'View Low Stock Items', 'url': '/inventory/?status=low-stock'}]
+    }
 
-    # ── How to add item (navigation shortcut) ────────────────────
-    if any(k in msg for k in ['where to add', 'where is add', 'find add item', 'navigate to add']):
-        return {
-            'reply': "Go to the top navigation bar → click 'Inventory' → then click the 'Add Item' button on the top right of the inventory page.",
-            'links': [{'label': 'Add Item', 'url': '/inventory/add/'}]
-        }
 
-    # ── Dashboard ─────────────────────────────────────────────────
-    if any(k in msg for k in ['dashboard', 'home page', 'main page', 'overview', 'go to dashboard']):
-        return {
-            'reply': (
-                "The Dashboard gives you a quick overview:\n"
-                "• Total items, low stock count, out of stock count\n"
-                "• Total inventory value\n"
-                "• 7-day sales trend mini chart\n"
-                "• AI stock alerts (critical, high priority)\n"
-                "• Recent items list\n"
-                "• Quick action buttons"
-            ),
-            'links': [{'label': 'Go to Dashboard', 'url': '/users/dashboard/'}]
-        }
+@data_answer('todays_sales', scope=lambda: date.today().isoformat())
+def _todays_sales():
+    today = date.today()
+    result = Transaction.objects.filter(
+        transaction_type='SALE', payment_status='PAID', timestamp__date=today
+    ).aggregate(total_qty=Sum('quantity'), total_amt=Sum('total_amount'))
+    qty = result['total_qty'] or 0
+    amt = result['total_amt'] or 0
+    return {
+        'reply': f"Today's sales ({today.strftime('%b %d, %Y')}):\n• {qty} unit(s) sold\n• Total: Rs. {amt:,.2f}",
+        'links': [{'label': 'View Transactions', 'url': '/inventory/transactions/'}]
+    }
 
-    # ── Fallback ──────────────────────────────────────────────────
+
+@data_answer('top_selling')
+def _top_selling():
+    top = list(
+        Transaction.objects.filter(transaction_type='SALE', payment_status='PAID')
+        .values('item__name')
+        .annotate(total=Sum('quantity'))
+        .order_by('-total')[:5]
+    )
+    if not top:
+        return {'reply': "No sales recorded yet. Start adding transactions to see top products."}
+    lines = [f"{i+1}. {p['item__name']} — {p['total']} units" for i, p in enumerate(top)]
+    return {
+        'reply': "Top selling products:\n" + "\n".join(lines),
+        'links': [{'label': 'View Analytics', 'url': '/inventory/analytics/'}]
+    }
+
+
+@data_answer('total_sales')
+def _total_sales():
+    result = Transaction.objects.filter(
+        transaction_type='SALE', payment_status='PAID'
+    ).aggregate(total=Sum('total_amount'), count=Count('id'))
+    amt = result['total'] or 0
+    return {
+        'reply': f"Total sales revenue (all time):\n• Rs. {amt:,.2f} from {result['count']} paid transaction(s).",
+        'links': [{'label': 'View Transactions', 'url': '/inventory/transactions/'}]
+    }
+
+
+@data_answer('inventory_value')
+def _inventory_value():
+    counters = stock_counters.read()
     return {
         'reply': (
-            "I couldn't understand that. Here are some things you can ask:\n"
-            "• 'Show low stock items'\n"
-            "• 'How to add an item?'\n"
-            "• 'How do payments work?'\n"
-            "• 'What is reorder level?'\n"
-            "• 'How does AI reorder work?'\n\n"
-            "Type 'help' to see the full list."
-        )
+            f"The total current inventory value is Rs. {counters.stock_value:,.2f} "
+            f"(Rs. {counters.stock_cost:,.2f} at cost price)."
+        ),
+        'links': [{'label': 'View Inventory', 'url': '/inventory/'}]
     }
+
+
+@data_answer('monthly_report', scope=lambda: timezone.now().strftime('%Y-%m'))
+def _monthly_report():
+    now = timezone.now()
+    report = Transaction.get_monthly_report(now.year, now.month)
+    return {
+        'reply': (
+            f"This month ({now.strftime('%B %Y')}):\n"
+            f"• Sales: Rs. {report['total_sales']:,.2f}\n"
+            f"• Purchases: Rs. {report['total_purchases']:,.2f}\n"
+            f"• Profit: Rs. {report['total_profit']:,.2f}"
+        ),
+        'links': [{'label': 'Full Monthly Report', 'url': '/inventory/reports/monthly/'}]
+    }
+
+
+@data_answer('transactions')
+def _transactions():
+    counts = Transaction.objects.aggregate(
+        count=Count('id'),
+        paid=Count('id', filter=Q(payment_status='PAID')),
+        pending=Count('id', filter=Q(payment_status='PENDING')),
+    )
+    return {
+        'reply': (
+            f"Transaction summary:\n"
+            f"• Total: {counts['count']} transaction(s)\n"
+            f"• Paid: {counts['paid']}\n"
+            f"• Pending: {counts['pending']}"
+        ),
+        'links': [{'label': 'View Transactions', 'url': '/inventory/transactions/'}]
+    }
+
+
+# ── Ad-hoc sales queries ──────────────────────────────────────────
+# Metrics in priority order: "profit of items sold" asks for profit
+QUERY_METRICS = [
+    ('profit', re.compile(r'\b(?:profits?|margins?|earnings)\b')),
+    ('units', re.compile(r'\b(?:units?|quantity|qty|how many|sold|sell|selling)\b')),
+    ('revenue', re.compile(r'\b(?:revenue|sales|turnover|income|takings)\b')),
+]
+
+QUERY_GROUPS = {
+    'item': 'item', 'product': 'item',
+    'supplier': 'supplier', 'vendor': 'supplier',
+    'customer': 'customer', 'buyer': 'customer', 'client': 'customer',
+    'payment method': 'payment_method', 'payment': 'payment_method', 'method': 'payment_method',
+}
+GROUP_PATTERN = re.compile(
+    r'\b(?:by|per|for each|each|across|top|best|which)\s+(?:\d+\s+)?(?:the\s+)?'
+    r'(payment method|payment|method|item|product|supplier|vendor|customer|buyer|client)s?\b'
+)
+TOP_ITEMS_PATTERN = re.compile(r'\b(?:top|best)[ -]selling\b|\bmost (?:sold|popular)\b')
+
+MONTH_NUMBERS = {name.lower(): number for number, name in enumerate(calendar.month_name) if name}
+MONTH_NUMBERS.update({name.lower(): number for number, name in enumerate(calendar.month_abbr) if name})
+MONTH_NUMBERS['sept'] = 9
+MONTH_PATTERN = re.compile(
+    r'\b(?:(since)\s+)?(?:(?:in|during|for|of)\s+)?(' + '|'.join(sorted(MONTH_NUMBERS, key=len, reverse=True)) +
+    r')\b(?:\s+(\d{4}))?'
+)
+ISO_RANGE_PATTERN = re.compile(
+    r'\b(?:from\s+|between\s+)?(\d{4}-\d{2}-\d{2})\s*(?:to|until|till|through|and|-)\s*(\d{4}-\d{2}-\d{2})\b'
+)
+ISO_DAY_PATTERN = re.compile(r'\b(?:(since)\s+|on\s+)?(\d{4}-\d{2}-\d{2})\b')
+ROLLING_PATTERN = re.compile(r'\b(?:last|past|previous)\s+(?P<count>\d+)\s+(?P<unit>day|week|month|year)s?\b')
+# "past week" is a rolling week, unlike the calendar "last week"
+PAST_PATTERN = re.compile(r'\bpast\s+(?P<count>)(?P<unit>day|week|month|year)\b')
+YEAR_PATTERN = re.compile(r'\b(?:in|during|for|of)\s+(\d{4})\b')
+NAMED_RANGES = re.compile(
+    r'\b(today|yesterday|this week|last week|previous week|this month|last month|previous month|'
+    r'this year|last year|previous year)\b'
+)
+
+SKU_PATTERN = re.compile(r'\b[a-z0-9]+(?:-[a-z0-9]+)+\b')
+ITEM_PHRASE_PATTERN = re.compile(r'\b(?:for|of|on|about)\s+(.+)')
+ITEM_PHRASE_END = re.compile(
+    r'\b(?:by|per|in|during|from|since|between|to|were|was|is|are|did|do|does|sold|sell|selling|have|has|had|'
+    r'we|with|and|this|last|past|month|week|year|day|days|period|time)\b|[?!.,]'
+)
+ITEM_PHRASE_FILLER = re.compile(r'^(?:(?:the|item|items|product|products|all|our|my|sku|each|every)(?:\s+|$))*')
+
+DEFAULT_QUERY_DAYS = 30
+
+GROUP_LABELS = {'item': 'item', 'supplier': 'supplier', 'customer': 'customer', 'payment_method': 'payment method'}
+METRIC_LABELS = {'units': 'Units sold', 'revenue': 'Revenue', 'profit': 'Profit'}
+
+
+def _shift_months(day, months):
+    """`day` moved by whole months, clamped to the end of shorter months."""
+    month_index = day.year * 12 + day.month - 1 + months
+    year, month = divmod(month_index, 12)
+    month += 1
+    return date(year, month, min(day.day, calendar.monthrange(year, month)[1]))
+
+
+def _month_range(year, month):
+    return date(year, month, 1), date(year, month, calendar.monthrange(year, month)[1])
+
+
+def _format_metric(metric, value):
+    if metric == 'units':
+        return f"{value:,} unit(s)"
+    return f"Rs. {value:,.2f}"
+
+
+class SalesQuery:
+    """A parsed ad-hoc sales question, answered from the daily sales rollups."""
+
+    def __init__(self, metric, start, end, period, group_by=None, item_text='', clamped=False):
+        self.metric = metric
+        self.start = start
+        self.end = end
+        self.period = period
+        self.group_by = group_by
+        self.item_text = item_text
+        self.clamped = clamped
+
+    def cache_scope(self):
+        key = '|'.join([self.metric, self.group_by or '', self.item_text, self.start.isoformat(), self.end.isoformat()])
+        # Hashed: the item text may hold characters cache backends reject in keys
+        return hashlib.md5(key.encode()).hexdigest()
+
+    def describe_period(self):
+        if self.start == self.end:
+            dates = self.start.strftime('%b %d, %Y')
+        elif self.start.year == self.end.year:
+            dates = f"{self.start.strftime('%b %d')} – {self.end.strftime('%b %d, %Y')}"
+        else:
+            dates = f"{self.start.strftime('%b %d, %Y')} – {self.end.strftime('%b %d, %Y')}"
+        return f"{self.period} ({dates})"
+
+    def find_item(self):
+        ids = search_index.search_ids('items', self.item_text, limit=1)
+        return Item.objects.filter(pk__in=ids).only('id', 'name').first() if ids else None
+
+    def answer(self):
+        item = None
+        if self.item_text:
+            item = self.find_item()
+            if item is None:
+                return {
+                    'reply': f"I couldn't find an item matching '{self.item_text}'. Try its exact name or SKU.",
+                    'links': [{'label': 'Search Inventory', 'url': '/inventory/'}]
+                }
+
+        summary = sales_summary(self.metric, self.start, self.end, item_id=item.pk if item else None, group_by=self.group_by)
+        subject = f" of {item.name}" if item else ""
+        period = self.describe_period()
+        if not summary['sales_count']:
+            reply = f"No paid sales{subject} {period}."
+        elif self.group_by:
+            lines = [
+                f"{i+1}. {label} — {_format_metric(self.metric, value)}"
+                for i, (label, value) in enumerate(summary['groups'])
+            ]
+            if summary['more_groups']:
+                lines.append("...")
+            reply = (
+                f"{METRIC_LABELS[self.metric]}{subject} by {GROUP_LABELS[self.group_by]}, {period}:\n" +
+                "\n".join(lines) +
+                f"\nTotal: {_format_metric(self.metric, summary[self.metric])}"
+            )
+        else:
+            figures = {
+                'revenue': f"• Revenue: {_format_metric('revenue', summary['revenue'])}",
+                'units': f"• Units sold: {summary['units']:,}",
+                'profit': f"• Profit: {_format_metric('profit', summary['profit'])}",
+            }
+            # The figure asked about first
+            lines = [figures[self.metric]] + [line for metric, line in figures.items() if metric != self.metric]
+            reply = f"Sales{subject}, {period}:\n" + "\n".join(lines) + f"\n• Paid sales: {summary['sales_count']:,}"
+        if self.clamped:
+            reply += f"\n(Only the last {(self.end - self.start).days + 1} days are covered.)"
+
+        links = [{'label': 'View Analytics', 'url': '/inventory/analytics/'}]
+        if item:
+            links.insert(0, {'label': f'{item.name} Analytics', 'url': f'/inventory/analytics/item/{item.pk}/'})
+        return {'reply': reply, 'links': links}
+
+
+class SalesQueryParser:
+    """
+    Turns a lowercased message into a SalesQuery, or None when it is not an
+    ad-hoc sales question (no metric, or nothing beyond the metric: "total
+    sales" and "profit" stay with their keyword intents).
+    """
+
+    def __init__(self, max_days=None):
+        self.max_days = max_days or getattr(settings, 'CHATBOT_QUERY_MAX_DAYS', 366)
+
+    def parse(self, msg, today=None):
+        metric = next((name for name, pattern in QUERY_METRICS if pattern.search(msg)), None)
+        if metric is None:
+            return None
+        today = today or timezone.localdate()
+
+        found = self.parse_range(msg, today)
+        rest = msg
+        if found:
+            start, end, period, span = found
+            rest = msg[:span[0]] + ' ' + msg[span[1]:]
+
+        group_by = None
+        match = GROUP_PATTERN.search(rest)
+        if match:
+            group_by = QUERY_GROUPS[match.group(1)]
+            rest = rest[:match.start()] + ' ' + rest[match.end():]
+
+        item_text = self.parse_item(rest)
+        if not (found or group_by or item_text):
+            return None
+        if group_by is None and not item_text and TOP_ITEMS_PATTERN.search(rest):
+            # "top selling products last week"; without a range it stays the all-time top_selling intent
+            group_by = 'item'
+        if not found:
+            start, end, period = today - timedelta(days=DEFAULT_QUERY_DAYS - 1), today, f"the last {DEFAULT_QUERY_DAYS} days"
+
+        end = min(end, today)
+        if start > end:
+            start = end
+        start, end, clamped = clamp_range(start, end, self.max_days)
+        return SalesQuery(metric, start, end, period, group_by=group_by, item_text=item_text, clamped=clamped)
+
+    def parse_range(self, msg, today):
+        """(start, end, period, (span start, span end)) of the first date range in `msg`, or None."""
+        match = ISO_RANGE_PATTERN.search(msg)
+        if match:
+            try:
+                start, end = sorted(date.fromisoformat(match.group(n)) for n in (1, 2))
+            except ValueError:
+                return None
+            return start, end, 'in that period', match.span()
+
+        match = ISO_DAY_PATTERN.search(msg)
+        if match:
+            try:
+                day = date.fromisoformat(match.group(2))
+            except ValueError:
+                return None
+            if match.group(1):
+                return day, today, f"since {day.strftime('%b %d, %Y')}", match.span()
+            return day, day, 'on that day', match.span()
+
+        match = ROLLING_PATTERN.search(msg) or PAST_PATTERN.search(msg)
+        if match:
+            count = int(match.group('count') or 1)
+            unit = match.group('unit')
+            # Capped: the range is cut to max_days below anyway
+            span = min(count, self.max_days)
+            if unit == 'day':
+                start = today - timedelta(days=span - 1)
+            elif unit == 'week':
+                start = today - timedelta(days=7 * span - 1)
+            else:
+                start = _shift_months(today, -span if unit == 'month' else -12 * span) + timedelta(days=1)
+            period = f"the last {count} {unit}s" if count > 1 else f"the past {unit}"
+            return start, today, period, match.span()
+
+        match = NAMED_RANGES.search(msg)
+        if match:
+            name = match.group(1).replace('previous', 'last')
+            monday = today - timedelta(days=today.weekday())
+            if name == 'today':
+                start = end = today
+            elif name == 'yesterday':
+                start = end = today - timedelta(days=1)
+            elif name == 'this week':
+                start, end = monday, today
+            elif name == 'last week':
+                start, end = monday - timedelta(days=7), monday - timedelta(days=1)
+            elif name == 'this month':
+                start, end = today.replace(day=1), today
+            elif name == 'last month':
+                previous = today.replace(day=1) - timedelta(days=1)
+                start, end = _month_range(previous.year, previous.month)
+            elif name == 'this year':
+                start, end = date(today.year, 1, 1), today
+            else:
+                start, end = date(today.year - 1, 1, 1), date(today.year - 1, 12, 31)
+            return start, end, name, match.span()
+
+        match = MONTH_PATTERN.search(msg)
+        if match:
+            month = MONTH_NUMBERS[match.group(2)]
+            if match.group(3):
+                year = int(match.group(3))
+            else:
+                # The most recent such month
+                year = today.year if month <= today.month else today.year - 1
+            start, end = _month_range(year, month)
+            if match.group(1):
+                return start, today, f"since {start.strftime('%B %Y')}", match.span()
+            return start, end, f"in {start.strftime('%B %Y')}", match.span()
+
+        match = YEAR_PATTERN.search(msg)
+        if match and 1900 < int(match.group(1)) <= today.year:
+            year = int(match.group(1))
+            return date(year, 1, 1), date(year, 12, 31), f"in {year}", match.span()
+        return None
+
+    def parse_item(self, rest):
+        """Item SKU or name mentioned in what is left of the message, or ''."""
+        for match in SKU_PATTERN.finditer(rest):
+            if any(ch.isdigit() for ch in match.group()):
+                return match.group()
+        match = ITEM_PHRASE_PATTERN.search(rest)
+        if not match:
+            return ''
+        phrase = match.group(1)
+        end = ITEM_PHRASE_END.search(phrase)
+        if end:
+            phrase = phrase[:end.start()]
+        return ITEM_PHRASE_FILLER.sub('', phrase.strip()).strip()
+
+
+sales_query_parser = SalesQueryParser()
+
+
+# ── Static answers ────────────────────────────────────────────────
+STATIC_ANSWERS = {
+    'help': {
+        'reply': (
+            "Hi! I'm your Inventory Assistant. Here's what you can ask me:\n\n"
+            "📦 Inventory\n"
+            "• How many items are in stock?\n"
+            "• Show low stock items\n"
+            "• Show out of stock items\n"
+            "• What is the inventory value?\n\n"
+            "💰 Sales & Transactions\n"
+            "• Today's sales\n"
+            "• Top selling products\n"
+            "• Total sales revenue\n"
+            "• How to record a sale?\n"
+            "• How to record a purchase?\n\n"
+            "📊 Reports & Analytics\n"
+            "• This month's report\n"
+            "• Revenue by supplier last month\n"
+            "• Units sold of <item name or SKU> in March\n"
+            "• Profit by payment method in the last 14 days\n"
+            "• What does the analytics page show?\n\n"
+            "⚙️ System Help\n"
+            "• How to add an item?\n"
+            "• How to edit an item?\n"
+            "• How to delete an item?\n"
+            "• How do payments work?\n"
+            "• What is SKU?\n"
+            "• What is reorder level?\n"
+            "• How does AI reorder work?\n"
+            "• How to manage users?\n"
+            "• How to export data?"
+        )
+    },
+    'analytics': {
+        'reply': (
+            "The Analytics page shows 5 live charts:\n"
+            "• Sales Trend — units sold over last 30 days\n"
+            "• Top 5 Products — best sellers by quantity\n"
+            "• Monthly Revenue — revenue grouped by month\n"
+            "• Stock Distribution — current stock as a pie chart\n"
+            "• Purchase vs Sales — side-by-side comparison"
+        ),
+        'links': [{'label': 'Open Analytics', 'url': '/inventory/analytics/'}]
+    },
+    'add_item': {
+        'reply': (
+            "To add a new item:\n"
+            "1. Go to Inventory → click 'Add Item'\n"
+            "2. Enter the item name, quantity, and price\n"
+            "3. Set the reorder level (minimum stock before alert)\n"
+            "4. Set lead time (days needed to restock)\n"
+            "5. Optionally upload an image — or leave it blank to auto-fetch from Unsplash\n"
+            "6. Click 'Add Item' to save"
+        ),
+        'links': [{'label': 'Add Item', 'url': '/inventory/add/'}]
+    },
+    'edit_item': {
+        'reply': (
+            "To edit an item:\n"
+            "1. Go to Inventory and find the item\n"
+            "2. Click the edit (pencil) icon next to it\n"
+            "3. Update the fields you want to change\n"
+            "4. Click 'Update Item' to save\n\n"
+            "Note: Only Managers and Admins can edit items."
+        ),
+        'links': [{'label': 'View Inventory', 'url': '/inventory/'}]
+    },
+    'delete_item': {
+        'reply': (
+            "To delete an item:\n"
+            "1. Go to Inventory and find the item\n"
+            "2. Click the delete (trash) icon\n"
+            "3. Confirm the deletion\n\n"
+            "Items are soft-deleted — they are marked inactive but not permanently removed. "
+            "Admins can restore them from the Admin panel."
+        ),
+        'links': [{'label': 'View Inventory', 'url': '/inventory/'}]
+    },
+    'record_sale': {
+        'reply': (
+            "To record a sale:\n"
+            "1. Go to Transactions → 'New Transaction'\n"
+            "2. Select the item from the dropdown\n"
+            "3. Set Transaction Type to 'Sale'\n"
+            "4. Enter quantity and unit price\n"
+            "5. Select a customer (optional)\n"
+            "6. Choose payment method (Cash, Khalti, eSewa, etc.)\n"
+            "7. Click 'Create Transaction'\n\n"
+            "Stock is automatically reduced when payment is marked as Paid."
+        ),
+        'links': [{'label': 'New Transaction', 'url': '/inventory/transactions/create/'}]
+    },
+    'record_purchase': {
+        'reply': (
+            "To record a purchase:\n"
+            "1. Go to Transactions → 'New Transaction'\n"
+            "2. Select the item from the dropdown\n"
+            "3. Set Transaction Type to 'Purchase'\n"
+            "4. Enter quantity and unit price\n"
+            "5. Select a supplier (optional)\n"
+            "6. Click 'Create Transaction'\n\n"
+            "Stock is automatically increased and the item's cost price is updated."
+        ),
+        'links': [{'label': 'New Transaction', 'url': '/inventory/transactions/create/'}]
+    },
+    'payments': {
+        'reply': (
+            "This system supports multiple payment methods:\n"
+            "• Cash — marked as Paid immediately\n"
+            "• Bank Transfer — marked as Paid immediately\n"
+            "• Khalti — digital wallet (Nepal)\n"
+            "• eSewa — digital wallet (Nepal)\n"
+            "• Credit — for deferred payments\n\n"
+            "For Khalti/eSewa, a payment simulation mode is available for testing. "
+            "After creating a transaction, open it and click 'Process Payment'."
+        ),
+        'links': [{'label': 'View Transactions', 'url': '/inventory/transactions/'}]
+    },
+    'sku': {
+        'reply': (
+            "SKU stands for Stock Keeping Unit — a unique code for each item.\n\n"
+            "• SKUs are auto-generated when you add a new item\n"
+            "• You can also set a custom SKU manually\n"
+            "• SKUs are visible in the Admin panel and item list\n"
+            "• They help identify items quickly without using the full name"
+        ),
+        'links': [{'label': 'View Inventory', 'url': '/inventory/'}]
+    },
+    'reorder_level': {
+        'reply': (
+            "The Reorder Level is the minimum stock quantity before the system alerts you to restock.\n\n"
+            "Example: If an item has reorder level = 10 and current stock drops to 8, "
+            "it will appear as 'Low Stock'.\n\n"
+            "You can set the reorder level when adding or editing an item. "
+            "The AI Reorder system also uses this to suggest restocking quantities."
+        ),
+        'links': [{'label': 'View Reorder Suggestions', 'url': '/inventory/reorder-suggestions/'}]
+    },
+    'ai_reorder': {
+        'reply': (
+            "The AI Reorder system uses machine learning to predict future demand:\n\n"
+            "• It analyses past sales transactions for each item\n"
+            "• Predicts how much stock you'll need in the coming days\n"
+            "• Flags items as Critical, High, Medium, or Low priority\n"
+            "• Suggests a reorder quantity based on predicted demand\n\n"
+            "To train AI models, go to AI Models page. Items need at least 7 sales records to train."
+        ),
+        'links': [
+            {'label': 'AI Reorder Suggestions', 'url': '/inventory/reorder-suggestions/'},
+            {'label': 'AI Model Management', 'url': '/inventory/ai/models/'}
+        ]
+    },
+    'export': {
+        'reply': (
+            "You can export data as CSV files:\n\n"
+            "• Inventory Export — includes all items with AI insights\n"
+            "  Go to Inventory → 'Export CSV'\n\n"
+            "• Transaction Export — includes all transactions with payment details\n"
+            "  Go to Transactions → 'Export CSV'"
+        ),
+        'links': [
+            {'label': 'Export Inventory', 'url': '/inventory/export/csv/'},
+            {'label': 'Export Transactions', 'url': '/inventory/transactions/export/csv/'}
+        ]
+    },
+    'user_roles': {
+        'reply': (
+            "The system has 3 user roles:\n\n"
+            "👑 Admin\n"
+            "• Full access to everything\n"
+            "• Can approve/reject users and assign roles\n"
+            "• Can delete items and transactions\n\n"
+            "🔧 Manager\n"
+            "• Can add, edit items and create transactions\n"
+            "• Can view analytics and reports\n"
+            "• Cannot delete or manage users\n\n"
+            "👁 Staff\n"
+            "• Read-only access\n"
+            "• Can view inventory and transactions\n"
+            "• Cannot make changes"
+        )
+    },
+    'manage_users': {
+        'reply': (
+            "User management (Admin only):\n\n"
+            "• New users register at /users/register/\n"
+            "• Their account starts as 'Pending'\n"
+            "• An Admin must approve them and assign a role (Manager or Staff)\n"
+            "• Go to Users → 'Manage Users' to see pending approvals\n\n"
+            "Only Admins can approve, reject, or change user roles."
+        ),
+        'links': [{'label': 'Manage Users', 'url': '/users/manage/'}]
+    },
+    'profit': {
+        'reply': (
+            "Profit is calculated as:\n"
+            "Profit = (Selling Price − Cost Price) × Quantity\n\n"
+            "• Cost price is automatically updated when you record a Purchase transaction\n"
+            "• Profit is shown per transaction in the Transactions list\n"
+            "• Monthly profit is shown in the Monthly Report\n\n"
+            "Make sure to record purchase transactions first so cost prices are accurate."
+        ),
+        'links': [{'label': 'View Transactions', 'url': '/inventory/transactions/'}]
+    },
+    'suppliers_customers': {
+        'reply': (
+            "Suppliers and Customers can be linked to transactions:\n\n"
+            "• Supplier — linked to Purchase transactions (who you buy from)\n"
+            "• Customer — linked to Sale transactions (who you sell to)\n\n"
+            "When creating a transaction, select the relevant supplier or customer from the dropdown. "
+            "They can be managed from the Admin panel."
+        ),
+        'links': [{'label': 'New Transaction', 'url': '/inventory/transactions/create/'}]
+    },
+    'where_to_add': {
+        'reply': "Go to the top navigation bar → click 'Inventory' → then click the 'Add Item' button on the top right of the inventory page.",
+        'links': [{'label': 'Add Item', 'url': '/inventory/add/'}]
+    },
+    'dashboard': {
+        'reply': (
+            "The Dashboard gives you a quick overview:\n"
+            "• Total items, low stock count, out of stock count\n"
+            "• Total inventory value\n"
+            "• 7-day sales trend mini chart\n"
+            "• AI stock alerts (critical, high priority)\n"
+            "• Recent items list\n"
+            "• Quick action buttons"
+        ),
+        'links': [{'label': 'Go to Dashboard', 'url': '/users/dashboard/'}]
+    },
+}
+
+FALLBACK_ANSWER = {
+    'reply': (
+        "I couldn't understand that. Here are some things you can ask:\n"
+        "• 'Show low stock items'\n"
+        "• 'How to add an item?'\n"
+        "• 'How do payments work?'\n"
+        "• 'What is reorder level?'\n"
+        "• 'How does AI reorder work?'\n\n"
+        "Type 'help' to see the full list."
+    )
+}
+
+
+def get_chatbot_response(message):
+    """
+    Process a user message and return a response dict.
+    Returns: { 'reply': str, 'links': list (optional) }
+    """
+    msg = message.lower().strip()
+
+    query = sales_query_parser.parse(msg)
+    if query is not None:
+        return chatbot_cache.answer('sales_query', query.answer, query.cache_scope())
+
+    intent = intent_router.route(msg)
+    if intent in DATA_ANSWERS:
+        compute, scope = DATA_ANSWERS[intent]
+        return chatbot_cache.answer(intent, compute, scope() if scope else '')
+
+    # Copy, so a caller changing the response cannot change the prebuilt answer
+    return dict(STATIC_ANSWERS.get(intent, FALLBACK_ANSWER))
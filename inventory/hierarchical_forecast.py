@@ -0,0 +1,211 @@
+"""
+Hierarchical Demand Forecasting
+===============================
+
+Pools sales across a three-level hierarchy (catalogue → supplier → item) so
+that new and intermittent items get a stable demand signal instead of a flat
+14-day moving average over a handful of sales.
+
+How it works:
+1. One grouped query builds the item × day sales matrix Y
+2. Every item is mapped to its supplier group (items without a supplier
+   form their own group); group totals are np.bincount sums over that
+   index, so no groups × items matrix is ever built
+3. Base forecasts are exponentially-weighted means of daily sales (Y @ w)
+4. Each item's base forecast is shrunk towards its supplier's per-item mean,
+   weighted by how many days the item actually sold on
+5. Shrunk item forecasts are rescaled so every supplier still sums to its
+   own base forecast (top-down); the catalogue forecast is the sum of the
+   supplier forecasts (bottom-up), so all three levels stay coherent
+
+Everything after the query is a handful of numpy matrix operations, so the
+cost grows with the number of items rather than with the number of
+per-item Python loops. The result is cached until a sale is recorded or
+changed, or an item is added, removed or moved to another supplier; stock
+and price edits do not invalidate it.
+"""
+
+import numpy as np
+from datetime import timedelta
+from django.utils import timezone
+from django.db.models import Count, F, Max, Sum
+from django.db.models.functions import TruncDate
+
+import logging
+logger = logging.getLogger(__name__)
+
+from .metrics import CACHE_REQUESTS
+from .models import Item, Transaction
+
+
+class HierarchicalForecaster:
+    """
+    Reconciled daily demand forecasts for every item, supplier and the
+    catalogue as a whole.
+    """
+
+    def __init__(self, days_history=56, half_life_days=14, shrinkage_days=5):
+        self.days_history = days_history
+        self.half_life_days = half_life_days
+        # Number of selling days at which an item's own history and its
+        # supplier prior carry equal weight.
+        self.shrinkage_days = shrinkage_days
+        self._snapshot = None
+
+    # ------------------------------------------------------------------
+    # Public API
+    # ------------------------------------------------------------------
+
+    def current_version(self):
+        """
+        Fingerprint of everything the forecast depends on: sale rows, which
+        items are active under which supplier, and the current date. Stock
+        and price changes leave it alone.
+        """
+        sales = Transaction.all_objects.filter(transaction_type='SALE').aggregate(
+            rows=Count('id'), last_id=Max('id'), last_change=Max('updated_at'),
+        )
+        # Weighted sums change when an item moves to another supplier
+        items = Item.objects.aggregate(
+            rows=Count('id'), last_id=Max('id'),
+            supplier_sum=Sum('supplier_id'), supplier_mix=Sum(F('id') * F('supplier_id')),
+        )
+        return (
+            timezone.now().date(),
+            sales['rows'], sales['last_id'], sales['last_change'],
+            items['rows'], items['last_id'], items['supplier_sum'], items['supplier_mix'],
+        )
+
+    def forecast(self, version=None):
+        """
+        Return the reconciled forecast snapshot, rebuilding it only when the
+        catalogue has changed since it was last built. Pass `version` (from
+        current_version()) to skip re-checking it when forecasting in bulk.
+
+        Returns:
+            dict: {
+                'version': ...,
+                'items': {item_id: avg daily demand},
+                'suppliers': {supplier_id or None: avg daily demand},
+                'catalogue': avg daily demand,
+                'selling_days': {item_id: days with at least one sale},
+            }
+        """
+        version = version or self.current_version()
+        if self._snapshot is None or self._snapshot['version'] != version:
+            CACHE_REQUESTS.inc(cache='hierarchy', result='miss')
+            self._snapshot = self._build(version)
+        else:
+            CACHE_REQUESTS.inc(cache='hierarchy', result='hit')
+        return self._snapshot
+
+    def invalidate(self):
+        """Drop the snapshot so the next forecast() rebuilds it."""
+        self._snapshot = None
+
+    def item_daily_demand(self, item):
+        """Reconciled average daily demand for one item, or None if unknown."""
+        return self.forecast()['items'].get(item.id)
+
+    def supplier_daily_demand(self, supplier_id):
+        """Average daily demand across all items of a supplier (None = unassigned)."""
+        return self.forecast()['suppliers'].get(supplier_id, 0.0)
+
+    # ------------------------------------------------------------------
+    # Matrix construction
+    # ------------------------------------------------------------------
+
+    def _build(self, version):
+        today = timezone.now().date()
+        start = today - timedelta(days=self.days_history - 1)
+
+        catalogue = list(Item.objects.values_list('id', 'supplier_id'))
+        if not catalogue:
+            return {
+                'version': version, 'items': {}, 'suppliers': {},
+                'catalogue': 0.0, 'selling_days': {},
+            }
+
+        item_ids = [item_id for item_id, _ in catalogue]
+        row_of = {item_id: row for row, item_id in enumerate(item_ids)}
+
+        group_keys = sorted({supplier_id for _, supplier_id in catalogue},
+                            key=lambda s: (s is None, s or 0))
+        group_of = {key: g for g, key in enumerate(group_keys)}
+
+        # group[i] = supplier group of item i
+        group = np.array([group_of[s] for _, s in catalogue], dtype=np.intp)
+
+        # Y[i, d] = units of item i sold on day d of the window
+        Y = np.zeros((len(item_ids), self.days_history))
+        daily_sales = (
+            Transaction.objects.filter(
+                transaction_type='SALE',
+                payment_status='PAID',
+                timestamp__date__gte=start,
+            )
+            .annotate(day=TruncDate('timestamp'))
+            .values('item_id', 'day')
+            .annotate(qty=Sum('quantity'))
+        )
+        for r in daily_sales:
+            row = row_of.get(r['item_id'])
+            col = (r['day'] - start).days
+            if row is not None and 0 <= col < self.days_history:
+                Y[row, col] += r['qty']
+
+        reconciled, group_base, selling_days = self._reconcile(Y, group, len(group_keys))
+
+        return {
+            'version': version,
+            'items': dict(zip(item_ids, reconciled.tolist())),
+            'suppliers': dict(zip(group_keys, group_base.tolist())),
+            'catalogue': float(group_base.sum()),
+            'selling_days': dict(zip(item_ids, selling_days.tolist())),
+        }
+
+    def _reconcile(self, Y, group, n_groups):
+        """
+        Shrink item forecasts towards their supplier and rescale so every
+        level of the hierarchy agrees.
+
+        Args:
+            Y: (items × days) daily sales matrix, oldest day first
+            group: supplier group index of every item
+            n_groups: number of supplier groups
+
+        Returns:
+            tuple: (item forecasts, supplier forecasts, selling days per item)
+        """
+        n_days = Y.shape[1]
+        age = np.arange(n_days)[::-1]
+        w = 0.5 ** (age / self.half_life_days)
+        w /= w.sum()
+
+        def group_sum(values):
+            return np.bincount(group, weights=values, minlength=n_groups)
+
+        item_base = Y @ w
+        group_base = group_sum(item_base)
+        group_size = np.bincount(group, minlength=n_groups)
+
+        # Prior: supplier's demand spread evenly over its items
+        group_mean = np.divide(group_base, group_size,
+                               out=np.zeros_like(group_base), where=group_size > 0)
+        prior = group_mean[group]
+
+        selling_days = (Y > 0).sum(axis=1)
+        alpha = selling_days / (selling_days + self.shrinkage_days)
+        shrunk = alpha * item_base + (1 - alpha) * prior
+
+        # Top-down: restore each supplier's total after shrinkage
+        group_shrunk = group_sum(shrunk)
+        scale = np.divide(group_base, group_shrunk,
+                          out=np.zeros_like(group_base), where=group_shrunk > 0)
+        reconciled = shrunk * scale[group]
+
+        return reconciled, group_base, selling_days
+
+
+# Module-level singleton
+hierarchical_forecaster = HierarchicalForecaster()
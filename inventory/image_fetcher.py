@@ -14,14 +14,56 @@ Academic Note (for FYP/Viva):
 
 import requests
 import os
+import hashlib
+import threading
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+from io import BytesIO
+from requests.adapters import HTTPAdapter
 from django.conf import settings
 from django.core.files.base import ContentFile
+from django.db.models import F
+from django.utils import timezone
 from urllib.parse import quote
 import logging
 
 # Setup logging for debugging and error tracking
 logger = logging.getLogger(__name__)
 
+from .metrics import CACHE_REQUESTS, IMAGE_FETCH_SECONDS
+
+# Content-Type -> stored file extension, when Pillow cannot tell
+IMAGE_EXTENSIONS = {'image/jpeg': 'jpg', 'image/png': 'png', 'image/gif': 'gif', 'image/webp': 'webp'}
+
+
+class RateLimiter:
+    """
+    Thread-safe limiter that spaces calls evenly to stay under an hourly
+    API quota. `per_hour` of 0 disables it.
+    """
+    
+    def __init__(self, per_hour=0):
+        self.per_hour = per_hour
+        self.interval = 3600.0 / per_hour if per_hour else 0.0
+        self._next_slot = 0.0
+        self._lock = threading.Lock()
+    
+    def wait(self):
+        """Block until the caller may make the next call."""
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            if self.interval:
+                self._next_slot = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+    
+    def pause(self, seconds):
+        """Hold every caller back for `seconds` (e.g. the API's Retry-After)."""
+        with self._lock:
+            self._next_slot = max(self._next_slot, time.monotonic() + seconds)
+
 
 class ProductImageFetcher:
     """
@@ -33,6 +75,18 @@ class ProductImageFetcher:
     3. Downloads the first matching image
     4. Saves it to media/products/ directory
     5. Returns the saved file for Django ImageField
+    
+    fetch_cached() adds a persistent cache in front of this:
+    - Every outcome is stored per normalized product name
+      (ProductImageCache), so repeated names never call the API again
+    - "No match" and errors are cached for a limited time (negative cache)
+    - Image files are named by the SHA-256 of their bytes, so identical
+      images are stored once however many items use them
+    - Concurrent lookups of the same name in one process wait for the
+      first one instead of calling the API in parallel
+    All HTTP calls share one pooled requests.Session (keep-alive), and
+    search calls go through a RateLimiter sized to the API quota
+    (IMAGE_FETCH_RATE_PER_HOUR); cache hits and image downloads are free.
     """
     
     def __init__(self):
@@ -40,6 +94,19 @@ class ProductImageFetcher:
         self.access_key = settings.UNSPLASH_ACCESS_KEY
         self.api_url = settings.UNSPLASH_API_URL
         self.timeout = 10  # API request timeout in seconds
+        self.miss_ttl = timedelta(hours=getattr(settings, 'IMAGE_CACHE_MISS_TTL_HOURS', 168))
+        self.error_ttl = timedelta(minutes=getattr(settings, 'IMAGE_CACHE_ERROR_TTL_MINUTES', 15))
+
+        # One pooled HTTP session for the API and the image CDN
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=getattr(settings, 'IMAGE_FETCH_POOL_SIZE', 10))
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+        self.rate_limiter = RateLimiter(getattr(settings, 'IMAGE_FETCH_RATE_PER_HOUR', 0))
+
+        self._inflight = {}
+        self._inflight_lock = threading.Lock()
     
     def fetch_product_image(self, product_name):
         """
@@ -49,21 +116,51 @@ class ProductImageFetcher:
             product_name (str): Name of the product to search for
             
         Returns:
-            ContentFile: Django file object ready to save to ImageField
+            tuple: (ContentFile, filename) ready to save to ImageField
             None: If fetching fails or API is unavailable
+        """
+        result = self.fetch_with_status(product_name)
+        if result['status'] == 'ok':
+            return result['content'], result['filename']
+        return None
+
+    def fetch_with_status(self, product_name):
+        """
+        Fetch a product image and report why it failed, so callers can
+        decide whether a retry makes sense.
+        
+        Args:
+            product_name (str): Name of the product to search for
+            
+        Returns:
+            dict: {
+                'status': 'ok' | 'not_found' | 'disabled' | 'error',
+                'content': ContentFile (status 'ok' only),
+                'filename': str (status 'ok' only),
+                'error': str (status 'error' only),
+            }
             
         Academic Explanation:
         - Uses HTTP GET request to Unsplash API
         - Searches for images matching product name
         - Downloads image in small size (400x300) to save bandwidth
         - Converts to Django ContentFile for database storage
+        - 'not_found' and 'disabled' are permanent; 'error' (timeouts,
+          5xx, rate limits) is worth retrying later
         """
         
         # Check if API key is configured
         if not self.access_key or self.access_key == 'YOUR_UNSPLASH_ACCESS_KEY_HERE':
             logger.warning("Unsplash API key not configured. Skipping automatic image fetch.")
-            return None
+            return {'status': 'disabled'}
         
+        with IMAGE_FETCH_SECONDS.time() as labels:
+            result = self._search_and_download(product_name)
+            labels['status'] = result['status']
+        return result
+    
+    def _search_and_download(self, product_name):
+        """The Unsplash search and image download behind fetch_with_status()."""
         try:
             # Step 1: Search for images using Unsplash API
             logger.info(f"Fetching image for product: {product_name}")
@@ -76,8 +173,9 @@ class ProductImageFetcher:
                 'client_id': self.access_key
             }
             
-            # Make API request with timeout
-            response = requests.get(
+            # Make API request with timeout, within the hourly quota
+            self.rate_limiter.wait()
+            response = self.session.get(
                 self.api_url,
                 params=params,
                 timeout=self.timeout
@@ -86,7 +184,10 @@ class ProductImageFetcher:
             # Check if API request was successful
             if response.status_code != 200:
                 logger.error(f"Unsplash API error: {response.status_code}")
-                return None
+                retry_after = response.headers.get('Retry-After', '')
+                if response.status_code in (403, 429) and retry_after.isdigit():
+                    self.rate_limiter.pause(int(retry_after))
+                return {'status': 'error', 'error': f"Unsplash API error: {response.status_code}"}
             
             # Parse JSON response
             data = response.json()
@@ -94,7 +195,7 @@ class ProductImageFetcher:
             # Check if any images were found
             if not data.get('results') or len(data['results']) == 0:
                 logger.warning(f"No images found for: {product_name}")
-                return None
+                return {'status': 'not_found'}
             
             # Step 2: Get the first image URL
             first_image = data['results'][0]
@@ -104,41 +205,168 @@ class ProductImageFetcher:
             logger.info(f"Found image URL: {image_url}")
             
             # Step 3: Download the image
-            image_response = requests.get(image_url, timeout=self.timeout)
+            image_response = self.session.get(image_url, timeout=self.timeout)
             
             if image_response.status_code != 200:
                 logger.error(f"Failed to download image: {image_response.status_code}")
-                return None
+                return {'status': 'error', 'error': f"Image download failed: {image_response.status_code}"}
             
             # Step 4: Create Django ContentFile from downloaded image
             # This allows us to save it directly to ImageField
             image_content = ContentFile(image_response.content)
+            content_type = image_response.headers.get('Content-Type', '')
+            extension = self._image_extension(image_response.content, content_type)
             
             # Generate a clean filename from product name
             # Example: "Wireless Mouse" -> "wireless_mouse.jpg"
-            filename = self._generate_filename(product_name)
+            filename = self._generate_filename(product_name, extension)
             
             logger.info(f"Successfully fetched image: {filename}")
-            return image_content, filename
+            return {'status': 'ok', 'content': image_content, 'filename': filename, 'content_type': content_type}
             
         except requests.exceptions.Timeout:
             logger.error(f"Timeout while fetching image for: {product_name}")
-            return None
+            return {'status': 'error', 'error': 'Timeout'}
             
         except requests.exceptions.RequestException as e:
             logger.error(f"Network error while fetching image: {str(e)}")
-            return None
+            return {'status': 'error', 'error': f"Network error: {e}"}
             
         except Exception as e:
             logger.error(f"Unexpected error while fetching image: {str(e)}")
-            return None
+            return {'status': 'error', 'error': str(e)}
+    
+    # ------------------------------------------------------------------
+    # Cached fetching
+    # ------------------------------------------------------------------
+    
+    @staticmethod
+    def normalize_query(product_name):
+        """"  Wireless  MOUSE " -> "wireless mouse" (the cache key)"""
+        return ' '.join((product_name or '').lower().split())[:255]
+    
+    def fetch_cached(self, product_name):
+        """
+        Fetch a product image through the persistent cache.
+        
+        Args:
+            product_name (str): Name of the product to search for
+            
+        Returns:
+            dict: {
+                'status': 'ok' | 'not_found' | 'disabled' | 'error',
+                'path': storage path of the image (status 'ok' only),
+                'cached': True if no API call was made,
+                'error': str (status 'error' only),
+                'retry_at': when a cached error expires (cached errors only),
+            }
+        """
+        from .models import ProductImageCache
+        
+        query = self.normalize_query(product_name)
+        with self._query_lock(query):
+            entry = ProductImageCache.objects.filter(query=query).first()
+            if entry is not None and entry.is_fresh:
+                cached = self._from_cache(entry)
+                if cached is not None:
+                    CACHE_REQUESTS.inc(cache='product_image', result='hit')
+                    ProductImageCache.objects.filter(pk=entry.pk).update(hits=F('hits') + 1)
+                    return cached
+            
+            CACHE_REQUESTS.inc(cache='product_image', result='miss')
+            return self._store(query, self.fetch_with_status(product_name))
+    
+    def _from_cache(self, entry):
+        if entry.status == 'HIT':
+            if entry.file and self._storage().exists(entry.file):
+                return {'status': 'ok', 'path': entry.file, 'cached': True}
+            return None  # File was removed; fetch again
+        if entry.status == 'MISS':
+            return {'status': 'not_found', 'cached': True}
+        return {'status': 'error', 'error': entry.error, 'cached': True, 'retry_at': entry.expires_at}
+    
+    def _store(self, query, result):
+        """Persist a fresh fetch result and return it in fetch_cached() form."""
+        from .models import ProductImageCache
+        
+        status = result['status']
+        if status == 'disabled':
+            return {'status': 'disabled', 'cached': False}
+        
+        defaults = {'content_hash': '', 'file': '', 'error': ''}
+        if status == 'ok':
+            data = result['content'].read()
+            content_hash = hashlib.sha256(data).hexdigest()
+            path = self._store_bytes(content_hash, data, result.get('content_type', ''))
+            defaults.update(status='HIT', content_hash=content_hash, file=path, expires_at=None)
+            response = {'status': 'ok', 'path': path, 'cached': False}
+        elif status == 'not_found':
+            defaults.update(status='MISS', expires_at=timezone.now() + self.miss_ttl)
+            response = {'status': 'not_found', 'cached': False}
+        else:
+            error = (result.get('error') or '')[:255]
+            defaults.update(status='ERROR', error=error, expires_at=timezone.now() + self.error_ttl)
+            response = {'status': 'error', 'error': error, 'cached': False}
+        
+        ProductImageCache.objects.update_or_create(query=query, defaults=defaults)
+        return response
+    
+    def _store_bytes(self, content_hash, data, content_type=''):
+        """Write image bytes once under a content-addressed name."""
+        storage = self._storage()
+        path = f"products/{content_hash}.{self._image_extension(data, content_type)}"
+        if storage.exists(path):
+            return path
+        return storage.save(path, ContentFile(data))
+    
+    @staticmethod
+    def _image_extension(data, content_type=''):
+        """
+        File extension for downloaded image bytes: the format Pillow detects,
+        else the response's Content-Type, else "jpg".
+        """
+        from PIL import Image
+        
+        try:
+            with Image.open(BytesIO(data)) as image:
+                detected = (image.format or '').lower()
+        except Exception:
+            detected = ''
+        if detected:
+            return 'jpg' if detected == 'jpeg' else detected
+        
+        mime_type = content_type.split(';')[0].strip().lower()
+        return IMAGE_EXTENSIONS.get(mime_type, 'jpg')
+    
+    @staticmethod
+    def _storage():
+        from .models import Item
+        return Item._meta.get_field('image').storage
+    
+    @contextmanager
+    def _query_lock(self, query):
+        """Serialize lookups of the same query within this process."""
+        with self._inflight_lock:
+            lock, waiters = self._inflight.get(query, (threading.Lock(), 0))
+            self._inflight[query] = (lock, waiters + 1)
+        try:
+            with lock:
+                yield
+        finally:
+            with self._inflight_lock:
+                lock, waiters = self._inflight[query]
+                if waiters == 1:
+                    del self._inflight[query]
+                else:
+                    self._inflight[query] = (lock, waiters - 1)
     
-    def _generate_filename(self, product_name):
+    def _generate_filename(self, product_name, extension='jpg'):
         """
         Generate a clean filename from product name
         
         Args:
             product_name (str): Original product name
+            extension (str): File extension of the downloaded image
             
         Returns:
             str: Clean filename suitable for file system
@@ -156,8 +384,7 @@ class ProductImageFetcher:
         # Limit length to 50 characters
         clean_name = clean_name[:50]
         
-        # Add .jpg extension
-        return f"{clean_name}.jpg"
+        return f"{clean_name}.{extension}"
 
 
 # Create a singleton instance for easy import
@@ -0,0 +1,273 @@
+"""
+Background Product Image Queue
+==============================
+
+Keeps network I/O out of Item.save(): items that need a product image are
+marked PENDING and fetched here, off the request path.
+
+How it works:
+1. Item.save() marks a new item, or a renamed item without an image, as
+   PENDING and wakes the in-process worker thread once the row is committed
+2. Workers claim due items with a conditional UPDATE (PENDING → FETCHING
+   plus a lease), so web processes and `manage.py process_image_queue` can
+   all drain the queue without fetching the same item twice
+3. Outcomes are written with queryset.update(), never Item.save(), so stock
+   fields, updated_at and the reorder snapshot are left alone. A result is
+   discarded if the item was renamed or given an image meanwhile
+4. Transient failures retry with exponential backoff (base × 2^(attempt-1),
+   plus jitter) up to max_attempts, then stay FAILED. "No match" and "API
+   not configured" are final
+5. A claim whose lease expires (worker died mid-fetch) becomes due again
+6. Fetches go through ProductImageFetcher.fetch_cached(), so repeated
+   product names are served from the image cache without an API call
+7. `manage.py backfill_item_images` uses claim_batch() / apply_batch() to
+   work through a whole catalogue with one UPDATE per batch
+8. After each pass the worker renders thumbnails for new uploads and
+   fetched images (ImageVariantBuilder.process_stale())
+"""
+
+import random
+import threading
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.db.models import Case, F, Min, Q, Value, When
+from django.utils import timezone
+
+import logging
+logger = logging.getLogger(__name__)
+
+from .models import Item
+from .image_fetcher import image_fetcher
+from .image_variants import image_variant_builder
+
+
+class ImageFetchQueue:
+    """
+    Database-backed queue of items waiting for a product image.
+    """
+
+    # Fetcher status -> final Item.image_status
+    final_statuses = {'ok': 'FETCHED', 'not_found': 'NOT_FOUND', 'disabled': 'SKIPPED'}
+
+    def __init__(self, lease_seconds=300, batch_size=20):
+        self.max_attempts = getattr(settings, 'IMAGE_FETCH_MAX_ATTEMPTS', 5)
+        self.retry_base_seconds = getattr(settings, 'IMAGE_FETCH_RETRY_BASE_SECONDS', 60)
+        self.lease_seconds = lease_seconds
+        self.batch_size = batch_size
+        self._wake_event = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    # ------------------------------------------------------------------
+    # Producer side
+    # ------------------------------------------------------------------
+
+    def wake(self):
+        """Signal that work is due; starts the in-process worker if needed."""
+        if not getattr(settings, 'IMAGE_FETCH_IN_PROCESS_WORKER', True):
+            return  # A separate `process_image_queue` worker drains the queue
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='image-fetch-worker', daemon=True)
+                self._thread.start()
+            self._wake_event.set()
+
+    # ------------------------------------------------------------------
+    # Consumer side
+    # ------------------------------------------------------------------
+
+    def due_items(self):
+        return Item.all_objects.filter(
+            image_status__in=('PENDING', 'FETCHING'),
+            image_next_attempt_at__lte=timezone.now(),
+        ).order_by('image_next_attempt_at')
+
+    def claim(self, item):
+        """Atomically take ownership of a due item. Returns True if claimed."""
+        claimed = Item.all_objects.filter(
+            pk=item.pk,
+            image_status=item.image_status,
+            image_next_attempt_at=item.image_next_attempt_at,
+        ).update(
+            image_status='FETCHING',
+            image_next_attempt_at=timezone.now() + timedelta(seconds=self.lease_seconds),
+        )
+        return claimed == 1
+
+    def claim_batch(self, items):
+        """
+        Take ownership of several items with one UPDATE.
+
+        Returns:
+            list: The items that were claimed (image_status set to FETCHING)
+        """
+        now = timezone.now()
+        lease = now + timedelta(seconds=self.lease_seconds)
+        due = Q(image_next_attempt_at__isnull=True) | Q(image_next_attempt_at__lte=now)
+        no_image = Q(image='') | Q(image__isnull=True)
+        pks = [item.pk for item in items]
+        Item.all_objects.filter(due, no_image, pk__in=pks).exclude(
+            image_status__in=('FETCHED', 'UPLOADED'),
+        ).update(image_status='FETCHING', image_next_attempt_at=lease)
+
+        claimed = set(Item.all_objects.filter(
+            pk__in=pks, image_status='FETCHING', image_next_attempt_at=lease,
+        ).values_list('pk', flat=True))
+        for item in items:
+            if item.pk in claimed:
+                item.image_status = 'FETCHING'
+        return [item for item in items if item.pk in claimed]
+
+    def release(self, items):
+        """Hand claimed items back to the queue (e.g. after an interrupted run)."""
+        return Item.all_objects.filter(
+            pk__in=[item.pk for item in items], image_status='FETCHING',
+        ).update(image_status='PENDING', image_next_attempt_at=timezone.now())
+
+    def apply_batch(self, outcomes):
+        """
+        Write several outcomes with one UPDATE: [(item, outcome_fields)].
+        Like process_item(), rows that were renamed or given an image since
+        they were claimed are left alone.
+
+        Returns:
+            int: Number of rows updated
+        """
+        if not outcomes:
+            return 0
+        guard = Q()
+        for item, _ in outcomes:
+            guard |= Q(pk=item.pk, name=item.name)
+
+        updates = {}
+        for column in set().union(*(fields for _, fields in outcomes)):
+            field = Item._meta.get_field(column)
+            whens = [
+                When(pk=item.pk, then=Value(fields[column], output_field=field))
+                for item, fields in outcomes if column in fields
+            ]
+            updates[column] = Case(*whens, default=F(column), output_field=field)
+
+        return Item.all_objects.filter(guard, image_status='FETCHING').update(**updates)
+
+    def process_item(self, item):
+        """
+        Fetch the image for a claimed item and record the outcome.
+
+        Returns:
+            str: The item's new image_status, or None if the result was
+                 discarded because the item changed meanwhile
+        """
+        result = image_fetcher.fetch_cached(item.name)
+        fields = self.outcome_fields(item, result)
+        attempts = fields['image_fetch_attempts']
+
+        # Only apply if nobody renamed the item or gave it an image meanwhile
+        updated = Item.all_objects.filter(pk=item.pk, image_status='FETCHING', name=item.name).update(**fields)
+        if not updated:
+            return None
+
+        logger.info(f"Image fetch for {item.name}: {fields['image_status']} (attempt {attempts})")
+        return fields['image_status']
+
+    def outcome_fields(self, item, result):
+        """
+        Item columns to write for a fetch_cached() result.
+
+        Returns:
+            dict: field -> value, always including image_status and
+                  image_fetch_attempts
+        """
+        attempts = item.image_fetch_attempts + 1
+        fields = {'image_fetch_attempts': attempts, 'image_fetch_error': '', 'image_next_attempt_at': None}
+
+        if result['status'] == 'ok':
+            # Content-addressed file, possibly shared with other items
+            fields.update(image=result['path'], image_status='FETCHED', image_variants_stale=True)
+        elif result['status'] in self.final_statuses:
+            fields['image_status'] = self.final_statuses[result['status']]
+        elif result.get('cached'):
+            # This name failed recently for another item: wait for that
+            # negative-cache entry to expire without spending an attempt
+            fields.update(
+                image_fetch_attempts=item.image_fetch_attempts,
+                image_fetch_error=result.get('error', '')[:255],
+                image_status='PENDING',
+                image_next_attempt_at=result['retry_at'],
+            )
+        else:
+            fields['image_fetch_error'] = result.get('error', '')[:255]
+            if attempts >= self.max_attempts:
+                fields['image_status'] = 'FAILED'
+            else:
+                fields['image_status'] = 'PENDING'
+                fields['image_next_attempt_at'] = timezone.now() + self.retry_delay(attempts)
+        return fields
+
+    def retry_delay(self, attempts):
+        """Exponential backoff with ±20% jitter."""
+        seconds = self.retry_base_seconds * (2 ** (attempts - 1))
+        return timedelta(seconds=seconds * random.uniform(0.8, 1.2))
+
+    def process_due(self, limit=None):
+        """
+        Drain every item that is currently due (or at most `limit` items).
+
+        Returns:
+            dict: {image_status: count} for the items processed
+        """
+        summary = {}
+        processed = 0
+        while limit is None or processed < limit:
+            batch = list(self.due_items()[:self.batch_size])
+            if not batch:
+                break
+            for item in batch:
+                if limit is not None and processed >= limit:
+                    break
+                if not self.claim(item):
+                    continue
+                item.image_status = 'FETCHING'
+                status = self.process_item(item)
+                processed += 1
+                if status:
+                    summary[status] = summary.get(status, 0) + 1
+        return summary
+
+    def seconds_until_next_due(self):
+        """Seconds until the next queued item is due, or None if the queue is empty."""
+        next_at = Item.all_objects.filter(
+            image_status__in=('PENDING', 'FETCHING'),
+        ).aggregate(next_at=Min('image_next_attempt_at'))['next_at']
+        if next_at is None:
+            return None
+        return max(0.0, (next_at - timezone.now()).total_seconds())
+
+    def _run(self):
+        """In-process worker loop; exits when the queue is empty."""
+        while True:
+            self._wake_event.clear()
+            try:
+                self.process_due()
+                image_variant_builder.process_stale()
+                wait = self.seconds_until_next_due()
+            except Exception as e:
+                logger.error(f"Image fetch worker error: {e}")
+                wait = float(self.retry_base_seconds)
+            finally:
+                close_old_connections()
+
+            if wait is None:
+                with self._lock:
+                    if not self._wake_event.is_set():
+                        self._thread = None
+                        return
+                continue
+
+            self._wake_event.wait(timeout=max(wait, 1.0))
+
+
+# Module-level singleton
+image_queue = ImageFetchQueue()
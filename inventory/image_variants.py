@@ -0,0 +1,128 @@
+"""
+Product Image Variants
+======================
+
+Generates small WebP and JPEG renditions of every item image so list
+pages never download the original.
+
+How it works:
+1. Item.save() (new upload) and the image queue (fetched image) flag an
+   item with image_variants_stale
+2. The image worker (image_queue.py / `process_image_queue`) calls
+   process_stale(), which renders each width in settings.IMAGE_VARIANT_WIDTHS
+   in both formats with Pillow (EXIF-rotated, never upscaled)
+3. Each rendition is stored as products/variants/<sha256 of its bytes>.<ext>
+   — a new image always gets new URLs, so the files can be served with
+   `Cache-Control: immutable`, and identical renditions are stored once
+4. The variant map is written to Item.image_variants with queryset.update(),
+   and only if the item still has the image the variants were built from
+5. Templates use {% item_picture %} (inventory_extras), which emits a
+   <picture> with WebP/JPEG srcsets and falls back to the original image
+"""
+
+import hashlib
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+
+import logging
+logger = logging.getLogger(__name__)
+
+from .models import Item
+
+
+class ImageVariantBuilder:
+    """
+    Pillow-based thumbnail renderer for Item.image.
+    """
+
+    # ext -> (Pillow format, save options)
+    formats = {
+        'webp': ('WEBP', {'quality': 80, 'method': 4}),
+        'jpeg': ('JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+    }
+
+    def __init__(self, batch_size=20):
+        self.widths = tuple(getattr(settings, 'IMAGE_VARIANT_WIDTHS', (64, 128, 320)))
+        self.batch_size = batch_size
+
+    def build(self, image_name):
+        """
+        Render every width and format for one stored image.
+
+        Returns:
+            dict: {'source': image_name, 'webp': {width: path}, 'jpeg': {width: path}}
+                  (widths are strings so the map round-trips through JSON)
+        """
+        from PIL import Image, ImageOps
+
+        storage = Item._meta.get_field('image').storage
+        with storage.open(image_name, 'rb') as f:
+            original = ImageOps.exif_transpose(Image.open(f))
+            original.load()
+
+        variants = {'source': image_name}
+        for ext, (fmt, options) in self.formats.items():
+            base = original.convert('RGB') if fmt == 'JPEG' else original.convert('RGBA')
+            variants[ext] = {}
+            for width in self.widths:
+                rendition = base.copy()
+                # Height is left unconstrained; thumbnail() never upscales
+                rendition.thumbnail((width, width * 10), Image.LANCZOS)
+                buffer = BytesIO()
+                rendition.save(buffer, fmt, **options)
+                variants[ext][str(width)] = self._store(buffer.getvalue(), ext)
+        return variants
+
+    def _store(self, data, ext):
+        storage = Item._meta.get_field('image').storage
+        path = f"products/variants/{hashlib.sha256(data).hexdigest()}.{ext}"
+        if storage.exists(path):
+            return path
+        return storage.save(path, ContentFile(data))
+
+    def process_item(self, item):
+        """Build and record variants for one item. Returns True if written."""
+        source = item.image.name
+        if not source:
+            Item.all_objects.filter(pk=item.pk, image='').update(image_variants={}, image_variants_stale=False)
+            return False
+
+        try:
+            variants = self.build(source)
+        except Exception as e:
+            # Unreadable or missing file: don't retry forever
+            logger.error(f"Image variants failed for {item.name}: {e}")
+            Item.all_objects.filter(pk=item.pk, image=source).update(image_variants_stale=False)
+            return False
+
+        return Item.all_objects.filter(pk=item.pk, image=source).update(
+            image_variants=variants, image_variants_stale=False,
+        ) == 1
+
+    def process_stale(self, limit=None):
+        """
+        Build variants for every flagged item (or at most `limit`).
+
+        Returns:
+            int: Number of items that received new variants
+        """
+        built = processed = last_pk = 0
+        while limit is None or processed < limit:
+            batch = list(
+                Item.all_objects.filter(image_variants_stale=True, pk__gt=last_pk).order_by('pk')[:self.batch_size]
+            )
+            if not batch:
+                break
+            for item in batch:
+                if limit is not None and processed >= limit:
+                    break
+                last_pk = item.pk
+                processed += 1
+                built += self.process_item(item)
+        return built
+
+
+# Module-level singleton
+image_variant_builder = ImageVariantBuilder()
@@ -0,0 +1,242 @@
+"""
+Live Feed (Server-Sent Events)
+==============================
+
+Pushes stock changes, new and updated transactions, and stock alerts to
+open pages, so the dashboard, transaction list and analytics pages patch
+themselves instead of being reloaded.
+
+How it works:
+1. Item.save() publishes a `stock` event when quantity or reorder level
+   changes (sales, purchases, stock adjustments, item edits), and
+   Transaction.save() publishes a `transaction` event when a transaction
+   is created or its payment status changes. Alerts from the stock event
+   bus (stock_events.py) are forwarded as `alert` events
+2. Events are published only after the surrounding transaction commits,
+   numbered, and kept in a short in-memory history. A failure to build or
+   send an event is logged, never raised into the save that caused it
+3. Each browser holds one EventSource connection to the `live_feed`
+   view. Under ASGI (inventory_system/asgi.py) a connection is an async
+   generator waiting on an asyncio.Event, so open pages cost no threads;
+   under WSGI (`runserver`) each connection occupies one thread
+4. A reconnecting browser sends Last-Event-ID and receives what it missed
+   from the history. If that is no longer possible (history overflowed,
+   server restarted) it gets a `resync` event and reloads the page
+5. Connections send a keep-alive comment every LIVE_FEED_HEARTBEAT_SECONDS
+   and are closed after LIVE_FEED_MAX_SECONDS; the browser reconnects
+   and resumes from its last event
+
+The feed is per process: run the ASGI server with a single worker
+process (it serves many connections) so every page sees every write.
+"""
+
+import asyncio
+import json
+import threading
+import time
+import uuid
+from collections import deque
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.urls import reverse
+from django.utils import timezone
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+class Subscription:
+    """One open connection: events waiting to be written, plus a wake-up callback."""
+
+    def __init__(self, notify, max_pending):
+        self.notify = notify
+        self.max_pending = max_pending
+        self.pending = deque()
+        self.overflowed = False
+
+
+class LiveFeed:
+    """
+    In-process publish/subscribe hub feeding the SSE endpoint.
+    """
+
+    def __init__(self, history_size=500, max_pending=200):
+        self.heartbeat_seconds = getattr(settings, 'LIVE_FEED_HEARTBEAT_SECONDS', 15)
+        self.max_seconds = getattr(settings, 'LIVE_FEED_MAX_SECONDS', 300)
+        self.retry_ms = getattr(settings, 'LIVE_FEED_RETRY_MS', 3000)
+        self.max_pending = max_pending
+        # Event ids are "<process epoch>-<sequence>", so ids from another
+        # process or an earlier run are recognised as unknown
+        self.epoch = uuid.uuid4().hex[:8]
+        self._sequence = 0
+        self._history = deque(maxlen=history_size)   # [(sequence, frame)]
+        self._subscriptions = set()
+        self._lock = threading.Lock()
+
+    # ------------------------------------------------------------------
+    # Publishing
+    # ------------------------------------------------------------------
+
+    def publish(self, event_type, data):
+        """
+        Send an event to every open connection once the current transaction
+        commits. `data` may be a callable returning the event data.
+
+        Never raises: publishing is called from model saves, and a failure
+        here must not undo or misreport the write that triggered it.
+        """
+        try:
+            payload = json.dumps(data() if callable(data) else data, cls=DjangoJSONEncoder)
+        except Exception as e:
+            logger.exception(f"Live feed {event_type} event could not be built: {e}")
+            return
+        transaction.on_commit(lambda: self._publish(event_type, payload), robust=True)
+
+    def _publish(self, event_type, payload):
+        with self._lock:
+            self._sequence += 1
+            frame = f"id: {self._event_id()}\nevent: {event_type}\ndata: {payload}\n\n"
+            self._history.append((self._sequence, frame))
+            woken = []
+            for subscription in self._subscriptions:
+                if len(subscription.pending) >= subscription.max_pending:
+                    if not subscription.overflowed:
+                        logger.warning("Live feed client fell behind; closing its connection so it reconnects")
+                    subscription.overflowed = True   # Slow client: it reconnects and replays
+                else:
+                    subscription.pending.append(frame)
+                woken.append(subscription)
+        for subscription in woken:
+            try:
+                subscription.notify()
+            except RuntimeError:
+                pass   # Event loop already closed; the connection is going away
+
+    def publish_stock_change(self, item, previous_quantity, previous_reorder_level):
+        self.publish('stock', lambda: {
+            'item_id': item.pk,
+            'name': item.name,
+            'sku': item.sku,
+            'quantity': item.quantity,
+            'previous_quantity': previous_quantity,
+            'reorder_level': item.reorder_level,
+            'previous_reorder_level': previous_reorder_level,
+            'price': item.price,
+            'is_active': item.is_active,
+        })
+
+    def publish_transaction(self, txn, previous_payment_status=None, created=False):
+        self.publish('transaction', lambda: {
+            'id': txn.pk,
+            'created': created,
+            'transaction_type': txn.transaction_type,
+            'item_id': txn.item_id,
+            'item_name': txn.item.name,
+            'quantity': txn.quantity,
+            'unit_price': txn.unit_price,
+            'total_amount': txn.total_amount,
+            'profit': txn.total_profit,
+            'payment_status': txn.payment_status,
+            'previous_payment_status': previous_payment_status,
+            'payment_method': txn.payment_method,
+            'performed_by': txn.performed_by.first_name or txn.performed_by.username,
+            'timestamp': txn.timestamp,
+            'date': timezone.localdate(txn.timestamp).isoformat(),
+            'url': reverse('inventory:transaction_detail', args=[txn.pk]),
+        })
+
+    def publish_alert(self, event):
+        """Stock event bus subscriber: forward threshold events to open pages."""
+        self.publish('alert', event)
+
+    @property
+    def last_event_id(self):
+        """Id of the newest event; pages pass it to the feed so nothing published after rendering is lost."""
+        with self._lock:
+            return self._event_id()
+
+    def _event_id(self):
+        return f"{self.epoch}-{self._sequence}"
+
+    # ------------------------------------------------------------------
+    # Connections
+    # ------------------------------------------------------------------
+
+    def subscribe(self, notify, last_event_id=None):
+        """
+        Register a connection. Returns (subscription, initial frames): the
+        events missed since last_event_id, or a `resync` event if they are
+        no longer available.
+        """
+        subscription = Subscription(notify, self.max_pending)
+        with self._lock:
+            frames = self._replay(last_event_id)
+            self._subscriptions.add(subscription)
+        return subscription, [f"retry: {self.retry_ms}\n\n"] + frames
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscriptions.discard(subscription)
+
+    def _replay(self, last_event_id):
+        if not last_event_id:
+            return []
+        epoch, _, sequence = last_event_id.partition('-')
+        oldest = self._history[0][0] if self._history else self._sequence + 1
+        if epoch != self.epoch or not sequence.isdigit() or not oldest - 1 <= int(sequence) <= self._sequence:
+            # Missed events are gone (or the id is from another process)
+            return [f"id: {self._event_id()}\nevent: resync\ndata: {{}}\n\n"]
+        return [frame for seq, frame in self._history if seq > int(sequence)]
+
+    def _drain(self, subscription):
+        with self._lock:
+            frames = list(subscription.pending)
+            subscription.pending.clear()
+        return frames
+
+    async def stream(self, last_event_id=None):
+        """Async SSE body for ASGI servers."""
+        loop = asyncio.get_running_loop()
+        wake = asyncio.Event()
+        subscription, frames = self.subscribe(lambda: loop.call_soon_threadsafe(wake.set), last_event_id)
+        deadline = loop.time() + self.max_seconds
+        try:
+            for frame in frames:
+                yield frame
+            while True:
+                wake.clear()
+                for frame in self._drain(subscription):
+                    yield frame
+                remaining = deadline - loop.time()
+                if subscription.overflowed or remaining <= 0:
+                    return
+                try:
+                    await asyncio.wait_for(wake.wait(), timeout=min(self.heartbeat_seconds, remaining))
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+        finally:
+            self.unsubscribe(subscription)
+
+    def stream_sync(self, last_event_id=None):
+        """Blocking SSE body for WSGI servers (one thread per connection)."""
+        wake = threading.Event()
+        subscription, frames = self.subscribe(wake.set, last_event_id)
+        deadline = time.monotonic() + self.max_seconds
+        try:
+            yield from frames
+            while True:
+                wake.clear()
+                yield from self._drain(subscription)
+                remaining = deadline - time.monotonic()
+                if subscription.overflowed or remaining <= 0:
+                    return
+                if not wake.wait(timeout=min(self.heartbeat_seconds, remaining)):
+                    yield ": keep-alive\n\n"
+        finally:
+            self.unsubscribe(subscription)
+
+
+# Module-level singleton
+live_feed = LiveFeed()
@@ -0,0 +1,347 @@
+"""
+Load Test Driver
+================
+
+Replays a realistic mix of user journeys against a running server and
+reports throughput and latency percentiles per endpoint, so capacity can
+be measured (and compared) before each release.
+
+How it works:
+1. `python manage.py seed_load_dataset` creates the catalogue, history
+   and the loadtest_N Manager accounts; start the server under test
+   (runserver --noreload, or the ASGI server) on that database
+2. Each virtual user is a thread with its own HTTP session (cookies,
+   keep-alive). It logs in through the login form as one of the load
+   accounts, reads the item choices from the transaction form, then runs
+   journeys picked at random by SCENARIOS weight until the run ends,
+   pausing for an exponentially distributed think time between journeys
+3. Journeys: browsing and searching the item list, transaction list and
+   typeahead, the dashboard, analytics and AI reorder pages, cash sales
+   through the transaction form, and Khalti sales completed through the
+   payment simulation pages (PAYMENT_SIMULATION_MODE must be on). They
+   create real transactions: run against a load-test database
+4. Every HTTP request is timed on its own and recorded under an endpoint
+   name (redirects are not followed automatically, each hop is its own
+   request). Status >= 400, connection errors and unexpected redirects
+   (e.g. back to the login page) count as errors
+5. LoadReport.summary() gives per-endpoint count, errors, throughput and
+   p50/p95/p99/max latency; the management command prints it as a table
+   and can write it as JSON for comparison between releases
+"""
+
+import json
+import math
+import random
+import re
+import threading
+import time
+from html import unescape
+from urllib.parse import urljoin
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+# Journey name -> relative weight
+SCENARIOS = {
+    'browse_items': 25,
+    'search': 10,
+    'transactions': 15,
+    'dashboard': 15,
+    'analytics': 4,
+    'reorder': 6,
+    'cash_sale': 15,
+    'gateway_sale': 10,
+}
+
+ITEM_OPTION_RE = re.compile(r'<option value="(\d+)"\s+data-price="([\d.]+)"[^>]*>\s*([^<(]+?)\s*\(Stock', re.S)
+CSRF_INPUT_RE = re.compile(r'name="csrfmiddlewaretoken" value="([^"]+)"')
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(pct / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+class LoadReport:
+    """
+    Thread-safe collection of request timings.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.samples = {}   # endpoint -> [seconds]
+        self.errors = {}    # endpoint -> count
+        self.error_examples = {}
+        self.started = None
+        self.finished = None
+
+    def record(self, endpoint, seconds, error=None):
+        with self.lock:
+            self.samples.setdefault(endpoint, []).append(seconds)
+            if error:
+                self.errors[endpoint] = self.errors.get(endpoint, 0) + 1
+                self.error_examples.setdefault(endpoint, error)
+
+    def summary(self):
+        """
+        Returns:
+            dict: {'duration', 'requests', 'errors', 'throughput',
+                   'endpoints': {name: {'requests', 'errors', 'throughput',
+                                        'p50', 'p95', 'p99', 'max', 'mean'}},
+                   'error_examples': {name: first error seen}}
+        """
+        duration = max((self.finished or time.monotonic()) - (self.started or time.monotonic()), 1e-9)
+        with self.lock:
+            endpoints = {}
+            for name, values in sorted(self.samples.items()):
+                values = sorted(values)
+                endpoints[name] = {
+                    'requests': len(values),
+                    'errors': self.errors.get(name, 0),
+                    'throughput': len(values) / duration,
+                    'mean': sum(values) / len(values),
+                    'p50': percentile(values, 50),
+                    'p95': percentile(values, 95),
+                    'p99': percentile(values, 99),
+                    'max': values[-1],
+                }
+            total = sum(entry['requests'] for entry in endpoints.values())
+            return {
+                'duration': duration,
+                'requests': total,
+                'errors': sum(self.errors.values()),
+                'throughput': total / duration,
+                'endpoints': endpoints,
+                'error_examples': dict(self.error_examples),
+            }
+
+
+class VirtualUser:
+    """
+    One simulated user: a logged-in HTTP session running journeys.
+    """
+
+    def __init__(self, driver, username, rng):
+        self.driver = driver
+        self.username = username
+        self.rng = rng
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=1)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.items = []   # (id, price, name) from the transaction form
+
+    # ------------------------------------------------------------------
+    # HTTP
+    # ------------------------------------------------------------------
+
+    def request(self, endpoint, method, path, expect=(200,), **kwargs):
+        """
+        Timed request without following redirects. Returns the response,
+        or None when it failed (the failure is recorded as an error).
+        """
+        url = urljoin(self.driver.base_url, path)
+        kwargs.setdefault('timeout', self.driver.timeout)
+        started = time.perf_counter()
+        try:
+            response = self.session.request(method, url, allow_redirects=False, **kwargs)
+            response.content   # Read the whole body inside the timing
+        except requests.RequestException as e:
+            self.driver.report.record(endpoint, time.perf_counter() - started, f'{type(e).__name__}: {e}')
+            return None
+        elapsed = time.perf_counter() - started
+
+        error = None
+        if response.status_code not in expect:
+            location = response.headers.get('Location', '')
+            error = f'HTTP {response.status_code}' + (f' -> {location}' if location else '')
+        self.driver.report.record(endpoint, elapsed, error)
+        return None if error else response
+
+    def get(self, endpoint, path, **kwargs):
+        return self.request(endpoint, 'GET', path, **kwargs)
+
+    def post(self, endpoint, path, data, expect=(302,), referer=None):
+        data = dict(data, csrfmiddlewaretoken=self.session.cookies.get('csrftoken', ''))
+        headers = {'Referer': urljoin(self.driver.base_url, referer or path)}
+        return self.request(endpoint, 'POST', path, expect=expect, data=data, headers=headers)
+
+    def follow(self, endpoint, response, expect=(200,)):
+        """GET the redirect target of `response`."""
+        return self.get(endpoint, response.headers['Location'], expect=expect)
+
+    # ------------------------------------------------------------------
+    # Journeys
+    # ------------------------------------------------------------------
+
+    def login(self):
+        page = self.get('login_form', '/users/login/')
+        if page is None:
+            return False
+        response = self.post('login', '/users/login/', {'username': self.username, 'password': self.driver.password})
+        if response is None or '/login' in response.headers.get('Location', ''):
+            return False
+        form = self.get('transaction_form', '/inventory/transactions/create/')
+        if form is None:
+            return False
+        self.items = [(int(pk), price, unescape(name)) for pk, price, name in ITEM_OPTION_RE.findall(form.text)]
+        return bool(self.items)
+
+    def browse_items(self):
+        page = self.get('item_list', '/inventory/')
+        status = self.rng.choice(['low-stock', 'in-stock', 'reorder-suggested'])
+        if page is not None and self.rng.random() < 0.5:
+            self.get('item_list_filtered', f'/inventory/?status={status}')
+
+    def search(self):
+        name = self.rng.choice(self.items)[2]
+        term = name.split()[self.rng.randrange(len(name.split()))]
+        for length in (2, 4, len(term)):
+            self.get('search_api', '/inventory/api/search/', params={'q': term[:length], 'type': 'items'})
+        self.get('item_list_search', '/inventory/', params={'search': term})
+
+    def transactions(self):
+        self.get('transaction_list', '/inventory/transactions/')
+        if self.rng.random() < 0.3:
+            self.get('transaction_list_filtered', '/inventory/transactions/', params={'type': 'SALE', 'payment_status': 'PAID'})
+
+    def dashboard(self):
+        self.get('dashboard', '/users/dashboard/')
+        self.get('notification_count', '/inventory/api/notifications/unread-count/')
+
+    def analytics(self):
+        self.get('analytics_dashboard', '/inventory/analytics/')
+
+    def reorder(self):
+        self.get('reorder_suggestions', '/inventory/reorder-suggestions/')
+
+    def _sale(self, payment_method):
+        item_id, price, _ = self.rng.choice(self.items)
+        form = self.get('transaction_form', '/inventory/transactions/create/')
+        if form is None:
+            return None
+        self.get('item_price', '/inventory/api/item-price/', params={'item_id': item_id})
+        return self.post('transaction_create', '/inventory/transactions/create/', {
+            'transaction_type': 'SALE',
+            'item': item_id,
+            'quantity': self.rng.choice((1, 1, 2, 3)),
+            'unit_price': price,
+            'payment_method': payment_method,
+            'notes': 'Load test',
+        })
+
+    def cash_sale(self):
+        created = self._sale('CASH')
+        if created is not None:
+            self.follow('transaction_list', created)
+
+    def gateway_sale(self):
+        created = self._sale('KHALTI')
+        if created is None:
+            return
+        location = created.headers['Location']
+        match = re.search(r'/transactions/(\d+)/', location)
+        if match is None:
+            return   # Sale was refused (e.g. out of stock) and redirected elsewhere
+        transaction_id = match.group(1)
+        self.follow('transaction_detail', created)
+        initiate = self.get('payment_initiate', f'/inventory/payment/khalti/initiate/{transaction_id}/', expect=(302,))
+        if initiate is None:
+            return
+        page = self.follow('payment_simulation_page', initiate)
+        if page is None:
+            return
+        completed = self.post('payment_simulate_complete', f'/inventory/payment/simulate/complete/{transaction_id}/',
+                              {'action': 'success', 'gateway': 'khalti'}, referer=initiate.headers['Location'])
+        if completed is not None:
+            self.follow('payment_result', completed)
+
+    # ------------------------------------------------------------------
+    # Loop
+    # ------------------------------------------------------------------
+
+    def run(self, stop_at, iterations):
+        if not self.login():
+            logger.warning(f"Virtual user {self.username} could not log in; stopping it")
+            return
+        names, weights = zip(*self.driver.scenarios.items())
+        done = 0
+        while time.monotonic() < stop_at and (iterations is None or done < iterations):
+            journey = self.rng.choices(names, weights=weights)[0]
+            try:
+                getattr(self, journey)()
+            except Exception as e:
+                logger.error(f"Journey {journey} of {self.username} failed: {e}")
+                self.driver.report.record(journey, 0.0, f'{type(e).__name__}: {e}')
+            done += 1
+            if self.driver.think_time:
+                time.sleep(min(self.rng.expovariate(1 / self.driver.think_time), self.driver.think_time * 5))
+
+
+class LoadDriver:
+    """
+    Runs virtual users concurrently against one server.
+    """
+
+    def __init__(self, base_url, accounts, password, users=10, duration=60, iterations=None,
+                 think_time=1.0, ramp_up=5.0, timeout=30, scenarios=None, seed=None):
+        self.base_url = base_url.rstrip('/') + '/'
+        self.accounts = accounts
+        self.password = password
+        self.users = users
+        self.duration = duration
+        self.iterations = iterations
+        self.think_time = think_time
+        self.ramp_up = ramp_up
+        self.timeout = timeout
+        self.scenarios = {name: weight for name, weight in (scenarios or SCENARIOS).items() if weight > 0}
+        self.rng = random.Random(seed)
+        self.report = LoadReport()
+
+    def run(self):
+        """Run every virtual user to completion; returns the report summary."""
+        self.report.started = time.monotonic()
+        stop_at = self.report.started + self.duration if self.duration else math.inf
+        threads = []
+        for i in range(self.users):
+            user = VirtualUser(self, self.accounts[i % len(self.accounts)], random.Random(self.rng.random()))
+            thread = threading.Thread(target=user.run, args=(stop_at, self.iterations),
+                                      name=f'load-user-{i + 1}', daemon=True)
+            threads.append(thread)
+            thread.start()
+            if self.ramp_up and i < self.users - 1:
+                time.sleep(self.ramp_up / self.users)
+        for thread in threads:
+            thread.join()
+        self.report.finished = time.monotonic()
+        return self.report.summary()
+
+
+def format_summary(summary):
+    """Plain-text table of a LoadReport summary."""
+    lines = [
+        f"{'endpoint':<28} {'reqs':>7} {'errors':>6} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'max ms':>8}",
+    ]
+    for name, entry in summary['endpoints'].items():
+        lines.append(
+            f"{name:<28} {entry['requests']:>7} {entry['errors']:>6} {entry['throughput']:>8.2f} "
+            f"{entry['p50'] * 1000:>8.1f} {entry['p95'] * 1000:>8.1f} {entry['p99'] * 1000:>8.1f} {entry['max'] * 1000:>8.1f}"
+        )
+    lines.append(
+        f"{'TOTAL':<28} {summary['requests']:>7} {summary['errors']:>6} {summary['throughput']:>8.2f}"
+        f"   over {summary['duration']:.1f}s"
+    )
+    return '\n'.join(lines)
+
+
+def write_summary(summary, path, options):
+    """Write the summary plus the run options as JSON (for comparing releases)."""
+    with open(path, 'w') as handle:
+        json.dump({'options': options, **summary}, handle, indent=2, default=str)
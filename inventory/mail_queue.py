@@ -0,0 +1,341 @@
+"""
+Outbound Mail Queue
+===================
+
+Keeps SMTP off the request path and stops stock storms from turning into
+thousands of emails.
+
+How it works:
+1. enqueue() stores OutboundEmail rows and wakes the in-process worker
+   once the transaction commits. Requests and commands never talk to SMTP
+2. queue_stock_alert() does not send anything by itself: it records one
+   PendingStockAlert per recipient and item (repeats only bump a counter)
+3. flush_digests() turns each recipient's pending alerts into ONE digest
+   email, at most once per EMAIL_DIGEST_INTERVAL_MINUTES. The first alert
+   after a quiet period goes out straight away; the rest wait for the
+   next interval. Items restocked meanwhile are left out
+4. process_due() claims due messages in batches (conditional UPDATE plus a
+   lease, as in image_queue.py) and sends them over one reused connection
+   (get_connection() + send_messages())
+5. Failed messages retry with exponential backoff up to max_attempts,
+   then stay FAILED; a send lease that expires (worker died) becomes due
+   again. `manage.py process_mail_queue` runs the same loop standalone
+"""
+
+import hashlib
+import random
+import threading
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import IntegrityError, close_old_connections, transaction
+from django.db.models import F, Max, Min
+from django.template.loader import render_to_string
+from django.utils import timezone
+
+import logging
+logger = logging.getLogger(__name__)
+
+from .models import OutboundEmail, PendingStockAlert
+
+
+class MailQueue:
+    """
+    Database-backed outbound mail queue with per-recipient alert digests.
+    """
+
+    def __init__(self, lease_seconds=300):
+        self.max_attempts = getattr(settings, 'EMAIL_QUEUE_MAX_ATTEMPTS', 5)
+        self.retry_base_seconds = getattr(settings, 'EMAIL_QUEUE_RETRY_BASE_SECONDS', 60)
+        self.batch_size = getattr(settings, 'EMAIL_QUEUE_BATCH_SIZE', 50)
+        self.digest_interval = timedelta(minutes=getattr(settings, 'EMAIL_DIGEST_INTERVAL_MINUTES', 60))
+        self.lease_seconds = lease_seconds
+        self._wake_event = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    # ------------------------------------------------------------------
+    # Producer side
+    # ------------------------------------------------------------------
+
+    def enqueue(self, recipients, subject, body, kind='GENERAL', dedupe=False):
+        """
+        Queue one message per recipient.
+
+        Args:
+            dedupe (bool): Skip recipients who were already sent (or have
+                queued) the identical message within the digest interval
+
+        Returns:
+            int: Number of messages queued
+        """
+        now = timezone.now()
+        rows = []
+        for recipient in dict.fromkeys(r for r in recipients if r):
+            key = self.dedupe_key(kind, recipient, subject, body)
+            if dedupe and OutboundEmail.objects.filter(
+                dedupe_key=key, created_at__gte=now - self.digest_interval,
+            ).exclude(status='FAILED').exists():
+                continue
+            rows.append(OutboundEmail(
+                recipient=recipient, subject=subject[:255], body=body,
+                kind=kind, dedupe_key=key, next_attempt_at=now,
+            ))
+
+        OutboundEmail.objects.bulk_create(rows)
+        if rows:
+            transaction.on_commit(self.wake)
+        return len(rows)
+
+    def queue_stock_alert(self, item, recipients):
+        """
+        Record a stock alert for the recipients' next digest. `item` may be
+        an Item or its primary key.
+
+        Returns:
+            int: Number of recipients with a new pending alert (repeats of
+                 an alert that is already pending are not counted)
+        """
+        item_id = getattr(item, 'pk', item)
+        created = 0
+        for recipient in dict.fromkeys(r for r in recipients if r):
+            bumped = PendingStockAlert.objects.filter(recipient=recipient, item_id=item_id).update(
+                occurrences=F('occurrences') + 1, last_alerted_at=timezone.now(),
+            )
+            if bumped:
+                continue
+            try:
+                with transaction.atomic():
+                    PendingStockAlert.objects.create(recipient=recipient, item_id=item_id)
+                created += 1
+            except IntegrityError:
+                # Raced with another process alerting the same pair
+                PendingStockAlert.objects.filter(recipient=recipient, item_id=item_id).update(
+                    occurrences=F('occurrences') + 1,
+                )
+
+        if created:
+            transaction.on_commit(self.wake)
+        return created
+
+    @staticmethod
+    def dedupe_key(kind, recipient, subject, body):
+        return hashlib.sha256('\x1f'.join((kind, recipient.lower(), subject, body)).encode()).hexdigest()
+
+    def wake(self):
+        """Signal that mail is due; starts the in-process worker if needed."""
+        if not getattr(settings, 'EMAIL_QUEUE_IN_PROCESS_WORKER', True):
+            return  # A separate `process_mail_queue` worker sends the mail
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='mail-queue-worker', daemon=True)
+                self._thread.start()
+            self._wake_event.set()
+
+    # ------------------------------------------------------------------
+    # Digests
+    # ------------------------------------------------------------------
+
+    def _digest_due_at(self):
+        """{recipient: when their next digest may be sent} for recipients with pending alerts."""
+        recipients = list(PendingStockAlert.objects.values_list('recipient', flat=True).distinct())
+        last_sent = dict(
+            OutboundEmail.objects.filter(kind='ALERT', recipient__in=recipients)
+            .values('recipient').annotate(last=Max('created_at')).values_list('recipient', 'last')
+        )
+        epoch = timezone.now() - self.digest_interval
+        return {r: (last_sent[r] + self.digest_interval if r in last_sent else epoch) for r in recipients}
+
+    def flush_digests(self):
+        """
+        Queue one digest per recipient whose interval has passed.
+
+        Returns:
+            int: Number of digest emails queued
+        """
+        now = timezone.now()
+        queued = 0
+        for recipient, due_at in self._digest_due_at().items():
+            if due_at > now:
+                continue
+            with transaction.atomic():
+                alerts = list(
+                    PendingStockAlert.objects.select_for_update(of=('self',))
+                    .filter(recipient=recipient).select_related('item')
+                    .order_by('item__quantity', 'item__name')
+                )
+                if not alerts:
+                    continue
+                PendingStockAlert.objects.filter(pk__in=[a.pk for a in alerts]).delete()
+
+                # Read stock now, not when the alert fired
+                still_low = [a for a in alerts if a.item.is_active and a.item.quantity <= a.item.reorder_level]
+                if not still_low:
+                    continue
+
+                out_of_stock = [a for a in still_low if a.item.quantity == 0]
+                subject = (
+                    f"⚠️ Low Stock Alert: {still_low[0].item.name}" if len(still_low) == 1
+                    else f"⚠️ Low Stock Alert: {len(still_low)} items need restocking"
+                )
+                body = render_to_string('inventory/email/stock_alert_digest.txt', {
+                    'alerts': still_low,
+                    'out_of_stock_count': len(out_of_stock),
+                    'low_stock_count': len(still_low) - len(out_of_stock),
+                    'since': min(a.first_alerted_at for a in alerts),
+                })
+                queued += self.enqueue([recipient], subject, body, kind='ALERT')
+        return queued
+
+    # ------------------------------------------------------------------
+    # Consumer side
+    # ------------------------------------------------------------------
+
+    def due_messages(self):
+        return OutboundEmail.objects.filter(
+            status__in=('QUEUED', 'SENDING'),
+            next_attempt_at__lte=timezone.now(),
+        ).order_by('next_attempt_at')
+
+    def claim_batch(self, messages):
+        """Take ownership of several due messages with one UPDATE. Returns the claimed ones."""
+        now = timezone.now()
+        lease = now + timedelta(seconds=self.lease_seconds)
+        pks = [m.pk for m in messages]
+        OutboundEmail.objects.filter(
+            pk__in=pks, status__in=('QUEUED', 'SENDING'), next_attempt_at__lte=now,
+        ).update(status='SENDING', next_attempt_at=lease)
+        claimed = set(OutboundEmail.objects.filter(
+            pk__in=pks, status='SENDING', next_attempt_at=lease,
+        ).values_list('pk', flat=True))
+        return [m for m in messages if m.pk in claimed]
+
+    def send_batch(self, messages):
+        """
+        Send claimed messages over one connection and record the outcomes.
+
+        Each message gets its own send_messages() call on the shared
+        connection. One call for the whole batch returns only a count and
+        the SMTP backend stops at the first error, so a failure part-way
+        would not say which recipients were sent: they would be retried
+        (duplicates) or dropped. After a failure the connection is reopened
+        once and the rest of the batch keeps sharing it; a closed
+        connection would make the backend open and close one per message.
+
+        Returns:
+            dict: {'sent': n, 'retrying': n, 'failed': n}
+        """
+        summary = {'sent': 0, 'retrying': 0, 'failed': 0}
+        sent, failed = [], set()
+        connection = get_connection(fail_silently=False)
+        try:
+            connection.open()
+            for message in messages:
+                email = EmailMessage(
+                    subject=message.subject, body=message.body,
+                    from_email=settings.DEFAULT_FROM_EMAIL, to=[message.recipient],
+                    connection=connection,
+                )
+                try:
+                    if not connection.send_messages([email]):
+                        raise RuntimeError('Mail backend accepted no messages')
+                    sent.append(message.pk)
+                except Exception as e:
+                    summary[self._record_failure(message, e)] += 1
+                    failed.add(message.pk)
+                    # The session may be unusable after an error: reconnect
+                    # once for the rest of the batch
+                    connection.close()
+                    connection.open()
+        except Exception as e:
+            # Could not connect at all: every unsent message retries later
+            for message in messages:
+                if message.pk not in sent and message.pk not in failed:
+                    summary[self._record_failure(message, e)] += 1
+        finally:
+            connection.close()
+
+        if sent:
+            OutboundEmail.objects.filter(pk__in=sent, status='SENDING').update(
+                status='SENT', sent_at=timezone.now(), next_attempt_at=None,
+                attempts=F('attempts') + 1, last_error='',
+            )
+        summary['sent'] = len(sent)
+        return summary
+
+    def _record_failure(self, message, error):
+        attempts = message.attempts + 1
+        fields = {'attempts': attempts, 'last_error': str(error)[:255]}
+        if attempts >= self.max_attempts:
+            fields.update(status='FAILED', next_attempt_at=None)
+            outcome = 'failed'
+        else:
+            fields.update(status='QUEUED', next_attempt_at=timezone.now() + self.retry_delay(attempts))
+            outcome = 'retrying'
+        OutboundEmail.objects.filter(pk=message.pk, status='SENDING').update(**fields)
+        message.attempts = attempts
+        logger.error(f"Email to {message.recipient} failed (attempt {attempts}): {error}")
+        return outcome
+
+    def retry_delay(self, attempts):
+        """Exponential backoff with ±20% jitter."""
+        seconds = self.retry_base_seconds * (2 ** (attempts - 1))
+        return timedelta(seconds=seconds * random.uniform(0.8, 1.2))
+
+    def process_due(self, limit=None):
+        """
+        Queue due digests, then send every due message (or at most `limit`).
+
+        Returns:
+            dict: {'digests': n, 'sent': n, 'retrying': n, 'failed': n}
+        """
+        summary = {'digests': self.flush_digests(), 'sent': 0, 'retrying': 0, 'failed': 0}
+        processed = 0
+        while limit is None or processed < limit:
+            size = self.batch_size if limit is None else min(self.batch_size, limit - processed)
+            claimed = self.claim_batch(list(self.due_messages()[:size]))
+            if not claimed:
+                break
+            for key, count in self.send_batch(claimed).items():
+                summary[key] += count
+            processed += len(claimed)
+        return summary
+
+    def seconds_until_next_due(self):
+        """Seconds until the next message or digest is due, or None if there is nothing to do."""
+        candidates = list(self._digest_due_at().values())
+        next_send = OutboundEmail.objects.filter(
+            status__in=('QUEUED', 'SENDING'),
+        ).aggregate(next_at=Min('next_attempt_at'))['next_at']
+        if next_send is not None:
+            candidates.append(next_send)
+        if not candidates:
+            return None
+        return max(0.0, (min(candidates) - timezone.now()).total_seconds())
+
+    def _run(self):
+        """In-process worker loop; exits when nothing is queued."""
+        while True:
+            self._wake_event.clear()
+            try:
+                self.process_due()
+                wait = self.seconds_until_next_due()
+            except Exception as e:
+                logger.error(f"Mail queue worker error: {e}")
+                wait = float(self.retry_base_seconds)
+            finally:
+                close_old_connections()
+
+            if wait is None:
+                with self._lock:
+                    if not self._wake_event.is_set():
+                        self._thread = None
+                        return
+                continue
+
+            self._wake_event.wait(timeout=max(wait, 1.0))
+
+
+# Module-level singleton
+mail_queue = MailQueue()
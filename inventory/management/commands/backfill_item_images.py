@@ -0,0 +1,181 @@
+"""
+Management command: backfill_item_images
+Usage:
+  python manage.py backfill_item_images
+  python manage.py backfill_item_images --workers 8 --rate 5000
+  python manage.py backfill_item_images --retry-failed --limit 500
+  python manage.py backfill_item_images --api-url http://127.0.0.1:8001/search/photos
+
+Fetches product images for every existing item that has none, without
+re-saving items one by one:
+- Items are read in primary-key batches and claimed with one UPDATE per
+  batch, so the in-process image worker never fetches the same item
+- Items that share a product name are fetched once
+- Fetches run on a bounded thread pool; API searches are spaced by the
+  fetcher's rate limiter (--rate, default IMAGE_FETCH_RATE_PER_HOUR)
+- Results go through the image cache (files stored once by content hash)
+  and are written back with one UPDATE per batch
+
+Progress lives on the items themselves (image_status), so an interrupted
+run resumes where it stopped when started again. Ctrl+C hands unfinished
+items back to the queue; items held by a killed run become available
+again when their lease expires. --api-url points the fetcher at another
+Unsplash-compatible endpoint, e.g. a local stub server for testing.
+"""
+
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.models import Q
+from django.utils import timezone
+
+from inventory.models import Item
+from inventory.image_fetcher import image_fetcher, RateLimiter
+from inventory.image_queue import image_queue
+from inventory.image_variants import image_variant_builder
+
+
+class Command(BaseCommand):
+    help = 'Fetch product images for existing items that have none, in bounded parallel batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=4,
+            help='Concurrent fetches (default: 4)',
+        )
+        parser.add_argument(
+            '--rate',
+            type=int,
+            default=None,
+            help='Maximum API searches per hour; 0 for no limit (default: IMAGE_FETCH_RATE_PER_HOUR)',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=50,
+            help='Items claimed and written per batch (default: 50)',
+        )
+        parser.add_argument(
+            '--limit',
+            type=int,
+            default=None,
+            help='Stop after this many items',
+        )
+        parser.add_argument(
+            '--retry-failed',
+            action='store_true',
+            help='Include items whose fetch FAILED or was SKIPPED',
+        )
+        parser.add_argument(
+            '--api-url',
+            default=None,
+            help='Search endpoint to use instead of UNSPLASH_API_URL',
+        )
+
+    def handle(self, *args, **options):
+        if not image_fetcher.access_key:
+            raise CommandError('UNSPLASH_ACCESS_KEY is not configured.')
+        if options['workers'] < 1 or options['batch_size'] < 1:
+            raise CommandError('--workers and --batch-size must be at least 1.')
+
+        if options['api_url']:
+            image_fetcher.api_url = options['api_url']
+        rate = options['rate']
+        if rate is None:
+            rate = getattr(settings, 'IMAGE_FETCH_RATE_PER_HOUR', 0)
+        image_fetcher.rate_limiter = RateLimiter(rate)
+
+        statuses = ['', 'PENDING', 'FETCHING']
+        if options['retry_failed']:
+            Item.all_objects.filter(image_status__in=('FAILED', 'SKIPPED')).filter(
+                Q(image='') | Q(image__isnull=True),
+            ).update(image_status='PENDING', image_fetch_attempts=0, image_next_attempt_at=None)
+
+        candidates = Item.all_objects.filter(
+            Q(image='') | Q(image__isnull=True),
+            Q(image_next_attempt_at__isnull=True) | Q(image_next_attempt_at__lte=timezone.now()),
+            image_status__in=statuses,
+        ).only('id', 'name', 'image_status', 'image_fetch_attempts', 'image_next_attempt_at')
+
+        self.stdout.write(
+            f'Backfilling images with {options["workers"]} worker(s), '
+            f'{"no rate limit" if not rate else f"{rate} searches/hour"}.'
+        )
+
+        totals = defaultdict(int)
+        processed = last_pk = 0
+        limit = options['limit']
+        with ThreadPoolExecutor(max_workers=options['workers']) as pool:
+            while limit is None or processed < limit:
+                size = options['batch_size'] if limit is None else min(options['batch_size'], limit - processed)
+                batch = list(candidates.filter(pk__gt=last_pk).order_by('pk')[:size])
+                if not batch:
+                    break
+                last_pk = batch[-1].pk
+
+                claimed = image_queue.claim_batch(batch)
+                if not claimed:
+                    continue
+                summary = self._process_batch(pool, claimed)
+                processed += len(claimed)
+                for status, count in summary.items():
+                    totals[status] += count
+
+                details = ', '.join(f'{status}: {count}' for status, count in sorted(summary.items()))
+                self.stdout.write(f'  {processed} item(s) processed (last id {last_pk}) — {details}')
+
+        built = image_variant_builder.process_stale()
+        details = ', '.join(f'{status}: {count}' for status, count in sorted(totals.items())) or 'nothing to do'
+        self.stdout.write(self.style.SUCCESS(
+            f'Backfill complete: {processed} item(s) ({details}); thumbnails built for {built}.'
+        ))
+
+        waiting = Item.all_objects.filter(image_status='PENDING', image_next_attempt_at__gt=timezone.now()).count()
+        if waiting:
+            self.stdout.write(f'{waiting} item(s) are waiting to retry after an error; run again later.')
+
+    def _process_batch(self, pool, claimed):
+        """Fetch one claimed batch and write every outcome with a single UPDATE."""
+        by_query = defaultdict(list)
+        for item in claimed:
+            by_query[image_fetcher.normalize_query(item.name)].append(item)
+
+        outcomes = []
+        futures = {pool.submit(self._fetch, items[0].name): query for query, items in by_query.items()}
+        try:
+            for future in as_completed(futures):
+                result = future.result()
+                for item in by_query[futures[future]]:
+                    outcomes.append((item, image_queue.outcome_fields(item, result)))
+        except BaseException:
+            # Interrupted (Ctrl+C): keep what finished, hand the rest back to the queue
+            for future in futures:
+                future.cancel()
+            image_queue.apply_batch(outcomes)
+            done = {item.pk for item, _ in outcomes}
+            image_queue.release([item for item in claimed if item.pk not in done])
+            self.stderr.write('Interrupted; run the command again to resume.')
+            raise
+
+        image_queue.apply_batch(outcomes)
+
+        summary = defaultdict(int)
+        for _, fields in outcomes:
+            summary[fields['image_status']] += 1
+        return summary
+
+    @staticmethod
+    def _fetch(name):
+        try:
+            return image_fetcher.fetch_cached(name)
+        except Exception as e:
+            # Counts as a failed attempt for these items, not for the run
+            return {'status': 'error', 'error': str(e), 'cached': False}
+        finally:
+            # Pool threads hold their own DB connections
+            connections.close_all()
@@ -0,0 +1,66 @@
+"""
+Management command: process_image_queue
+Usage:
+  python manage.py process_image_queue            # run as a long-lived worker
+  python manage.py process_image_queue --once     # drain what is due, then exit
+  python manage.py process_image_queue --retry-failed
+
+Fetches product images for items queued by Item.save() and renders their
+thumbnails. Use this when IMAGE_FETCH_IN_PROCESS_WORKER is False, or from
+cron as a safety net.
+"""
+
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from django.utils import timezone
+
+from inventory.models import Item
+from inventory.image_queue import image_queue
+from inventory.image_variants import image_variant_builder
+
+
+class Command(BaseCommand):
+    help = 'Fetch product images for items waiting in the background image queue'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Process every item that is currently due, then exit',
+        )
+        parser.add_argument(
+            '--interval',
+            type=int,
+            default=30,
+            help='Seconds between polls when running as a worker (default: 30)',
+        )
+        parser.add_argument(
+            '--retry-failed',
+            action='store_true',
+            help='Re-queue items whose fetch FAILED or was SKIPPED before processing',
+        )
+
+    def handle(self, *args, **options):
+        if options['retry_failed']:
+            requeued = Item.all_objects.filter(
+                image_status__in=('FAILED', 'SKIPPED'),
+            ).update(image_status='PENDING', image_fetch_attempts=0, image_next_attempt_at=timezone.now())
+            self.stdout.write(f'Re-queued {requeued} item(s).')
+
+        while True:
+            summary = image_queue.process_due()
+            if summary:
+                details = ', '.join(f'{status}: {count}' for status, count in sorted(summary.items()))
+                self.stdout.write(self.style.SUCCESS(f'Processed {sum(summary.values())} item(s) ({details})'))
+
+            built = image_variant_builder.process_stale()
+            if built:
+                self.stdout.write(self.style.SUCCESS(f'Built thumbnails for {built} item(s)'))
+
+            if options['once']:
+                break
+
+            close_old_connections()
+            time.sleep(options['interval'])
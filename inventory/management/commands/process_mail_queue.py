@@ -0,0 +1,63 @@
+"""
+Management command: process_mail_queue
+Usage:
+  python manage.py process_mail_queue              # run as a long-lived worker
+  python manage.py process_mail_queue --once       # send what is due, then exit
+  python manage.py process_mail_queue --retry-failed
+
+Queues due stock alert digests and sends queued email over one SMTP
+connection per batch. Use this when EMAIL_QUEUE_IN_PROCESS_WORKER is
+False, or from cron as a safety net.
+"""
+
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from django.utils import timezone
+
+from inventory.models import OutboundEmail
+from inventory.mail_queue import mail_queue
+
+
+class Command(BaseCommand):
+    help = 'Send queued email and stock alert digests from the outbound mail queue'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Send everything that is currently due, then exit',
+        )
+        parser.add_argument(
+            '--interval',
+            type=int,
+            default=30,
+            help='Seconds between polls when running as a worker (default: 30)',
+        )
+        parser.add_argument(
+            '--retry-failed',
+            action='store_true',
+            help='Re-queue messages that FAILED before sending',
+        )
+
+    def handle(self, *args, **options):
+        if options['retry_failed']:
+            requeued = OutboundEmail.objects.filter(status='FAILED').update(
+                status='QUEUED', attempts=0, next_attempt_at=timezone.now(),
+            )
+            self.stdout.write(f'Re-queued {requeued} message(s).')
+
+        while True:
+            summary = mail_queue.process_due()
+            if any(summary.values()):
+                self.stdout.write(self.style.SUCCESS(
+                    f"Digests queued: {summary['digests']}, sent: {summary['sent']}, "
+                    f"retrying: {summary['retrying']}, failed: {summary['failed']}"
+                ))
+
+            if options['once']:
+                break
+
+            close_old_connections()
+            time.sleep(options['interval'])
@@ -0,0 +1,46 @@
+"""
+Management command: process_reorder_queue
+Usage:
+  python manage.py process_reorder_queue            # run as a long-lived worker
+  python manage.py process_reorder_queue --once     # refresh what is stale, then exit
+
+Recomputes the stored reorder snapshot of items marked stale by Item.save().
+Use this when REORDER_SNAPSHOT_IN_PROCESS_WORKER is False, or from cron as a
+safety net.
+"""
+
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from inventory.reorder_queue import reorder_queue
+
+
+class Command(BaseCommand):
+    help = 'Refresh the reorder snapshot of items waiting in the background reorder queue'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Refresh every item that is currently stale, then exit',
+        )
+        parser.add_argument(
+            '--interval',
+            type=int,
+            default=30,
+            help='Seconds between polls when running as a worker (default: 30)',
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            refreshed = reorder_queue.process_stale()
+            if refreshed:
+                self.stdout.write(self.style.SUCCESS(f'Refreshed reorder snapshot for {refreshed} item(s)'))
+
+            if options['once']:
+                break
+
+            close_old_connections()
+            time.sleep(options['interval'])
@@ -0,0 +1,65 @@
+"""
+Management command: rebuild_sales_rollups
+Usage:
+  python manage.py rebuild_sales_rollups                   # every day with sales
+  python manage.py rebuild_sales_rollups --days 7          # only the last 7 days
+  python manage.py rebuild_sales_rollups --verify          # report drift, write nothing
+
+Recomputes the daily sales rollups (DailySales) that the chatbot's ad-hoc
+sales questions read. Sales saved through the app keep them up to date;
+run this after imports that bypass save() (bulk_create, raw SQL, queryset
+deletes), or with --verify from cron to check they still agree with the
+transaction table.
+"""
+
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from inventory import sales_rollups
+
+
+class Command(BaseCommand):
+    help = 'Recompute (or verify) the daily sales rollups from the transaction table'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=None,
+            help='Only the last N days, including today (default: all)',
+        )
+        parser.add_argument(
+            '--verify',
+            action='store_true',
+            help='Compare the rollups with the transactions and exit with an error on drift instead of rebuilding',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Rows written per INSERT batch (default: 1000)',
+        )
+
+    def handle(self, *args, **options):
+        if options['days'] is not None and options['days'] < 1:
+            raise CommandError('--days must be at least 1.')
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be at least 1.')
+        start = timezone.localdate() - timedelta(days=options['days'] - 1) if options['days'] else None
+
+        if options['verify']:
+            drift = sales_rollups.verify(start=start)
+            for day, item_id, expected, stored in drift[:20]:
+                self.stdout.write(
+                    f"  {day} item {item_id}: expected {expected[0]} unit(s), Rs. {expected[1]}, {expected[2]} sale(s); "
+                    f"stored {stored[0]} unit(s), Rs. {stored[1]}, {stored[2]} sale(s)"
+                )
+            if drift:
+                raise CommandError(f'{len(drift)} day/item bucket(s) differ; run rebuild_sales_rollups to fix them.')
+            self.stdout.write(self.style.SUCCESS('Daily sales rollups match the transactions.'))
+            return
+
+        written = sales_rollups.rebuild(start=start, batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {written} daily sales row(s).'))
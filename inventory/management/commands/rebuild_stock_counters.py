@@ -0,0 +1,44 @@
+"""
+Management command: rebuild_stock_counters
+Usage:
+  python manage.py rebuild_stock_counters
+  python manage.py rebuild_stock_counters --verify     # report drift, write nothing
+
+Recomputes the catalogue StockCounters row (item counts per stock status,
+stock value at price and at cost, reorder alert counts) that the item
+list, the dashboard and the chatbot read. Item saves keep it up to date;
+run this after writes that bypass Item.save() (queryset.update(),
+bulk_create, raw SQL), or with --verify from cron to check it still
+agrees with the item table.
+"""
+
+from django.core.management.base import BaseCommand, CommandError
+
+from inventory.stock_counters import stock_counters
+
+
+class Command(BaseCommand):
+    help = 'Recompute (or verify) the catalogue stock counters from the item table'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verify',
+            action='store_true',
+            help='Compare the counters with the item table and exit with an error on drift instead of rebuilding',
+        )
+
+    def handle(self, *args, **options):
+        if options['verify']:
+            drift = stock_counters.verify()
+            for counter, (expected, stored) in drift.items():
+                self.stdout.write(f"  {counter}: expected {expected}, stored {stored}")
+            if drift:
+                raise CommandError(f'{len(drift)} counter(s) differ; run rebuild_stock_counters to fix them.')
+            self.stdout.write(self.style.SUCCESS('Stock counters match the item table.'))
+            return
+
+        counters = stock_counters.rebuild()
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt the stock counters: {counters.total_items} item(s), {counters.low_stock} low and '
+            f'{counters.out_of_stock} out of stock, Rs. {counters.stock_value:,.2f} at price.'
+        ))
@@ -0,0 +1,88 @@
+"""
+Management command: reconcile_payments
+Usage:
+  python manage.py reconcile_payments                  # run as a long-lived worker
+  python manage.py reconcile_payments --once           # reconcile once, then exit (cron)
+  python manage.py reconcile_payments --once --min-age 5 --expire-after 48
+  python manage.py reconcile_payments --concurrency 16 --limit 500
+
+Looks up Khalti / eSewa transactions that are still PENDING with the
+gateway and settles them; ones never paid are marked FAILED once they
+expire. See inventory/payment_reconciler.py.
+"""
+
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+
+from inventory.payment_reconciler import payment_reconciler
+
+
+class Command(BaseCommand):
+    help = 'Settle stale PENDING Khalti / eSewa payments by looking them up with the gateway'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Reconcile everything currently due, then exit',
+        )
+        parser.add_argument(
+            '--interval',
+            type=int,
+            default=300,
+            help='Seconds between runs when running as a worker (default: 300)',
+        )
+        parser.add_argument(
+            '--min-age',
+            type=int,
+            default=None,
+            help='Only check transactions pending at least this many minutes '
+                 '(default: PAYMENT_RECONCILE_AFTER_MINUTES)',
+        )
+        parser.add_argument(
+            '--expire-after',
+            type=int,
+            default=None,
+            help='Mark unpaid transactions FAILED after this many hours '
+                 '(default: PAYMENT_PENDING_EXPIRY_HOURS)',
+        )
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=None,
+            help='Gateway lookups in flight at once (default: PAYMENT_RECONCILE_CONCURRENCY)',
+        )
+        parser.add_argument(
+            '--limit',
+            type=int,
+            default=None,
+            help='Check at most this many transactions per run',
+        )
+
+    def handle(self, *args, **options):
+        if options['concurrency'] is not None and options['concurrency'] < 1:
+            raise CommandError('--concurrency must be at least 1.')
+        if options['limit'] is not None and options['limit'] < 1:
+            raise CommandError('--limit must be at least 1.')
+
+        while True:
+            summary = payment_reconciler.reconcile(
+                min_age_minutes=options['min_age'],
+                expire_after_hours=options['expire_after'],
+                concurrency=options['concurrency'],
+                limit=options['limit'],
+            )
+            if summary['checked'] or options['once']:
+                self.stdout.write(self.style.SUCCESS(
+                    f"Checked: {summary['checked']}, paid: {summary['paid']}, failed: {summary['failed']}, "
+                    f"expired: {summary['expired']}, still pending: {summary['pending']}, "
+                    f"skipped: {summary['skipped']}, errors: {summary['errors']}"
+                ))
+
+            if options['once']:
+                break
+
+            close_old_connections()
+            time.sleep(options['interval'])
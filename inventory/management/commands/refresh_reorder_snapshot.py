@@ -0,0 +1,45 @@
+"""
+Management command: refresh_reorder_snapshot
+Usage:
+  python manage.py refresh_reorder_snapshot
+  python manage.py refresh_reorder_snapshot --stale-only
+
+Recomputes the stored AI reorder status (Item.reorder_*) that the item list
+page reads. Items are refreshed in the background after each stock change
+(see process_reorder_queue); run this nightly (e.g. from cron) so forecasts
+drift with the calendar and with sales of sibling items.
+"""
+
+from django.core.management.base import BaseCommand
+
+from inventory.models import Item
+from inventory.ml_predictor import refresh_reorder_snapshot
+
+
+class Command(BaseCommand):
+    help = 'Recompute the stored AI reorder snapshot for every active item'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--stale-only',
+            action='store_true',
+            help='Only refresh items that have never been checked',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Number of items written per UPDATE batch (default: 500)',
+        )
+
+    def handle(self, *args, **options):
+        items = Item.objects.all()
+        if options['stale_only']:
+            items = items.filter(reorder_checked_at__isnull=True)
+
+        refreshed = refresh_reorder_snapshot(items.iterator(), batch_size=options['batch_size'])
+        needing = Item.objects.filter(reorder_needed=True).count()
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Refreshed {refreshed} item(s); {needing} currently need reordering.'
+        ))
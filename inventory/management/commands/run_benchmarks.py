@@ -0,0 +1,186 @@
+"""
+Management command: run_benchmarks
+Usage:
+  python manage.py run_benchmarks                          # every benchmark, result saved to BENCHMARK_DIR
+  python manage.py run_benchmarks --compare latest         # ... and compared with the previous result
+  python manage.py run_benchmarks -k chatbot -k export     # only benchmarks whose name contains these
+  python manage.py run_benchmarks --compare base.json --fail-threshold 0.25   # exit 1 on a >25% slowdown
+  python manage.py run_benchmarks --list
+
+Runs the micro-benchmarks in inventory/benchmarks.py against a throwaway
+test database seeded with a fixed synthetic dataset (the configured
+database is never touched) and writes the timings as JSON.
+"""
+
+from io import StringIO
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.test import override_settings
+from django.test.runner import DiscoverRunner
+from django.utils import timezone
+
+from inventory import benchmarks
+
+
+class Command(BaseCommand):
+    help = 'Time the hot inventory functions on a fixed synthetic dataset and store the results as JSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '-k',
+            dest='patterns',
+            action='append',
+            default=[],
+            metavar='PATTERN',
+            help='Only run benchmarks whose name contains PATTERN (repeatable)',
+        )
+        parser.add_argument('--list', action='store_true', help='List the benchmarks and exit')
+        parser.add_argument(
+            '--items',
+            type=int,
+            default=benchmarks.DEFAULT_DATASET['items'],
+            help=f"Items in the dataset (default: {benchmarks.DEFAULT_DATASET['items']})",
+        )
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=benchmarks.DEFAULT_DATASET['days'],
+            help=f"Days of sales history (default: {benchmarks.DEFAULT_DATASET['days']})",
+        )
+        parser.add_argument(
+            '--tx-per-day',
+            type=int,
+            default=benchmarks.DEFAULT_DATASET['tx_per_day'],
+            help=f"Average sales per day (default: {benchmarks.DEFAULT_DATASET['tx_per_day']})",
+        )
+        parser.add_argument('--min-rounds', type=int, default=5, help='Timed rounds per benchmark at least (default: 5)')
+        parser.add_argument(
+            '--min-time',
+            type=float,
+            default=0.5,
+            help='Seconds spent timing each benchmark at least (default: 0.5)',
+        )
+        parser.add_argument(
+            '--max-time',
+            type=float,
+            default=10.0,
+            help='Stop adding rounds to a benchmark after this many seconds (default: 10)',
+        )
+        parser.add_argument('--output', metavar='PATH', help='Result file (default: BENCHMARK_DIR/<time>-<commit>.json)')
+        parser.add_argument(
+            '--compare',
+            metavar='PATH',
+            help='Compare medians with an earlier result file, or "latest" for the newest one in BENCHMARK_DIR',
+        )
+        parser.add_argument(
+            '--threshold',
+            type=float,
+            default=0.25,
+            help='Relative median change reported as a regression or improvement (default: 0.25)',
+        )
+        parser.add_argument(
+            '--fail-threshold',
+            type=float,
+            default=None,
+            help='Exit with an error when any median is slower than the baseline by more than this (e.g. 0.25)',
+        )
+
+    def handle(self, *args, **options):
+        selected = benchmarks.select(options['patterns'])
+        if options['list']:
+            for bench in selected:
+                self.stdout.write(bench.name)
+            return
+        if not selected:
+            raise CommandError(f"No benchmark matches {', '.join(options['patterns'])}")
+
+        baseline_path = None
+        if options['compare'] == 'latest':
+            baseline_path = benchmarks.latest_result()
+            if baseline_path is None:
+                self.stdout.write(self.style.WARNING('No earlier result in BENCHMARK_DIR to compare with'))
+        elif options['compare']:
+            baseline_path = options['compare']
+        baseline = benchmarks.load(baseline_path) if baseline_path else None
+
+        dataset = {
+            'items': options['items'],
+            'days': options['days'],
+            'tx_per_day': options['tx_per_day'],
+            'seed': benchmarks.DEFAULT_DATASET['seed'],
+        }
+        results = {
+            'created': timezone.now().isoformat(),
+            **benchmarks.environment(),
+            'dataset': dataset,
+            'timing': {key: options[key] for key in ('min_rounds', 'min_time', 'max_time')},
+            'benchmarks': {},
+        }
+
+        runner = DiscoverRunner(interactive=False, verbosity=0)
+        runner.setup_test_environment()
+        old_config = runner.setup_databases()
+        try:
+            with override_settings(EMAIL_QUEUE_IN_PROCESS_WORKER=False, IMAGE_FETCH_IN_PROCESS_WORKER=False):
+                results['benchmarks'] = self.run_selected(selected, dataset, options)
+        finally:
+            runner.teardown_databases(old_config)
+            runner.teardown_test_environment()
+
+        path = benchmarks.save(results, options['output'] or benchmarks.result_path(results))
+        self.stdout.write(self.style.SUCCESS(f'Results written to {path}'))
+
+        if baseline is not None:
+            self.report_comparison(results, baseline, baseline_path, options)
+
+    def run_selected(self, selected, dataset, options):
+        self.stdout.write(
+            f"Seeding {dataset['items']} items with {dataset['days']} days of history "
+            f"({dataset['tx_per_day']} sales/day)..."
+        )
+        call_command(
+            'seed_load_dataset', items=dataset['items'], days=dataset['days'], tx_per_day=dataset['tx_per_day'],
+            users=1, seed=dataset['seed'], stdout=StringIO(),
+        )
+        ctx = benchmarks.BenchmarkContext.build()
+
+        self.stdout.write(f"{'benchmark':<44} {'rounds':>6} {'min ms':>9} {'median ms':>10} {'max ms':>9} {'iqr ms':>8}")
+        timings = {}
+        for bench in selected:
+            stats = benchmarks.time_benchmark(
+                bench, ctx, options['min_rounds'], options['min_time'], options['max_time'],
+            )
+            timings[bench.name] = stats
+            self.stdout.write(
+                f"{bench.name:<44} {stats['rounds']:>6} {stats['min'] * 1000:>9.2f} "
+                f"{stats['median'] * 1000:>10.2f} {stats['max'] * 1000:>9.2f} {stats['iqr'] * 1000:>8.2f}"
+            )
+        return timings
+
+    def report_comparison(self, results, baseline, baseline_path, options):
+        self.stdout.write(f"\nMedians against {baseline_path} ({(baseline.get('commit') or '?')[:10]}):")
+        if baseline.get('dataset') != results['dataset']:
+            self.stdout.write(self.style.WARNING(
+                f"  Baseline used a different dataset ({baseline.get('dataset')}); timings are not comparable"
+            ))
+
+        rows = benchmarks.compare(results, baseline, options['threshold'], names=set(results['benchmarks']))
+        styles = {'regression': self.style.ERROR, 'improvement': self.style.SUCCESS}
+        for row in rows:
+            if row['change'] is None:
+                line = f"  {row['name']:<44} {row['status']}"
+            else:
+                line = (
+                    f"  {row['name']:<44} {row['baseline'] * 1000:>9.2f} -> {row['current'] * 1000:>9.2f} ms "
+                    f"{row['change']:>+7.1%}  {row['status']}"
+                )
+            self.stdout.write(styles.get(row['status'], str)(line))
+
+        if options['fail_threshold'] is not None:
+            slower = [row['name'] for row in rows if row['change'] is not None and row['change'] > options['fail_threshold']]
+            if slower:
+                raise CommandError(
+                    f"{len(slower)} benchmark(s) slower than the baseline by more than "
+                    f"{options['fail_threshold']:.0%}: {', '.join(slower)}"
+                )
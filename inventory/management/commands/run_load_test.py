@@ -0,0 +1,131 @@
+"""
+Management command: run_load_test
+Usage:
+  python manage.py run_load_test                                        # 10 users for 60s against localhost:8000
+  python manage.py run_load_test --users 50 --duration 300 --think-time 0.5
+  python manage.py run_load_test --base-url https://staging.example.com --json load-report.json
+  python manage.py run_load_test --iterations 20 --think-time 0         # fixed amount of work, as fast as possible
+
+Drives a running server with concurrent virtual users (see
+inventory/load_test.py) and prints per-endpoint throughput and
+p50/p95/p99 latency. Seed the server's database with seed_load_dataset
+first: the virtual users log in as its loadtest_N accounts and create
+real sales and simulated gateway payments.
+"""
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from inventory.load_test import SCENARIOS, LoadDriver, format_summary, write_summary
+from inventory.management.commands.seed_load_dataset import USER_PREFIX
+
+
+class Command(BaseCommand):
+    help = 'Replay a realistic mix of requests against a running server and report latency percentiles'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--base-url',
+            default='http://127.0.0.1:8000',
+            help='Server under test (default: http://127.0.0.1:8000)',
+        )
+        parser.add_argument('--users', type=int, default=10, help='Concurrent virtual users (default: 10)')
+        parser.add_argument(
+            '--duration',
+            type=float,
+            default=None,
+            help='Seconds to run (default: 60, or no limit with --iterations)',
+        )
+        parser.add_argument(
+            '--iterations',
+            type=int,
+            default=None,
+            help='Stop each user after this many journeys instead (no time limit unless --duration is also given)',
+        )
+        parser.add_argument(
+            '--think-time',
+            type=float,
+            default=1.0,
+            help='Mean pause between journeys per user, in seconds (default: 1.0)',
+        )
+        parser.add_argument(
+            '--ramp-up',
+            type=float,
+            default=5.0,
+            help='Seconds over which the users are started (default: 5)',
+        )
+        parser.add_argument('--accounts', type=int, default=20, help='Load-test accounts to spread the users over (default: 20)')
+        parser.add_argument(
+            '--password',
+            default='loadtest-password',
+            help='Password of the load-test accounts (default: loadtest-password)',
+        )
+        parser.add_argument(
+            '--scenario',
+            action='append',
+            default=[],
+            metavar='NAME=WEIGHT',
+            help=f"Override a journey weight, e.g. --scenario gateway_sale=0 (journeys: {', '.join(SCENARIOS)})",
+        )
+        parser.add_argument('--timeout', type=float, default=30, help='Per-request timeout in seconds (default: 30)')
+        parser.add_argument('--seed', type=int, default=None, help='Random seed for the journey mix')
+        parser.add_argument('--json', metavar='PATH', help='Also write the report as JSON to PATH')
+
+    def handle(self, *args, **options):
+        if options['users'] < 1 or options['accounts'] < 1:
+            raise CommandError('--users and --accounts must be at least 1')
+        if options['duration'] is None and options['iterations'] is None:
+            options['duration'] = 60
+
+        scenarios = dict(SCENARIOS)
+        for override in options['scenario']:
+            name, _, weight = override.partition('=')
+            if name not in SCENARIOS or not weight.replace('.', '', 1).isdigit():
+                raise CommandError(f"Invalid --scenario {override!r}; use NAME=WEIGHT with one of: {', '.join(SCENARIOS)}")
+            scenarios[name] = float(weight)
+        if not any(scenarios.values()):
+            raise CommandError('Every journey has weight 0')
+        if scenarios.get('gateway_sale') and not getattr(settings, 'PAYMENT_SIMULATION_MODE', False):
+            self.stdout.write(self.style.WARNING(
+                'PAYMENT_SIMULATION_MODE is off here; if it is off on the server too, gateway_sale journeys will fail '
+                '(disable them with --scenario gateway_sale=0)'
+            ))
+
+        accounts = [f'{USER_PREFIX}{i}' for i in range(1, options['accounts'] + 1)]
+        driver = LoadDriver(
+            options['base_url'],
+            accounts,
+            options['password'],
+            users=options['users'],
+            duration=options['duration'],
+            iterations=options['iterations'],
+            think_time=options['think_time'],
+            ramp_up=options['ramp_up'],
+            timeout=options['timeout'],
+            scenarios=scenarios,
+            seed=options['seed'],
+        )
+
+        limit = f"{options['duration']:g}s" if options['duration'] else f"{options['iterations']} journeys per user"
+        self.stdout.write(f"Running {options['users']} virtual users against {driver.base_url} for {limit}...")
+        summary = driver.run()
+        if not summary['requests']:
+            raise CommandError('No requests were made; is the server running and seeded with seed_load_dataset?')
+
+        self.stdout.write(format_summary(summary))
+        for endpoint, error in summary['error_examples'].items():
+            self.stdout.write(self.style.WARNING(f'  {endpoint}: first error: {error}'))
+
+        if options['json']:
+            run_options = {
+                key: options[key]
+                for key in ('base_url', 'users', 'duration', 'iterations', 'think_time', 'ramp_up', 'seed')
+            }
+            run_options['scenarios'] = scenarios
+            write_summary(summary, options['json'], run_options)
+            self.stdout.write(f"Report written to {options['json']}")
+
+        style = self.style.SUCCESS if not summary['errors'] else self.style.WARNING
+        self.stdout.write(style(
+            f"{summary['requests']} requests, {summary['errors']} errors, {summary['throughput']:.1f} req/s"
+        ))
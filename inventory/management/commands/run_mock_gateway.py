@@ -0,0 +1,66 @@
+"""
+Management command: run_mock_gateway
+Usage:
+  python manage.py run_mock_gateway
+  python manage.py run_mock_gateway --port 8002 --latency 0.5
+  python manage.py run_mock_gateway --fail-rate 0.1
+
+Serves mock Khalti and eSewa verification and status APIs
+(inventory/mock_gateway.py) for local testing. Start the app with the printed environment variables
+to send payment verifications there instead of the real gateways. A
+Khalti token or eSewa refId starting with "fail" is always rejected.
+"""
+
+from django.core.management.base import BaseCommand, CommandError
+
+from inventory.mock_gateway import MockGatewayServer
+
+
+class Command(BaseCommand):
+    help = 'Run a local mock of the Khalti and eSewa payment verification and status APIs'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--host',
+            default='127.0.0.1',
+            help='Interface to listen on (default: 127.0.0.1)',
+        )
+        parser.add_argument(
+            '--port',
+            type=int,
+            default=8002,
+            help='Port to listen on (default: 8002)',
+        )
+        parser.add_argument(
+            '--latency',
+            type=float,
+            default=0.0,
+            help='Seconds to wait before every response, to imitate a slow gateway',
+        )
+        parser.add_argument(
+            '--fail-rate',
+            type=float,
+            default=0.0,
+            help='Share of verifications to reject at random, 0-1 (default: 0)',
+        )
+
+    def handle(self, *args, **options):
+        if not 0 <= options['fail_rate'] <= 1:
+            raise CommandError('--fail-rate must be between 0 and 1.')
+
+        try:
+            server = MockGatewayServer(options['host'], options['port'], options['latency'], options['fail_rate'])
+        except OSError as e:
+            raise CommandError(f'Cannot listen on {options["host"]}:{options["port"]}: {e}')
+
+        self.stdout.write(self.style.SUCCESS(f'Mock payment gateway listening on {server.base_url}'))
+        self.stdout.write('Start the app with:')
+        for name, url in server.urls.items():
+            self.stdout.write(f'  {name}={url}')
+
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            self.stdout.write('Stopping mock gateway.')
+        finally:
+            server.stop()
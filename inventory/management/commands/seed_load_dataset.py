@@ -0,0 +1,300 @@
+"""
+Management command: seed_load_dataset
+Usage:
+  python manage.py seed_load_dataset                                   # 1,000 items, 90 days, 300 sales/day
+  python manage.py seed_load_dataset --items 10000 --days 180 --tx-per-day 2000
+  python manage.py seed_load_dataset --clear --seed 7                  # replace an earlier load dataset
+  python manage.py seed_load_dataset --clear --items 0                 # remove it
+
+Builds a synthetic catalogue for load testing (run_load_test) with
+bulk_create instead of per-row inserts:
+- Suppliers, customers and items (SKUs "LOAD-000001" ...) with skewed
+  popularity: a few items sell most, as in a real shop
+- Daily sales for --days days with a weekly rhythm and a slow upward
+  trend, paid by cash, bank transfer, Khalti or eSewa (some gateway
+  payments failed or still pending); stock is restocked from the item's
+  supplier whenever it falls below the reorder level, so final stock
+  levels match the history
+- --users approved Manager accounts (loadtest_1 ...) that the load driver
+  logs in as, all with the --password password
+
+The same --seed gives the same dataset (timestamps are relative to now).
+Rows are written without model save() signals; the search index picks
+the new rows up on its next sync, the daily sales rollups for the seeded
+days and the catalogue stock counters are rebuilt in the same transaction
+and the stored reorder snapshot is refreshed at the end (skip with
+--no-snapshot).
+"""
+
+import itertools
+import math
+import random
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth.models import Group, User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction as db_transaction
+from django.utils import timezone
+
+from inventory import sales_rollups
+from inventory.models import Customer, Item, Supplier, Transaction
+from inventory.stock_counters import stock_counters
+from users.models import UserProfile
+
+
+SKU_PREFIX = 'LOAD-'
+SUPPLIER_PREFIX = 'Load Supplier'
+CUSTOMER_PREFIX = 'Load Customer'
+USER_PREFIX = 'loadtest_'
+
+PRODUCTS = [
+    'Mouse', 'Keyboard', 'Monitor', 'Headphones', 'Charger Cable', 'Laptop Stand', 'Webcam',
+    'Desk Lamp', 'Notebook', 'Backpack', 'Water Bottle', 'Speaker', 'Router', 'Power Bank',
+    'USB Hub', 'Office Chair', 'Printer Paper', 'Ink Cartridge', 'Smartphone Case', 'Tablet',
+]
+VARIANTS = ['Basic', 'Pro', 'Wireless', 'Compact', 'Deluxe', 'Eco', 'Max', 'Mini', 'Plus', 'Ultra']
+
+# (method, share of sales)
+PAYMENT_MIX = [('CASH', 0.45), ('BANK_TRANSFER', 0.10), ('KHALTI', 0.28), ('ESEWA', 0.17)]
+GATEWAY_FAILURE_RATE = 0.04
+
+
+@contextmanager
+def historical_timestamps():
+    """Let bulk_create keep the timestamps we set instead of auto_now_add's 'now'."""
+    field = Transaction._meta.get_field('timestamp')
+    field.auto_now_add = False
+    try:
+        yield
+    finally:
+        field.auto_now_add = True
+
+
+class Command(BaseCommand):
+    help = 'Create a reproducible synthetic catalogue and sales history for load testing'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--items', type=int, default=1000, help='Items to create (default: 1000)')
+        parser.add_argument('--days', type=int, default=90, help='Days of sales history (default: 90)')
+        parser.add_argument(
+            '--tx-per-day',
+            type=int,
+            default=300,
+            help='Average sales per day across the catalogue (default: 300)',
+        )
+        parser.add_argument(
+            '--suppliers',
+            type=int,
+            default=None,
+            help='Suppliers to create (default: one per 25 items)',
+        )
+        parser.add_argument(
+            '--customers',
+            type=int,
+            default=None,
+            help='Customers to create (default: one per 10 items)',
+        )
+        parser.add_argument('--users', type=int, default=20, help='Manager accounts for the load driver (default: 20)')
+        parser.add_argument(
+            '--password',
+            default='loadtest-password',
+            help='Password of the load-test accounts (default: loadtest-password)',
+        )
+        parser.add_argument('--seed', type=int, default=42, help='Random seed (default: 42)')
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=2000,
+            help='Rows per INSERT (default: 2000)',
+        )
+        parser.add_argument(
+            '--clear',
+            action='store_true',
+            help='Delete an earlier load dataset first, with its accounts and everything they recorded',
+        )
+        parser.add_argument(
+            '--no-snapshot',
+            action='store_true',
+            help='Skip refreshing the stored reorder snapshot of the new items',
+        )
+
+    def handle(self, *args, **options):
+        for name in ('items', 'days', 'tx_per_day', 'users'):
+            if options[name] < 0:
+                raise CommandError(f"--{name.replace('_', '-')} cannot be negative.")
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be at least 1.')
+
+        if options['clear']:
+            self.clear()
+        elif Item.all_objects.filter(sku__startswith=SKU_PREFIX).exists():
+            raise CommandError('A load dataset already exists. Use --clear to replace it.')
+
+        if not options['items']:
+            return
+
+        self.rng = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        started = time.monotonic()
+
+        with db_transaction.atomic():
+            admin = User.objects.filter(is_superuser=True).order_by('pk').first()
+            users = self.create_users(options['users'], options['password'])
+            performers = users or ([admin] if admin else [])
+            if not performers:
+                raise CommandError('Create a superuser or pass --users so transactions have a performer.')
+
+            suppliers = self.create_suppliers(options['suppliers'] or max(1, options['items'] // 25))
+            customers = self.create_customers(options['customers'] or max(1, options['items'] // 10))
+            items = self.create_items(options['items'], suppliers)
+            counts = self.create_history(items, customers, performers, options['days'], options['tx_per_day'])
+            rollups = sales_rollups.rebuild(start=timezone.localdate() - timedelta(days=options['days']))
+            stock_counters.rebuild()
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Created {len(suppliers)} suppliers, {len(customers)} customers, {len(items)} items, "
+            f"{counts['sales']} sales and {counts['purchases']} restocks for {len(users)} accounts "
+            f"({rollups} daily sales rollup rows) in {time.monotonic() - started:.1f}s"
+        ))
+
+        if not options['no_snapshot']:
+            from inventory.ml_predictor import refresh_reorder_snapshot
+
+            started = time.monotonic()
+            refreshed = refresh_reorder_snapshot(Item.objects.filter(sku__startswith=SKU_PREFIX).iterator())
+            self.stdout.write(f"Refreshed the reorder snapshot of {refreshed} items in {time.monotonic() - started:.1f}s")
+
+    # ------------------------------------------------------------------
+    # Steps
+    # ------------------------------------------------------------------
+
+    def clear(self):
+        with db_transaction.atomic():
+            transactions, _ = Transaction.all_objects.filter(item__sku__startswith=SKU_PREFIX).delete()
+            items, _ = Item.all_objects.filter(sku__startswith=SKU_PREFIX).delete()
+            Supplier.objects.filter(name__startswith=SUPPLIER_PREFIX).delete()
+            Customer.objects.filter(name__startswith=CUSTOMER_PREFIX).delete()
+            User.objects.filter(username__startswith=USER_PREFIX).delete()
+        self.stdout.write(f"Removed the earlier load dataset ({items} rows with items, {transactions} with transactions)")
+
+    def create_users(self, count, password):
+        manager, _ = Group.objects.get_or_create(name='Manager')
+        users = []
+        for i in range(1, count + 1):
+            # create_user() (not bulk_create) so the profile signal and password hashing run
+            user = User.objects.create_user(f'{USER_PREFIX}{i}', f'{USER_PREFIX}{i}@example.com', password)
+            users.append(user)
+        manager.user_set.add(*users)
+        UserProfile.objects.filter(user__in=users).update(
+            is_approved=True, approval_status='approved', approved_at=timezone.now(),
+        )
+        return users
+
+    def create_suppliers(self, count):
+        rng = self.rng
+        Supplier.objects.bulk_create([
+            Supplier(
+                name=f'{SUPPLIER_PREFIX} {i:04d}',
+                email=f'supplier{i}@load.example.com',
+                lead_time_days=rng.randint(3, 14),
+            )
+            for i in range(1, count + 1)
+        ], batch_size=self.batch_size)
+        return list(Supplier.objects.filter(name__startswith=SUPPLIER_PREFIX).order_by('pk'))
+
+    def create_customers(self, count):
+        Customer.objects.bulk_create([
+            Customer(name=f'{CUSTOMER_PREFIX} {i:05d}', email=f'customer{i}@load.example.com')
+            for i in range(1, count + 1)
+        ], batch_size=self.batch_size)
+        return list(Customer.objects.filter(name__startswith=CUSTOMER_PREFIX).order_by('pk'))
+
+    def create_items(self, count, suppliers):
+        rng = self.rng
+        items = []
+        for i in range(1, count + 1):
+            price = Decimal(str(round(math.exp(rng.uniform(math.log(50), math.log(5000))), 2)))
+            supplier = rng.choice(suppliers)
+            items.append(Item(
+                name=f'{rng.choice(VARIANTS)} {rng.choice(PRODUCTS)} {i:05d}',
+                sku=f'{SKU_PREFIX}{i:06d}',
+                supplier=supplier,
+                quantity=rng.randint(20, 120),
+                price=price,
+                cost_price=(price * Decimal(str(rng.uniform(0.55, 0.8)))).quantize(Decimal('0.01')),
+                reorder_level=rng.randint(5, 30),
+                lead_time_days=supplier.lead_time_days,
+            ))
+        Item.objects.bulk_create(items, batch_size=self.batch_size)
+        # Read back for primary keys (not every backend returns them from bulk_create)
+        return list(Item.objects.filter(sku__startswith=SKU_PREFIX).select_related('supplier').order_by('pk'))
+
+    def create_history(self, items, customers, performers, days, tx_per_day):
+        """Simulate day by day: sales by popularity, restocks below the reorder level."""
+        rng = self.rng
+        now = timezone.now()
+        # Zipf-like popularity: item k sells about 1/k as often as the top seller
+        ranks = list(range(1, len(items) + 1))
+        rng.shuffle(ranks)
+        cum_weights = list(itertools.accumulate(1 / rank for rank in ranks))
+        stock = {item.pk: item.quantity for item in items}
+        methods, method_weights = zip(*PAYMENT_MIX)
+        pending, counts = [], {'sales': 0, 'purchases': 0}
+
+        with historical_timestamps():
+            for day_offset in range(days, 0, -1):
+                day = (now - timedelta(days=day_offset)).replace(hour=9, minute=0, second=0, microsecond=0)
+                weekend = 1.5 if day.weekday() >= 5 else 1.0
+                trend = 0.8 + 0.4 * (days - day_offset) / max(days, 1)
+                sales_today = max(0, round(rng.gauss(tx_per_day * weekend * trend, tx_per_day * 0.1)))
+
+                for item in rng.choices(items, cum_weights=cum_weights, k=sales_today):
+                    quantity = rng.choice((1, 1, 1, 2, 2, 3, 5))
+                    method = rng.choices(methods, weights=method_weights)[0]
+                    status = 'PAID'
+                    if method in ('KHALTI', 'ESEWA'):
+                        if rng.random() < GATEWAY_FAILURE_RATE:
+                            status = 'FAILED'
+                        elif day_offset <= 1 and rng.random() < 0.2:
+                            status = 'PENDING'
+                    if status == 'PAID':
+                        if stock[item.pk] < quantity:
+                            continue   # Out of stock: the sale never happened
+                        stock[item.pk] -= quantity
+                    unit_price = (item.price * Decimal(str(rng.uniform(0.97, 1.03)))).quantize(Decimal('0.01'))
+                    pending.append(Transaction(
+                        item=item, transaction_type='SALE', quantity=quantity, unit_price=unit_price,
+                        total_amount=unit_price * quantity, payment_status=status, payment_method=method,
+                        payment_reference=f'LOAD-{rng.getrandbits(48):012x}' if method in ('KHALTI', 'ESEWA') else None,
+                        performed_by=rng.choice(performers), customer=rng.choice(customers) if rng.random() < 0.6 else None,
+                        timestamp=day + timedelta(seconds=rng.randint(0, 10 * 3600)), notes='Load test sale',
+                    ))
+                    counts['sales'] += 1
+
+                # End of day: restock everything that fell below its reorder level
+                for item in items:
+                    if stock[item.pk] < item.reorder_level:
+                        quantity = item.reorder_level * rng.randint(3, 6)
+                        stock[item.pk] += quantity
+                        pending.append(Transaction(
+                            item=item, transaction_type='PURCHASE', quantity=quantity, unit_price=item.cost_price,
+                            total_amount=item.cost_price * quantity, payment_status='PAID',
+                            payment_method='BANK_TRANSFER', performed_by=rng.choice(performers),
+                            supplier=item.supplier, timestamp=day + timedelta(hours=11), notes='Load test restock',
+                        ))
+                        counts['purchases'] += 1
+
+                if len(pending) >= self.batch_size * 5:
+                    Transaction.objects.bulk_create(pending, batch_size=self.batch_size)
+                    pending = []
+
+            Transaction.objects.bulk_create(pending, batch_size=self.batch_size)
+
+        # Final stock follows from the simulated history
+        for item in items:
+            item.quantity = stock[item.pk]
+        Item.objects.bulk_update(items, ['quantity'], batch_size=self.batch_size)
+        return counts
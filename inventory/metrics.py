@@ -0,0 +1,376 @@
+"""
+In-Process Metrics
+==================
+
+Counters and histograms for the hot paths, exported at /metrics in the
+Prometheus text format. No metrics service or client library is needed:
+point any Prometheus-compatible scraper at the endpoint, or read it with
+curl.
+
+How it works:
+1. Every metric is declared at the bottom of this module, so /metrics
+   lists the whole catalogue even before a metric has been recorded
+2. Values live in this process and are updated under one lock, so threads
+   (runserver, the image and mail workers, the payment verification pool)
+   all add to the same numbers. With several worker processes each
+   process reports its own values; scrape each worker, or sum them
+3. MetricsMiddleware times every request by URL name and counts the
+   database queries it makes. Queries are counted by a wrapper installed
+   on each database connection (install_query_counter(), from
+   InventoryConfig.ready()) and attributed to the request through a
+   context variable, so async views whose ORM calls run in worker threads
+   are counted as well. Streaming responses are timed to their first byte
+4. Forecasting, chart rendering, gateway verification, image fetching and
+   the forecast / hierarchy / access / image caches record their own
+   metrics where the work happens. Cache hit ratios and the forecast
+   fallback rate are derived from those counts when /metrics is rendered
+5. Values reset when the process restarts; Prometheus handles that for
+   counters and histograms
+"""
+
+import bisect
+import contextvars
+import functools
+import threading
+import time
+from contextlib import contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+# Seconds: from a cached lookup to a slow report or gateway call
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class Metric:
+    """A named metric with a fixed set of label names."""
+
+    kind = None
+
+    def __init__(self, registry, name, documentation, labelnames=()):
+        self.registry = registry
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.values = {}   # label values tuple -> value
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def header(self):
+        return [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self.registry.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def samples(self):
+        return [f'{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}'
+                for key, value in sorted(self.values.items())]
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, registry, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(registry, name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self.registry.lock:
+            state = self.values.get(key)
+            if state is None:
+                state = self.values[key] = {'buckets': [0] * len(self.buckets), 'sum': 0.0, 'count': 0}
+            if index < len(self.buckets):
+                state['buckets'][index] += 1
+            state['sum'] += value
+            state['count'] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """
+        Time the block. Yields the labels dict, so labels only known at the
+        end (an outcome, a status) can be filled in inside the block; ones
+        still missing when the block raises are recorded as "error".
+        """
+        labels = dict(labels)
+        started = time.perf_counter()
+        try:
+            yield labels
+        finally:
+            for name in self.labelnames:
+                labels.setdefault(name, 'error')
+            self.observe(time.perf_counter() - started, **labels)
+
+    def timed(self, **labels):
+        """Decorator form of time() with fixed labels."""
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.time(**labels):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def count(self, **labels):
+        """Observations recorded so far for the label values given (others summed)."""
+        with self.registry.lock:
+            return sum(state['count'] for key, state in self.values.items()
+                       if all(dict(zip(self.labelnames, key))[k] == str(v) for k, v in labels.items()))
+
+    def samples(self):
+        lines = []
+        for key, state in sorted(self.values.items()):
+            cumulative = 0
+            for bound, in_bucket in zip(self.buckets, state['buckets']):
+                cumulative += in_bucket
+                le = _format_labels(self.labelnames, key, [('le', _format_value(bound))])
+                lines.append(f'{self.name}_bucket{le} {cumulative}')
+            inf = _format_labels(self.labelnames, key, [('le', '+Inf')])
+            lines.append(f'{self.name}_bucket{inf} {state["count"]}')
+            lines.append(f'{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(state["sum"])}')
+            lines.append(f'{self.name}_count{_format_labels(self.labelnames, key)} {state["count"]}')
+        return lines
+
+
+class MetricsRegistry:
+    """
+    All metrics of this process, rendered together in the Prometheus
+    text exposition format.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.metrics = {}
+
+    def _register(self, metric):
+        if metric.name in self.metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._register(Counter(self, name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(self, name, documentation, labelnames, buckets))
+
+    def render(self):
+        """Every metric, plus the derived ratios, as text/plain version 0.0.4."""
+        with self.lock:
+            lines = []
+            for metric in self.metrics.values():
+                lines += metric.header()
+                lines += metric.samples()
+        lines += self._derived()
+        return '\n'.join(lines) + '\n'
+
+    def _derived(self):
+        """Ratios computed from the raw counts at render time."""
+        lines = [
+            '# HELP inventory_cache_hit_ratio Share of lookups served from each cache since start',
+            '# TYPE inventory_cache_hit_ratio gauge',
+        ]
+        with self.lock:
+            totals = {}
+            for (cache, result), value in CACHE_REQUESTS.values.items():
+                hits, total = totals.get(cache, (0, 0))
+                totals[cache] = (hits + (value if result == 'hit' else 0), total + value)
+        for cache, (hits, total) in sorted(totals.items()):
+            lines.append(f'inventory_cache_hit_ratio{{cache="{_escape(cache)}"}} {_format_value(hits / total)}')
+
+        forecasts = FORECAST_SECONDS.count()
+        lines += [
+            '# HELP inventory_forecast_fallback_ratio Share of forecasts not served by the per-item regression model',
+            '# TYPE inventory_forecast_fallback_ratio gauge',
+        ]
+        if forecasts:
+            fallback = 1 - FORECAST_SECONDS.count(method='ml') / forecasts
+            lines.append(f'inventory_forecast_fallback_ratio {_format_value(fallback)}')
+        return lines
+
+
+# Module-level singleton
+metrics = MetricsRegistry()
+
+
+# ----------------------------------------------------------------------
+# Request and query instrumentation
+# ----------------------------------------------------------------------
+
+# {'queries': int, 'seconds': float} for the request being served, if any
+_request_queries = contextvars.ContextVar('inventory_request_queries', default=None)
+
+
+def _count_query(execute, sql, params, many, context):
+    stats = _request_queries.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats['queries'] += 1
+        stats['seconds'] += time.perf_counter() - started
+
+
+def _install_on_connection(sender, connection, **kwargs):
+    if _count_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_count_query)
+
+
+def install_query_counter():
+    """Count queries on every database connection, including ones already open."""
+    from django.db import connections
+    from django.db.backends.signals import connection_created
+
+    connection_created.connect(_install_on_connection, dispatch_uid='inventory_metrics_query_counter')
+    for connection in connections.all(initialized_only=True):
+        _install_on_connection(None, connection)
+
+
+def _view_name(request):
+    match = getattr(request, 'resolver_match', None)
+    return (match.view_name if match else None) or 'unmatched'
+
+
+class MetricsMiddleware:
+    """
+    Records latency, status and database queries for every request,
+    labelled by URL name. Serves sync and async views without forcing
+    either onto the other's thread model.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        stats, token, started = self._start()
+        try:
+            response = self.get_response(request)
+        finally:
+            _request_queries.reset(token)
+        self._finish(request, response, stats, started)
+        return response
+
+    async def __acall__(self, request):
+        stats, token, started = self._start()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _request_queries.reset(token)
+        self._finish(request, response, stats, started)
+        return response
+
+    @staticmethod
+    def _start():
+        stats = {'queries': 0, 'seconds': 0.0}
+        return stats, _request_queries.set(stats), time.perf_counter()
+
+    @staticmethod
+    def _finish(request, response, stats, started):
+        view = _view_name(request)
+        REQUEST_SECONDS.observe(time.perf_counter() - started, view=view)
+        REQUESTS.inc(view=view, method=request.method, status=f'{response.status_code // 100}xx')
+        REQUEST_QUERIES.observe(stats['queries'], view=view)
+        REQUEST_QUERY_SECONDS.observe(stats['seconds'], view=view)
+
+
+# ----------------------------------------------------------------------
+# Metric catalogue
+# ----------------------------------------------------------------------
+
+REQUEST_SECONDS = metrics.histogram(
+    'inventory_http_request_duration_seconds',
+    'Time to respond to a request (first byte for streaming responses)',
+    ['view'],
+)
+REQUESTS = metrics.counter(
+    'inventory_http_requests_total',
+    'Requests served, by URL name, method and status class',
+    ['view', 'method', 'status'],
+)
+REQUEST_QUERIES = metrics.histogram(
+    'inventory_db_queries_per_request',
+    'Database queries made while serving one request',
+    ['view'],
+    buckets=QUERY_COUNT_BUCKETS,
+)
+REQUEST_QUERY_SECONDS = metrics.histogram(
+    'inventory_db_query_duration_seconds_per_request',
+    'Time spent in database queries while serving one request',
+    ['view'],
+)
+FORECAST_TRAIN_SECONDS = metrics.histogram(
+    'inventory_forecast_train_duration_seconds',
+    'train_demand_model() duration, by outcome (trained, insufficient_data, error)',
+    ['outcome'],
+)
+FORECAST_PREDICT_SECONDS = metrics.histogram(
+    'inventory_forecast_predict_duration_seconds',
+    'predict_future_demand() duration, cache hits included',
+)
+FORECAST_SECONDS = metrics.histogram(
+    'inventory_forecast_compute_duration_seconds',
+    'Time to compute one uncached forecast, by the method that produced it',
+    ['method'],
+)
+CHART_RENDER_SECONDS = metrics.histogram(
+    'inventory_chart_render_duration_seconds',
+    'InventoryAnalytics chart generation time, by chart',
+    ['chart'],
+)
+GATEWAY_VERIFY_SECONDS = metrics.histogram(
+    'inventory_gateway_verify_duration_seconds',
+    'Payment verification time from the callback view, pool wait included',
+    ['gateway', 'outcome'],
+)
+IMAGE_FETCH_SECONDS = metrics.histogram(
+    'inventory_image_fetch_duration_seconds',
+    'Unsplash search and image download time, by result status',
+    ['status'],
+)
+CACHE_REQUESTS = metrics.counter(
+    'inventory_cache_requests_total',
+    'Cache lookups by cache and result (hit or miss)',
+    ['cache', 'result'],
+)
@@ -0,0 +1,71 @@
+# Generated by Django 6.0 on 2026-10-19 08:20
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import F
+
+
+def seed_reorder_snapshot(apps, schema_editor):
+    """
+    Threshold-based starting values; reorder_checked_at stays NULL so
+    `manage.py refresh_reorder_snapshot --stale-only` replaces them with AI results.
+    """
+    Item = apps.get_model('inventory', 'Item')
+    low = Item.objects.filter(quantity__lte=F('reorder_level'))
+    low.filter(quantity__lte=0).update(reorder_needed=True, reorder_urgency='CRITICAL', reorder_rank=0)
+    low.filter(quantity__gt=0).update(reorder_needed=True, reorder_urgency='HIGH', reorder_rank=1)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0016_purchase_planning'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='item',
+            name='reorder_ai_powered',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='item',
+            name='reorder_checked_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='item',
+            name='reorder_needed',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='item',
+            name='reorder_rank',
+            field=models.PositiveSmallIntegerField(default=4, help_text='0 = CRITICAL … 3 = LOW, 4 = no reorder needed'),
+        ),
+        migrations.AddField(
+            model_name='item',
+            name='reorder_shortage_risk',
+            field=models.FloatField(default=0),
+        ),
+        migrations.AddField(
+            model_name='item',
+            name='reorder_suggested_quantity',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='item',
+            name='reorder_urgency',
+            field=models.CharField(blank=True, max_length=10),
+        ),
+        migrations.AddIndex(
+            model_name='item',
+            index=models.Index(fields=['name', 'id'], name='item_name_keyset_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='item',
+            index=models.Index(fields=['reorder_rank', '-reorder_shortage_risk'], name='item_reorder_rank_idx'),
+        ),
+        migrations.RunPython(seed_reorder_snapshot, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 6.0 on 2026-10-19 08:26
+
+from django.db import migrations, models
+
+
+def mark_existing_images(apps, schema_editor):
+    """Items that already have an image are done; image-less ones stay unqueued."""
+    Item = apps.get_model('inventory', 'Item')
+    Item.objects.exclude(image='').exclude(image__isnull=True).update(image_status='UPLOADED')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0017_item_reorder_snapshot'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='item',
+            name='image_fetch_attempts',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='item',
+            name='image_fetch_error',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='item',
+            name='image_next_attempt_at',
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='item',
+            name='image_status',
+            field=models.CharField(blank=True, choices=[('', 'Not requested'), ('PENDING', 'Pending'), ('FETCHING', 'Fetching'), ('FETCHED', 'Fetched'), ('UPLOADED', 'Uploaded'), ('NOT_FOUND', 'No match found'), ('SKIPPED', 'Image API not configured'), ('FAILED', 'Failed')], default='', max_length=10),
+        ),
+        migrations.RunPython(mark_existing_images, migrations.RunPython.noop),
+    ]
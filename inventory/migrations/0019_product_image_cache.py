@@ -0,0 +1,28 @@
+# Generated by Django 6.0 on 2026-10-19 08:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0018_item_image_fetch_status'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductImageCache',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('query', models.CharField(help_text='Normalized product name', max_length=255, unique=True)),
+                ('status', models.CharField(choices=[('HIT', 'Image found'), ('MISS', 'No match'), ('ERROR', 'Fetch failed')], max_length=5)),
+                ('content_hash', models.CharField(blank=True, db_index=True, help_text='SHA-256 of the image bytes', max_length=64)),
+                ('file', models.CharField(blank=True, help_text='Storage path of the image', max_length=255)),
+                ('error', models.CharField(blank=True, max_length=255)),
+                ('expires_at', models.DateTimeField(blank=True, help_text='Empty for hits, which never expire', null=True)),
+                ('hits', models.PositiveIntegerField(default=0, help_text='Times this entry saved an API call')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 6.0 on 2026-10-19 08:30
+
+from django.db import migrations, models
+
+
+def mark_existing_images(apps, schema_editor):
+    """Queue thumbnails for every image uploaded or fetched before this migration."""
+    Item = apps.get_model('inventory', 'Item')
+    Item.objects.exclude(image='').exclude(image__isnull=True).update(image_variants_stale=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0019_product_image_cache'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='item',
+            name='image_variants',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.AddField(
+            model_name='item',
+            name='image_variants_stale',
+            field=models.BooleanField(db_index=True, default=False),
+        ),
+        migrations.RunPython(mark_existing_images, migrations.RunPython.noop),
+    ]
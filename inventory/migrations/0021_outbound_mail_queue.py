@@ -0,0 +1,49 @@
+# Generated by Django 6.0 on 2026-10-19 08:35
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0020_item_image_variants'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OutboundEmail',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('recipient', models.EmailField(db_index=True, max_length=254)),
+                ('subject', models.CharField(max_length=255)),
+                ('body', models.TextField()),
+                ('kind', models.CharField(choices=[('ALERT', 'Stock alert digest'), ('REPORT', 'Low stock report'), ('TRANSACTION', 'Transaction confirmation'), ('GENERAL', 'General')], default='GENERAL', max_length=12)),
+                ('dedupe_key', models.CharField(blank=True, db_index=True, help_text='SHA-256 of kind, recipient, subject and body', max_length=64)),
+                ('status', models.CharField(choices=[('QUEUED', 'Queued'), ('SENDING', 'Sending'), ('SENT', 'Sent'), ('FAILED', 'Failed')], default='QUEUED', max_length=8)),
+                ('attempts', models.PositiveSmallIntegerField(default=0)),
+                ('next_attempt_at', models.DateTimeField(blank=True, help_text='When a queued message is due, or a send lease expires', null=True)),
+                ('last_error', models.CharField(blank=True, max_length=255)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('sent_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['status', 'next_attempt_at'], name='outbound_email_due_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='PendingStockAlert',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('recipient', models.EmailField(max_length=254)),
+                ('occurrences', models.PositiveIntegerField(default=1, help_text='Alerts raised since the last digest')),
+                ('first_alerted_at', models.DateTimeField(auto_now_add=True)),
+                ('last_alerted_at', models.DateTimeField(auto_now=True)),
+                ('item', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='pending_alerts', to='inventory.item')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('recipient', 'item'), name='pending_alert_recipient_item_uniq')],
+            },
+        ),
+    ]
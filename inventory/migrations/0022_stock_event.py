@@ -0,0 +1,30 @@
+# Generated by Django 6.0 on 2026-10-19 08:37
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0021_outbound_mail_queue'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('event_type', models.CharField(choices=[('LOW_STOCK', 'Fell to reorder level'), ('OUT_OF_STOCK', 'Out of stock'), ('STOCKOUT_RISK', 'Projected to run out within lead time'), ('RESTOCKED', 'Back above reorder level')], max_length=15)),
+                ('quantity', models.IntegerField()),
+                ('previous_quantity', models.IntegerField(blank=True, null=True)),
+                ('reorder_level', models.IntegerField()),
+                ('days_until_stockout', models.FloatField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+                ('item', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_events', to='inventory.item')),
+            ],
+            options={
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
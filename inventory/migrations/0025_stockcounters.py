@@ -0,0 +1,63 @@
+# Generated by Django 6.0 on 2026-10-19 09:38
+
+import django.utils.timezone
+from decimal import Decimal
+from django.db import migrations, models
+from django.db.models import Count, DecimalField, F, Q, Sum
+
+
+def count_existing_items(apps, schema_editor):
+    """Create the counters row from the current catalogue; item saves keep it up to date from here."""
+    Item = apps.get_model('inventory', 'Item')
+    StockCounters = apps.get_model('inventory', 'StockCounters')
+    needed = Q(reorder_needed=True)
+    money = DecimalField(max_digits=16, decimal_places=2)
+    values = Item.objects.filter(is_active=True).aggregate(
+        total_items=Count('id'),
+        in_stock=Count('id', filter=Q(quantity__gt=F('reorder_level'))),
+        low_stock=Count('id', filter=Q(quantity__lte=F('reorder_level'), quantity__gt=0)),
+        out_of_stock=Count('id', filter=Q(quantity=0)),
+        stock_value=Sum(F('price') * F('quantity'), output_field=money),
+        stock_cost=Sum(F('cost_price') * F('quantity'), output_field=money),
+        reorder_alerts=Count('id', filter=needed),
+        critical_alerts=Count('id', filter=needed & Q(reorder_urgency='CRITICAL')),
+        high_alerts=Count('id', filter=needed & Q(reorder_urgency='HIGH')),
+        medium_alerts=Count('id', filter=needed & Q(reorder_urgency='MEDIUM')),
+        ai_powered_alerts=Count('id', filter=needed & Q(reorder_ai_powered=True)),
+    )
+    # Whole cents: SQLite sums decimals as floats
+    values['stock_value'] = (values['stock_value'] or Decimal('0')).quantize(Decimal('0.01'))
+    values['stock_cost'] = (values['stock_cost'] or Decimal('0')).quantize(Decimal('0.01'))
+    StockCounters.objects.update_or_create(pk=1, defaults=values)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0024_dailysales'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockCounters',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total_items', models.PositiveIntegerField(default=0)),
+                ('in_stock', models.PositiveIntegerField(default=0)),
+                ('low_stock', models.PositiveIntegerField(default=0)),
+                ('out_of_stock', models.PositiveIntegerField(default=0)),
+                ('stock_value', models.DecimalField(decimal_places=2, default=Decimal('0.00'), help_text='Sum of price x quantity', max_digits=16)),
+                ('stock_cost', models.DecimalField(decimal_places=2, default=Decimal('0.00'), help_text='Sum of cost price x quantity', max_digits=16)),
+                ('reorder_alerts', models.PositiveIntegerField(default=0, help_text='Items whose stored reorder snapshot needs a reorder')),
+                ('critical_alerts', models.PositiveIntegerField(default=0)),
+                ('high_alerts', models.PositiveIntegerField(default=0)),
+                ('medium_alerts', models.PositiveIntegerField(default=0)),
+                ('ai_powered_alerts', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'verbose_name_plural': 'stock counters',
+            },
+        ),
+        migrations.RunPython(count_existing_items, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 6.0 on 2026-10-19 12:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0025_stockcounters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='item',
+            name='reorder_stale',
+            field=models.BooleanField(db_index=True, default=False, help_text='Waiting for the reorder snapshot worker (see reorder_queue.py)'),
+        ),
+    ]
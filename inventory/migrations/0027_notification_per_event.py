@@ -0,0 +1,83 @@
+# Generated by Django 6.0 on 2026-10-19 12:40
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def collapse_per_user_rows(apps, schema_editor):
+    """
+    Keep one notification per event (its per-user copies share item, type
+    and message) and turn each copy's read flag into a NotificationRead.
+    Only the newest notification per item stays current.
+    """
+    Notification = apps.get_model('inventory', 'Notification')
+    NotificationRead = apps.get_model('inventory', 'NotificationRead')
+
+    kept, duplicates, reads = {}, [], set()
+    for row in Notification.objects.order_by('created_at', 'pk').iterator():
+        keep = kept.setdefault((row.item_id, row.event_type, row.message, row.link), row)
+        if keep.pk != row.pk:
+            duplicates.append(row.pk)
+        if row.is_read:
+            reads.add((keep.pk, row.user_id))
+
+    NotificationRead.objects.bulk_create(
+        [NotificationRead(notification_id=pk, user_id=user_id) for pk, user_id in reads], batch_size=500,
+    )
+    for start in range(0, len(duplicates), 500):
+        Notification.objects.filter(pk__in=duplicates[start:start + 500]).delete()
+
+    newest = {}
+    for row in kept.values():
+        newest[row.item_id] = row.pk
+    Notification.objects.exclude(pk__in=list(newest.values())).update(superseded=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0026_item_reorder_stale'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NotificationRead',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('read_at', models.DateTimeField(auto_now_add=True)),
+                ('notification', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reads', to='inventory.notification')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='notification_reads', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('user', 'notification'), name='notification_read_user_uniq')],
+            },
+        ),
+        migrations.AddField(
+            model_name='notification',
+            name='superseded',
+            field=models.BooleanField(default=False, help_text='A later event for the item replaced this alert'),
+        ),
+        migrations.RunPython(collapse_per_user_rows, migrations.RunPython.noop),
+        migrations.RemoveIndex(
+            model_name='notification',
+            name='notification_inbox_idx',
+        ),
+        migrations.RemoveField(
+            model_name='notification',
+            name='is_read',
+        ),
+        migrations.RemoveField(
+            model_name='notification',
+            name='read_at',
+        ),
+        migrations.RemoveField(
+            model_name='notification',
+            name='user',
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['superseded', '-created_at'], name='notification_active_idx'),
+        ),
+    ]
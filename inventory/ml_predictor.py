@@ -12,12 +12,21 @@ Key improvements over v1:
 - Smarter minimum data handling
 - Cleaner reorder recommendation logic
 - Suggested quantity capped to prevent inflated test-data numbers
+- Forecasts cached per item and invalidated by the item's sales watermark
+- Sparse-history items fall back to a supplier-pooled hierarchical forecast
+- Reorder status is stored on Item (refresh_reorder_snapshot) so list pages
+  read it from the database instead of running ML per row
+- Whole-catalogue passes (calculate_reorder_recommendations) read watermarks
+  and sales history with one grouped query each instead of per item
+- Training, prediction and forecast-cache metrics are exported at /metrics
 """
 
 import numpy as np
 import pandas as pd
 from datetime import datetime, timedelta
 from django.utils import timezone
+from django.db.models import Count, Max, Sum
+from django.db.models.functions import TruncDate
 from sklearn.linear_model import LinearRegression
 from sklearn.preprocessing import StandardScaler
 from sklearn.metrics import mean_absolute_error, mean_squared_error
@@ -28,6 +37,8 @@ import logging
 logger = logging.getLogger(__name__)
 
 from .models import Item, Transaction
+from .hierarchical_forecast import hierarchical_forecaster
+from .metrics import CACHE_REQUESTS, FORECAST_PREDICT_SECONDS, FORECAST_SECONDS, FORECAST_TRAIN_SECONDS
 
 
 class InventoryDemandPredictor:
@@ -36,14 +47,20 @@ class InventoryDemandPredictor:
 
     Trains one model per item using historical daily sales data.
     Falls back to a simple moving average when data is insufficient.
+
+    Forecasts are cached per item for the longest horizon computed so far;
+    shorter horizons are served by slicing. A cached forecast is reused
+    until the item's sales watermark (or the calendar day) changes.
     """
 
     def __init__(self):
         self.models = {}
         self.scalers = {}
         self.model_metrics = {}
+        self.forecast_cache = {}
 
-    def _get_daily_sales_df(self, item, days_history=90):
+    def _get_daily_sales(self, item, days_history=90):
+        """{date: units sold} over the last days_history days for one item."""
         end_date = timezone.now()
         start_date = end_date - timedelta(days=days_history)
 
@@ -55,16 +72,45 @@ class InventoryDemandPredictor:
             timestamp__lte=end_date
         ).order_by('timestamp')
 
+        sales_by_day = {}
+        for sale in sales:
+            day = sale.timestamp.date()
+            sales_by_day[day] = sales_by_day.get(day, 0) + sale.quantity
+        return sales_by_day
+
+    def _get_daily_sales_many(self, item_ids=None, days_history=90):
+        """
+        _get_daily_sales() for many items (every item when item_ids is None)
+        in one grouped query: {item_id: {date: units sold}}.
+        """
+        end_date = timezone.now()
+        sales = Transaction.objects.filter(
+            transaction_type='SALE',
+            payment_status='PAID',
+            timestamp__gte=end_date - timedelta(days=days_history),
+            timestamp__lte=end_date,
+        )
+        if item_ids is not None:
+            sales = sales.filter(item_id__in=item_ids)
+
+        by_item = {}
+        for row in (sales.annotate(day=TruncDate('timestamp'))
+                    .values('item_id', 'day').annotate(units=Sum('quantity')).order_by()):
+            by_item.setdefault(row['item_id'], {})[row['day']] = row['units']
+        return by_item
+
+    def _get_daily_sales_df(self, item, days_history=90, sales_by_day=None):
+        end_date = timezone.now()
+        start_date = end_date - timedelta(days=days_history)
+
         date_range = pd.date_range(
             start=start_date.date(),
             end=end_date.date(),
             freq='D'
         )
 
-        sales_by_day = {}
-        for sale in sales:
-            day = sale.timestamp.date()
-            sales_by_day[day] = sales_by_day.get(day, 0) + sale.quantity
+        if sales_by_day is None:
+            sales_by_day = self._get_daily_sales(item, days_history)
 
         rows = []
         for i, dt in enumerate(date_range):
@@ -97,9 +143,12 @@ class InventoryDemandPredictor:
             'rolling_avg_7', 'rolling_avg_14',
         ]
 
-    def _simple_moving_average(self, item, days=14):
+    def _simple_moving_average(self, item, days=14, sales_by_day=None):
         end_date = timezone.now()
         start_date = end_date - timedelta(days=days)
+        if sales_by_day is not None:
+            total = sum(qty for day, qty in sales_by_day.items() if day >= start_date.date())
+            return total / days if days > 0 else 0
         sales = Transaction.objects.filter(
             item=item,
             transaction_type='SALE',
@@ -109,8 +158,61 @@ class InventoryDemandPredictor:
         total = sum(s.quantity for s in sales)
         return total / days if days > 0 else 0
 
-    def train_demand_model(self, item, days_history=90):
-        df = self._get_daily_sales_df(item, days_history)
+    def _sales_watermark(self, item):
+        """
+        Cheap fingerprint of an item's sales history.
+
+        Any sale being created, paid, edited or soft-deleted bumps either the
+        row count or the latest updated_at, so a cached forecast built under an
+        older watermark is stale. The current date is included because
+        forecasts are anchored on "tomorrow".
+        """
+        agg = Transaction.all_objects.filter(
+            item_id=item.id,
+            transaction_type='SALE',
+        ).aggregate(rows=Count('id'), last_id=Max('id'), last_change=Max('updated_at'))
+        return (timezone.now().date(), agg['rows'], agg['last_id'], agg['last_change'])
+
+    def _sales_watermarks(self, item_ids=None):
+        """_sales_watermark() for many items (every item when item_ids is None) in one grouped query."""
+        today = timezone.now().date()
+        sales = Transaction.all_objects.filter(transaction_type='SALE')
+        if item_ids is not None:
+            sales = sales.filter(item_id__in=item_ids)
+        rows = sales.values('item_id').annotate(
+            rows=Count('id'), last_id=Max('id'), last_change=Max('updated_at'),
+        ).order_by()
+        return {row['item_id']: (today, row['rows'], row['last_id'], row['last_change']) for row in rows}
+
+    def _empty_watermark(self):
+        return (timezone.now().date(), 0, None, None)
+
+    def invalidate_forecast(self, item_id=None):
+        """Drop cached forecasts for one item, or for every item when item_id is None."""
+        if item_id is None:
+            self.forecast_cache.clear()
+        else:
+            self.forecast_cache.pop(item_id, None)
+
+    def train_demand_model(self, item, days_history=90, sales_by_day=None):
+        with FORECAST_TRAIN_SECONDS.time() as labels:
+            result = self._train_demand_model(item, days_history, sales_by_day)
+            if result.get('success'):
+                labels['outcome'] = 'trained'
+            elif 'available' in result or 'non_zero_days' in result:
+                labels['outcome'] = 'insufficient_data'
+        return result
+
+    def _train_demand_model(self, item, days_history=90, sales_by_day=None):
+        if sales_by_day is not None and sum(1 for qty in sales_by_day.values() if qty > 0) < 3:
+            # Preloaded history too thin to train on: skip building the frame
+            return {
+                'success': False,
+                'error': 'Not enough actual sales transactions to train model',
+                'non_zero_days': sum(1 for qty in sales_by_day.values() if qty > 0),
+            }
+
+        df = self._get_daily_sales_df(item, days_history, sales_by_day)
 
         if df is None or len(df) < 14:
             return {
@@ -155,6 +257,7 @@ class InventoryDemandPredictor:
 
             self.models[item.id] = model
             self.scalers[item.id] = scaler
+            self.invalidate_forecast(item.id)
             self.model_metrics[item.id] = {
                 'mae': mae,
                 'rmse': rmse,
@@ -176,9 +279,122 @@ class InventoryDemandPredictor:
             logger.error(f"ML training failed for {item.name}: {e}")
             return {'success': False, 'error': str(e)}
 
+    @FORECAST_PREDICT_SECONDS.timed()
     def predict_future_demand(self, item, forecast_days=7):
+        """
+        Forecast daily demand for the next forecast_days days.
+
+        Served from forecast_cache when a forecast at least as long was already
+        computed under the current sales watermark; otherwise computed afresh
+        and stored as the item's new longest horizon.
+        """
+        return self._predict(item, forecast_days, self._sales_watermark(item),
+                             hierarchical_forecaster.current_version)
+
+    def _predict(self, item, forecast_days, watermark, hierarchy_version, sales_by_day=None):
+        """
+        predict_future_demand() with the watermark supplied, hierarchy_version
+        a callable returning the current hierarchy version, and optionally the
+        item's preloaded daily sales.
+        """
+        cached = self.forecast_cache.get(item.id)
+
+        if cached and cached['watermark'] == watermark and cached['days'] >= forecast_days:
+            # Hierarchical forecasts also depend on sibling items' sales
+            version = cached['result'].get('hierarchy_version')
+            if version is None or version == hierarchy_version():
+                CACHE_REQUESTS.inc(cache='forecast', result='hit')
+                return self._slice_forecast(cached['result'], forecast_days)
+
+        CACHE_REQUESTS.inc(cache='forecast', result='miss')
+        with FORECAST_SECONDS.time() as labels:
+            result = self._compute_forecast(item, forecast_days, sales_by_day, hierarchy_version)
+            labels['method'] = result['method']
+        self.forecast_cache[item.id] = {
+            'watermark': watermark,
+            'days': forecast_days,
+            'result': result,
+        }
+        return self._slice_forecast(result, forecast_days)
+
+    def _slice_forecast(self, result, forecast_days):
+        """Return a fresh forecast dict covering only the first forecast_days days."""
+        predictions = [dict(p) for p in result['predictions'][:forecast_days]]
+
+        if 'avg_daily_raw' in result:
+            avg_daily = result['avg_daily_raw']
+            total = avg_daily * forecast_days
+        else:
+            total = sum(p['predicted_demand'] for p in predictions)
+            avg_daily = total / forecast_days
+
+        summary = dict(result['summary'])
+        summary.update({
+            'total_predicted_demand': round(total, 2),
+            'avg_daily_demand': round(avg_daily, 2),
+            'forecast_period': f'{forecast_days} days',
+        })
+
+        return {
+            'success': result['success'],
+            'method': result['method'],
+            'predictions': predictions,
+            'summary': summary,
+        }
+
+    def _is_cached(self, item, forecast_days, watermark):
+        cached = self.forecast_cache.get(item.id)
+        return bool(cached and cached['watermark'] == watermark and cached['days'] >= forecast_days)
+
+    def forecast_many(self, items, forecast_days=None, whole_catalogue=False):
+        """
+        predict_future_demand() for many items with a fixed number of queries:
+        one for every item's sales watermark, one for the sales history of
+        items missing from the cache, and the hierarchy version check.
+
+        Args:
+            items: Item instances
+            forecast_days: Horizon in days, a function item -> days, or None
+                           for each item's lead time
+            whole_catalogue: items is the whole catalogue, so the grouped
+                             queries need no item filter
+
+        Returns:
+            dict: {item_id: forecast}
+        """
+        items = list(items)
+        item_ids = None if whole_catalogue else [item.id for item in items]
+        watermarks = self._sales_watermarks(item_ids)
+        empty = self._empty_watermark()
+
+        version = []
+
+        def hierarchy_version():
+            if not version:
+                version.append(hierarchical_forecaster.current_version())
+            return version[0]
+
+        def horizon(item):
+            if forecast_days is None:
+                return item.lead_time_days
+            return forecast_days(item) if callable(forecast_days) else forecast_days
+
+        missing = [item for item in items
+                   if not self._is_cached(item, horizon(item), watermarks.get(item.id, empty))]
+        history = {}
+        if missing:
+            all_missing = whole_catalogue and len(missing) == len(items)
+            history = self._get_daily_sales_many(None if all_missing else [item.id for item in missing])
+
+        return {
+            item.id: self._predict(item, horizon(item), watermarks.get(item.id, empty),
+                                   hierarchy_version, history.get(item.id, {}))
+            for item in items
+        }
+
+    def _compute_forecast(self, item, forecast_days, sales_by_day=None, current_hierarchy_version=None):
         if item.id not in self.models:
-            train_result = self.train_demand_model(item)
+            train_result = self.train_demand_model(item, sales_by_day=sales_by_day)
         else:
             train_result = {'success': True}
 
@@ -189,7 +405,7 @@ class InventoryDemandPredictor:
                 model = self.models[item.id]
                 scaler = self.scalers[item.id]
 
-                df_history = self._get_daily_sales_df(item, days_history=90)
+                df_history = self._get_daily_sales_df(item, days_history=90, sales_by_day=sales_by_day)
                 last_rolling_7 = float(df_history['rolling_avg_7'].iloc[-1]) if df_history is not None else 0.0
                 last_rolling_14 = float(df_history['rolling_avg_14'].iloc[-1]) if df_history is not None else 0.0
                 history_len = len(df_history) if df_history is not None else 90
@@ -236,8 +452,27 @@ class InventoryDemandPredictor:
             except Exception as e:
                 logger.warning(f"ML prediction failed for {item.name}, falling back: {e}")
 
-        # Fallback: simple moving average
-        avg_daily = self._simple_moving_average(item, days=14)
+        # Fallback: hierarchical forecast pooled with the item's supplier,
+        # then a plain moving average if the hierarchy is unavailable
+        method = 'hierarchical'
+        accuracy_label = 'N/A (hierarchical)'
+        hierarchy_version = None
+        avg_daily = None
+        try:
+            snapshot = hierarchical_forecaster.forecast(
+                current_hierarchy_version() if current_hierarchy_version else None
+            )
+            hierarchy_version = snapshot['version']
+            avg_daily = snapshot['items'].get(item.id)
+        except Exception as e:
+            logger.warning(f"Hierarchical forecast failed for {item.name}, falling back: {e}")
+
+        if avg_daily is None:
+            method = 'moving_average'
+            accuracy_label = 'N/A (moving average)'
+            hierarchy_version = None
+            avg_daily = self._simple_moving_average(item, days=14, sales_by_day=sales_by_day)
+
         predictions = []
         for i in range(forecast_days):
             future_date = today + timedelta(days=i + 1)
@@ -251,20 +486,44 @@ class InventoryDemandPredictor:
         total = avg_daily * forecast_days
         return {
             'success': True,
-            'method': 'moving_average',
+            'method': method,
+            'avg_daily_raw': avg_daily,
+            'hierarchy_version': hierarchy_version,
             'predictions': predictions,
             'summary': {
                 'total_predicted_demand': round(total, 2),
                 'avg_daily_demand': round(avg_daily, 2),
                 'forecast_period': f'{forecast_days} days',
-                'model_accuracy': 'N/A (moving average)',
+                'model_accuracy': accuracy_label,
             },
         }
 
     def calculate_reorder_recommendation(self, item):
-        forecast = self.predict_future_demand(item, item.lead_time_days)
+        return self._recommend(item, self.predict_future_demand(item, item.lead_time_days))
+
+    def calculate_reorder_recommendations(self, items=None, whole_catalogue=False, lead_time=None):
+        """
+        calculate_reorder_recommendation() for many items with a fixed number
+        of queries (see forecast_many). items=None loads the whole catalogue;
+        pass whole_catalogue=True when the given items already are.
+        lead_time is an optional function item -> days that replaces each
+        item's own lead time as the demand horizon.
+
+        Returns:
+            dict: {item_id: recommendation}
+        """
+        whole_catalogue = whole_catalogue or items is None
+        items = list(Item.objects.all() if items is None else items)
+        forecasts = self.forecast_many(items, forecast_days=lead_time, whole_catalogue=whole_catalogue)
+        return {
+            item.id: self._recommend(item, forecasts[item.id], lead_time(item) if lead_time else None)
+            for item in items
+        }
 
+    def _recommend(self, item, forecast, lead_time_days=None):
         current_stock = item.quantity
+        if lead_time_days is None:
+            lead_time_days = item.lead_time_days
         ai_powered = forecast.get('method') == 'ml'
 
         predicted_demand = forecast['summary']['total_predicted_demand']
@@ -284,14 +543,14 @@ class InventoryDemandPredictor:
         # Reorder decision
         needs_reorder = (
             current_stock == 0
-            or days_until_stockout < item.lead_time_days
+            or days_until_stockout < lead_time_days
             or current_stock < stock_needed
         )
 
         # Urgency
         if current_stock == 0:
             urgency = 'CRITICAL'
-        elif days_until_stockout < item.lead_time_days:
+        elif days_until_stockout < lead_time_days:
             urgency = 'HIGH'
         elif shortage_risk > 0:
             urgency = 'MEDIUM'
@@ -327,7 +586,7 @@ class InventoryDemandPredictor:
             'model_accuracy': forecast['summary']['model_accuracy'],
             'ai_insights': {
                 'avg_daily_demand': round(avg_daily, 2),
-                'forecast_period': f'{item.lead_time_days} days',
+                'forecast_period': f'{lead_time_days} days',
                 'safety_buffer': round(safety_buffer, 2),
                 'confidence': confidence,
             },
@@ -365,16 +624,19 @@ def train_all_models():
     return results
 
 
-def get_ai_reorder_suggestions():
+def get_ai_reorder_suggestions(lead_time=None):
     """
     Return a sorted list of items that need reordering, with AI recommendations.
     CRITICAL → HIGH → MEDIUM → LOW, then by shortage risk descending.
+    lead_time optionally maps each item to the horizon it is sized for.
     """
     urgency_order = {'CRITICAL': 0, 'HIGH': 1, 'MEDIUM': 2, 'LOW': 3}
     suggestions = []
 
-    for item in Item.objects.all():
-        rec = ml_predictor.calculate_reorder_recommendation(item)
+    items = list(Item.objects.select_related('supplier'))
+    recommendations = ml_predictor.calculate_reorder_recommendations(items, whole_catalogue=True, lead_time=lead_time)
+    for item in items:
+        rec = recommendations[item.id]
         if rec['needs_reorder']:
             suggestions.append({'item': item, 'recommendation': rec})
 
@@ -383,4 +645,71 @@ def get_ai_reorder_suggestions():
         -x['recommendation']['shortage_risk'],
     ))
 
-    return suggestions
\ No newline at end of file
+    return suggestions
+
+
+# Snapshot columns written by refresh_reorder_snapshot()
+REORDER_SNAPSHOT_FIELDS = [
+    'reorder_needed', 'reorder_urgency', 'reorder_rank', 'reorder_shortage_risk',
+    'reorder_suggested_quantity', 'reorder_ai_powered', 'reorder_checked_at',
+]
+REORDER_URGENCY_RANK = {'CRITICAL': 0, 'HIGH': 1, 'MEDIUM': 2, 'LOW': 3}
+
+
+def refresh_reorder_snapshot(items=None, batch_size=500):
+    """
+    Recompute and store the reorder snapshot (Item.reorder_*) for the given
+    items, or for the whole catalogue when items is None.
+
+    Called by the reorder snapshot worker (reorder_queue.py) for items whose
+    stock changed, and by the refresh_reorder_snapshot management command
+    for periodic full refreshes.
+    Uses bulk_update so updated_at (and the forecast caches keyed on it) is
+    left untouched. Emits a STOCKOUT_RISK stock event for items whose
+    projected stockout newly falls inside their lead time.
+
+    Returns:
+        int: Number of items refreshed
+    """
+    from .stock_counters import stock_counters
+    from .stock_events import stock_events
+
+    whole_catalogue = items is None
+    items = list(Item.objects.all() if items is None else items)
+    now = timezone.now()
+
+    try:
+        recommendations = ml_predictor.calculate_reorder_recommendations(items, whole_catalogue=whole_catalogue)
+    except Exception as e:
+        logger.error(f"Reorder snapshot recommendations failed: {e}")
+        recommendations = {}
+
+    for item in items:
+        was_needed = item.reorder_needed
+        rec = recommendations.get(item.id)
+        if rec is None:
+            needs = item.quantity <= item.reorder_level
+            rec = {
+                'needs_reorder': needs,
+                'urgency': ('CRITICAL' if item.quantity == 0 else 'HIGH') if needs else 'LOW',
+                'shortage_risk': float(max(0, item.reorder_level - item.quantity)),
+                'suggested_quantity': max(item.reorder_level, 10) if needs else 0,
+                'ai_powered': False,
+            }
+
+        item.reorder_needed = rec['needs_reorder']
+        item.reorder_urgency = rec['urgency'] if rec['needs_reorder'] else ''
+        item.reorder_rank = REORDER_URGENCY_RANK.get(item.reorder_urgency, 4)
+        item.reorder_shortage_risk = rec['shortage_risk']
+        item.reorder_suggested_quantity = rec['suggested_quantity']
+        item.reorder_ai_powered = rec['ai_powered']
+        item.reorder_checked_at = now
+
+        days_out = rec.get('days_until_stockout')
+        if (rec['needs_reorder'] and not was_needed and item.quantity > item.reorder_level
+                and days_out is not None and days_out < item.lead_time_days):
+            stock_events.emit('STOCKOUT_RISK', item, days_until_stockout=days_out)
+
+    # Alert counts in the catalogue counters change with the snapshot
+    stock_counters.bulk_update(items, REORDER_SNAPSHOT_FIELDS, batch_size=batch_size)
+    return len(items)
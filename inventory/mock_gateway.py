@@ -0,0 +1,199 @@
+"""
+Mock Payment Gateway Server
+===========================
+
+A local stand-in for the Khalti and eSewa verification and status APIs,
+for testing the payment callbacks (and their throughput) and the payment
+reconciler without gateway accounts.
+
+How it works:
+1. MockGatewayServer is a threaded HTTP server that answers
+   - POST /khalti/api/v2/payment/verify/  like Khalti's token verification
+   - GET  /esewa/epay/transrec            like eSewa's transaction verification
+   - GET  /khalti/api/v2/merchant-transaction/  like Khalti's transaction lookup
+   - GET  /esewa/api/epay/transaction/status/   like eSewa's status check
+2. Verification outcomes are deterministic: a Khalti token or eSewa refId
+   starting with "fail" is rejected and everything else is accepted,
+   unless fail_rate rejects a random share as well
+3. Lookups answer from a registry filled with set_payment(); transactions
+   that were never registered are unknown to the gateway
+4. `latency` delays every response, to imitate a slow gateway
+5. `python manage.py run_mock_gateway` runs it standalone and prints the
+   *_URL settings that point the app at it; tests can start one
+   in-process with start() / stop()
+"""
+
+import json
+import random
+import threading
+import time
+import uuid
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+KHALTI_VERIFY_PATH = '/khalti/api/v2/payment/verify/'
+ESEWA_VERIFY_PATH = '/esewa/epay/transrec'
+KHALTI_LOOKUP_PATH = '/khalti/api/v2/merchant-transaction/'
+ESEWA_STATUS_PATH = '/esewa/api/epay/transaction/status/'
+
+# Khalti state name -> eSewa status, for set_payment()
+ESEWA_STATUSES = {
+    'Completed': 'COMPLETE',
+    'Pending': 'PENDING',
+    'Initiated': 'PENDING',
+    'Expired': 'CANCELED',
+    'User canceled': 'CANCELED',
+    'Refunded': 'FULL_REFUND',
+}
+
+
+class MockGatewayHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'   # keep-alive, like the real gateways
+
+    def log_message(self, format, *args):
+        logger.debug(f"Mock gateway: {format % args}")
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        length = int(self.headers.get('Content-Length') or 0)
+        form = {k: v[0] for k, v in parse_qs(self.rfile.read(length).decode()).items()}
+        if url.path != KHALTI_VERIFY_PATH:
+            return self._send(404, 'application/json', {'detail': 'Not found.'})
+        self.server.gateway.record('khalti_verify')
+
+        if not self.headers.get('Authorization', '').startswith('Key '):
+            return self._send(401, 'application/json', {'detail': 'Authentication credentials were not provided.'})
+        token, amount = form.get('token', ''), form.get('amount', '')
+        if not token or not amount.isdigit():
+            return self._send(400, 'application/json', {'token': ['This field is required.']})
+        if self.server.gateway.rejects(token):
+            return self._send(400, 'application/json', {'detail': 'Invalid token.', 'error_key': 'validation_error'})
+        self._send(200, 'application/json', {
+            'idx': f"MOCK{uuid.uuid4().hex[:18].upper()}",
+            'token': token,
+            'amount': int(amount),
+            'state': {'name': 'Completed', 'template': 'is complete'},
+            'refunded': False,
+        })
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = {k: v[0] for k, v in parse_qs(url.query).items()}
+        if url.path == KHALTI_LOOKUP_PATH:
+            return self._khalti_lookup(params)
+        if url.path == ESEWA_STATUS_PATH:
+            return self._esewa_status(params)
+        if url.path != ESEWA_VERIFY_PATH:
+            return self._send(404, 'text/plain', 'Not found')
+        self.server.gateway.record('esewa_verify')
+
+        ok = all(params.get(k) for k in ('amt', 'rid', 'pid', 'scd')) and not self.server.gateway.rejects(params['rid'])
+        code = 'Success' if ok else 'failure'
+        self._send(200, 'text/xml', f"<response>\n<response_code>\n{code}\n</response_code>\n</response>\n")
+
+    def _khalti_lookup(self, params):
+        self.server.gateway.record('khalti_lookup')
+        if not self.headers.get('Authorization', '').startswith('Key '):
+            return self._send(401, 'application/json', {'detail': 'Authentication credentials were not provided.'})
+        payment = self.server.gateway.payments.get(params.get('product_identity', ''))
+        records = []
+        if payment:
+            records.append({
+                'idx': payment['reference'],
+                'product_identity': params['product_identity'],
+                'amount': payment['amount_paisa'],
+                'state': {'name': payment['state']},
+            })
+        self._send(200, 'application/json', {'total_records': len(records), 'records': records})
+
+    def _esewa_status(self, params):
+        self.server.gateway.record('esewa_status')
+        transaction_id = params.get('transaction_uuid', '').removeprefix('TXN')
+        payment = self.server.gateway.payments.get(transaction_id)
+        if payment is None:
+            return self._send(200, 'application/json', {'status': 'NOT_FOUND'})
+        self._send(200, 'application/json', {
+            'product_code': params.get('product_code'),
+            'transaction_uuid': params.get('transaction_uuid'),
+            'total_amount': float(params.get('total_amount') or 0),
+            'status': ESEWA_STATUSES.get(payment['state'], 'PENDING'),
+            'ref_id': payment['reference'],
+        })
+
+    def _send(self, status, content_type, body):
+        time.sleep(self.server.gateway.latency)
+        data = (json.dumps(body) if content_type == 'application/json' else body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+class MockGatewayServer:
+    """
+    Threaded mock of the Khalti and eSewa verification and lookup endpoints.
+    """
+
+    def __init__(self, host='127.0.0.1', port=0, latency=0.0, fail_rate=0.0):
+        self.latency = latency
+        self.fail_rate = fail_rate
+        self.counts = Counter()   # requests served per endpoint
+        self.payments = {}        # transaction id -> what lookups report
+        self._counts_lock = threading.Lock()
+        self.httpd = ThreadingHTTPServer((host, port), MockGatewayHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.gateway = self
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def urls(self):
+        """Settings that point the payment gateways at this server."""
+        return {
+            'KHALTI_VERIFY_URL': self.base_url + KHALTI_VERIFY_PATH,
+            'ESEWA_VERIFY_URL': self.base_url + ESEWA_VERIFY_PATH,
+            'KHALTI_LOOKUP_URL': self.base_url + KHALTI_LOOKUP_PATH,
+            'ESEWA_STATUS_URL': self.base_url + ESEWA_STATUS_PATH,
+        }
+
+    def set_payment(self, transaction_id, amount, state='Completed'):
+        """
+        Make lookups report a payment for our transaction: `amount` in
+        rupees, `state` a Khalti state name ('Completed', 'Pending',
+        'Expired', 'User canceled', 'Refunded').
+        """
+        self.payments[str(transaction_id)] = {
+            'amount_paisa': int(round(float(amount) * 100)),
+            'state': state,
+            'reference': f"MOCK{uuid.uuid4().hex[:18].upper()}",
+        }
+
+    def rejects(self, reference):
+        return reference.lower().startswith('fail') or random.random() < self.fail_rate
+
+    def record(self, endpoint):
+        with self._counts_lock:
+            self.counts[endpoint] += 1
+
+    def start(self):
+        """Serve from a background thread (for tests)."""
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name='mock-gateway', daemon=True)
+        self._thread.start()
+        return self
+
+    def serve_forever(self):
+        self.httpd.serve_forever()
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
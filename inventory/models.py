@@ -19,6 +19,17 @@ class ActiveManager(models.Manager):
 
 
 class Item(models.Model):
+    IMAGE_STATUS_CHOICES = [
+        ('', 'Not requested'),
+        ('PENDING', 'Pending'),
+        ('FETCHING', 'Fetching'),
+        ('FETCHED', 'Fetched'),
+        ('UPLOADED', 'Uploaded'),
+        ('NOT_FOUND', 'No match found'),
+        ('SKIPPED', 'Image API not configured'),
+        ('FAILED', 'Failed'),
+    ]
+
     name = models.CharField(max_length=100)
     supplier = models.ForeignKey('Supplier', on_delete=models.SET_NULL, null=True, blank=True, related_name='items')
     sku = models.CharField(max_length=50, unique=True, db_index=True, null=True, blank=True, help_text="Stock Keeping Unit - Unique identifier")
@@ -27,7 +38,28 @@ class Item(models.Model):
     cost_price = models.DecimalField(max_digits=10, decimal_places=2, default=0, help_text="Cost price per unit")
     reorder_level = models.IntegerField(default=10)
     lead_time_days = models.IntegerField(default=7)
+    min_order_quantity = models.PositiveIntegerField(default=1, help_text="Minimum order quantity (MOQ) accepted by the supplier")
     image = models.ImageField(upload_to='products/', blank=True, null=True)
+
+    # Background image fetch state (see image_queue.py)
+    image_status = models.CharField(max_length=10, choices=IMAGE_STATUS_CHOICES, blank=True, default='')
+    image_fetch_attempts = models.PositiveSmallIntegerField(default=0)
+    image_next_attempt_at = models.DateTimeField(null=True, blank=True, db_index=True)
+    image_fetch_error = models.CharField(max_length=255, blank=True)
+
+    # Resized WebP/JPEG renditions of `image` (see image_variants.py)
+    image_variants = models.JSONField(default=dict, blank=True)
+    image_variants_stale = models.BooleanField(default=False, db_index=True)
+
+    # Stored AI reorder snapshot (see ml_predictor.refresh_reorder_snapshot)
+    reorder_needed = models.BooleanField(default=False)
+    reorder_urgency = models.CharField(max_length=10, blank=True)
+    reorder_rank = models.PositiveSmallIntegerField(default=4, help_text="0 = CRITICAL … 3 = LOW, 4 = no reorder needed")
+    reorder_shortage_risk = models.FloatField(default=0)
+    reorder_suggested_quantity = models.PositiveIntegerField(default=0)
+    reorder_ai_powered = models.BooleanField(default=False)
+    reorder_checked_at = models.DateTimeField(null=True, blank=True)
+    reorder_stale = models.BooleanField(default=False, db_index=True, help_text="Waiting for the reorder snapshot worker (see reorder_queue.py)")
     
     # Soft delete field
     is_active = models.BooleanField(default=True, help_text="Set to False to soft delete")
@@ -41,8 +73,37 @@ class Item(models.Model):
     objects = ActiveManager()  # Default manager returns only active items
     all_objects = models.Manager()  # Use this to get all items including deleted
 
+    # Fields that change an item's reorder status when saved
+    REORDER_INPUT_FIELDS = {'quantity', 'reorder_level', 'lead_time_days', 'is_active'}
+    # Fields that change what the image worker should do, and the state it keeps
+    IMAGE_INPUT_FIELDS = {'name', 'image'}
+    IMAGE_STATE_FIELDS = {
+        'image_status', 'image_fetch_attempts', 'image_next_attempt_at', 'image_fetch_error',
+        'image_variants', 'image_variants_stale',
+    }
+
+    class Meta:
+        indexes = [
+            # Keyset pagination and prefix search on the item list
+            models.Index(fields=['name', 'id'], name='item_name_keyset_idx'),
+            # Most urgent reorder suggestions first
+            models.Index(fields=['reorder_rank', '-reorder_shortage_risk'], name='item_reorder_rank_idx'),
+        ]
+
     def __str__(self):
         return f"{self.name} (SKU: {self.sku})"
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the stored name so save() can tell when it changes
+        if 'name' in field_names:
+            instance._loaded_name = values[field_names.index('name')]
+        if 'image' in field_names:
+            instance._loaded_image = values[field_names.index('image')] or ''
+        if 'quantity' in field_names and 'reorder_level' in field_names:
+            instance._loaded_stock = (values[field_names.index('quantity')], values[field_names.index('reorder_level')])
+        return instance
     
     @classmethod
     def get_by_sku(cls, sku):
@@ -83,20 +144,81 @@ class Item(models.Model):
         # Auto-generate SKU if not provided
         if not self.sku:
             self.sku = self.generate_sku()
-        
-        if not self.image or not self.image.name:
-            try:
-                from .image_fetcher import image_fetcher
-                result = image_fetcher.fetch_product_image(self.name)
-                
-                if result:
-                    image_content, filename = result
-                    self.image.save(filename, image_content, save=False)
-            except Exception as e:
-                logger.warning(f"Failed to fetch image for {self.name}: {e}")
-                pass
-
-        super().save(*args, **kwargs)
+
+        update_fields = kwargs.get('update_fields')
+        extra_fields = set()
+
+        # Image acquisition never happens here: a new item, or a renamed item
+        # without an image, is queued for the background fetcher instead.
+        # Partial saves that write neither name nor image (stock updates)
+        # leave the image columns to the image worker.
+        wake_image_worker = False
+        if update_fields is None or self.IMAGE_INPUT_FIELDS.intersection(update_fields):
+            name_changed = not self._state.adding and getattr(self, '_loaded_name', self.name) != self.name
+            if self.image and self.image.name:
+                # A file assigned but not yet stored is a fresh upload
+                if not self.image._committed or self.image_status not in ('FETCHED', 'UPLOADED'):
+                    self.image_status = 'UPLOADED'
+                    self.image_next_attempt_at = None
+            elif self._state.adding or name_changed:
+                self.image_status = 'PENDING'
+                self.image_fetch_attempts = 0
+                self.image_next_attempt_at = timezone.now()
+                self.image_fetch_error = ''
+                wake_image_worker = True
+
+            # A new or replaced image needs fresh thumbnails from the image worker
+            image_name = self.image.name if self.image else ''
+            if image_name and (not self.image._committed or image_name != getattr(self, '_loaded_image', image_name)):
+                self.image_variants_stale = True
+                wake_image_worker = True
+            elif not image_name and self.image_variants:
+                self.image_variants = {}
+            extra_fields |= self.IMAGE_STATE_FIELDS
+
+        # The reorder snapshot is recomputed by the background worker
+        stale_reorder = update_fields is None or bool(self.REORDER_INPUT_FIELDS.intersection(update_fields))
+        if stale_reorder:
+            self.reorder_stale = True
+            extra_fields.add('reorder_stale')
+
+        if update_fields is not None:
+            kwargs['update_fields'] = set(update_fields) | extra_fields
+
+        # The catalogue counters (stock_counters.py) change in the same transaction
+        from .stock_counters import COUNTED_FIELDS, stock_counters
+        saved = COUNTED_FIELDS if update_fields is None else [f for f in COUNTED_FIELDS if f in update_fields]
+        with transaction.atomic(savepoint=False):
+            previous = None
+            if saved and not self._state.adding:
+                previous = stock_counters.stored_states([self.pk]).get(self.pk)
+            super().save(*args, **kwargs)
+            if saved:
+                # Only the fields this save wrote; the rest keep their stored values
+                current = stock_counters.state_of(self)
+                if previous is not None:
+                    current = {**previous, **{field: current[field] for field in saved}}
+                stock_counters.apply(stock_counters.change(previous, current))
+        self._loaded_name = self.name
+        self._loaded_image = self.image.name if self.image else ''
+
+        # Raise threshold events (low / out of stock / restocked) on change
+        loaded_stock = getattr(self, '_loaded_stock', None)
+        if loaded_stock is not None and (update_fields is None or {'quantity', 'reorder_level'} & set(update_fields)):
+            if loaded_stock != (self.quantity, self.reorder_level):
+                from .stock_events import stock_events
+                from .live_feed import live_feed
+                stock_events.emit_threshold_crossings(self, *loaded_stock)
+                live_feed.publish_stock_change(self, *loaded_stock)
+        self._loaded_stock = (self.quantity, self.reorder_level)
+
+        if wake_image_worker:
+            from .image_queue import image_queue
+            transaction.on_commit(image_queue.wake)
+
+        if stale_reorder:
+            from .reorder_queue import reorder_queue
+            transaction.on_commit(reorder_queue.wake)
 
     @property
     def is_low_stock(self):
@@ -117,11 +239,21 @@ class Item(models.Model):
         else:
             return "in-stock"
 
-    def get_image_url(self):
-        """Return image URL or placeholder if no image exists"""
-        if self.image:
-            return self.image.url
-        return '/static/images/no-image-placeholder.svg'
+    def get_image_url(self, width=None):
+        """
+        Return image URL or placeholder if no image exists. With `width`,
+        returns the smallest JPEG rendition at least that wide, if built.
+        """
+        if not self.image:
+            return '/static/images/no-image-placeholder.svg'
+        if width and self.image_variants.get('source') == self.image.name:
+            renditions = sorted(self.image_variants.get('jpeg', {}).items(), key=lambda kv: int(kv[0]))
+            for w, path in renditions:
+                if int(w) >= width:
+                    return self.image.storage.url(path)
+            if renditions:
+                return self.image.storage.url(renditions[-1][1])
+        return self.image.url
 
     def get_average_daily_usage(self, days=30):
         """Calculate average daily usage based on sales transactions"""
@@ -207,6 +339,10 @@ class Supplier(models.Model):
     email = models.EmailField(blank=True, null=True)
     phone = models.CharField(max_length=20, blank=True, null=True)
     address = models.TextField(blank=True, null=True)
+
+    # Purchase planning
+    lead_time_days = models.PositiveIntegerField(null=True, blank=True, help_text="Shared delivery lead time for every item from this supplier")
+    order_budget = models.DecimalField(max_digits=12, decimal_places=2, null=True, blank=True, help_text="Maximum spend per purchase order run")
     
     # Soft delete field
     is_active = models.BooleanField(default=True, help_text="Set to False to soft delete")
@@ -338,7 +474,7 @@ class Transaction(models.Model):
     def total_profit(self):
         """Calculate total profit for SALE transactions"""
         if self.transaction_type == 'SALE':
-            profit_per_unit = self.unit_price - self.item.cost_price
+            profit_per_unit = Decimal(str(self.unit_price)) - self.item.cost_price
             return profit_per_unit * self.quantity
         return Decimal('0.00')
 
@@ -354,14 +490,18 @@ class Transaction(models.Model):
                 raise ValidationError(f"Insufficient stock. Available: {self.item.quantity}")
 
     def save(self, *args, **kwargs):
-        self.total_amount = Decimal(str(self.quantity)) * Decimal(str(self.unit_price))
+        # The transaction form passes a float; profit and the live feed need Decimal arithmetic
+        self.unit_price = Decimal(str(self.unit_price))
+        self.total_amount = Decimal(str(self.quantity)) * self.unit_price
         self.clean()
 
         is_new = self.pk is None
+        previous_status = None
 
         if not is_new:
             try:
                 old_transaction = Transaction.objects.get(pk=self.pk)
+                previous_status = old_transaction.payment_status
                 status_changed_to_paid = (
                     old_transaction.payment_status != 'PAID' and
                     self.payment_status == 'PAID'
@@ -373,19 +513,27 @@ class Transaction(models.Model):
 
         with transaction.atomic():
             if status_changed_to_paid:
+                # Only the stock columns: the image worker may have written the rest meanwhile
+                stock_fields = ['quantity', 'updated_at']
                 if self.transaction_type == 'SALE':
                     self.item.quantity -= self.quantity
                 elif self.transaction_type == 'PURCHASE':
                     self.item.quantity += self.quantity
                     # Auto-update cost price when purchasing
                     self.item.cost_price = self.unit_price
+                    stock_fields.append('cost_price')
 
                 if self.item.quantity < 0:
                     raise ValidationError("Stock cannot be negative")
 
-                self.item.save()
+                self.item.save(update_fields=stock_fields)
 
             super().save(*args, **kwargs)
+
+        # Open dashboards and transaction lists patch themselves from this
+        if is_new or previous_status != self.payment_status:
+            from .live_feed import live_feed
+            live_feed.publish_transaction(self, previous_status, created=is_new)
     
     @classmethod
     def total_sales_for_month(cls, year, month):
@@ -445,15 +593,25 @@ class Transaction(models.Model):
         Returns:
             Decimal: Total profit for the month
         """
-        sales = cls.objects.filter(
+        result = cls.objects.filter(
             transaction_type='SALE',
             payment_status='PAID',
             timestamp__year=year,
             timestamp__month=month
-        ).select_related('item')
+        ).aggregate(total=cls._profit_sum())
         
-        total_profit = sum(sale.total_profit for sale in sales)
-        return Decimal(str(total_profit))
+        return result['total'] or Decimal('0.00')
+
+    @staticmethod
+    def _profit_sum(**filters):
+        """Sum of (unit price - item cost price) x quantity, computed by the database."""
+        from django.db.models import DecimalField, ExpressionWrapper, F, Q, Sum
+
+        profit = ExpressionWrapper(
+            (F('unit_price') - F('item__cost_price')) * F('quantity'),
+            output_field=DecimalField(max_digits=14, decimal_places=2),
+        )
+        return Sum(profit, filter=Q(**filters) if filters else None)
     
     @classmethod
     def get_monthly_report(cls, year, month):
@@ -467,26 +625,26 @@ class Transaction(models.Model):
         Returns:
             dict: Dictionary containing sales, purchases, profit, and transaction counts
         """
-        from django.db.models import Count
-        
-        sales_total = cls.total_sales_for_month(year, month)
-        purchases_total = cls.total_purchases_for_month(year, month)
-        profit_total = cls.total_profit_for_month(year, month)
+        from django.db.models import Count, Q, Sum
         
-        # Get transaction counts
-        sales_count = cls.objects.filter(
-            transaction_type='SALE',
+        # Every figure in one aggregate over the month's paid transactions
+        is_sale, is_purchase = Q(transaction_type='SALE'), Q(transaction_type='PURCHASE')
+        totals = cls.objects.filter(
             payment_status='PAID',
             timestamp__year=year,
             timestamp__month=month
-        ).count()
-        
-        purchases_count = cls.objects.filter(
-            transaction_type='PURCHASE',
-            payment_status='PAID',
-            timestamp__year=year,
-            timestamp__month=month
-        ).count()
+        ).aggregate(
+            sales=Sum('total_amount', filter=is_sale),
+            purchases=Sum('total_amount', filter=is_purchase),
+            profit=cls._profit_sum(transaction_type='SALE'),
+            sales_count=Count('id', filter=is_sale),
+            purchases_count=Count('id', filter=is_purchase),
+        )
+        sales_total = totals['sales'] or Decimal('0.00')
+        purchases_total = totals['purchases'] or Decimal('0.00')
+        profit_total = totals['profit'] or Decimal('0.00')
+        sales_count = totals['sales_count']
+        purchases_count = totals['purchases_count']
         
         return {
             'year': year,
@@ -524,3 +682,293 @@ class StockAdjustment(models.Model):
 
     def __str__(self):
         return f"{self.adjustment_type} {self.quantity} - {self.item.name}"
+
+
+class PurchaseOrder(models.Model):
+    """Multi-line purchase order for one supplier, drafted by the purchase planner."""
+    STATUS_CHOICES = [
+        ('DRAFT',     'Draft'),
+        ('PLACED',    'Placed'),
+        ('CANCELLED', 'Cancelled'),
+    ]
+
+    supplier          = models.ForeignKey(Supplier, on_delete=models.SET_NULL, null=True, blank=True, related_name='purchase_orders')
+    status            = models.CharField(max_length=10, choices=STATUS_CHOICES, default='DRAFT')
+    expected_delivery = models.DateField(null=True, blank=True)
+    total_cost        = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    notes             = models.TextField(blank=True, null=True)
+    created_by        = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='purchase_orders')
+    created_at        = models.DateTimeField(auto_now_add=True)
+    updated_at        = models.DateTimeField(auto_now=True, null=True)
+
+    class Meta:
+        ordering = ["-created_at"]
+
+    def __str__(self):
+        supplier = self.supplier.name if self.supplier else 'No supplier'
+        return f"PO #{self.pk} - {supplier} ({self.status})"
+
+    def place(self, user):
+        """
+        Turn a draft into PAID purchase transactions, one per line.
+
+        Runs atomically: if any line fails validation no stock is changed
+        and the order stays a draft. The order row is locked and its status
+        re-read first, so a repeated request cannot place it twice.
+        """
+        with transaction.atomic():
+            locked = PurchaseOrder.objects.select_for_update().get(pk=self.pk)
+            if locked.status != 'DRAFT':
+                self.status = locked.status
+                raise ValidationError(f"Only draft orders can be placed (this one is {locked.get_status_display()}).")
+
+            for line in locked.lines.select_related('item'):
+                Transaction.objects.create(
+                    item=line.item,
+                    transaction_type='PURCHASE',
+                    quantity=line.quantity,
+                    unit_price=line.unit_cost,
+                    payment_status='PAID',
+                    payment_method='BANK_TRANSFER',
+                    supplier=locked.supplier,
+                    performed_by=user,
+                    notes=f'Purchase order #{self.pk}',
+                )
+            locked.status = 'PLACED'
+            locked.save(update_fields=['status', 'updated_at'])
+            self.status, self.updated_at = locked.status, locked.updated_at
+
+
+class PurchaseOrderLine(models.Model):
+    purchase_order     = models.ForeignKey(PurchaseOrder, on_delete=models.CASCADE, related_name='lines')
+    item               = models.ForeignKey(Item, on_delete=models.CASCADE, related_name='purchase_order_lines')
+    quantity           = models.PositiveIntegerField()
+    unit_cost          = models.DecimalField(max_digits=10, decimal_places=2)
+    suggested_quantity = models.PositiveIntegerField(default=0)
+    urgency            = models.CharField(max_length=10, blank=True)
+
+    def __str__(self):
+        return f"{self.quantity} x {self.item.name} (PO #{self.purchase_order_id})"
+
+    @property
+    def line_total(self):
+        return self.unit_cost * self.quantity
+
+
+class ProductImageCache(models.Model):
+    """
+    Outcome of an image search per normalized product name, so repeated
+    names never hit the image API twice. Hits point at a content-addressed
+    file shared by every item with the same image; misses and errors
+    expire so they are retried eventually.
+    """
+    STATUS_CHOICES = [
+        ('HIT', 'Image found'),
+        ('MISS', 'No match'),
+        ('ERROR', 'Fetch failed'),
+    ]
+
+    query        = models.CharField(max_length=255, unique=True, help_text="Normalized product name")
+    status       = models.CharField(max_length=5, choices=STATUS_CHOICES)
+    content_hash = models.CharField(max_length=64, blank=True, db_index=True, help_text="SHA-256 of the image bytes")
+    file         = models.CharField(max_length=255, blank=True, help_text="Storage path of the image")
+    error        = models.CharField(max_length=255, blank=True)
+    expires_at   = models.DateTimeField(null=True, blank=True, help_text="Empty for hits, which never expire")
+    hits         = models.PositiveIntegerField(default=0, help_text="Times this entry saved an API call")
+    created_at   = models.DateTimeField(auto_now_add=True)
+    updated_at   = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.query}: {self.status}"
+
+    @property
+    def is_fresh(self):
+        return self.expires_at is None or self.expires_at > timezone.now()
+
+
+class OutboundEmail(models.Model):
+    """
+    One message in the outbound mail queue (see mail_queue.py). Callers
+    only insert rows; a worker sends them in batches over one SMTP
+    connection and retries failures with backoff.
+    """
+    KIND_CHOICES = [
+        ('ALERT',       'Stock alert digest'),
+        ('REPORT',      'Low stock report'),
+        ('TRANSACTION', 'Transaction confirmation'),
+        ('GENERAL',     'General'),
+    ]
+    STATUS_CHOICES = [
+        ('QUEUED',  'Queued'),
+        ('SENDING', 'Sending'),
+        ('SENT',    'Sent'),
+        ('FAILED',  'Failed'),
+    ]
+
+    recipient       = models.EmailField(db_index=True)
+    subject         = models.CharField(max_length=255)
+    body            = models.TextField()
+    kind            = models.CharField(max_length=12, choices=KIND_CHOICES, default='GENERAL')
+    dedupe_key      = models.CharField(max_length=64, blank=True, db_index=True, help_text="SHA-256 of kind, recipient, subject and body")
+    status          = models.CharField(max_length=8, choices=STATUS_CHOICES, default='QUEUED')
+    attempts        = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(null=True, blank=True, help_text="When a queued message is due, or a send lease expires")
+    last_error      = models.CharField(max_length=255, blank=True)
+    created_at      = models.DateTimeField(auto_now_add=True)
+    sent_at         = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ["-created_at"]
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='outbound_email_due_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.subject} -> {self.recipient} ({self.status})"
+
+
+class PendingStockAlert(models.Model):
+    """
+    A stock alert waiting for its recipient's next digest email. There is
+    one row per recipient and item, so repeated alerts collapse into it.
+    """
+    recipient        = models.EmailField()
+    item             = models.ForeignKey(Item, on_delete=models.CASCADE, related_name='pending_alerts')
+    occurrences      = models.PositiveIntegerField(default=1, help_text="Alerts raised since the last digest")
+    first_alerted_at = models.DateTimeField(auto_now_add=True)
+    last_alerted_at  = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['recipient', 'item'], name='pending_alert_recipient_item_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.item.name} -> {self.recipient} (x{self.occurrences})"
+
+
+class StockEvent(models.Model):
+    """
+    Log of stock threshold events raised by stock_events.py: an item
+    crossing its reorder level or zero, coming back in stock, or being
+    projected to run out within its lead time.
+    """
+    EVENT_TYPES = [
+        ('LOW_STOCK',     'Fell to reorder level'),
+        ('OUT_OF_STOCK',  'Out of stock'),
+        ('STOCKOUT_RISK', 'Projected to run out within lead time'),
+        ('RESTOCKED',     'Back above reorder level'),
+    ]
+
+    item                = models.ForeignKey(Item, on_delete=models.CASCADE, related_name='stock_events')
+    event_type          = models.CharField(max_length=15, choices=EVENT_TYPES)
+    quantity            = models.IntegerField()
+    previous_quantity   = models.IntegerField(null=True, blank=True)
+    reorder_level       = models.IntegerField()
+    days_until_stockout = models.FloatField(null=True, blank=True)
+    created_at          = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        ordering = ["-created_at"]
+
+    def __str__(self):
+        return f"{self.get_event_type_display()}: {self.item.name} ({self.quantity})"
+
+
+class Notification(models.Model):
+    """
+    Persisted in-app notification, one row per stock event whatever the
+    number of users. Written by the stock event subscriber (notifications.py)
+    when stock conditions change; each user's read state is a
+    NotificationRead row, so dashboards read a few rows instead of
+    recomputing alerts.
+    """
+    LEVEL_CHOICES = [
+        ('danger',  'Critical'),
+        ('warning', 'Warning'),
+        ('info',    'Info'),
+    ]
+
+    item       = models.ForeignKey(Item, on_delete=models.CASCADE, null=True, blank=True, related_name='notifications')
+    event_type = models.CharField(max_length=15, blank=True)
+    level      = models.CharField(max_length=10, choices=LEVEL_CHOICES, default='info')
+    message    = models.CharField(max_length=255)
+    link       = models.CharField(max_length=200, blank=True)
+    superseded = models.BooleanField(default=False, help_text="A later event for the item replaced this alert")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ["-created_at"]
+        indexes = [
+            # Current alerts, newest first
+            models.Index(fields=['superseded', '-created_at'], name='notification_active_idx'),
+        ]
+
+    def __str__(self):
+        return self.message
+
+
+class NotificationRead(models.Model):
+    """A user has read a Notification."""
+    notification = models.ForeignKey(Notification, on_delete=models.CASCADE, related_name='reads')
+    user         = models.ForeignKey(User, on_delete=models.CASCADE, related_name='notification_reads')
+    read_at      = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'notification'], name='notification_read_user_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.user.username} read {self.notification_id}"
+
+
+class DailySales(models.Model):
+    """
+    Paid sales pre-aggregated per day, item, customer and payment method.
+    Maintained by sales_rollups.py; the chatbot's ad-hoc sales questions
+    read these rows instead of scanning the transaction table.
+    """
+    day            = models.DateField()
+    item           = models.ForeignKey(Item, on_delete=models.CASCADE, related_name='daily_sales')
+    customer       = models.ForeignKey(Customer, on_delete=models.SET_NULL, null=True, blank=True, related_name='daily_sales')
+    payment_method = models.CharField(max_length=20, choices=Transaction.PAYMENT_METHOD_CHOICES)
+    units          = models.PositiveIntegerField(default=0)
+    revenue        = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'))
+    sales_count    = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        verbose_name_plural = 'daily sales'
+        indexes = [
+            # Date-range scans, and the per-item bucket a sale refreshes
+            models.Index(fields=['day', 'item'], name='daily_sales_day_item_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.day} {self.item.name}: {self.units} unit(s), Rs. {self.revenue}"
+
+
+class StockCounters(models.Model):
+    """
+    Catalogue-wide headline numbers for active items, kept in a single row
+    (pk=1) by stock_counters.py so list pages and the dashboard read one
+    row instead of aggregating the item table.
+    """
+    total_items       = models.PositiveIntegerField(default=0)
+    in_stock          = models.PositiveIntegerField(default=0)
+    low_stock         = models.PositiveIntegerField(default=0)
+    out_of_stock      = models.PositiveIntegerField(default=0)
+    stock_value       = models.DecimalField(max_digits=16, decimal_places=2, default=Decimal('0.00'), help_text="Sum of price x quantity")
+    stock_cost        = models.DecimalField(max_digits=16, decimal_places=2, default=Decimal('0.00'), help_text="Sum of cost price x quantity")
+    reorder_alerts    = models.PositiveIntegerField(default=0, help_text="Items whose stored reorder snapshot needs a reorder")
+    critical_alerts   = models.PositiveIntegerField(default=0)
+    high_alerts       = models.PositiveIntegerField(default=0)
+    medium_alerts     = models.PositiveIntegerField(default=0)
+    ai_powered_alerts = models.PositiveIntegerField(default=0)
+    updated_at        = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        verbose_name_plural = 'stock counters'
+
+    def __str__(self):
+        return f"{self.total_items} items, Rs. {self.stock_value} at price"
@@ -7,16 +7,23 @@ analysis for proactive inventory management.
 
 Key fixes over v1:
 - _get_ai_coverage() no longer runs ML on every item just for a percentage
-- Dashboard alerts cap predicted demand display to avoid alarming test-data numbers
-- days_until_stockout of 0.0 is treated as "unknown" not "imminent"
-- get_notification_summary() is cheaper — reuses one alerts call
-- add_dashboard_notifications() skips if messages already exist (no duplicates on refresh)
+- Inventory list page and dashboard read their counts from the maintained
+  StockCounters row (stock_counters.py): one single-row query
+- Dashboard alerts are persisted Notification rows, written when a stock
+  event fires (notify_stock_event), instead of being regenerated into
+  Django messages on every dashboard view
+- One Notification per event for everyone, with per-user NotificationRead
+  markers, so an alert costs one INSERT however many users there are. A
+  newer event for the same item marks older alerts superseded rather than
+  read on everybody's behalf
 """
 
 from django.contrib import messages
-from django.contrib.messages import get_messages
-from .models import Item
-from .ml_predictor import get_ai_reorder_suggestions, ml_predictor
+from django.db.models import Exists, OuterRef
+from django.urls import reverse
+from .models import Item, Notification, NotificationRead
+from .ml_predictor import ml_predictor
+from .stock_counters import stock_counters
 
 
 class InventoryNotificationManager:
@@ -25,189 +32,151 @@ class InventoryNotificationManager:
     predictions and basic stock thresholds.
     """
 
-    def __init__(self):
-        self.alert_types = {
-            'CRITICAL': {'level': messages.ERROR,   'icon': 'bi-exclamation-triangle-fill', 'color': 'danger'},
-            'HIGH':     {'level': messages.WARNING,  'icon': 'bi-exclamation-triangle',      'color': 'warning'},
-            'MEDIUM':   {'level': messages.INFO,     'icon': 'bi-info-circle',               'color': 'info'},
-            'LOW':      {'level': messages.INFO,     'icon': 'bi-check-circle',              'color': 'success'},
-        }
-
     # ------------------------------------------------------------------
-    # Core alert builder
+    # Persisted inbox
     # ------------------------------------------------------------------
 
-    def get_ai_stock_alerts(self):
+    # Stock event type -> (Notification level, message template)
+    event_messages = {
+        'OUT_OF_STOCK':  ('danger',  "\u26a0\ufe0f CRITICAL: {item_name} is out of stock — immediate restock needed!"),
+        'LOW_STOCK':     ('warning', "\u26a0\ufe0f {item_name} is low on stock: {quantity} units left (reorder at {reorder_level})."),
+        'STOCKOUT_RISK': ('warning', "\U0001f916 AI ALERT: {item_name} may run out in ~{days:.0f} days, inside its {lead_time_days}-day lead time."),
+    }
+
+    def notify_stock_event(self, event):
         """
-        Get AI-powered stock alerts. Returns a sorted list of alert dicts.
-        Only items that genuinely need reordering are included.
+        Stock event subscriber (see stock_events.py). Supersedes the item's
+        current alert with one for the new state; a RESTOCKED event just
+        supersedes it.
+
+        Returns:
+            int: Number of notifications created
         """
-        alerts = []
-
-        for suggestion in get_ai_reorder_suggestions():
-            item           = suggestion['item']
-            recommendation = suggestion['recommendation']
-            urgency        = recommendation.get('urgency', 'LOW')
-            ai_powered     = recommendation.get('ai_powered', False)
-
-            # Cap display at 3× current stock so alerts stay believable
-            raw_predicted = recommendation.get('predicted_demand', 0)
-            display_predicted = (
-                min(raw_predicted, max(item.quantity * 3, 50))
-                if isinstance(raw_predicted, (int, float)) and item.quantity > 0
-                else raw_predicted
-            )
+        Notification.objects.filter(
+            item_id=event['item_id'], superseded=False, event_type__in=self.event_messages,
+        ).update(superseded=True)
 
-            # days_until_stockout of 0.0 means "no sales data", not "runs out today"
-            days_out = recommendation.get('days_until_stockout', None)
-            if isinstance(days_out, float) and days_out == 0.0:
-                days_out = None
-
-            alerts.append({
-                'item':               item,
-                'urgency':            urgency,
-                'ai_powered':         ai_powered,
-                'current_stock':      recommendation.get('current_stock', item.quantity),
-                'predicted_demand':   display_predicted,
-                'shortage_risk':      recommendation.get('shortage_risk', 0),
-                'suggested_quantity': recommendation.get('suggested_quantity', 0),
-                'days_until_stockout': days_out,
-                'model_accuracy':     recommendation.get('model_accuracy', 'N/A'),
-                'alert_config':       self.alert_types.get(urgency, self.alert_types['LOW']),
-            })
-
-        urgency_order = {'CRITICAL': 0, 'HIGH': 1, 'MEDIUM': 2, 'LOW': 3}
-        alerts.sort(key=lambda x: urgency_order.get(x['urgency'], 4))
-        return alerts
+        if event['type'] not in self.event_messages:
+            return 0
 
-    # ------------------------------------------------------------------
-    # Dashboard message injection
-    # ------------------------------------------------------------------
+        level, template = self.event_messages[event['type']]
+        Notification.objects.create(
+            item_id=event['item_id'], event_type=event['type'], level=level,
+            message=template.format(days=event['days_until_stockout'] or 0, **event)[:255],
+            link=reverse('inventory:reorder_suggestions'),
+        )
+        return 1
 
-    def add_dashboard_notifications(self, request):
+    def inbox(self, user):
         """
-        Add AI-based stock notifications to Django messages for the dashboard.
-        Skips silently if messages already exist to prevent duplicates on refresh.
-        Limits noise: max 3 critical + 2 high + 1 summary.
+        Every notification since the user joined, newest first, annotated
+        with is_read for that user.
         """
-        # Peek at existing messages without consuming them
-        storage = get_messages(request)
-        existing = list(storage)
-        # Restore messages so they are still available to the template
-        for msg in existing:
-            messages.add_message(request, msg.level, str(msg))
-
-        # If any messages already queued, don't add more
-        if existing:
-            return
+        return Notification.objects.filter(created_at__gte=user.date_joined).annotate(
+            is_read=Exists(NotificationRead.objects.filter(notification=OuterRef('pk'), user=user)),
+        )
 
-        alerts = self.get_ai_stock_alerts()
-        critical_alerts = [a for a in alerts if a['urgency'] == 'CRITICAL']
-        high_alerts     = [a for a in alerts if a['urgency'] == 'HIGH']
-
-        for alert in critical_alerts[:3]:
-            item = alert['item']
-            if alert['ai_powered']:
-                msg = (
-                    f"\U0001f916 AI CRITICAL: {item.name} is out of stock! "
-                    f"Order {alert['suggested_quantity']} units now."
-                )
-            else:
-                msg = f"\u26a0\ufe0f CRITICAL: {item.name} is out of stock — immediate restock needed!"
-            messages.add_message(request, messages.ERROR, msg)
-
-        for alert in high_alerts[:2]:
-            item     = alert['item']
-            days_out = alert['days_until_stockout']
-
-            if alert['ai_powered']:
-                if isinstance(days_out, (int, float)) and days_out > 0:
-                    msg = (
-                        f"\U0001f916 AI HIGH ALERT: {item.name} may run out in "
-                        f"~{days_out:.0f} days. "
-                        f"Current stock: {alert['current_stock']} units. "
-                        f"Consider ordering {alert['suggested_quantity']} units."
-                    )
-                else:
-                    msg = (
-                        f"\U0001f916 AI HIGH ALERT: {item.name} needs reordering. "
-                        f"Current stock: {alert['current_stock']} units. "
-                        f"Suggested order: {alert['suggested_quantity']} units."
-                    )
-            else:
-                msg = f"\u26a0\ufe0f HIGH: {item.name} is low on stock — restock soon."
-
-            messages.add_message(request, messages.WARNING, msg)
-
-        # Summary only when there are many alerts
-        if len(alerts) > 5:
-            ai_count = sum(1 for a in alerts if a['ai_powered'])
-            messages.add_message(
-                request, messages.INFO,
-                f"\U0001f4ca INVENTORY SUMMARY: {len(alerts)} items need attention "
-                f"({ai_count} with AI analysis). Visit AI Reorder for full analysis."
-            )
+    def unread(self, user):
+        """Current (not superseded) notifications the user has not read."""
+        return self.inbox(user).filter(superseded=False, is_read=False)
 
-    def add_inventory_page_notifications(self, request):
-        """Focused notifications for the inventory list page."""
-        alerts = self.get_ai_stock_alerts()
+    def unread_count(self, user):
+        return self.unread(user).count()
 
-        if not alerts:
+    def get_inbox(self, user, limit=5):
+        """
+        Newest unread notifications for a user, for the dashboard panel.
+
+        Returns:
+            dict: {'unread_count': int, 'notifications': [Notification]}
+        """
+        unread = self.unread(user)
+        return {
+            'unread_count': unread.count(),
+            'notifications': list(unread.select_related('item')[:limit]),
+        }
+
+    def mark_read(self, user, notification_ids=None):
+        """Mark some (or all) of a user's unread notifications read. Returns the number changed."""
+        unread = self.unread(user)
+        if notification_ids is not None:
+            unread = unread.filter(pk__in=notification_ids)
+        pks = list(unread.values_list('pk', flat=True))
+        NotificationRead.objects.bulk_create(
+            [NotificationRead(notification_id=pk, user=user) for pk in pks], ignore_conflicts=True,
+        )
+        return len(pks)
+
+    def add_inventory_page_notifications(self, request, summary=None):
+        """
+        Focused notifications for the inventory list page.
+        Reads the stored reorder snapshot; pass summary to reuse one already fetched.
+        """
+        if summary is None:
+            summary = self.get_snapshot_summary()
+
+        if not summary['total_alerts']:
             messages.add_message(
                 request, messages.SUCCESS,
                 "\u2705 All items are well-stocked!"
             )
             return
 
-        critical_count = sum(1 for a in alerts if a['urgency'] == 'CRITICAL')
-        high_count     = sum(1 for a in alerts if a['urgency'] == 'HIGH')
-        ai_count       = sum(1 for a in alerts if a['ai_powered'])
-
-        if critical_count:
+        if summary['critical_count']:
             messages.add_message(
                 request, messages.ERROR,
-                f"\U0001f6a8 {critical_count} critical stock alert(s) detected — immediate action required."
+                f"\U0001f6a8 {summary['critical_count']} critical stock alert(s) detected — immediate action required."
             )
-        if high_count:
+        if summary['high_count']:
             messages.add_message(
                 request, messages.WARNING,
-                f"\u26a0\ufe0f {high_count} high-priority item(s) need restocking soon "
-                f"({ai_count} with AI analysis)."
+                f"\u26a0\ufe0f {summary['high_count']} high-priority item(s) need restocking soon "
+                f"({summary['ai_powered_count']} with AI analysis)."
             )
 
     # ------------------------------------------------------------------
     # Summary for template widgets
     # ------------------------------------------------------------------
 
-    def get_notification_summary(self):
+    def get_snapshot_summary(self):
         """
-        Return a summary dict for dashboard template widgets.
-        Calls get_ai_stock_alerts() once and derives everything from it.
+        Alert counters for the dashboard and inventory list widgets, plus the
+        stock status counts and stock value, read from the maintained
+        StockCounters row (stock_counters.py) in a single-row query. The
+        alert counts reflect the stored reorder snapshot (Item.reorder_*).
         """
-        alerts = self.get_ai_stock_alerts()
-
-        return {
-            'total_alerts':      len(alerts),
-            'critical_count':    sum(1 for a in alerts if a['urgency'] == 'CRITICAL'),
-            'high_count':        sum(1 for a in alerts if a['urgency'] == 'HIGH'),
-            'medium_count':      sum(1 for a in alerts if a['urgency'] == 'MEDIUM'),
-            'ai_powered_count':  sum(1 for a in alerts if a['ai_powered']),
-            'ai_coverage':       self._get_ai_coverage(),
-            'has_critical':      any(a['urgency'] == 'CRITICAL' for a in alerts),
-            'has_high':          any(a['urgency'] == 'HIGH'     for a in alerts),
-            'alerts':            alerts[:5],
+        counters = stock_counters.read()
+        summary = {
+            'total_items':        counters.total_items,
+            'total_alerts':       counters.reorder_alerts,
+            'critical_count':     counters.critical_alerts,
+            'high_count':         counters.high_alerts,
+            'medium_count':       counters.medium_alerts,
+            'ai_powered_count':   counters.ai_powered_alerts,
+            'low_stock_count':    counters.low_stock,
+            'out_of_stock_count': counters.out_of_stock,
+            'in_stock_count':     counters.in_stock,
+            'total_value':        counters.stock_value,
+            'total_cost':         counters.stock_cost,
         }
+        summary.update({
+            'ai_coverage':  self._get_ai_coverage(summary['total_items']),
+            'has_critical': summary['critical_count'] > 0,
+            'has_high':     summary['high_count'] > 0,
+        })
+        return summary
 
     # ------------------------------------------------------------------
     # Helpers
     # ------------------------------------------------------------------
 
-    def _get_ai_coverage(self):
+    def _get_ai_coverage(self, total=None):
         """
         Calculate what % of items have a trained ML model.
         Uses ml_predictor.models (in-memory dict) — no extra DB or ML calls.
         """
-        total = Item.objects.count()
+        if total is None:
+            total = Item.objects.count()
         if total == 0:
             return 0
         trained = len(ml_predictor.models)
@@ -22,6 +22,17 @@ Security Features:
 - Payment verification before marking as complete
 - Secure callback handling
 - Transaction atomicity (all-or-nothing updates)
+- Verification results are applied under a row lock, so a repeated or
+  concurrent callback can never mark a payment (or deduct its stock) twice
+
+Connection Handling:
+- Each gateway keeps one pooled requests.Session per process (keep-alive
+  connections are reused across verifications)
+- Connect/read timeouts are set per gateway in PAYMENT_GATEWAY_TIMEOUTS
+- The callback views are async: verification calls run on a bounded
+  thread pool (PAYMENT_VERIFY_CONCURRENCY) while the view awaits, so a
+  slow gateway does not hold a web worker per pending payment
+- mock_gateway.py serves both verification APIs locally for testing
 
 Why Two Gateways?
 - Khalti: Popular in Nepal, mobile-first
@@ -29,18 +40,74 @@ Why Two Gateways?
 - Provides user choice and redundancy
 """
 
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
 import requests
-import hashlib
-import hmac
-import base64
+from requests.adapters import HTTPAdapter
 from django.conf import settings
 from django.urls import reverse
 import logging
 
 logger = logging.getLogger(__name__)
 
+from .metrics import GATEWAY_VERIFY_SECONDS
+
+
+_sessions = {}
+_verify_pool = None
+_lock = threading.Lock()
+
+
+def gateway_session(name):
+    """Pooled HTTP session shared by every client of one gateway in this process."""
+    with _lock:
+        if name not in _sessions:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_maxsize=getattr(settings, 'PAYMENT_GATEWAY_POOL_SIZE', 20))
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            _sessions[name] = session
+        return _sessions[name]
+
+
+def verify_pool():
+    """Bounded thread pool the async views use for verification calls."""
+    global _verify_pool
+    with _lock:
+        if _verify_pool is None:
+            _verify_pool = ThreadPoolExecutor(
+                max_workers=getattr(settings, 'PAYMENT_VERIFY_CONCURRENCY', 20),
+                thread_name_prefix='payment-verify',
+            )
+        return _verify_pool
+
+
+class PaymentGatewayClient:
+    """
+    Shared plumbing for gateway clients: pooled session, per-gateway
+    timeouts and an awaitable verify_payment().
+    """
+
+    gateway_name = None   # Key in PAYMENT_GATEWAY_TIMEOUTS
+
+    def __init__(self):
+        self.session = gateway_session(self.gateway_name)
+        timeouts = getattr(settings, 'PAYMENT_GATEWAY_TIMEOUTS', {})
+        self.timeout = tuple(timeouts.get(self.gateway_name, (3.05, 10)))   # (connect, read) seconds
+
+    async def averify_payment(self, *args):
+        """verify_payment() for async views; runs on the verification pool."""
+        loop = asyncio.get_running_loop()
+        with GATEWAY_VERIFY_SECONDS.time(gateway=self.gateway_name.lower()) as labels:
+            result = await loop.run_in_executor(verify_pool(), functools.partial(self.verify_payment, *args))
+            labels['outcome'] = 'success' if result.get('success') else 'failure'
+        return result
 
-class KhaltiPaymentGateway:
+
+class KhaltiPaymentGateway(PaymentGatewayClient):
     """
     Khalti Payment Gateway Integration
     
@@ -56,11 +123,18 @@ class KhaltiPaymentGateway:
     
     Documentation: https://docs.khalti.com/
     """
-    
+
+    gateway_name = 'KHALTI'
+
+    # Khalti transaction states that mean the payment will never complete
+    closed_states = {'Expired', 'User canceled', 'Refunded', 'Partially refunded', 'Failed'}
+
     def __init__(self):
+        super().__init__()
         self.public_key = settings.KHALTI_PUBLIC_KEY
         self.secret_key = settings.KHALTI_SECRET_KEY
         self.verify_url = settings.KHALTI_VERIFY_URL
+        self.lookup_url = settings.KHALTI_LOOKUP_URL
     
     def initiate_payment(self, transaction, request):
         """
@@ -118,11 +192,11 @@ class KhaltiPaymentGateway:
             
             logger.info(f"Verifying Khalti payment with token: {token}")
             
-            response = requests.post(
+            response = self.session.post(
                 self.verify_url,
                 headers=headers,
                 data=payload,
-                timeout=10
+                timeout=self.timeout
             )
             
             if response.status_code == 200:
@@ -158,7 +232,47 @@ class KhaltiPaymentGateway:
             }
 
 
-class EsewaPaymentGateway:
+    def lookup_payment(self, transaction):
+        """
+        Look up a payment by our transaction ID (product_identity), for
+        payments whose callback never arrived
+        
+        Args:
+            transaction: Transaction model instance
+        
+        Returns:
+            dict: {'status': 'PAID' | 'PENDING' | 'FAILED' | 'NOT_FOUND' | 'ERROR',
+                   'reference': Khalti idx (when PAID), 'error': message (when ERROR)}
+        """
+        amount_in_paisa = int(float(transaction.total_amount) * 100)
+        try:
+            response = self.session.get(
+                self.lookup_url,
+                headers={'Authorization': f'Key {self.secret_key}'},
+                params={'product_identity': str(transaction.id)},
+                timeout=self.timeout
+            )
+            if response.status_code != 200:
+                return {'status': 'ERROR', 'error': f"HTTP {response.status_code}"}
+            records = response.json().get('records', [])
+        except (requests.exceptions.RequestException, ValueError) as e:
+            return {'status': 'ERROR', 'error': str(e)}
+
+        states = set()
+        for record in records:
+            state = (record.get('state') or {}).get('name', '')
+            # Only a completed payment of the full amount settles the transaction
+            if state == 'Completed' and int(record.get('amount') or 0) == amount_in_paisa:
+                return {'status': 'PAID', 'reference': record.get('idx')}
+            states.add(state)
+        if not records:
+            return {'status': 'NOT_FOUND'}
+        if states <= self.closed_states:
+            return {'status': 'FAILED'}
+        return {'status': 'PENDING'}
+
+
+class EsewaPaymentGateway(PaymentGatewayClient):
     """
     eSewa Payment Gateway Integration
     
@@ -174,11 +288,26 @@ class EsewaPaymentGateway:
     
     Documentation: https://developer.esewa.com.np/
     """
-    
+
+    gateway_name = 'ESEWA'
+
+    # eSewa status check response -> our lookup status
+    lookup_statuses = {
+        'COMPLETE': 'PAID',
+        'PENDING': 'PENDING',
+        'AMBIGUOUS': 'PENDING',
+        'NOT_FOUND': 'NOT_FOUND',
+        'CANCELED': 'FAILED',
+        'FULL_REFUND': 'FAILED',
+        'PARTIAL_REFUND': 'FAILED',
+    }
+
     def __init__(self):
+        super().__init__()
         self.merchant_id = settings.ESEWA_MERCHANT_ID
         self.payment_url = settings.ESEWA_PAYMENT_URL
         self.verify_url = settings.ESEWA_VERIFY_URL
+        self.status_url = settings.ESEWA_STATUS_URL
         self.success_url = settings.ESEWA_SUCCESS_URL
         self.failure_url = settings.ESEWA_FAILURE_URL
     
@@ -237,10 +366,10 @@ class EsewaPaymentGateway:
             
             logger.info(f"Verifying eSewa payment: {params}")
             
-            response = requests.get(
+            response = self.session.get(
                 self.verify_url,
                 params=params,
-                timeout=10
+                timeout=self.timeout
             )
             
             # eSewa returns XML response
@@ -279,6 +408,40 @@ class EsewaPaymentGateway:
             }
 
 
+    def lookup_payment(self, transaction):
+        """
+        Check a payment's status with eSewa's status API, for payments
+        whose callback never arrived
+        
+        Args:
+            transaction: Transaction model instance
+        
+        Returns:
+            dict: {'status': 'PAID' | 'PENDING' | 'FAILED' | 'NOT_FOUND' | 'ERROR',
+                   'reference': eSewa ref_id (when PAID), 'error': message (when ERROR)}
+        """
+        params = {
+            'product_code': self.merchant_id,
+            'total_amount': f"{float(transaction.total_amount):.2f}",
+            'transaction_uuid': f"TXN{transaction.id}",
+        }
+        try:
+            response = self.session.get(self.status_url, params=params, timeout=self.timeout)
+            if response.status_code != 200:
+                return {'status': 'ERROR', 'error': f"HTTP {response.status_code}"}
+            data = response.json()
+        except (requests.exceptions.RequestException, ValueError) as e:
+            return {'status': 'ERROR', 'error': str(e)}
+
+        status = self.lookup_statuses.get(data.get('status'))
+        if status is None:
+            return {'status': 'ERROR', 'error': f"Unknown eSewa status {data.get('status')!r}"}
+        result = {'status': status}
+        if status == 'PAID':
+            result['reference'] = data.get('ref_id')
+        return result
+
+
 # Gateway factory for easy access
 def get_payment_gateway(payment_method):
     """
@@ -296,3 +459,35 @@ def get_payment_gateway(payment_method):
         return EsewaPaymentGateway()
     else:
         return None
+
+
+def apply_verification(transaction_id, success, reference=None, note=None):
+    """
+    Record a gateway verification result on a transaction.
+
+    The transaction row is locked while it is updated, and a PAID
+    transaction is never changed again, so replayed or concurrent
+    callbacks (and the payment reconciler) are harmless. `note` is
+    appended to the transaction notes when the status changes.
+
+    Returns:
+        tuple: (Transaction, changed)
+    """
+    from django.db import transaction as db_transaction
+    from .models import Transaction
+
+    with db_transaction.atomic():
+        transaction_obj = Transaction.objects.select_for_update().select_related('item').get(pk=transaction_id)
+        if transaction_obj.payment_status == 'PAID':
+            return transaction_obj, False
+        if success:
+            transaction_obj.payment_status = 'PAID'
+            transaction_obj.payment_reference = reference
+        elif transaction_obj.payment_status == 'FAILED':
+            return transaction_obj, False
+        else:
+            transaction_obj.payment_status = 'FAILED'
+        if note:
+            transaction_obj.notes = f"{transaction_obj.notes}\n{note}" if transaction_obj.notes else note
+        transaction_obj.save()
+    return transaction_obj, True
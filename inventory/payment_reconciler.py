@@ -0,0 +1,148 @@
+"""
+Pending-Payment Reconciliation
+==============================
+
+Settles Khalti / eSewa transactions whose gateway callback never reached
+us (browser closed, network drop, callback timed out), so they do not sit
+PENDING forever with their stock unaccounted for.
+
+How it works:
+1. Candidates are PENDING KHALTI / ESEWA transactions older than
+   PAYMENT_RECONCILE_AFTER_MINUTES, so payments still in progress are
+   left alone. They are read in primary-key batches of
+   PAYMENT_RECONCILE_BATCH_SIZE
+2. Each batch is looked up with the gateway's status API
+   (lookup_payment() in payment_gateways.py, or PaymentSimulator in
+   simulation mode) from a pool of PAYMENT_RECONCILE_CONCURRENCY threads.
+   The threads only make HTTP calls; they never touch the database
+3. Results are applied one at a time through apply_verification(), which
+   locks the row and never changes a PAID transaction, so a callback
+   arriving meanwhile (or a second reconciler) cannot double-count stock:
+   - PAID      -> PAID with the gateway reference (stock is deducted)
+   - FAILED    -> FAILED (cancelled, refunded or expired at the gateway)
+   - PENDING / NOT_FOUND -> left alone until the transaction is older than
+     PAYMENT_PENDING_EXPIRY_HOURS, then FAILED with an "expired" note
+   - ERROR     -> left alone and retried on the next run
+4. `python manage.py reconcile_payments` runs it once (cron) or as a
+   long-lived worker
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.utils import timezone
+
+import logging
+logger = logging.getLogger(__name__)
+
+from .models import Transaction
+from .payment_gateways import apply_verification, get_payment_gateway
+from .payment_simulation import PaymentSimulator
+
+
+GATEWAY_METHODS = ('KHALTI', 'ESEWA')
+
+
+class PaymentReconciler:
+    """
+    Looks up stale PENDING gateway payments and settles them.
+    """
+
+    def __init__(self):
+        self.min_age_minutes = getattr(settings, 'PAYMENT_RECONCILE_AFTER_MINUTES', 15)
+        self.expiry_hours = getattr(settings, 'PAYMENT_PENDING_EXPIRY_HOURS', 24)
+        self.concurrency = getattr(settings, 'PAYMENT_RECONCILE_CONCURRENCY', 8)
+        self.batch_size = getattr(settings, 'PAYMENT_RECONCILE_BATCH_SIZE', 100)
+
+    def candidates(self, min_age_minutes=None, limit=None):
+        """PENDING gateway transactions old enough to reconcile, in primary-key batches."""
+        min_age = self.min_age_minutes if min_age_minutes is None else min_age_minutes
+        queryset = Transaction.objects.filter(
+            payment_status='PENDING',
+            payment_method__in=GATEWAY_METHODS,
+            timestamp__lte=timezone.now() - timedelta(minutes=min_age),
+        ).select_related('item').order_by('pk')
+
+        last_pk, remaining = 0, limit
+        while remaining is None or remaining > 0:
+            size = self.batch_size if remaining is None else min(self.batch_size, remaining)
+            batch = list(queryset.filter(pk__gt=last_pk)[:size])
+            if not batch:
+                return
+            yield batch
+            last_pk = batch[-1].pk
+            if remaining is not None:
+                remaining -= len(batch)
+
+    def lookup(self, transaction):
+        """Gateway status of one transaction (runs in a pool thread; HTTP only)."""
+        try:
+            if PaymentSimulator.is_simulation_mode():
+                return PaymentSimulator.lookup_payment(transaction)
+            gateway = get_payment_gateway(transaction.payment_method)
+            return gateway.lookup_payment(transaction)
+        except Exception as e:
+            return {'status': 'ERROR', 'error': str(e)}
+
+    def reconcile(self, min_age_minutes=None, expire_after_hours=None, concurrency=None, limit=None):
+        """
+        Reconcile every candidate once.
+
+        Returns:
+            dict: counts of transactions checked, paid, failed, expired,
+                  still pending, skipped (settled meanwhile by a callback)
+                  and errors (lookup failed or could not be applied)
+        """
+        expiry_hours = self.expiry_hours if expire_after_hours is None else expire_after_hours
+        expires_before = timezone.now() - timedelta(hours=expiry_hours)
+        summary = {'checked': 0, 'paid': 0, 'failed': 0, 'expired': 0, 'pending': 0, 'skipped': 0, 'errors': 0}
+
+        with ThreadPoolExecutor(max_workers=concurrency or self.concurrency,
+                                thread_name_prefix='payment-reconcile') as pool:
+            for batch in self.candidates(min_age_minutes, limit):
+                for transaction, result in zip(batch, pool.map(self.lookup, batch)):
+                    summary['checked'] += 1
+                    summary[self.apply(transaction, result, expires_before)] += 1
+
+        if summary['checked']:
+            logger.info(f"Payment reconciliation: {summary}")
+        return summary
+
+    def apply(self, transaction, result, expires_before):
+        """Apply one lookup result; returns the summary key it counts towards."""
+        status = result.get('status')
+        label = f"{transaction.payment_method} transaction #{transaction.pk}"
+
+        if status == 'ERROR':
+            logger.warning(f"Payment lookup failed for {label}: {result.get('error')}")
+            return 'errors'
+
+        try:
+            if status == 'PAID':
+                _, changed = apply_verification(
+                    transaction.pk, True, result.get('reference'),
+                    note='Payment confirmed by reconciliation',
+                )
+                return 'paid' if changed else 'skipped'
+            if status == 'FAILED':
+                _, changed = apply_verification(
+                    transaction.pk, False, note='Payment failed at gateway (reconciliation)',
+                )
+                return 'failed' if changed else 'skipped'
+            if transaction.timestamp <= expires_before:
+                _, changed = apply_verification(
+                    transaction.pk, False,
+                    note=f"Expired: no completed {transaction.payment_method} payment found by reconciliation",
+                )
+                return 'expired' if changed else 'skipped'
+        except ValidationError as e:
+            # Paid at the gateway but the stock is gone: needs a person
+            logger.error(f"Cannot settle {label} reported {status}: {e}")
+            return 'errors'
+        return 'pending'
+
+
+# Module-level singleton
+payment_reconciler = PaymentReconciler()
@@ -63,6 +63,29 @@ class PaymentSimulator:
             'message': 'Payment simulated successfully (Test Mode)'
         }
     
+    # What lookup_payment() reports, by transaction id (set by tests)
+    lookup_outcomes = {}
+
+    @classmethod
+    def set_lookup_outcome(cls, transaction_id, status):
+        """Make lookup_payment() report `status` ('PAID', 'PENDING', 'FAILED', ...) for a transaction"""
+        cls.lookup_outcomes[transaction_id] = status
+
+    @classmethod
+    def lookup_payment(cls, transaction):
+        """
+        Simulate a gateway status lookup, as used by the payment reconciler
+        
+        A simulated payment is completed on the simulation page, so a
+        transaction that is still PENDING was abandoned: it is reported
+        NOT_FOUND unless set_lookup_outcome() says otherwise.
+        """
+        status = cls.lookup_outcomes.get(transaction.id, 'NOT_FOUND')
+        result = {'status': status}
+        if status == 'PAID':
+            result['reference'] = f"{transaction.payment_method}_SIM_{uuid.uuid4().hex[:8].upper()}"
+        return result
+    
     @staticmethod
     def get_simulation_message():
         """Get message to display in simulation mode"""
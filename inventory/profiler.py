@@ -0,0 +1,426 @@
+"""
+On-Demand Request Profiler
+==========================
+
+Lets an admin profile one request of a slow page to see whether Python
+code (ML, pandas, templates) or SQL dominates, without a profiler
+running for everyone else.
+
+How it works:
+1. An admin adds ?_profile=1 to a URL (or sends an "X-Profile: 1"
+   header). ProfilingMiddleware checks the flag against user_is_admin();
+   for anyone else the flag is ignored and the request runs as usual
+2. The request is profiled in one of two modes:
+   - sample (default, also ?_profile=1): a background thread records the
+     request thread's Python stack every PROFILE_SAMPLE_INTERVAL_MS.
+     Saved as a speedscope file (open at https://www.speedscope.app) -
+     a flamegraph in which time spent waiting on the database appears as
+     "SQL: ..." frames under the code that ran the query
+   - cprofile (?_profile=cprofile): deterministic cProfile, saved as a
+     .pstats file for `python -m pstats`, snakeviz and similar tools
+3. In both modes every query is captured with its duration and the
+   project stack frames (inventory/, users/) that issued it, and time is
+   broken down by package (sql, inventory, django, pandas, sklearn ...)
+4. Profiles are written to PROFILE_DIR (a JSON summary plus the profile
+   file) and only the newest PROFILE_KEEP are kept. The profiled
+   response carries an X-Profile-URL header pointing at the summary;
+   /inventory/profiles/ lists recent profiles with download links
+5. Under ASGI the view is run through sync_to_async() in the profiled
+   thread, so sync views - every page except the payment callbacks and
+   the live feed - are profiled the same way as under WSGI
+"""
+
+import cProfile
+import io
+import json
+import os
+import pstats
+import re
+import sys
+import threading
+import time
+import uuid
+from contextlib import ExitStack
+from pathlib import Path
+
+from asgiref.sync import async_to_sync, iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections
+from django.utils import timezone
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+MODES = ('sample', 'cprofile')
+PROFILE_ID_RE = re.compile(r'^[0-9a-f]{32}$')
+PROJECT_APPS = ('inventory', 'users', 'inventory_system')
+
+
+def _package_of(filename):
+    """Coarse owner of a source file: project app, installed package or stdlib."""
+    path = filename.replace('\\', '/')
+    if 'site-packages/' in path:
+        return path.split('site-packages/', 1)[1].split('/', 1)[0].removesuffix('.py')
+    base = str(settings.BASE_DIR).replace('\\', '/') + '/'
+    if path.startswith(base):
+        return path[len(base):].split('/', 1)[0]
+    if path.startswith(('<frozen', sys.prefix, sys.base_prefix)):
+        return 'stdlib'
+    return 'other'
+
+
+def _is_project_frame(filename):
+    return _package_of(filename) in PROJECT_APPS and not filename.endswith(('profiler.py', 'metrics.py'))
+
+
+def _project_stack(limit=6):
+    """The innermost `limit` project frames of the caller's stack, outermost first."""
+    frames = []
+    frame = sys._getframe(1)
+    while frame is not None and len(frames) < limit:
+        filename = frame.f_code.co_filename
+        if _is_project_frame(filename):
+            location = f"{os.path.basename(os.path.dirname(filename))}/{os.path.basename(filename)}"
+            frames.append(f"{location}:{frame.f_lineno} in {frame.f_code.co_name}")
+        frame = frame.f_back
+    return frames[::-1]
+
+
+class StackSampler:
+    """
+    Records one thread's Python stack at a fixed interval from a
+    background thread (a pure-Python sampling profiler).
+    """
+
+    def __init__(self, thread_id, interval):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.frames = []          # speedscope frames: {'name', 'file', 'line'}
+        self.frame_index = {}     # (name, file, line) -> index into frames
+        self.samples = []         # stacks of frame indices, root first
+        self.weights = []         # seconds each sample stands for
+        self.active_sql = None    # set by the SQL capture while a query runs
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='request-profiler', daemon=True)
+
+    def start(self):
+        self._started = time.perf_counter()
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        return time.perf_counter() - self._started
+
+    def _frame(self, name, filename, line):
+        key = (name, filename, line)
+        index = self.frame_index.get(key)
+        if index is None:
+            index = self.frame_index[key] = len(self.frames)
+            self.frames.append({'name': name, 'file': filename, 'line': line})
+        return index
+
+    def _run(self):
+        last = time.perf_counter()
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            now = time.perf_counter()
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(self._frame(code.co_name, code.co_filename, code.co_firstlineno))
+                frame = frame.f_back
+            stack.reverse()
+            sql = self.active_sql
+            if sql is not None:
+                stack.append(self._frame(f"SQL: {' '.join(sql.split())[:80]}", '<database>', 0))
+            self.samples.append(stack)
+            self.weights.append(now - last)
+            last = now
+
+
+class RequestProfiler:
+    """
+    Profiles single requests and keeps the newest results on disk.
+    """
+
+    # Read from settings on use, so changes to them apply without a restart
+
+    @property
+    def directory(self):
+        return Path(getattr(settings, 'PROFILE_DIR', settings.BASE_DIR / 'profiles'))
+
+    @property
+    def keep(self):
+        return getattr(settings, 'PROFILE_KEEP', 50)
+
+    @property
+    def sample_interval(self):
+        return getattr(settings, 'PROFILE_SAMPLE_INTERVAL_MS', 1) / 1000
+
+    @property
+    def max_queries(self):
+        return getattr(settings, 'PROFILE_MAX_QUERIES', 500)
+
+    # ------------------------------------------------------------------
+    # Profiling
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def requested_mode(request):
+        """'sample', 'cprofile' or None when the request did not ask to be profiled."""
+        flag = request.GET.get('_profile') or request.headers.get('X-Profile')
+        if not flag or flag in ('0', 'false', 'off'):
+            return None
+        return flag if flag in MODES else 'sample'
+
+    def run(self, request, mode, call):
+        """
+        Run `call()` (the rest of the request) in this thread under the
+        profiler, save the result and return the response.
+        """
+        queries = []
+        sampler = StackSampler(threading.get_ident(), self.sample_interval) if mode == 'sample' else None
+        profile = cProfile.Profile() if mode == 'cprofile' else None
+
+        def capture_sql(execute, sql, params, many, context):
+            if sampler is not None:
+                sampler.active_sql = sql
+            started = time.perf_counter()
+            try:
+                return execute(sql, params, many, context)
+            finally:
+                elapsed = time.perf_counter() - started
+                if sampler is not None:
+                    sampler.active_sql = None
+                if len(queries) < self.max_queries:
+                    queries.append({'sql': sql[:2000], 'seconds': elapsed, 'stack': _project_stack()})
+                else:
+                    queries.append({'sql': '', 'seconds': elapsed,
+                                    'stack': ['(not captured: PROFILE_MAX_QUERIES reached)']})
+
+        started_at = timezone.now()
+        with ExitStack() as stack:
+            for alias in connections:
+                stack.enter_context(connections[alias].execute_wrapper(capture_sql))
+            if sampler is not None:
+                sampler.start()
+            started = time.perf_counter()
+            if profile is not None:
+                profile.enable()
+            try:
+                response = call()
+            finally:
+                if profile is not None:
+                    profile.disable()
+                duration = time.perf_counter() - started
+                if sampler is not None:
+                    sampler.stop()
+
+        try:
+            profile_id = self.save(request, response, mode, started_at, duration, queries, sampler, profile)
+        except Exception as e:
+            logger.error(f"Could not save profile of {request.path}: {e}")
+            return response
+        response['X-Profile-Id'] = profile_id
+        response['X-Profile-URL'] = f"/inventory/profiles/{profile_id}/"
+        return response
+
+    # ------------------------------------------------------------------
+    # Summaries
+    # ------------------------------------------------------------------
+
+    def _sampled_summary(self, sampler):
+        """Top functions and time by package from the recorded stacks."""
+        self_time, total_time, by_package = {}, {}, {}
+        for stack, weight in zip(sampler.samples, sampler.weights):
+            leaf = sampler.frames[stack[-1]]
+            self_time[stack[-1]] = self_time.get(stack[-1], 0) + weight
+            for index in set(stack):
+                total_time[index] = total_time.get(index, 0) + weight
+            package = 'sql' if leaf['file'] == '<database>' else _package_of(leaf['file'])
+            by_package[package] = by_package.get(package, 0) + weight
+        functions = [
+            {
+                'function': sampler.frames[index]['name'],
+                'location': f"{sampler.frames[index]['file']}:{sampler.frames[index]['line']}",
+                'calls': None,
+                'self_seconds': self_time.get(index, 0),
+                'total_seconds': seconds,
+            }
+            for index, seconds in total_time.items()
+        ]
+        return functions, by_package
+
+    @staticmethod
+    def _cprofile_summary(profile, sql_seconds):
+        """Top functions and self time by package from cProfile stats."""
+        stats = pstats.Stats(profile, stream=io.StringIO())
+        functions, by_package = [], {}
+        for (filename, line, name), (_, calls, self_seconds, total_seconds, _) in stats.stats.items():
+            functions.append({
+                'function': name,
+                'location': f"{filename}:{line}",
+                'calls': calls,
+                'self_seconds': self_seconds,
+                'total_seconds': total_seconds,
+            })
+            package = _package_of(filename) if filename != '~' else 'builtins'
+            by_package[package] = by_package.get(package, 0) + self_seconds
+        by_package['sql'] = sql_seconds   # overlaps the database driver's own entries
+        return functions, by_package
+
+    @staticmethod
+    def _sql_call_sites(queries):
+        """Queries grouped by the innermost project frame that issued them, slowest first."""
+        sites = {}
+        for query in queries:
+            site = query['stack'][-1] if query['stack'] else '(outside project code)'
+            entry = sites.setdefault(site, {'site': site, 'queries': 0, 'seconds': 0.0})
+            entry['queries'] += 1
+            entry['seconds'] += query['seconds']
+        return sorted(sites.values(), key=lambda entry: entry['seconds'], reverse=True)
+
+    # ------------------------------------------------------------------
+    # Storage
+    # ------------------------------------------------------------------
+
+    def save(self, request, response, mode, started_at, duration, queries, sampler, profile):
+        """Write the summary and profile file; returns the profile id."""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        profile_id = uuid.uuid4().hex
+        sql_seconds = sum(query['seconds'] for query in queries)
+        match = getattr(request, 'resolver_match', None)
+        name = f"{request.method} {request.path}"
+
+        if mode == 'sample':
+            functions, by_package = self._sampled_summary(sampler)
+            filename = f"{profile_id}.speedscope.json"
+            (self.directory / filename).write_text(json.dumps({
+                '$schema': 'https://www.speedscope.app/file-format-schema.json',
+                'shared': {'frames': sampler.frames},
+                'profiles': [{
+                    'type': 'sampled',
+                    'name': name,
+                    'unit': 'seconds',
+                    'startValue': 0,
+                    'endValue': sum(sampler.weights),
+                    'samples': sampler.samples,
+                    'weights': sampler.weights,
+                }],
+                'name': name,
+                'activeProfileIndex': 0,
+                'exporter': 'inventory request profiler',
+            }))
+        else:
+            functions, by_package = self._cprofile_summary(profile, sql_seconds)
+            filename = f"{profile_id}.pstats"
+            profile.dump_stats(self.directory / filename)
+
+        summary = {
+            'id': profile_id,
+            'mode': mode,
+            'file': filename,
+            'created': started_at.isoformat(),
+            'method': request.method,
+            'path': request.get_full_path(),
+            'view': (match.view_name if match else None) or 'unmatched',
+            'user': request.user.get_username(),
+            'status': response.status_code,
+            'duration': duration,
+            'query_count': len(queries),
+            'sql_seconds': sql_seconds,
+            'samples': len(sampler.samples) if sampler is not None else None,
+            'by_package': sorted(by_package.items(), key=lambda pair: pair[1], reverse=True),
+            'top_cumulative': sorted(functions, key=lambda f: f['total_seconds'], reverse=True)[:30],
+            'top_self': sorted(functions, key=lambda f: f['self_seconds'], reverse=True)[:30],
+            'sql_call_sites': self._sql_call_sites(queries)[:30],
+            'queries': queries[:self.max_queries],
+        }
+        (self.directory / f"{profile_id}.json").write_text(json.dumps(summary))
+        self.prune()
+        logger.info(f"Profiled {name} ({mode}, {duration:.3f}s, {len(queries)} queries) as {profile_id}")
+        return profile_id
+
+    def _summaries(self):
+        """Summary files, newest first."""
+        if not self.directory.is_dir():
+            return []
+        paths = [path for path in self.directory.glob('*.json') if PROFILE_ID_RE.match(path.stem)]
+        return sorted(paths, key=os.path.getmtime, reverse=True)
+
+    def prune(self):
+        """Delete all but the newest PROFILE_KEEP profiles."""
+        for path in self._summaries()[self.keep:]:
+            for stale in self.directory.glob(f"{path.stem}.*"):
+                stale.unlink(missing_ok=True)
+
+    def recent(self):
+        """Summaries of the stored profiles, newest first (without per-query detail)."""
+        profiles = []
+        for path in self._summaries():
+            try:
+                summary = json.loads(path.read_text())
+            except (OSError, ValueError):
+                continue
+            for key in ('queries', 'top_cumulative', 'top_self', 'sql_call_sites'):
+                summary.pop(key, None)
+            profiles.append(summary)
+        return profiles
+
+    def get(self, profile_id):
+        """Full summary of one profile, or None."""
+        if not PROFILE_ID_RE.match(profile_id or ''):
+            return None
+        try:
+            return json.loads((self.directory / f"{profile_id}.json").read_text())
+        except (OSError, ValueError):
+            return None
+
+    def file_path(self, summary):
+        return self.directory / summary['file']
+
+
+# Module-level singleton
+request_profiler = RequestProfiler()
+
+
+class ProfilingMiddleware:
+    """
+    Profiles requests that carry the profile flag and come from an admin.
+    Must come after AuthenticationMiddleware.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        mode = request_profiler.requested_mode(request)
+        if mode is None or not self._allowed(request):
+            return self.get_response(request)
+        return request_profiler.run(request, mode, lambda: self.get_response(request))
+
+    async def __acall__(self, request):
+        mode = request_profiler.requested_mode(request)
+        if mode is None or not await sync_to_async(self._allowed)(request):
+            return await self.get_response(request)
+        # Run the rest of the request from a sync thread: sync views called
+        # through async_to_sync come back to this same thread, so the
+        # profiler sees them
+        call = async_to_sync(self.get_response)
+        return await sync_to_async(request_profiler.run)(request, mode, lambda: call(request))
+
+    @staticmethod
+    def _allowed(request):
+        from users.decorators import user_is_admin
+        return user_is_admin(request.user)
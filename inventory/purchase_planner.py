@@ -0,0 +1,278 @@
+"""
+Multi-Item Purchase Order Planner
+=================================
+
+Turns the per-item AI reorder suggestions into one draft purchase order per
+supplier, respecting minimum order quantities (MOQ), each supplier's shared
+lead time, a per-supplier order budget and an optional overall budget.
+
+How it works:
+1. One pass over the catalogue collects every item that needs reordering
+   (get_ai_reorder_suggestions) and groups the lines by Item.supplier
+2. Every line is sized for the lead time of the order it lands on: the
+   supplier's shared lead time, or its slowest item's when it has none
+3. Each line's target quantity is the AI suggestion rounded up to its MOQ
+4. Without any budget every line is ordered at its target quantity
+5. With budgets, quantities are chosen by a small mixed-integer program
+   (scipy.optimize.milp) over whole MOQ packs that maximises
+   urgency-weighted coverage of the targets; a greedy allocation is used if
+   the solver is unavailable or runs past PURCHASE_PLANNER_TIME_LIMIT
+"""
+
+from collections import OrderedDict
+from datetime import timedelta
+from decimal import Decimal, ROUND_HALF_UP
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+
+import logging
+logger = logging.getLogger(__name__)
+
+from .models import Item, PurchaseOrder, PurchaseOrderLine
+from .ml_predictor import get_ai_reorder_suggestions
+from .hierarchical_forecast import hierarchical_forecaster
+
+
+class PurchaseOrderPlanner:
+    """
+    Plans order quantities for every supplier in a single pass.
+    """
+
+    # Value of covering one full target quantity, by urgency
+    urgency_weights = {'CRITICAL': 8.0, 'HIGH': 4.0, 'MEDIUM': 2.0, 'LOW': 1.0}
+
+    # ------------------------------------------------------------------
+    # Planning
+    # ------------------------------------------------------------------
+
+    def build_plan(self, budget=None):
+        """
+        Build a draft plan for all items needing reorder.
+
+        Args:
+            budget: Optional overall spending limit (Decimal/float) across
+                    every supplier. Supplier.order_budget applies on top.
+
+        Returns:
+            dict: {
+                'orders': [per-supplier dicts with 'supplier', 'lines',
+                           'total_cost', 'expected_delivery', 'daily_demand'],
+                'unfunded': lines the budget could not cover,
+                'total_cost': Decimal,
+                'budget': budget,
+            }
+        """
+        order_lead_times = self._order_lead_times()
+
+        def lead_time(item):
+            return order_lead_times.get(item.supplier_id) or item.lead_time_days
+
+        lines = [
+            self._make_line(s['item'], s['recommendation'])
+            for s in get_ai_reorder_suggestions(lead_time=lead_time)
+        ]
+
+        quantities = self._allocate(lines, budget)
+        for line, qty in zip(lines, quantities):
+            line['quantity'] = qty
+            line['line_total'] = (line['unit_cost'] * qty).quantize(Decimal('0.01'))
+
+        supplier_demand = hierarchical_forecaster.forecast()['suppliers']
+        today = timezone.now().date()
+
+        groups = OrderedDict()
+        for line in lines:
+            if line['quantity'] > 0:
+                groups.setdefault(line['supplier_id'], []).append(line)
+
+        orders = []
+        for supplier_id, group in groups.items():
+            supplier = group[0]['item'].supplier
+            orders.append({
+                'supplier': supplier,
+                'lines': group,
+                'total_cost': sum((line['line_total'] for line in group), Decimal('0.00')),
+                'expected_delivery': today + timedelta(days=lead_time(group[0]['item'])),
+                'daily_demand': round(supplier_demand.get(supplier_id, 0.0), 2),
+            })
+
+        return {
+            'orders': orders,
+            'unfunded': [line for line in lines if line['quantity'] == 0],
+            'total_cost': sum((o['total_cost'] for o in orders), Decimal('0.00')),
+            'budget': budget,
+        }
+
+    def _order_lead_times(self):
+        """{supplier_id: shared lead time}, falling back to the slowest item's."""
+        rows = (
+            Item.objects.filter(supplier__isnull=False)
+            .values('supplier_id', 'supplier__lead_time_days')
+            .annotate(slowest=Max('lead_time_days'))
+        )
+        return {row['supplier_id']: row['supplier__lead_time_days'] or row['slowest'] for row in rows}
+
+    def _make_line(self, item, recommendation):
+        moq = max(1, item.min_order_quantity)
+        suggested = max(1, int(recommendation.get('suggested_quantity') or 0))
+        # Round up to a whole number of MOQ packs
+        target = -(-suggested // moq) * moq
+
+        unit_cost = item.cost_price if item.cost_price > 0 else item.price * Decimal('0.6')
+        unit_cost = Decimal(unit_cost).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+
+        urgency = recommendation.get('urgency', 'LOW')
+        return {
+            'item': item,
+            'supplier_id': item.supplier_id,
+            'urgency': urgency,
+            'recommendation': recommendation,
+            'suggested_quantity': suggested,
+            'moq': moq,
+            'target': target,
+            'unit_cost': unit_cost,
+            'weight': self.urgency_weights.get(urgency, 1.0),
+        }
+
+    # ------------------------------------------------------------------
+    # Allocation
+    # ------------------------------------------------------------------
+
+    def _budget_rows(self, lines, budget):
+        """Return [(line indices, limit)] for every active budget constraint."""
+        rows = []
+        if budget is not None:
+            rows.append((list(range(len(lines))), float(budget)))
+
+        by_supplier = OrderedDict()
+        for i, line in enumerate(lines):
+            supplier = line['item'].supplier
+            if supplier and supplier.order_budget is not None:
+                by_supplier.setdefault(supplier.id, (supplier.order_budget, []))[1].append(i)
+        for limit, indices in by_supplier.values():
+            rows.append((indices, float(limit)))
+        return rows
+
+    def _allocate(self, lines, budget):
+        if not lines:
+            return []
+
+        rows = self._budget_rows(lines, budget)
+        if not rows:
+            return [line['target'] for line in lines]
+
+        try:
+            return self._allocate_milp(lines, rows)
+        except Exception as e:
+            logger.warning(f"Purchase plan solver failed, using greedy allocation: {e}")
+            return self._allocate_greedy(lines, rows)
+
+    def _allocate_milp(self, lines, rows):
+        """
+        maximise   sum(w_i / target_i * moq_i * k_i)
+        subject to sum(cost_i * moq_i * k_i) <= limit     for every budget row
+                   0 <= k_i <= target_i / moq_i, k_i integer
+
+        k_i is the number of MOQ packs ordered, so quantities are whole packs
+        exactly as in the greedy allocation.
+        """
+        import numpy as np
+        from scipy import sparse
+        from scipy.optimize import milp, LinearConstraint, Bounds
+
+        n = len(lines)
+        cost = np.array([float(line['unit_cost']) for line in lines])
+        target = np.array([line['target'] for line in lines], dtype=float)
+        moq = np.array([line['moq'] for line in lines], dtype=float)
+        weight = np.array([line['weight'] for line in lines])
+
+        c = -(weight / target) * moq
+
+        # One sparse row per budget: only the lines it covers are non-zero
+        row_index, col_index, limits = [], [], []
+        for r, (indices, limit) in enumerate(rows):
+            row_index.extend([r] * len(indices))
+            col_index.extend(indices)
+            limits.append(limit)
+        A_budget = sparse.csr_matrix(
+            (cost[col_index] * moq[col_index], (row_index, col_index)), shape=(len(rows), n),
+        )
+
+        result = milp(
+            c,
+            constraints=[LinearConstraint(A_budget, -np.inf, np.array(limits))],
+            integrality=np.ones(n),
+            bounds=Bounds(np.zeros(n), target // moq),
+            options={'time_limit': settings.PURCHASE_PLANNER_TIME_LIMIT},
+        )
+        # status 1 is the time limit: the greedy allocation is used instead
+        if not result.success:
+            raise RuntimeError(result.message)
+
+        return [int(round(k)) * line['moq'] for k, line in zip(result.x, lines)]
+
+    def _allocate_greedy(self, lines, rows):
+        """Most urgent, cheapest-per-coverage lines first; trim the last one to fit."""
+        remaining = [limit for _, limit in rows]
+        rows_of = [[] for _ in lines]
+        for r, (indices, _) in enumerate(rows):
+            for i in indices:
+                rows_of[i].append(r)
+
+        order = sorted(
+            range(len(lines)),
+            key=lambda i: -lines[i]['weight'] / (lines[i]['target'] * float(lines[i]['unit_cost']) or 1e-9),
+        )
+
+        quantities = [0] * len(lines)
+        for i in order:
+            line = lines[i]
+            cost = float(line['unit_cost'])
+            qty = line['target']
+            if cost > 0:
+                affordable = min(remaining[r] for r in rows_of[i]) if rows_of[i] else float('inf')
+                qty = min(qty, int(affordable // cost))
+                # Whole MOQ packs only
+                qty -= qty % line['moq']
+            if qty < line['moq']:
+                continue
+            quantities[i] = qty
+            for r in rows_of[i]:
+                remaining[r] -= qty * cost
+        return quantities
+
+    # ------------------------------------------------------------------
+    # Persistence
+    # ------------------------------------------------------------------
+
+    def create_drafts(self, plan, user):
+        """Persist a plan as one DRAFT PurchaseOrder per supplier."""
+        created = []
+        with transaction.atomic():
+            for order in plan['orders']:
+                po = PurchaseOrder.objects.create(
+                    supplier=order['supplier'],
+                    expected_delivery=order['expected_delivery'],
+                    total_cost=order['total_cost'],
+                    created_by=user,
+                    notes='Drafted by purchase planner',
+                )
+                PurchaseOrderLine.objects.bulk_create([
+                    PurchaseOrderLine(
+                        purchase_order=po,
+                        item=line['item'],
+                        quantity=line['quantity'],
+                        unit_cost=line['unit_cost'],
+                        suggested_quantity=line['suggested_quantity'],
+                        urgency=line['urgency'],
+                    )
+                    for line in order['lines']
+                ])
+                created.append(po)
+        return created
+
+
+# Module-level singleton
+purchase_planner = PurchaseOrderPlanner()
@@ -0,0 +1,125 @@
+"""
+Background Reorder Snapshot Queue
+=================================
+
+Keeps demand forecasting out of Item.save(): an item whose stock or reorder
+inputs change is only marked stale, and its stored reorder snapshot
+(Item.reorder_*) is recomputed here, off the request path.
+
+How it works:
+1. Item.save() sets reorder_stale when it writes quantity, reorder_level,
+   lead_time_days or is_active, and wakes the in-process worker thread once
+   the row is committed
+2. The worker waits REORDER_SNAPSHOT_DELAY_SECONDS before draining, so a
+   burst of sales and purchases is refreshed in one batched pass instead of
+   one forecast per save
+3. Workers claim stale items with a conditional UPDATE (reorder_stale
+   True → False) before forecasting, so a change committed during the
+   refresh marks the item stale again and it is picked up on the next pass
+4. refresh_reorder_snapshot() recomputes the batch with a fixed number of
+   queries and writes only the snapshot columns
+5. `manage.py process_reorder_queue` drains the queue from a separate
+   process when REORDER_SNAPSHOT_IN_PROCESS_WORKER is False
+"""
+
+import threading
+import time
+
+from django.conf import settings
+from django.db import close_old_connections
+
+import logging
+logger = logging.getLogger(__name__)
+
+from .models import Item
+
+
+class ReorderSnapshotQueue:
+    """
+    Database-backed queue of items whose reorder snapshot is out of date.
+    """
+
+    def __init__(self, batch_size=500):
+        self.batch_size = batch_size
+        self._wake_event = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    # ------------------------------------------------------------------
+    # Producer side
+    # ------------------------------------------------------------------
+
+    def wake(self):
+        """Signal that items went stale; starts the in-process worker if needed."""
+        if not getattr(settings, 'REORDER_SNAPSHOT_IN_PROCESS_WORKER', True):
+            return  # A separate `process_reorder_queue` worker drains the queue
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='reorder-snapshot-worker', daemon=True)
+                self._thread.start()
+            self._wake_event.set()
+
+    # ------------------------------------------------------------------
+    # Consumer side
+    # ------------------------------------------------------------------
+
+    def stale_ids(self):
+        return Item.all_objects.filter(reorder_stale=True).order_by('pk').values_list('pk', flat=True)
+
+    def claim_batch(self, pks):
+        """
+        Clear the stale flag of several items with one UPDATE.
+
+        Returns:
+            int: Number of items claimed
+        """
+        return Item.all_objects.filter(pk__in=pks, reorder_stale=True).update(reorder_stale=False)
+
+    def process_stale(self, limit=None):
+        """
+        Refresh every stale item (or at most `limit` items) in batches.
+
+        Returns:
+            int: Number of active items refreshed
+        """
+        from .ml_predictor import refresh_reorder_snapshot
+
+        refreshed = 0
+        seen = 0
+        while limit is None or seen < limit:
+            size = self.batch_size if limit is None else min(self.batch_size, limit - seen)
+            pks = list(self.stale_ids()[:size])
+            if not pks:
+                break
+            seen += len(pks)
+            if not self.claim_batch(pks):
+                continue
+            # Deactivated items only drop their flag
+            items = Item.objects.filter(pk__in=pks).select_related('supplier')
+            refreshed += refresh_reorder_snapshot(items, batch_size=self.batch_size)
+        return refreshed
+
+    def _run(self):
+        """In-process worker loop; exits when nothing is stale."""
+        delay = getattr(settings, 'REORDER_SNAPSHOT_DELAY_SECONDS', 5)
+        while True:
+            # Let the rest of a burst of stock changes arrive first
+            time.sleep(delay)
+            self._wake_event.clear()
+            try:
+                refreshed = self.process_stale()
+                if refreshed:
+                    logger.info(f"Refreshed reorder snapshot for {refreshed} item(s)")
+            except Exception as e:
+                logger.error(f"Reorder snapshot worker error: {e}")
+            finally:
+                close_old_connections()
+
+            with self._lock:
+                if not self._wake_event.is_set():
+                    self._thread = None
+                    return
+
+
+# Module-level singleton
+reorder_queue = ReorderSnapshotQueue()
@@ -0,0 +1,219 @@
+"""
+Daily Sales Rollups
+===================
+
+Paid sales pre-aggregated into DailySales rows (one per day, item,
+customer and payment method), so questions about a date range read a few
+rollup rows instead of every transaction in it.
+
+How it works:
+1. Saving a sale re-aggregates its (day, item) bucket from the transaction
+   table inside the same database transaction, so the rollup commits or
+   rolls back with the sale, and edits (a PENDING sale becoming PAID, a
+   soft delete) are reflected exactly. A hard-deleted sale does the same;
+   bulk deletes through a queryset are left to the caller, like
+   queryset.update(), and deleting an item cascades to its rows
+2. rebuild() recomputes a range of days with one grouped query. Run the
+   rebuild_sales_rollups command after imports that bypass save()
+   (bulk_create, raw SQL); seed_load_dataset does so itself
+3. verify() compares the stored totals per day and item with the
+   transaction table and returns the buckets that differ
+4. sales_summary() answers one metric (units, revenue or profit) for a
+   date range, optionally for one item and grouped by item, supplier,
+   customer or payment method, in two queries over the rollup rows.
+   Profit uses each item's current cost price, like
+   Transaction.total_profit and the monthly report
+"""
+
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import transaction as db_transaction
+from django.db.models import Count, DecimalField, ExpressionWrapper, F, Sum
+from django.db.models.functions import TruncDate
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+import logging
+logger = logging.getLogger(__name__)
+
+from .models import DailySales, Transaction
+
+
+METRICS = ('units', 'revenue', 'profit')
+
+# grouping -> (key fields of the rollup row, label field, label when the key is empty)
+GROUPINGS = {
+    'item':           (('item_id', 'item__name'), 'item__name', 'Unknown item'),
+    'supplier':       (('item__supplier_id', 'item__supplier__name'), 'item__supplier__name', 'No supplier'),
+    'customer':       (('customer_id', 'customer__name'), 'customer__name', 'Walk-in (no customer)'),
+    'payment_method': (('payment_method',), 'payment_method', 'Unknown'),
+}
+
+PAYMENT_METHOD_LABELS = dict(Transaction.PAYMENT_METHOD_CHOICES)
+
+
+def _paid_sales():
+    return Transaction.objects.filter(transaction_type='SALE', payment_status='PAID')
+
+
+def _aggregate(transactions):
+    """Rollup rows (unsaved) for a queryset of transactions."""
+    rows = (
+        transactions.filter(transaction_type='SALE', payment_status='PAID')
+        .values('item_id', 'customer_id', 'payment_method', day=TruncDate('timestamp'))
+        .annotate(units=Sum('quantity'), revenue=Sum('total_amount'), sales_count=Count('id'))
+        .order_by()
+    )
+    return (DailySales(**row) for row in rows.iterator())
+
+
+def refresh_bucket(item_id, day):
+    """Recompute the rollup rows of one item on one day."""
+    rows = list(_aggregate(Transaction.objects.filter(item_id=item_id, timestamp__date=day)))
+    with db_transaction.atomic():
+        DailySales.objects.filter(item_id=item_id, day=day).delete()
+        if rows:
+            DailySales.objects.bulk_create(rows)
+
+
+def rebuild(start=None, end=None, batch_size=1000):
+    """
+    Recompute every rollup row from `start` to `end` (inclusive dates; open
+    ended when None). Returns the number of rows written.
+    """
+    stored = DailySales.objects.all()
+    transactions = Transaction.objects.all()
+    if start is not None:
+        stored = stored.filter(day__gte=start)
+        transactions = transactions.filter(timestamp__date__gte=start)
+    if end is not None:
+        stored = stored.filter(day__lte=end)
+        transactions = transactions.filter(timestamp__date__lte=end)
+
+    written = 0
+    with db_transaction.atomic():
+        stored.delete()
+        batch = []
+        for row in _aggregate(transactions):
+            batch.append(row)
+            if len(batch) >= batch_size:
+                DailySales.objects.bulk_create(batch)
+                written += len(batch)
+                batch = []
+        if batch:
+            DailySales.objects.bulk_create(batch)
+            written += len(batch)
+    logger.info(f"Rebuilt {written} daily sales row(s) from {start or 'the first sale'} to {end or 'today'}")
+    return written
+
+
+def verify(start=None, end=None):
+    """
+    Buckets whose stored totals differ from the transaction table, as
+    (day, item_id, expected, stored) with (units, revenue, sales_count)
+    tuples; an empty list when the rollup is in sync.
+    """
+    expected, stored = {}, {}
+    transactions = _paid_sales()
+    rollups = DailySales.objects.all()
+    if start is not None:
+        transactions = transactions.filter(timestamp__date__gte=start)
+        rollups = rollups.filter(day__gte=start)
+    if end is not None:
+        transactions = transactions.filter(timestamp__date__lte=end)
+        rollups = rollups.filter(day__lte=end)
+
+    rows = (
+        transactions.values('item_id', day=TruncDate('timestamp'))
+        .annotate(units=Sum('quantity'), revenue=Sum('total_amount'), sales_count=Count('id'))
+        .order_by()
+    )
+    for row in rows.iterator():
+        expected[(row['day'], row['item_id'])] = (row['units'], row['revenue'], row['sales_count'])
+    rows = (
+        rollups.values('day', 'item_id')
+        .annotate(total_units=Sum('units'), total_revenue=Sum('revenue'), total_sales=Sum('sales_count'))
+        .order_by()
+    )
+    for row in rows.iterator():
+        if row['total_sales']:
+            stored[(row['day'], row['item_id'])] = (row['total_units'], row['total_revenue'], row['total_sales'])
+
+    empty = (0, Decimal('0.00'), 0)
+    return sorted(
+        (day, item_id, expected.get((day, item_id), empty), stored.get((day, item_id), empty))
+        for day, item_id in expected.keys() | stored.keys()
+        if expected.get((day, item_id)) != stored.get((day, item_id))
+    )
+
+
+def _profit():
+    return ExpressionWrapper(
+        F('revenue') - F('units') * F('item__cost_price'),
+        output_field=DecimalField(max_digits=16, decimal_places=2),
+    )
+
+
+def sales_summary(metric, start, end, item_id=None, group_by=None, limit=10):
+    """
+    Totals of paid sales from `start` to `end` (inclusive dates) and, with
+    `group_by`, the `limit` groups with the highest `metric`:
+
+        {'units', 'revenue', 'profit', 'sales_count',
+         'groups': [(label, value), ...], 'more_groups': bool}
+    """
+    if metric not in METRICS:
+        raise ValueError(f"Unknown metric {metric!r}; use one of {', '.join(METRICS)}")
+    rows = DailySales.objects.filter(day__gte=start, day__lte=end)
+    if item_id is not None:
+        rows = rows.filter(item_id=item_id)
+
+    totals = rows.aggregate(
+        total_units=Sum('units'), total_revenue=Sum('revenue'), total_profit=Sum(_profit()),
+        total_sales=Sum('sales_count'),
+    )
+    summary = {
+        'units': totals['total_units'] or 0,
+        'revenue': totals['total_revenue'] or Decimal('0.00'),
+        'profit': totals['total_profit'] or Decimal('0.00'),
+        'sales_count': totals['total_sales'] or 0,
+        'groups': [],
+        'more_groups': False,
+    }
+    if group_by is None or not summary['sales_count']:
+        return summary
+
+    keys, label_field, empty_label = GROUPINGS[group_by]
+    value = {'units': Sum('units'), 'revenue': Sum('revenue'), 'profit': Sum(_profit())}[metric]
+    groups = list(rows.values(*keys).annotate(value=value).order_by('-value', label_field)[:limit + 1])
+    for group in groups[:limit]:
+        label = group[label_field]
+        if group_by == 'payment_method':
+            label = PAYMENT_METHOD_LABELS.get(label, label)
+        summary['groups'].append((label or empty_label, group['value'] or 0))
+    summary['more_groups'] = len(groups) > limit
+    return summary
+
+
+def clamp_range(start, end, max_days):
+    """(start, end, clamped): the range cut to its last `max_days` days."""
+    if (end - start).days + 1 <= max_days:
+        return start, end, False
+    return end - timedelta(days=max_days - 1), end, True
+
+
+@receiver(post_save, sender=Transaction)
+def _sale_saved(sender, instance, created, **kwargs):
+    # A new sale that is not paid yet adds nothing to the rollup
+    if instance.transaction_type != 'SALE' or (created and instance.payment_status != 'PAID'):
+        return
+    refresh_bucket(instance.item_id, timezone.localdate(instance.timestamp))
+
+
+@receiver(post_delete, sender=Transaction)
+def _sale_deleted(sender, instance, origin=None, **kwargs):
+    # Only Transaction.hard_delete(); queryset and cascading deletes are bulk operations
+    if instance.transaction_type == 'SALE' and isinstance(origin, Transaction):
+        refresh_bucket(instance.item_id, timezone.localdate(instance.timestamp))
@@ -0,0 +1,358 @@
+"""
+In-Process Search Index
+=======================
+
+Fast ranked search over items, suppliers and customers without
+`icontains` table scans. Works the same on MySQL and SQLite.
+
+How it works:
+1. Each searchable model gets a TrigramIndex built once per process from a
+   single values() query: every name is split into padded character
+   trigrams with a posting set per trigram
+2. Exact keys (item SKU, supplier/customer email) live in a sorted list, so
+   prefix lookups are a bisect rather than a scan; names get the same
+   treatment for "starts with" matches. Keys are trigram-indexed too, so
+   "example.com" finds customers by their email domain
+3. Fuzzy matches count shared trigrams over the rarest posting sets only
+   (bounded work for common trigrams), then re-rank the best candidates by
+   trigram similarity with bonuses for prefix and whole-word matches
+4. post_save / post_delete signals keep the index in sync within the
+   process; changes made by other processes are picked up incrementally
+   (rows with a newer updated_at) at most every `sync_interval` seconds
+
+Only primary keys are stored in the index — callers load the rows they
+display, so prices and stock levels are never stale.
+"""
+
+import re
+import heapq
+import threading
+import time
+from bisect import bisect_left, insort
+from collections import Counter, defaultdict
+from itertools import islice
+from operator import itemgetter
+
+from django.db.models import Count, Max
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+import logging
+logger = logging.getLogger(__name__)
+
+from .models import Item, Supplier, Customer
+
+
+_NON_WORD = re.compile(r'[^a-z0-9@.]+')
+_WORD_SPLIT = re.compile(r'[\s@.]+')
+_EMPTY = frozenset()
+
+
+def normalize(text):
+    """Lower-case and collapse everything but letters, digits, '@' and '.' to single spaces."""
+    return _NON_WORD.sub(' ', (text or '').lower()).strip()
+
+
+def trigrams(text):
+    """Padded character trigrams of every word ("  w", " wi", "wid", ..., "et ")."""
+    grams = set()
+    for word in _WORD_SPLIT.split(text):
+        if not word:
+            continue
+        padded = f'  {word} '
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+class TrigramIndex:
+    """
+    Trigram + sorted-key index over one model.
+    """
+
+    def __init__(self, min_similarity=0.4, candidate_budget=5000, rerank_size=200):
+        self.min_similarity = min_similarity
+        # Maximum posting entries counted per fuzzy lookup
+        self.candidate_budget = candidate_budget
+        # Candidates re-ranked by exact similarity per lookup
+        self.rerank_size = rerank_size
+        self.docs = {}                    # pk -> (normalized text, trigram set, keys)
+        self.postings = defaultdict(set)  # trigram -> {pk}
+        self.keys = []                    # sorted [(normalized key, pk)]
+        self.names = []                   # sorted [(normalized text, pk)]
+
+    def __len__(self):
+        return len(self.docs)
+
+    def add(self, pk, text, keys=()):
+        text = normalize(text)
+        keys = tuple(k for k in (normalize(k) for k in keys) if k)
+        existing = self.docs.get(pk)
+        if existing and existing[0] == text and existing[2] == keys:
+            return  # Unchanged (e.g. a stock update)
+        self.remove(pk)
+
+        grams = trigrams(' '.join((text,) + keys))
+        self.docs[pk] = (text, grams, keys)
+        for gram in grams:
+            self.postings[gram].add(pk)
+        for key in keys:
+            insort(self.keys, (key, pk))
+        insort(self.names, (text, pk))
+
+    def load(self, rows):
+        """Bulk-add (pk, text, keys) rows into an empty index; sorts once at the end."""
+        for pk, text, keys in rows:
+            text = normalize(text)
+            keys = tuple(k for k in (normalize(k) for k in keys) if k)
+            grams = trigrams(' '.join((text,) + keys))
+            self.docs[pk] = (text, grams, keys)
+            for gram in grams:
+                self.postings[gram].add(pk)
+            self.keys.extend((key, pk) for key in keys)
+            self.names.append((text, pk))
+        self.keys.sort()
+        self.names.sort()
+
+    def remove(self, pk):
+        doc = self.docs.pop(pk, None)
+        if doc is None:
+            return
+        text, grams, keys = doc
+        for gram in grams:
+            posting = self.postings.get(gram)
+            if posting is not None:
+                posting.discard(pk)
+                if not posting:
+                    del self.postings[gram]
+        for key in keys:
+            self._remove_sorted(self.keys, (key, pk))
+        self._remove_sorted(self.names, (text, pk))
+
+    @staticmethod
+    def _remove_sorted(entries, entry):
+        i = bisect_left(entries, entry)
+        if i < len(entries) and entries[i] == entry:
+            del entries[i]
+
+    @staticmethod
+    def _prefix_hits(entries, prefix, limit):
+        hits = []
+        i = bisect_left(entries, (prefix,))
+        while i < len(entries) and len(hits) < limit and entries[i][0].startswith(prefix):
+            hits.append(entries[i])
+            i += 1
+        return hits
+
+    def search(self, query, limit=10):
+        """
+        Ranked lookup.
+
+        Returns:
+            list: [(pk, score)] best first, at most `limit` entries
+        """
+        q = normalize(query)
+        if not q:
+            return []
+
+        scores = {}
+
+        # 1. Exact key / key prefix (SKU, email)
+        for key, pk in self._prefix_hits(self.keys, q, limit):
+            scores[pk] = 3.0 if key == q else 2.0
+
+        # 2. Name prefix
+        for text, pk in self._prefix_hits(self.names, q, limit):
+            scores[pk] = max(scores.get(pk, 0), 1.5 if text == q else 1.0 + self._similarity(q, pk))
+
+        # 3. Fuzzy trigram match, unless the prefix matches already fill the page
+        if len(scores) < limit:
+            qgrams = trigrams(q)
+            for pk in self._fuzzy_candidates(qgrams):
+                text = self.docs[pk][0]
+                sim = self._similarity(q, pk, qgrams)
+                if f' {q}' in f' {text}':
+                    sim += 0.5   # whole-word prefix inside the name
+                if sim >= self.min_similarity:
+                    scores[pk] = max(scores.get(pk, 0), sim)
+
+        ranked = sorted(scores.items(), key=lambda kv: (-kv[1], self.docs[kv[0]][0]))
+        return ranked[:limit]
+
+    def _fuzzy_candidates(self, qgrams):
+        postings = sorted((self.postings.get(g, _EMPTY) for g in qgrams), key=len)
+        postings = [p for p in postings if p]
+        if not postings:
+            return []
+
+        counts = Counter()
+        budget = self.candidate_budget
+        for posting in postings:
+            if len(posting) > budget:
+                break
+            counts.update(posting)
+            budget -= len(posting)
+
+        if not counts:
+            # Every trigram is common: prefer names containing all of them,
+            # shortest first, from a bounded sample
+            common = set.intersection(*postings) or postings[0]
+            sample = islice(common, self.candidate_budget)
+            return heapq.nsmallest(self.rerank_size, sample, key=lambda pk: len(self.docs[pk][1]))
+
+        return [pk for pk, _ in heapq.nlargest(self.rerank_size, counts.items(), key=itemgetter(1))]
+
+    def _similarity(self, q, pk, qgrams=None):
+        """
+        Share of the query's trigrams found in the name, blended with
+        whole-name Jaccard similarity so shorter names win ties.
+        """
+        qgrams = trigrams(q) if qgrams is None else qgrams
+        grams = self.docs[pk][1]
+        if not qgrams:
+            return 0.0
+        shared = len(qgrams & grams)
+        coverage = shared / len(qgrams)
+        jaccard = shared / (len(qgrams) + len(grams) - shared)
+        return 0.75 * coverage + 0.25 * jaccard
+
+
+class SearchIndex:
+    """
+    Registry of per-model trigram indexes, built lazily and kept in sync.
+    """
+
+    # kind -> (model, text field, key fields)
+    sources = {
+        'items':     (Item,     'name', ('sku',)),
+        'suppliers': (Supplier, 'name', ('email',)),
+        'customers': (Customer, 'name', ('email',)),
+    }
+
+    def __init__(self, sync_interval=30):
+        self.sync_interval = sync_interval
+        self._indexes = {}
+        self._state = {}       # kind -> {'rows', 'watermark', 'checked'}
+        self._lock = threading.RLock()
+
+    # ------------------------------------------------------------------
+    # Public API
+    # ------------------------------------------------------------------
+
+    def search(self, kind, query, limit=10):
+        """Ranked [(pk, score)] for `query` in the given kind's index."""
+        with self._lock:
+            return self._get(kind).search(query, limit)
+
+    def search_ids(self, kind, query, limit=10):
+        """Ranked primary keys only."""
+        return [pk for pk, _ in self.search(kind, query, limit)]
+
+    def index_instance(self, instance):
+        kind = self._kind_of(instance)
+        if kind is None:
+            return
+        with self._lock:
+            if kind not in self._indexes:
+                return  # Not built yet in this process; the first lookup will load it
+            index = self._indexes[kind]
+            if getattr(instance, 'is_active', True):
+                _, text_field, key_fields = self.sources[kind]
+                index.add(instance.pk, getattr(instance, text_field),
+                          [getattr(instance, f) for f in key_fields])
+            else:
+                index.remove(instance.pk)
+
+    def remove_instance(self, instance):
+        kind = self._kind_of(instance)
+        with self._lock:
+            if kind in self._indexes:
+                self._indexes[kind].remove(instance.pk)
+
+    def rebuild(self, kind=None):
+        """Drop and rebuild one index (or all) from the database."""
+        with self._lock:
+            for k in ([kind] if kind else list(self.sources)):
+                self._indexes.pop(k, None)
+                self._get(k)
+
+    # ------------------------------------------------------------------
+    # Build / sync
+    # ------------------------------------------------------------------
+
+    def _kind_of(self, instance):
+        for kind, (model, _, _) in self.sources.items():
+            if isinstance(instance, model):
+                return kind
+        return None
+
+    def _fingerprint(self, model):
+        return model.all_objects.aggregate(rows=Count('id'), watermark=Max('updated_at'))
+
+    def _get(self, kind):
+        if kind not in self.sources:
+            raise KeyError(f"Unknown search index: {kind}")
+
+        index = self._indexes.get(kind)
+        if index is None:
+            index = self._build(kind)
+        elif time.monotonic() - self._state[kind]['checked'] > self.sync_interval:
+            index = self._sync(kind, index)
+        return index
+
+    def _build(self, kind):
+        model, text_field, key_fields = self.sources[kind]
+        started = time.monotonic()
+
+        state = self._fingerprint(model)
+        index = TrigramIndex()
+        index.load(
+            (row[0], row[1], row[2:])
+            for row in model.objects.values_list('id', text_field, *key_fields).iterator()
+        )
+
+        state['checked'] = time.monotonic()
+        self._indexes[kind], self._state[kind] = index, state
+        logger.info(f"Built {kind} search index: {len(index)} rows in {time.monotonic() - started:.2f}s")
+        return index
+
+    def _sync(self, kind, index):
+        """Apply changes made by other processes since the last check."""
+        model, text_field, key_fields = self.sources[kind]
+        state = self._state[kind]
+        current = self._fingerprint(model)
+
+        if current['rows'] < state['rows']:
+            return self._build(kind)  # Hard deletes: start over
+
+        if current['watermark'] != state['watermark'] or current['rows'] != state['rows']:
+            changed = model.all_objects.all()
+            if state['watermark'] is not None:
+                # auto_now stamps every insert and update, new rows included
+                changed = changed.filter(updated_at__gt=state['watermark'])
+            for row in changed.values_list('id', 'is_active', text_field, *key_fields).iterator():
+                if row[1]:
+                    index.add(row[0], row[2], row[3:])
+                else:
+                    index.remove(row[0])
+
+        current['checked'] = time.monotonic()
+        self._state[kind] = current
+        return index
+
+
+# Module-level singleton
+search_index = SearchIndex()
+
+
+@receiver(post_save, sender=Item)
+@receiver(post_save, sender=Supplier)
+@receiver(post_save, sender=Customer)
+def _index_on_save(sender, instance, **kwargs):
+    search_index.index_instance(instance)
+
+
+@receiver(post_delete, sender=Item)
+@receiver(post_delete, sender=Supplier)
+@receiver(post_delete, sender=Customer)
+def _unindex_on_delete(sender, instance, **kwargs):
+    search_index.remove_instance(instance)
@@ -0,0 +1,196 @@
+"""
+Catalogue Stock Counters
+========================
+
+Headline numbers (item counts per stock status, stock value at price and
+at cost, reorder alert counts) maintained in the single StockCounters row,
+so the item list, the dashboard and the chatbot read one row instead of
+aggregating the whole item table.
+
+How it works:
+1. Each active item contributes to the counters according to its stored
+   state (COUNTED_FIELDS): 1 to total_items and to its stock status,
+   price x quantity to stock_value, and so on
+2. Item.save() reads the row's stored state under a row lock, saves, and
+   adds the difference between the old and new contribution to the
+   counters with one UPDATE, all in the item's database transaction. A
+   hard delete subtracts the item's contribution the same way, and
+   bulk_update() does the same for batches (the reorder snapshot refresh)
+3. queryset.update() and bulk_create() bypass all of this: call rebuild()
+   afterwards (admin actions and seed_load_dataset do). The
+   rebuild_stock_counters command verifies or rebuilds the row. The row is
+   created by migration 0025; read() rebuilds it should it ever be missing
+4. Stock status follows the item list filters: in stock above the reorder
+   level, low stock at or below it but above zero, out of stock at zero
+"""
+
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, DecimalField, F, Q, Sum
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+from django.utils import timezone
+
+import logging
+logger = logging.getLogger(__name__)
+
+from .models import Item, StockCounters
+
+
+# Item fields a counter depends on
+COUNTED_FIELDS = (
+    'is_active', 'quantity', 'reorder_level', 'price', 'cost_price',
+    'reorder_needed', 'reorder_urgency', 'reorder_ai_powered',
+)
+
+COUNTERS = (
+    'total_items', 'in_stock', 'low_stock', 'out_of_stock', 'stock_value', 'stock_cost',
+    'reorder_alerts', 'critical_alerts', 'high_alerts', 'medium_alerts', 'ai_powered_alerts',
+)
+
+SINGLETON_PK = 1
+
+
+def contribution(state):
+    """Counter values one item adds, from a dict of its COUNTED_FIELDS (None for no item)."""
+    if not state or not state['is_active']:
+        return {}
+    quantity, level = state['quantity'], state['reorder_level']
+    needed, urgency = state['reorder_needed'], state['reorder_urgency']
+    return {
+        'total_items': 1,
+        'in_stock': int(quantity > level),
+        'low_stock': int(0 < quantity <= level),
+        'out_of_stock': int(quantity == 0),
+        'stock_value': Decimal(str(state['price'])) * quantity,
+        'stock_cost': Decimal(str(state['cost_price'])) * quantity,
+        'reorder_alerts': int(needed),
+        'critical_alerts': int(needed and urgency == 'CRITICAL'),
+        'high_alerts': int(needed and urgency == 'HIGH'),
+        'medium_alerts': int(needed and urgency == 'MEDIUM'),
+        'ai_powered_alerts': int(needed and state['reorder_ai_powered']),
+    }
+
+
+class StockCounterStore:
+    """
+    Reads and maintains the StockCounters row.
+    """
+
+    # ------------------------------------------------------------------
+    # Item states
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def state_of(item):
+        return {field: getattr(item, field) for field in COUNTED_FIELDS}
+
+    @staticmethod
+    def stored_states(pks):
+        """{pk: stored state} for the given items, locked until the transaction ends."""
+        rows = Item.all_objects.select_for_update().filter(pk__in=pks).values('pk', *COUNTED_FIELDS)
+        return {row.pop('pk'): row for row in rows}
+
+    @staticmethod
+    def change(old, new, into=None):
+        """Add the counter change from item state `old` to `new` to the dict `into` (returned)."""
+        delta = {} if into is None else into
+        before, after = contribution(old), contribution(new)
+        for counter in COUNTERS:
+            diff = after.get(counter, 0) - before.get(counter, 0)
+            if diff:
+                delta[counter] = delta.get(counter, 0) + diff
+        return delta
+
+    # ------------------------------------------------------------------
+    # Writes
+    # ------------------------------------------------------------------
+
+    def apply(self, delta):
+        """Add `delta` ({counter: change}) to the row in one UPDATE."""
+        delta = {counter: diff for counter, diff in delta.items() if diff}
+        if not delta:
+            return
+        updates = {counter: F(counter) + diff for counter, diff in delta.items()}
+        # A missing row is built from scratch by the next read()
+        StockCounters.objects.filter(pk=SINGLETON_PK).update(updated_at=timezone.now(), **updates)
+
+    def bulk_update(self, items, fields, batch_size=500):
+        """Item.all_objects.bulk_update() that keeps the counters in step."""
+        counted = [field for field in fields if field in COUNTED_FIELDS]
+        with transaction.atomic():
+            for start in range(0, len(items), batch_size):
+                batch = items[start:start + batch_size]
+                stored = self.stored_states([item.pk for item in batch]) if counted else {}
+                Item.all_objects.bulk_update(batch, fields, batch_size=batch_size)
+                delta = {}
+                for item in batch:
+                    old = stored.get(item.pk)
+                    if old is not None:
+                        self.change(old, {**old, **{field: getattr(item, field) for field in counted}}, into=delta)
+                self.apply(delta)
+
+    def rebuild(self):
+        """Recompute the row from the item table; returns it."""
+        with transaction.atomic():
+            values = self.compute()
+            counters, _ = StockCounters.objects.update_or_create(
+                pk=SINGLETON_PK, defaults={**values, 'updated_at': timezone.now()},
+            )
+        return counters
+
+    # ------------------------------------------------------------------
+    # Reads
+    # ------------------------------------------------------------------
+
+    def read(self):
+        """The StockCounters row (one query), built first if missing."""
+        counters = StockCounters.objects.filter(pk=SINGLETON_PK).first()
+        if counters is None:
+            logger.info("Stock counters missing; rebuilding them from the item table")
+            counters = self.rebuild()
+        return counters
+
+    @staticmethod
+    def compute():
+        """Every counter aggregated from the item table in one query."""
+        needed = Q(reorder_needed=True)
+        money = DecimalField(max_digits=16, decimal_places=2)
+        values = Item.objects.aggregate(
+            total_items=Count('id'),
+            in_stock=Count('id', filter=Q(quantity__gt=F('reorder_level'))),
+            low_stock=Count('id', filter=Q(quantity__lte=F('reorder_level'), quantity__gt=0)),
+            out_of_stock=Count('id', filter=Q(quantity=0)),
+            stock_value=Sum(F('price') * F('quantity'), output_field=money),
+            stock_cost=Sum(F('cost_price') * F('quantity'), output_field=money),
+            reorder_alerts=Count('id', filter=needed),
+            critical_alerts=Count('id', filter=needed & Q(reorder_urgency='CRITICAL')),
+            high_alerts=Count('id', filter=needed & Q(reorder_urgency='HIGH')),
+            medium_alerts=Count('id', filter=needed & Q(reorder_urgency='MEDIUM')),
+            ai_powered_alerts=Count('id', filter=needed & Q(reorder_ai_powered=True)),
+        )
+        # Whole cents: SQLite sums decimals as floats
+        values['stock_value'] = (values['stock_value'] or Decimal('0')).quantize(Decimal('0.01'))
+        values['stock_cost'] = (values['stock_cost'] or Decimal('0')).quantize(Decimal('0.01'))
+        return values
+
+    def verify(self):
+        """{counter: (expected, stored)} for every counter that has drifted; empty when in sync."""
+        expected = self.compute()
+        stored = StockCounters.objects.filter(pk=SINGLETON_PK).values(*COUNTERS).first() or {}
+        return {
+            counter: (expected[counter], stored.get(counter))
+            for counter in COUNTERS
+            if stored.get(counter) is None or expected[counter] != stored[counter]
+        }
+
+
+# Module-level singleton
+stock_counters = StockCounterStore()
+
+
+@receiver(post_delete, sender=Item)
+def _item_deleted(sender, instance, **kwargs):
+    # Runs inside the delete's transaction; soft deletes go through Item.save()
+    stock_counters.apply(stock_counters.change(stock_counters.state_of(instance), None))
@@ -0,0 +1,252 @@
+"""
+Stock Threshold Events
+======================
+
+Push-based low-stock alerting: work is done when stock changes, not by
+rescanning the catalogue.
+
+How it works:
+1. Item.save() compares the stored quantity / reorder level with the new
+   values and calls emit_threshold_crossings(). Transaction.save(), the
+   stock adjustment view, item edits and placed purchase orders all save
+   the item, so every stock mutation passes through here
+2. refresh_reorder_snapshot() (ml_predictor.py) emits STOCKOUT_RISK when an
+   item's projected stockout newly falls inside its lead time
+3. Events are plain dicts delivered to subscribers only after the
+   surrounding transaction commits, so a rolled-back sale alerts nobody.
+   A failing subscriber is logged and never affects the others or the save
+4. Built-in subscribers:
+   - in-app: every event is written to the StockEvent log, and alerts
+     become Notification rows shared by every user (notifications.py)
+   - email: alerts go to the mail queue's per-recipient digests
+     (mail_queue.py), addressed to managers and admins. The recipient list
+     is cached and dropped whenever a user or their groups change
+   - webhooks: alerts are POSTed as JSON to STOCK_ALERT_WEBHOOKS from a
+     small background pool, signed with STOCK_ALERT_WEBHOOK_SECRET. A
+     failed POST is resubmitted after its backoff by a timer, so retries
+     never hold a pool thread
+   - live: every event is pushed to open pages through the SSE live feed
+     (live_feed.py)
+
+Event types: LOW_STOCK, OUT_OF_STOCK, STOCKOUT_RISK, RESTOCKED.
+"""
+
+import hashlib
+import hmac
+import json
+import math
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Q
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+import logging
+logger = logging.getLogger(__name__)
+
+from .live_feed import live_feed
+from .models import StockEvent
+
+
+# Events that call for action (RESTOCKED is informational)
+ALERT_EVENTS = frozenset({'LOW_STOCK', 'OUT_OF_STOCK', 'STOCKOUT_RISK'})
+
+
+class StockEventBus:
+    """
+    In-process publish/subscribe for stock threshold events.
+    """
+
+    def __init__(self):
+        self._subscribers = []   # [(name, callback, event types or None)]
+
+    def subscribe(self, callback, event_types=None, name=None):
+        """
+        Register callback(event) for the given event types (all if None).
+        Re-subscribing under the same name replaces the earlier callback.
+        """
+        name = name or f"{callback.__module__}.{callback.__qualname__}"
+        types = frozenset(event_types) if event_types else None
+        self._subscribers = [s for s in self._subscribers if s[0] != name] + [(name, callback, types)]
+
+    def unsubscribe(self, name):
+        self._subscribers = [s for s in self._subscribers if s[0] != name]
+
+    @staticmethod
+    def threshold_crossings(quantity, reorder_level, previous_quantity, previous_reorder_level):
+        """Event types raised by a stock change (empty if no threshold was crossed)."""
+        was_low = previous_quantity <= previous_reorder_level
+        is_low = quantity <= reorder_level
+        if quantity == 0 and previous_quantity > 0:
+            return ['OUT_OF_STOCK']
+        if is_low and not was_low:
+            return ['LOW_STOCK']
+        if was_low and not is_low:
+            return ['RESTOCKED']
+        return []
+
+    def emit_threshold_crossings(self, item, previous_quantity, previous_reorder_level):
+        for event_type in self.threshold_crossings(
+            item.quantity, item.reorder_level, previous_quantity, previous_reorder_level,
+        ):
+            self.emit(event_type, item, previous_quantity=previous_quantity)
+
+    def emit(self, event_type, item, previous_quantity=None, days_until_stockout=None):
+        """Publish an event for `item` once the current transaction commits."""
+        if days_until_stockout is not None and not math.isfinite(days_until_stockout):
+            days_until_stockout = None
+        event = {
+            'type': event_type,
+            'item_id': item.pk,
+            'item_name': item.name,
+            'sku': item.sku,
+            'quantity': item.quantity,
+            'previous_quantity': previous_quantity,
+            'reorder_level': item.reorder_level,
+            'lead_time_days': item.lead_time_days,
+            'days_until_stockout': days_until_stockout,
+            'occurred_at': timezone.now().isoformat(),
+        }
+        transaction.on_commit(lambda: self.dispatch(event))
+
+    def dispatch(self, event):
+        for name, callback, types in list(self._subscribers):
+            if types is not None and event['type'] not in types:
+                continue
+            try:
+                callback(event)
+            except Exception as e:
+                logger.error(f"Stock event subscriber {name} failed for {event['type']} {event['item_name']}: {e}")
+
+
+class WebhookNotifier:
+    """
+    Posts alert events to the configured webhook URLs in the background,
+    retrying each delivery a few times with backoff.
+    """
+
+    def __init__(self, max_workers=2, attempts=3, timeout=5, retry_base_seconds=2):
+        self.attempts = attempts
+        self.timeout = timeout
+        self.retry_base_seconds = retry_base_seconds
+        self.session = requests.Session()
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='stock-webhook')
+
+    @property
+    def urls(self):
+        return list(getattr(settings, 'STOCK_ALERT_WEBHOOKS', []))
+
+    def __call__(self, event):
+        body = json.dumps({'event': event['type'], 'data': event}).encode()
+        for url in self.urls:
+            self._pool.submit(self.deliver, url, body)
+
+    def deliver(self, url, body, attempt=1):
+        """
+        POST one event. Returns True on a 2xx response; otherwise the next
+        attempt is scheduled (see schedule_retry) and False is returned.
+        """
+        headers = {'Content-Type': 'application/json'}
+        secret = getattr(settings, 'STOCK_ALERT_WEBHOOK_SECRET', '')
+        if secret:
+            signature = hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+            headers['X-Inventory-Signature'] = f"sha256={signature}"
+
+        try:
+            response = self.session.post(url, data=body, headers=headers, timeout=self.timeout)
+            if response.status_code < 300:
+                return True
+            error = f"HTTP {response.status_code}"
+        except requests.exceptions.RequestException as e:
+            error = str(e)
+
+        if attempt < self.attempts:
+            self.schedule_retry(url, body, attempt + 1)
+        else:
+            logger.error(f"Stock webhook {url} failed after {self.attempts} attempts: {error}")
+        return False
+
+    def schedule_retry(self, url, body, attempt):
+        """Resubmit a delivery to the pool once its backoff (base × 2^(attempt-2)) has passed."""
+        delay = self.retry_base_seconds * (2 ** (attempt - 2))
+        timer = threading.Timer(delay, self._pool.submit, args=(self.deliver, url, body, attempt))
+        timer.daemon = True
+        timer.start()
+        return timer
+
+
+ALERT_RECIPIENTS_KEY = 'inventory:stock-alert-recipients'
+
+
+def alert_recipients():
+    """
+    Email addresses of active managers and admins, unless
+    STOCK_ALERT_RECIPIENTS is set. Cached for
+    STOCK_ALERT_RECIPIENTS_CACHE_SECONDS so an alert storm does not query
+    the user table once per event.
+    """
+    configured = getattr(settings, 'STOCK_ALERT_RECIPIENTS', None)
+    if configured:
+        return list(configured)
+    recipients = cache.get(ALERT_RECIPIENTS_KEY)
+    if recipients is None:
+        recipients = list(
+            User.objects.filter(Q(is_superuser=True) | Q(groups__name='Manager'), is_active=True)
+            .exclude(email='').values_list('email', flat=True).distinct()
+        )
+        cache.set(ALERT_RECIPIENTS_KEY, recipients, getattr(settings, 'STOCK_ALERT_RECIPIENTS_CACHE_SECONDS', 300))
+    return recipients
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+@receiver(m2m_changed, sender=User.groups.through)
+def _recipients_changed(sender, **kwargs):
+    # After commit, so a concurrent alert cannot cache the old list again
+    transaction.on_commit(lambda: cache.delete(ALERT_RECIPIENTS_KEY))
+
+
+def record_event(event):
+    """In-app subscriber: keep every event in the StockEvent log."""
+    StockEvent.objects.create(
+        item_id=event['item_id'],
+        event_type=event['type'],
+        quantity=event['quantity'],
+        previous_quantity=event['previous_quantity'],
+        reorder_level=event['reorder_level'],
+        days_until_stockout=event['days_until_stockout'],
+    )
+
+
+def inbox_alert(event):
+    """In-app subscriber: update every user's notification inbox."""
+    from .notifications import notification_manager
+    notification_manager.notify_stock_event(event)
+
+
+def email_alert(event):
+    """Email subscriber: add the item to each recipient's next alert digest."""
+    if not getattr(settings, 'STOCK_ALERT_EMAIL', True):
+        return
+    from .mail_queue import mail_queue
+    recipients = alert_recipients()
+    if recipients:
+        mail_queue.queue_stock_alert(event['item_id'], recipients)
+
+
+# Module-level singletons
+stock_events = StockEventBus()
+webhook_notifier = WebhookNotifier()
+
+stock_events.subscribe(record_event, name='in_app')
+stock_events.subscribe(inbox_alert, name='inbox')
+stock_events.subscribe(email_alert, ALERT_EVENTS, name='email')
+stock_events.subscribe(webhook_notifier, ALERT_EVENTS, name='webhooks')
+stock_events.subscribe(live_feed.publish_alert, name='live')
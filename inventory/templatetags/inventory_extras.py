@@ -1,5 +1,7 @@
 from django import template
-from django.contrib.auth.models import Group
+from django.utils.html import format_html
+
+from users.utils import UserRoleManager
 
 register = template.Library()
 
@@ -30,24 +32,17 @@ def rupees_int(value):
 @register.filter
 def get_user_role(user):
     """Get user role as string"""
-    if user.is_superuser:
-        return "admin"
-    elif user.groups.filter(name='Manager').exists():
-        return "manager"
-    elif user.groups.filter(name='Staff').exists():
-        return "staff"
-    else:
-        return "user"
+    return UserRoleManager.get_user_role(user) or "user"
 
 @register.filter
 def can_add_items(user):
     """Check if user can add items"""
-    return user.is_superuser or user.groups.filter(name='Manager').exists()
+    return UserRoleManager.is_manager_or_admin(user)
 
 @register.filter
 def can_edit_items(user):
     """Check if user can edit items"""
-    return user.is_superuser or user.groups.filter(name='Manager').exists()
+    return UserRoleManager.is_manager_or_admin(user)
 
 @register.filter
 def can_delete_items(user):
@@ -62,3 +57,50 @@ def subtract(value, arg):
         return float(value) - float(arg)
     except (ValueError, TypeError):
         return 0
+
+
+@register.simple_tag
+def item_picture(item, width=64, css_class=''):
+    """
+    Render an item's image as a <picture> using its WebP/JPEG thumbnails
+    (see image_variants.py), sized for `width` CSS pixels. Falls back to
+    the original image or the placeholder until thumbnails are built.
+
+    Usage: {% item_picture item 64 "product-thumbnail" %}
+    """
+    variants = item.image_variants if item.image else {}
+    if not variants or variants.get('source') != item.image.name:
+        return format_html('<img src="{}" alt="{}" class="{}" width="{}" loading="lazy">',
+                           item.get_image_url(), item.name, css_class, width)
+
+    storage = item.image.storage
+
+    def srcset(ext):
+        return ', '.join(f"{storage.url(path)} {w}w" for w, path in
+                         sorted(variants.get(ext, {}).items(), key=lambda kv: int(kv[0])))
+
+    return format_html(
+        '<picture><source type="image/webp" srcset="{}" sizes="{}px">'
+        '<img src="{}" srcset="{}" sizes="{}px" alt="{}" class="{}" width="{}" loading="lazy" decoding="async">'
+        '</picture>',
+        srcset('webp'), width,
+        item.get_image_url(width), srcset('jpeg'), width, item.name, css_class, width,
+    )
+
+
+@register.simple_tag
+def live_feed_script():
+    """
+    Load the live feed client (static/js/live-feed.js), connected from the
+    moment the page was rendered so no update is missed in between.
+
+    Usage: {% live_feed_script %}
+    """
+    from django.templatetags.static import static
+    from django.urls import reverse
+    from inventory.live_feed import live_feed
+
+    return format_html(
+        '<script src="{}" data-url="{}" data-last-event-id="{}"></script>',
+        static('js/live-feed.js'), reverse('inventory:live_feed'), live_feed.last_event_id,
+    )
@@ -1,3 +1,1745 @@
-from django.test import TestCase
+"""
+Query-count and latency budgets per view
+========================================
 
-# Create your tests here.
+Guards against N+1 regressions: every URL in inventory/urls.py and
+users/urls.py is requested against catalogues of several sizes, and the
+number of queries each view makes must not grow with the catalogue.
+With CHECK_VIEW_LATENCY=1 each view must also answer within its
+wall-clock budget at the largest size.
+
+How it works:
+1. A superuser session requests every URL once on a small catalogue to
+   warm process-level state (content types, templates, caches)
+2. The catalogue is then grown to each size in QUERY_BUDGET_SIZES (items
+   with a sale each, plus suppliers and customers in proportion) and
+   every URL is requested once more against fresh per-size fixtures
+3. Query counts must be identical at every size. Timings depend on the
+   machine, so latency is only asserted when CHECK_VIEW_LATENCY is set:
+   the time taken at the largest size must then stay within VIEW_BUDGETS
+   (DEFAULT_VIEW_BUDGET otherwise), scaled by VIEW_BUDGET_SCALE
+4. A URL added to either urls.py is picked up automatically; URL
+   parameters it needs must be added to make_fixtures() or the test fails
+
+The rest of the module covers the chatbot, stock counters, queues,
+payments and the other subsystems, one TestCase per subsystem.
+
+Runs on SQLite:
+  python manage.py test inventory --settings=inventory_system.test_settings
+  QUERY_BUDGET_SIZES=10,1000 python manage.py test inventory --settings=inventory_system.test_settings
+  CHECK_VIEW_LATENCY=1 python manage.py test inventory --settings=inventory_system.test_settings
+"""
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import BytesIO, StringIO
+from urllib.parse import parse_qs, quote, urlsplit
+
+from asgiref.sync import sync_to_async
+from PIL import Image as PILImage
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core import mail
+from django.core.exceptions import ValidationError
+from django.core.management import call_command
+from django.core.cache import cache
+from django.core.mail.backends import locmem
+from django.db import connection, transaction as db_transaction
+from django.test import LiveServerTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from inventory import benchmarks, sales_rollups
+from inventory import urls as inventory_urls
+from inventory.chatbot import (
+    DATA_ANSWERS, INTENTS, STATIC_ANSWERS, get_chatbot_response, intent_router, sales_query_parser,
+)
+from inventory.ml_predictor import InventoryDemandPredictor
+from inventory.models import (
+    Customer, DailySales, Item, Notification, OutboundEmail, ProductImageCache, PurchaseOrder, PurchaseOrderLine,
+    StockCounters, Supplier, Transaction,
+)
+from inventory.stock_counters import stock_counters
+from users import urls as users_urls
+
+
+QUERY_BUDGET_SIZES = [int(n) for n in os.getenv('QUERY_BUDGET_SIZES', '10,1000,10000').split(',')]
+CHECK_VIEW_LATENCY = os.getenv('CHECK_VIEW_LATENCY', '') not in ('', '0')
+VIEW_BUDGET_SCALE = float(os.getenv('VIEW_BUDGET_SCALE', '1'))
+
+# Seconds allowed at the largest catalogue size
+DEFAULT_VIEW_BUDGET = 1.0
+VIEW_BUDGETS = {
+    'inventory:export_csv': 6.0,
+    'inventory:transaction_export_csv': 4.0,
+    'inventory:reorder_suggestions': 6.0,
+    'inventory:purchase_planning': 6.0,
+    'inventory:ai_model_management': 3.0,
+}
+
+# URLs that cannot be measured with a plain GET
+SKIPPED_URLS = {
+    'inventory:live_feed': 'streams events until LIVE_FEED_MAX_SECONDS',
+    'users:logout': 'ends the session used by every other request',
+}
+
+
+@override_settings(
+    EMAIL_QUEUE_IN_PROCESS_WORKER=False,
+    IMAGE_FETCH_IN_PROCESS_WORKER=False,
+    REORDER_SNAPSHOT_IN_PROCESS_WORKER=False,
+    PAYMENT_SIMULATION_MODE=True,
+)
+class ViewQueryBudgetTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('budget_admin', 'admin@example.com', 'password')
+
+    def setUp(self):
+        self.suppliers = []
+        self.customers = 0
+        self.items = 0
+        self.client.force_login(self.admin)
+
+    # ------------------------------------------------------------------
+    # Catalogue and fixtures
+    # ------------------------------------------------------------------
+
+    def grow_catalogue(self, size):
+        """Add items (each with one paid sale), suppliers and customers up to `size` items."""
+        start = self.items
+        if size <= start:
+            return
+        supplier_count = max(1, size // 20)
+        self.suppliers += Supplier.objects.bulk_create([
+            Supplier(name=f'Supplier {i}') for i in range(len(self.suppliers), supplier_count)
+        ])
+        Customer.objects.bulk_create([
+            Customer(name=f'Customer {i}') for i in range(self.customers, supplier_count)
+        ])
+        self.customers = max(self.customers, supplier_count)
+        items = Item.objects.bulk_create([
+            Item(
+                name=f'Budget Item {i}', sku=f'BUDGET-{i}', quantity=i % 40, price=Decimal('25.00'),
+                cost_price=Decimal('15.00'), reorder_level=10, supplier=self.suppliers[i % len(self.suppliers)],
+            )
+            for i in range(start, size)
+        ])
+        now = timezone.now()
+        Transaction.objects.bulk_create([
+            Transaction(
+                item=item, transaction_type='SALE', quantity=1, unit_price=Decimal('25.00'),
+                total_amount=Decimal('25.00'), payment_status='PAID', payment_method='CASH',
+                performed_by=self.admin, timestamp=now - timedelta(days=i % 30),
+            )
+            for i, item in enumerate(items, start)
+        ])
+        self.items = size
+
+    def make_fixtures(self, size):
+        """Fresh objects for URL parameters, so one-shot actions behave the same at every size."""
+        item = Item.objects.create(name=f'Fixture {size}', sku=f'FIXTURE-{size}', quantity=50,
+                                   price=Decimal('40.00'), cost_price=Decimal('20.00'), supplier=self.suppliers[0])
+        transaction = Transaction.objects.create(
+            item=item, transaction_type='SALE', quantity=2, unit_price=Decimal('40.00'),
+            payment_status='PENDING', payment_method='CASH', performed_by=self.admin,
+        )
+        order = PurchaseOrder.objects.create(supplier=self.suppliers[0], created_by=self.admin)
+        PurchaseOrderLine.objects.create(purchase_order=order, item=item, quantity=5, unit_cost=Decimal('20.00'))
+        notification = Notification.objects.create(
+            event_type='LOW_STOCK', item=item, message=f'{item.name} is low on stock',
+        )
+        pending = User.objects.create_user(f'pending{size}', f'pending{size}@example.com', 'password')
+        return {
+            'item_id': item.pk,
+            'supplier_id': self.suppliers[0].pk,
+            'customer_id': Customer.objects.first().pk,
+            'transaction_id': transaction.pk,
+            'order_id': order.pk,
+            'notification_id': notification.pk,
+            'user_id': pending.pk,
+            'gateway_type': 'khalti',
+            'profile_id': 'missing',
+            'uidb64': 'MQ',
+            'token': 'invalid-token',
+        }
+
+    @staticmethod
+    def url_names():
+        names = []
+        for module in (inventory_urls, users_urls):
+            names += [f'{module.app_name}:{p.name}' for p in module.urlpatterns if p.name]
+        return [name for name in names if name not in SKIPPED_URLS]
+
+    def measure(self, name, fixtures):
+        """(status, queries, seconds) for one GET of the named URL."""
+        url = reverse(name, kwargs=self.kwargs_for(name, fixtures))
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            response = self.client.get(url)
+            if getattr(response, 'streaming', False):
+                b''.join(response.streaming_content)
+            elapsed = time.perf_counter() - started
+        return response.status_code, len(queries), elapsed
+
+    def kwargs_for(self, name, fixtures):
+        for module in (inventory_urls, users_urls):
+            for pattern in module.urlpatterns:
+                if f'{module.app_name}:{pattern.name}' == name:
+                    params = pattern.pattern.converters.keys()
+                    missing = [p for p in params if p not in fixtures]
+                    self.assertFalse(missing, f'{name}: add fixtures for URL parameters {missing}')
+                    return {p: fixtures[p] for p in params}
+        self.fail(f'Unknown URL {name}')
+
+    # ------------------------------------------------------------------
+    # Test
+    # ------------------------------------------------------------------
+
+    def test_query_count_is_independent_of_catalogue_size(self):
+        names = self.url_names()
+
+        # Warm process-level state on a small catalogue
+        self.grow_catalogue(min(QUERY_BUDGET_SIZES))
+        warm_fixtures = self.make_fixtures(0)
+        for name in names:
+            self.measure(name, warm_fixtures)
+
+        results = {}   # size -> {name: (status, queries, seconds)}
+        for size in sorted(QUERY_BUDGET_SIZES):
+            self.grow_catalogue(size)
+            fixtures = self.make_fixtures(size)
+            self.client.force_login(self.admin)
+            results[size] = {name: self.measure(name, fixtures) for name in names}
+
+        smallest, largest = min(results), max(results)
+        for name in names:
+            with self.subTest(url=name):
+                status, queries, _ = results[smallest][name]
+                self.assertLess(status, 500, f'{name} failed with HTTP {status}')
+                counts = {size: results[size][name][1] for size in results}
+                self.assertEqual(
+                    len(set(counts.values())), 1,
+                    f'{name} query count grows with the catalogue: {counts}',
+                )
+                if not CHECK_VIEW_LATENCY:
+                    continue
+                budget = VIEW_BUDGETS.get(name, DEFAULT_VIEW_BUDGET) * VIEW_BUDGET_SCALE
+                elapsed = results[largest][name][2]
+                self.assertLessEqual(
+                    elapsed, budget,
+                    f'{name} took {elapsed:.2f}s with {largest} items (budget {budget:.2f}s)',
+                )
+
+
+@override_settings(REORDER_SNAPSHOT_IN_PROCESS_WORKER=False)
+class ChatbotQueryBudgetTests(TestCase):
+    """
+    Chatbot answers: one scan picks the first matching intent, data answers
+    take at most three queries and repeats are served from the cache until
+    an item or transaction changes.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('chatbot_admin', 'chatbot@example.com', 'password')
+        cls.item = Item.objects.create(name='Chatbot Item', sku='CHATBOT-1', quantity=3, reorder_level=5,
+                                       price=Decimal('10.00'), cost_price=Decimal('6.00'))
+        Item.objects.create(name='Empty Item', sku='CHATBOT-2', quantity=0, price=Decimal('5.00'))
+
+    def setUp(self):
+        cache.clear()
+
+    def test_first_matching_intent_wins(self):
+        self.assertEqual(intent_router.route('show out of stock items'), 'out_of_stock')
+        self.assertEqual(intent_router.route('export the low stock list'), 'low_stock')
+        self.assertEqual(intent_router.route('go to dashboard analytics'), 'analytics')
+        self.assertIsNone(intent_router.route('tell me a joke'))
+        for name, phrases in INTENTS:
+            self.assertTrue(name in DATA_ANSWERS or name in STATIC_ANSWERS, f'{name} has no answer')
+            for phrase in phrases:
+                first = next(n for n, ps in INTENTS if any(p in phrase for p in ps))
+                self.assertEqual(intent_router.route(phrase), first, phrase)
+
+    def test_data_answers_are_cached_until_data_changes(self):
+        for name in DATA_ANSWERS:
+            message = dict(INTENTS)[name][0]
+            with self.subTest(intent=name):
+                with CaptureQueriesContext(connection) as miss:
+                    first = get_chatbot_response(message)
+                self.assertLessEqual(len(miss), 3)
+                with CaptureQueriesContext(connection) as hit:
+                    self.assertEqual(get_chatbot_response(message), first)
+                self.assertEqual(len(hit), 0)
+
+        before = get_chatbot_response('inventory value')['reply']
+        with self.captureOnCommitCallbacks(execute=True):
+            self.item.quantity = 100
+            self.item.save()
+        self.assertNotEqual(get_chatbot_response('inventory value')['reply'], before)
+
+
+@override_settings(REORDER_SNAPSHOT_IN_PROCESS_WORKER=False)
+class SalesQueryTests(TestCase):
+    """
+    Ad-hoc sales questions: the parser's date ranges and groupings, rollups
+    kept in step with sales, and answers read from a few rollup rows.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('rollup_admin', 'rollup@example.com', 'password')
+        cls.supplier = Supplier.objects.create(name='Rollup Supplier')
+        cls.customer = Customer.objects.create(name='Rollup Customer')
+        cls.mouse = Item.objects.create(name='Rollup Mouse', sku='ROLLUP-1', quantity=100, price=Decimal('20.00'),
+                                        cost_price=Decimal('12.00'), supplier=cls.supplier)
+        cls.keyboard = Item.objects.create(name='Rollup Keyboard', sku='ROLLUP-2', quantity=100,
+                                           price=Decimal('50.00'), cost_price=Decimal('30.00'))
+
+    def setUp(self):
+        cache.clear()
+
+    def sell(self, item, quantity, status='PAID', **fields):
+        return Transaction.objects.create(
+            item=item, transaction_type='SALE', quantity=quantity, unit_price=item.price,
+            payment_status=status, payment_method=fields.pop('payment_method', 'CASH'), performed_by=self.admin, **fields,
+        )
+
+    def test_parser_reads_metric_range_grouping_and_item(self):
+        today = date(2026, 10, 19)   # a Monday
+        cases = {
+            'revenue by supplier last month': ('revenue', date(2026, 9, 1), date(2026, 9, 30), 'supplier', ''),
+            'units sold of rollup mouse in march': ('units', date(2026, 3, 1), date(2026, 3, 31), None, 'rollup mouse'),
+            'profit by payment method in the last 14 days': ('profit', date(2026, 10, 6), today, 'payment_method', ''),
+            'sales of rollup-2 last week': ('revenue', date(2026, 10, 12), date(2026, 10, 18), None, 'rollup-2'),
+            'revenue from 2026-03-01 to 2026-03-15 by customer': ('revenue', date(2026, 3, 1), date(2026, 3, 15), 'customer', ''),
+            'top selling products this year': ('units', date(2026, 1, 1), today, 'item', ''),
+            'sales in december': ('revenue', date(2025, 12, 1), date(2025, 12, 31), None, ''),
+        }
+        for message, expected in cases.items():
+            with self.subTest(message=message):
+                query = sales_query_parser.parse(message, today)
+                self.assertEqual((query.metric, query.start, query.end, query.group_by, query.item_text), expected)
+
+        # Nothing beyond a metric: left to the keyword intents
+        for message in ('total sales', 'daily sales', 'how is profit calculated', 'top selling products', 'monthly sales'):
+            self.assertIsNone(sales_query_parser.parse(message, today), message)
+        query = sales_query_parser.parse('sales in the last 5000 days', today)
+        self.assertEqual((query.end - query.start).days + 1, sales_query_parser.max_days)
+
+    def test_rollups_follow_every_sale(self):
+        self.sell(self.mouse, 2)
+        self.sell(self.mouse, 3, customer=self.customer, payment_method='KHALTI')
+        pending = self.sell(self.keyboard, 4, status='PENDING')
+        self.assertFalse(DailySales.objects.filter(item=self.keyboard).exists())
+
+        pending.payment_status = 'PAID'
+        pending.save()
+        self.assertEqual(DailySales.objects.get(item=self.keyboard).units, 4)
+        pending.delete()   # soft delete
+        self.assertFalse(DailySales.objects.filter(item=self.keyboard).exists())
+        self.sell(self.keyboard, 1).hard_delete()
+        self.assertEqual(sales_rollups.verify(), [])
+
+        # Bulk writes bypass the signals until the rollups are rebuilt
+        Transaction.objects.bulk_create([
+            Transaction(item=self.keyboard, transaction_type='SALE', quantity=5, unit_price=Decimal('50.00'),
+                        total_amount=Decimal('250.00'), payment_status='PAID', payment_method='CASH',
+                        performed_by=self.admin),
+        ])
+        self.assertEqual(len(sales_rollups.verify()), 1)
+        sales_rollups.rebuild()
+        self.assertEqual(sales_rollups.verify(), [])
+
+    def test_questions_are_answered_from_rollups_and_cached(self):
+        self.sell(self.mouse, 2)
+        self.sell(self.mouse, 3, customer=self.customer, payment_method='KHALTI')
+        self.sell(self.keyboard, 1)
+
+        for message, expected in [
+            ("today's sales", 'Rs. 150.00'),
+            ('revenue by supplier this week', '1. Rollup Supplier — Rs. 100.00\n2. No supplier — Rs. 50.00'),
+            ('profit by payment method today', '1. Cash — Rs. 36.00\n2. Khalti — Rs. 24.00'),
+            ('units sold of rollup-1 today', 'Units sold: 5'),
+            ('revenue by customer in the last 7 days', 'Walk-in (no customer) — Rs. 90.00'),
+        ]:
+            with self.subTest(message=message):
+                with CaptureQueriesContext(connection) as miss:
+                    first = get_chatbot_response(message)
+                self.assertIn(expected, first['reply'])
+                self.assertLessEqual(len(miss), 4)
+                with CaptureQueriesContext(connection) as hit:
+                    self.assertEqual(get_chatbot_response(message), first)
+                self.assertEqual(len(hit), 0)
+
+        self.assertIn("couldn't find an item", get_chatbot_response('sales of no such gadget today')['reply'])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.sell(self.keyboard, 2)
+        self.assertIn('Rs. 250.00', get_chatbot_response("today's sales")['reply'])
+
+
+class StockCounterTests(TestCase):
+    """
+    The StockCounters row follows every stock and price change in the same
+    transaction, and matches a full recount of the item table.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('counter_admin', 'counter@example.com', 'password')
+
+    def setUp(self):
+        self.plenty = Item.objects.create(name='Counter Plenty', sku='COUNTER-1', quantity=20, reorder_level=5,
+                                          price=Decimal('10.00'), cost_price=Decimal('6.00'))
+        self.few = Item.objects.create(name='Counter Few', sku='COUNTER-2', quantity=3, reorder_level=5,
+                                       price=Decimal('4.50'), cost_price=Decimal('2.00'))
+
+    def assertInSync(self):
+        self.assertEqual(stock_counters.verify(), {})
+
+    def test_counters_follow_every_item_change(self):
+        counters = stock_counters.read()
+        self.assertEqual((counters.total_items, counters.in_stock, counters.low_stock, counters.out_of_stock),
+                         (2, 1, 1, 0))
+        self.assertEqual(counters.stock_value, Decimal('213.50'))
+        self.assertEqual(counters.stock_cost, Decimal('126.00'))
+
+        Transaction.objects.create(item=self.few, transaction_type='SALE', quantity=3, unit_price=Decimal('4.50'),
+                                   payment_status='PAID', payment_method='CASH', performed_by=self.admin)
+        self.assertEqual(stock_counters.read().out_of_stock, 1)
+        self.assertInSync()
+        Transaction.objects.create(item=self.few, transaction_type='PURCHASE', quantity=10, unit_price=Decimal('3.00'),
+                                   payment_status='PAID', payment_method='CASH', performed_by=self.admin)
+        self.assertInSync()   # stock and cost price both changed
+
+        self.plenty.price = Decimal('12.00')
+        self.plenty.save()
+        self.assertEqual(stock_counters.read().stock_value, Decimal('285.00'))
+        self.few.delete()   # soft delete
+        self.assertEqual(stock_counters.read().total_items, 1)
+        self.plenty.hard_delete()
+        self.assertInSync()
+        self.assertEqual(stock_counters.read().total_items, 0)
+
+    def test_partial_save_counts_only_saved_fields(self):
+        self.plenty.quantity = 0               # changed in memory, never saved
+        self.plenty.price = Decimal('11.00')
+        self.plenty.save(update_fields=['price'])
+        self.assertInSync()
+        counters = stock_counters.read()
+        self.assertEqual((counters.in_stock, counters.out_of_stock), (1, 0))
+        self.assertEqual(counters.stock_value, Decimal('233.50'))
+
+        self.plenty.save(update_fields=['name'])   # no counted field
+        self.assertInSync()
+
+    def test_rebuild_after_bulk_writes(self):
+        StockCounters.objects.all().delete()
+        self.assertEqual(stock_counters.read().total_items, 2)   # rebuilt on first read
+
+        Item.objects.update(quantity=0)
+        self.assertEqual(set(stock_counters.verify()), {'in_stock', 'low_stock', 'out_of_stock', 'stock_value', 'stock_cost'})
+        stock_counters.rebuild()
+        self.assertInSync()
+
+    def test_list_pages_read_one_row(self):
+        stock_counters.read()
+        self.client.force_login(self.admin)
+        for name in ('inventory:item_list', 'users:dashboard'):
+            with self.subTest(url=name):
+                with CaptureQueriesContext(connection) as queries:
+                    self.client.get(reverse(name))
+                counter_reads = [q for q in queries if 'inventory_stockcounters' in q['sql']]
+                item_aggregates = [q for q in queries if 'COUNT(' in q['sql'] and 'FROM "inventory_item"' in q['sql']]
+                self.assertEqual(len(counter_reads), 1)
+                self.assertEqual(item_aggregates, [])
+
+
+
+class PurchaseOrderTests(TestCase):
+    """
+    Purchase plans order whole MOQ packs with or without a budget, and an
+    order is placed at most once however often it is submitted.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('order_admin', 'order@example.com', 'password')
+        cls.supplier = Supplier.objects.create(name='Order Supplier')
+
+    def test_budgeted_plan_orders_whole_packs(self):
+        from inventory.purchase_planner import purchase_planner
+
+        lines = []
+        for n, (moq, suggested, urgency) in enumerate([(12, 30, 'CRITICAL'), (5, 7, 'HIGH'), (1, 9, 'LOW')]):
+            item = Item.objects.create(name=f'Pack Item {n}', sku=f'PACK-{n}', quantity=0, price=Decimal('10.00'),
+                                       cost_price=Decimal('3.00'), min_order_quantity=moq, supplier=self.supplier)
+            lines.append(purchase_planner._make_line(item, {'suggested_quantity': suggested, 'urgency': urgency}))
+
+        self.assertEqual(purchase_planner._allocate(lines, None), [36, 10, 9])
+        for budget in (Decimal('100.00'), Decimal('50.00'), Decimal('20.00')):
+            with self.subTest(budget=budget):
+                quantities = purchase_planner._allocate(lines, budget)
+                for qty, line in zip(quantities, lines):
+                    self.assertEqual(qty % line['moq'], 0)
+                    self.assertLessEqual(qty, line['target'])
+                self.assertLessEqual(sum(qty * line['unit_cost'] for qty, line in zip(quantities, lines)), budget)
+
+    def test_lines_are_sized_for_the_order_lead_time(self):
+        from inventory.purchase_planner import purchase_planner
+
+        slow = Supplier.objects.create(name='Slow Supplier')
+        self.supplier.lead_time_days = 21
+        self.supplier.save()
+        for n, (supplier, lead_time) in enumerate([(self.supplier, 3), (self.supplier, 14), (slow, 5), (slow, 9)]):
+            Item.objects.create(name=f'Lead Item {n}', sku=f'LEAD-{n}', quantity=0, price=Decimal('10.00'),
+                                lead_time_days=lead_time, supplier=supplier)
+
+        plan = purchase_planner.build_plan()
+        expected = {self.supplier.pk: 21, slow.pk: 9}
+        self.assertEqual(len(plan['orders']), 2)
+        for order in plan['orders']:
+            lead_time = expected[order['supplier'].pk]
+            self.assertEqual(order['expected_delivery'], timezone.now().date() + timedelta(days=lead_time))
+            for line in order['lines']:
+                self.assertEqual(line['recommendation']['ai_insights']['forecast_period'], f'{lead_time} days')
+
+    def test_order_is_placed_once(self):
+        item = Item.objects.create(name='Order Item', sku='ORDER-1', quantity=2, price=Decimal('10.00'),
+                                   cost_price=Decimal('4.00'), supplier=self.supplier)
+        order = PurchaseOrder.objects.create(supplier=self.supplier, created_by=self.admin)
+        PurchaseOrderLine.objects.create(purchase_order=order, item=item, quantity=10, unit_cost=Decimal('4.00'))
+
+        stale = PurchaseOrder.objects.get(pk=order.pk)   # a second request that loaded the draft too
+        order.place(self.admin)
+        with self.assertRaises(ValidationError):
+            stale.place(self.admin)
+
+        item.refresh_from_db()
+        self.assertEqual(item.quantity, 12)
+        self.assertEqual(Transaction.objects.filter(item=item, transaction_type='PURCHASE').count(), 1)
+        self.assertEqual(stale.status, 'PLACED')
+
+
+class ForecastCacheTests(TestCase):
+    """
+    Cached demand forecasts are reused until a sale changes the item's
+    sales watermark.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('forecast_admin', 'forecast@example.com', 'password')
+        cls.item = Item.objects.create(name='Forecast Item', sku='FORECAST-1', quantity=500, price=Decimal('10.00'),
+                                       cost_price=Decimal('6.00'))
+
+    def sell(self, quantity):
+        Transaction.objects.create(item=self.item, transaction_type='SALE', quantity=quantity,
+                                   unit_price=Decimal('10.00'), payment_status='PAID', payment_method='CASH',
+                                   performed_by=self.admin)
+
+    def test_new_sale_invalidates_forecast(self):
+        predictor = InventoryDemandPredictor()
+        self.sell(4)
+        predictor.predict_future_demand(self.item, 14)
+        computed = predictor.forecast_cache[self.item.id]['result']
+
+        predictor.predict_future_demand(self.item, 7)   # shorter horizon: sliced from the cache
+        self.assertIs(predictor.forecast_cache[self.item.id]['result'], computed)
+
+        self.sell(6)
+        predictor.predict_future_demand(self.item, 7)
+        self.assertIsNot(predictor.forecast_cache[self.item.id]['result'], computed)
+        self.assertEqual(predictor.forecast_cache[self.item.id]['watermark'], predictor._sales_watermark(self.item))
+
+
+@override_settings(EMAIL_QUEUE_IN_PROCESS_WORKER=False, REORDER_SNAPSHOT_IN_PROCESS_WORKER=False)
+class ReorderQueueTests(TestCase):
+    """
+    Stock changes only mark the reorder snapshot stale; the queue worker
+    recomputes it in batches and clears the flag.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('reorder_admin', 'reorder@example.com', 'password')
+
+    def setUp(self):
+        self.items = [
+            Item.objects.create(name=f'Reorder Item {n}', sku=f'REORDER-{n}', quantity=20, reorder_level=5,
+                                price=Decimal('10.00'), cost_price=Decimal('6.00'))
+            for n in range(3)
+        ]
+
+    def test_sale_marks_item_stale_without_forecasting(self):
+        from inventory.reorder_queue import reorder_queue
+
+        Item.all_objects.update(reorder_stale=False)
+        with self.captureOnCommitCallbacks(execute=True):
+            Transaction.objects.create(item=self.items[0], transaction_type='SALE', quantity=18,
+                                       unit_price=Decimal('10.00'), payment_status='PAID', payment_method='CASH',
+                                       performed_by=self.admin)
+        item = Item.objects.get(pk=self.items[0].pk)
+        self.assertTrue(item.reorder_stale)
+        self.assertIsNone(item.reorder_checked_at)
+        self.assertIsNone(reorder_queue._thread)
+
+        # Saves that leave the reorder inputs alone do not queue the item
+        other = self.items[1]
+        other.price = Decimal('12.00')
+        other.save(update_fields=['price'])
+        self.assertFalse(Item.all_objects.get(pk=other.pk).reorder_stale)
+
+        self.assertEqual(reorder_queue.process_stale(), 1)
+        item.refresh_from_db()
+        self.assertFalse(item.reorder_stale)
+        self.assertIsNotNone(item.reorder_checked_at)
+        self.assertTrue(item.reorder_needed)
+
+    def test_stale_items_are_refreshed_in_batches(self):
+        from inventory.reorder_queue import ReorderSnapshotQueue
+
+        queue = ReorderSnapshotQueue(batch_size=2)
+        self.items[2].delete()   # deactivated: the flag is dropped without a forecast
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(queue.process_stale(), 2)
+        claims = [q for q in queries if q['sql'].startswith('UPDATE') and '"reorder_stale"' in q['sql']]
+        self.assertEqual(len(claims), 2)
+        self.assertFalse(Item.all_objects.filter(reorder_stale=True).exists())
+        self.assertEqual(Item.objects.filter(reorder_checked_at__isnull=False).count(), 2)
+
+
+class ItemSearchTests(TestCase):
+    """
+    Item list search results are shown and paged in rank order.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('search_admin', 'search@example.com', 'password')
+        for n, name in enumerate(['Alpha Cable Mouse', 'Mouse', 'Mouse Pad', 'Beta Mouse Wireless', 'Mousetrap']):
+            Item.objects.create(name=name, sku=f'SEARCH-{n}', quantity=5, price=Decimal('1.00'))
+
+    def test_results_keep_rank_order_across_pages(self):
+        from inventory.search_index import search_index
+        from inventory.views import _ranked_page
+
+        ranked = search_index.search_ids('items', 'mouse', limit=10)
+        self.assertEqual(len(ranked), 5)
+        self.client.force_login(self.admin)
+        response = self.client.get(reverse('inventory:item_list'), {'search': 'mouse'})
+        self.assertEqual([item.pk for item in response.context['items']], ranked)
+
+        items, pages, params = Item.objects.all(), [], {}
+        while True:
+            rows, prev_cursor, next_cursor = _ranked_page(items, ranked, params, 2)
+            pages.append([row.pk for row in rows])
+            if not next_cursor:
+                break
+            params = {'after': str(next_cursor)}
+        self.assertEqual(pages, [ranked[0:2], ranked[2:4], ranked[4:]])
+        rows, prev_cursor, _ = _ranked_page(items, ranked, {'before': str(prev_cursor)}, 2)
+        self.assertEqual([row.pk for row in rows], ranked[2:4])
+
+    def test_transaction_form_lists_few_items_and_searches_the_rest(self):
+        from inventory.views import TRANSACTION_ITEM_CHOICES
+
+        for n in range(TRANSACTION_ITEM_CHOICES):
+            Item.objects.create(name=f'Urgent Item {n}', sku=f'URGENT-{n}', quantity=0, price=Decimal('1.00'),
+                                reorder_needed=True, reorder_urgency='CRITICAL', reorder_rank=0)
+        mouse = Item.objects.get(name='Mousetrap')
+        self.client.force_login(self.admin)
+
+        response = self.client.get(reverse('inventory:transaction_create'))
+        self.assertEqual(len(response.context['items']), TRANSACTION_ITEM_CHOICES)
+        self.assertNotIn(mouse, response.context['items'])
+
+        response = self.client.get(reverse('inventory:transaction_create'), {'item': mouse.pk})
+        self.assertEqual(response.context['items'][0], mouse)
+        self.assertContains(response, f'<option value="{mouse.pk}" selected')
+
+        response = self.client.get(reverse('inventory:search_api'), {'type': 'items', 'q': 'mousetrap'})
+        self.assertEqual(response.json()['results'][0]['id'], mouse.pk)
+
+
+class _StubUnsplashHandler(BaseHTTPRequestHandler):
+    """Unsplash-compatible search endpoint plus the image files it points at."""
+
+    searches = []
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        if url.path == '/search/photos':
+            query = parse_qs(url.query)['query'][0]
+            self.searches.append(query)
+            host = f'http://{self.server.server_address[0]}:{self.server.server_address[1]}'
+            if query.lower().startswith('broken'):
+                self._reply(503, 'text/plain', b'unavailable')
+                return
+            results = [] if query.lower().startswith('nothing') else [{'urls': {'small': f'{host}/img/{quote(query)}'}}]
+            self._reply(200, 'application/json', json.dumps({'results': results}).encode())
+        elif url.path.startswith('/img/'):
+            # Same-length names get identical bytes; "png ..." names are served as PNG
+            image_format = 'PNG' if url.path.lower().startswith('/img/png') else 'JPEG'
+            image = BytesIO()
+            PILImage.new('RGB', (40, 30), (len(url.path) * 7 % 256, 90, 160)).save(image, image_format)
+            self._reply(200, f'image/{image_format.lower()}', image.getvalue())
+        else:
+            self._reply(404, 'text/plain', b'not found')
+
+    def _reply(self, status, content_type, body):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@override_settings(IMAGE_FETCH_IN_PROCESS_WORKER=False, REORDER_SNAPSHOT_IN_PROCESS_WORKER=False)
+class BackfillItemImagesTests(TransactionTestCase):
+    """
+    backfill_item_images against a local stub of the Unsplash API: outcomes
+    land in image_status, names that normalise alike are searched once, and
+    a second run picks up what the first one left behind.
+    """
+
+    def setUp(self):
+        from inventory.image_fetcher import image_fetcher
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), _StubUnsplashHandler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.api_url = f'http://127.0.0.1:{self.server.server_address[1]}/search/photos'
+        _StubUnsplashHandler.searches = []
+
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        media = override_settings(MEDIA_ROOT=media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+
+        saved = (image_fetcher.access_key, image_fetcher.api_url, image_fetcher.rate_limiter)
+        image_fetcher.access_key = 'stub-key'
+        self.addCleanup(self._restore_fetcher, image_fetcher, saved)
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    @staticmethod
+    def _restore_fetcher(image_fetcher, saved):
+        image_fetcher.access_key, image_fetcher.api_url, image_fetcher.rate_limiter = saved
+
+    def backfill(self, *args):
+        # One pool worker: SQLite's shared in-memory test database locks whole
+        # tables between connections, so parallel cache writes would collide
+        call_command('backfill_item_images', '--api-url', self.api_url, '--rate', '0', '--workers', '1',
+                     *args, stdout=StringIO(), stderr=StringIO())
+
+    def test_backfill_fetches_dedups_and_resumes(self):
+        names = ['Stub Mouse', '  stub MOUSE ', 'Stub Keyboard', 'Nothing Here', 'Stub Cable']
+        items = [Item.objects.create(name=name, sku=f'STUB-{n}', quantity=1, price=Decimal('1.00'))
+                 for n, name in enumerate(names)]
+        self.assertEqual({item.image_status for item in items}, {'PENDING'})
+
+        # First run stops after three items: both mice share one search
+        self.backfill('--limit', '3', '--batch-size', '3')
+        mouse, same_mouse, keyboard, nothing, cable = [Item.all_objects.get(pk=item.pk) for item in items]
+        self.assertEqual(sorted(_StubUnsplashHandler.searches), ['Stub Keyboard', 'Stub Mouse'])
+        self.assertEqual((mouse.image_status, same_mouse.image_status, keyboard.image_status),
+                         ('FETCHED', 'FETCHED', 'FETCHED'))
+        self.assertEqual(mouse.image.name, same_mouse.image.name)
+        self.assertNotEqual(mouse.image.name, keyboard.image.name)
+        self.assertEqual((nothing.image_status, cable.image_status), ('PENDING', 'PENDING'))
+
+        # A killed run left the cable claimed; its lease has run out
+        Item.all_objects.filter(pk=cable.pk).update(
+            image_status='FETCHING', image_next_attempt_at=timezone.now() - timedelta(seconds=1),
+        )
+        self.backfill()
+        statuses = dict(Item.all_objects.filter(pk__in=[item.pk for item in items]).values_list('name', 'image_status'))
+        self.assertEqual(statuses['Nothing Here'], 'NOT_FOUND')
+        self.assertEqual(statuses['Stub Cable'], 'FETCHED')
+        self.assertEqual(sorted(_StubUnsplashHandler.searches), ['Nothing Here', 'Stub Cable', 'Stub Keyboard', 'Stub Mouse'])
+
+        # Nothing left to do: no further searches
+        self.backfill()
+        self.assertEqual(len(_StubUnsplashHandler.searches), 4)
+
+
+class ProductImageCacheTests(TestCase):
+    """
+    fetch_cached() against the Unsplash stub: hits are stored once per
+    content hash under the image's real format, "no match" and errors are
+    cached for their own TTLs and searched again once those run out.
+    """
+
+    def setUp(self):
+        from inventory.image_fetcher import ProductImageFetcher, RateLimiter
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), _StubUnsplashHandler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        _StubUnsplashHandler.searches = []
+
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        media = override_settings(MEDIA_ROOT=media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+
+        self.fetcher = ProductImageFetcher()
+        self.fetcher.access_key = 'stub-key'
+        self.fetcher.api_url = f'http://127.0.0.1:{self.server.server_address[1]}/search/photos'
+        self.fetcher.rate_limiter = RateLimiter(0)
+
+    def test_hits_are_stored_once_under_their_format(self):
+        first = self.fetcher.fetch_cached('Stub Lamp A')
+        again = self.fetcher.fetch_cached('  stub LAMP a ')
+        twin = self.fetcher.fetch_cached('Stub Lamp B')   # different name, identical bytes
+        png = self.fetcher.fetch_cached('PNG Lamp')
+
+        self.assertEqual((first['status'], first['cached'], again['cached']), ('ok', False, True))
+        self.assertEqual(again['path'], first['path'])
+        self.assertEqual(twin['path'], first['path'])
+        self.assertTrue(first['path'].endswith('.jpg'))
+        self.assertTrue(png['path'].endswith('.png'))
+        self.assertEqual(_StubUnsplashHandler.searches, ['Stub Lamp A', 'Stub Lamp B', 'PNG Lamp'])
+        self.assertEqual(len(os.listdir(os.path.join(settings.MEDIA_ROOT, 'products'))), 2)
+        self.assertIsNone(ProductImageCache.objects.get(query='stub lamp a').expires_at)
+        self.assertEqual(self.fetcher._image_extension(b'not an image', 'image/webp; q=1'), 'webp')
+
+    def test_negative_entries_expire_after_their_ttl(self):
+        for name, status, ttl in (('Nothing Here', 'not_found', self.fetcher.miss_ttl),
+                                  ('Broken Lamp', 'error', self.fetcher.error_ttl)):
+            with self.subTest(status=status):
+                before = timezone.now()
+                self.assertEqual(self.fetcher.fetch_cached(name)['status'], status)
+                entry = ProductImageCache.objects.get(query=self.fetcher.normalize_query(name))
+                self.assertTrue(before + ttl <= entry.expires_at <= timezone.now() + ttl)
+
+                cached = self.fetcher.fetch_cached(name)
+                self.assertEqual((cached['status'], cached['cached']), (status, True))
+                self.assertEqual(_StubUnsplashHandler.searches.count(name), 1)
+
+                ProductImageCache.objects.filter(pk=entry.pk).update(expires_at=timezone.now() - timedelta(seconds=1))
+                self.assertFalse(self.fetcher.fetch_cached(name)['cached'])
+                self.assertEqual(_StubUnsplashHandler.searches.count(name), 2)
+
+
+@override_settings(IMAGE_FETCH_IN_PROCESS_WORKER=False, REORDER_SNAPSHOT_IN_PROCESS_WORKER=False)
+class ImageQueueTests(TestCase):
+    """
+    Image queue claims are exclusive until their lease runs out, failures
+    back off exponentially, and neither a rename nor a sale lets the worker
+    and the request path overwrite each other.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('queue_admin', 'queue@example.com', 'password')
+
+    def setUp(self):
+        self.item = Item.objects.create(name='Queue Lamp', sku='QUEUE-1', quantity=10, price=Decimal('5.00'))
+
+    def test_claim_is_exclusive_until_the_lease_expires(self):
+        from inventory.image_queue import image_queue
+
+        stale = Item.all_objects.get(pk=self.item.pk)
+        self.assertIn(self.item, image_queue.due_items())
+        self.assertTrue(image_queue.claim(self.item))
+        self.assertFalse(image_queue.claim(stale))   # a second worker saw the same due row
+        self.assertNotIn(self.item, image_queue.due_items())
+
+        # The worker died mid-fetch: once the lease is over the item is due again
+        Item.all_objects.filter(pk=self.item.pk).update(image_next_attempt_at=timezone.now() - timedelta(seconds=1))
+        expired = Item.all_objects.get(pk=self.item.pk)
+        self.assertIn(expired, image_queue.due_items())
+        self.assertTrue(image_queue.claim(expired))
+
+    @override_settings(IMAGE_FETCH_RETRY_BASE_SECONDS=60, IMAGE_FETCH_MAX_ATTEMPTS=3)
+    def test_failures_back_off_then_give_up(self):
+        from inventory.image_queue import ImageFetchQueue
+
+        queue = ImageFetchQueue()
+        failure = {'status': 'error', 'error': 'timeout'}
+        for attempts, base in ((0, 60), (1, 120)):
+            self.item.image_fetch_attempts = attempts
+            before = timezone.now()
+            fields = queue.outcome_fields(self.item, failure)
+            self.assertEqual((fields['image_status'], fields['image_fetch_attempts']), ('PENDING', attempts + 1))
+            delay = (fields['image_next_attempt_at'] - before).total_seconds()
+            self.assertTrue(base * 0.8 - 1 <= delay <= base * 1.2 + 1, delay)
+
+        self.item.image_fetch_attempts = 2
+        fields = queue.outcome_fields(self.item, failure)
+        self.assertEqual((fields['image_status'], fields['image_next_attempt_at']), ('FAILED', None))
+
+    def test_result_for_a_renamed_item_is_discarded(self):
+        from inventory.image_queue import image_queue
+
+        self.assertTrue(image_queue.claim(self.item))
+        self.item.image_status = 'FETCHING'
+        Item.all_objects.filter(pk=self.item.pk).update(name='Queue Desk Lamp')
+
+        self.assertIsNone(image_queue.process_item(self.item))
+        renamed = Item.all_objects.get(pk=self.item.pk)
+        self.assertEqual((renamed.image_status, renamed.image_fetch_attempts), ('FETCHING', 0))
+
+    def test_sale_keeps_what_the_worker_wrote(self):
+        loaded = Item.all_objects.get(pk=self.item.pk)
+        Item.all_objects.filter(pk=self.item.pk).update(
+            image='products/lamp.jpg', image_status='FETCHED', image_variants_stale=True,
+        )
+        Transaction.objects.create(item=loaded, transaction_type='SALE', quantity=4, unit_price=Decimal('5.00'),
+                                   payment_status='PAID', payment_method='CASH', performed_by=self.admin)
+
+        item = Item.all_objects.get(pk=self.item.pk)
+        self.assertEqual(item.quantity, 6)
+        self.assertEqual((item.image.name, item.image_status, item.image_variants_stale),
+                         ('products/lamp.jpg', 'FETCHED', True))
+
+
+@override_settings(IMAGE_FETCH_IN_PROCESS_WORKER=False, REORDER_SNAPSHOT_IN_PROCESS_WORKER=False,
+                   IMAGE_VARIANT_WIDTHS=(32, 96))
+class ImageVariantTests(TestCase):
+    """
+    Uploads get a rendition per configured width in both formats, pages use
+    them through {% item_picture %}, and a replaced image is rendered again.
+    """
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        media = override_settings(MEDIA_ROOT=media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+
+    @staticmethod
+    def upload(name, color):
+        from django.core.files.uploadedfile import SimpleUploadedFile
+
+        image = BytesIO()
+        PILImage.new('RGB', (400, 200), color).save(image, 'JPEG')
+        return SimpleUploadedFile(name, image.getvalue(), content_type='image/jpeg')
+
+    def test_renditions_follow_the_configured_widths_and_the_image(self):
+        from django.template import Context, Template
+        from inventory.image_variants import ImageVariantBuilder
+
+        builder = ImageVariantBuilder()
+        item = Item.objects.create(name='Variant Vase', sku='VARIANT-1', quantity=1, price=Decimal('1.00'),
+                                   image=self.upload('vase.jpg', (200, 40, 40)))
+        self.assertTrue(item.image_variants_stale)
+        self.assertEqual(builder.process_stale(), 1)
+
+        item.refresh_from_db()
+        variants = item.image_variants
+        self.assertEqual(variants['source'], item.image.name)
+        for ext in ('webp', 'jpeg'):
+            self.assertEqual(sorted(variants[ext], key=int), ['32', '96'])
+            for width, path in variants[ext].items():
+                with item.image.storage.open(path) as f:
+                    self.assertEqual(PILImage.open(f).size[0], int(width))
+
+        html = Template('{% load inventory_extras %}{% item_picture item 96 %}').render(Context({'item': item}))
+        self.assertIn(item.image.storage.url(variants['webp']['96']) + ' 96w', html)
+        self.assertNotIn(item.image.url + '"', html)
+
+        # A new upload makes the old renditions stale until they are rebuilt
+        item.image = self.upload('vase-blue.jpg', (40, 40, 200))
+        item.save()
+        self.assertTrue(item.image_variants_stale)
+        self.assertEqual(item.get_image_url(96), item.image.url)
+        self.assertEqual(builder.process_stale(), 1)
+        item.refresh_from_db()
+        self.assertEqual(item.image_variants['source'], item.image.name)
+        self.assertNotEqual(item.image_variants['jpeg']['96'], variants['jpeg']['96'])
+
+
+class _BouncingMailBackend(locmem.EmailBackend):
+    """locmem backend that connects like the SMTP one and refuses "bounce" addresses."""
+
+    opened = 0
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.connected = False
+
+    def open(self):
+        if self.connected:
+            return False
+        type(self).opened += 1
+        self.connected = True
+        return True
+
+    def close(self):
+        self.connected = False
+
+    def send_messages(self, messages):
+        new_connection = self.open()
+        try:
+            if any('bounce' in address for message in messages for address in message.to):
+                raise ConnectionError('Recipient refused')
+            return super().send_messages(messages)
+        finally:
+            if new_connection:
+                self.close()
+
+
+@override_settings(
+    EMAIL_BACKEND='inventory.tests._BouncingMailBackend',
+    EMAIL_QUEUE_IN_PROCESS_WORKER=False,
+    EMAIL_QUEUE_RETRY_BASE_SECONDS=60,
+    EMAIL_QUEUE_MAX_ATTEMPTS=2,
+    REORDER_SNAPSHOT_IN_PROCESS_WORKER=False,
+)
+class MailQueueTests(TestCase):
+    """
+    Stock alerts collapse into one digest per recipient and interval, a
+    refused message backs off and gives up, and the rest of its batch keeps
+    sharing one reopened connection.
+    """
+
+    def setUp(self):
+        from inventory.mail_queue import MailQueue
+
+        self.queue = MailQueue()
+        _BouncingMailBackend.opened = 0
+        self.items = [Item.objects.create(name=f'Digest Item {n}', sku=f'DIGEST-{n}', quantity=n, reorder_level=5,
+                                          price=Decimal('1.00')) for n in range(3)]
+
+    def test_alerts_are_digested_per_recipient(self):
+        for item in self.items:
+            self.queue.queue_stock_alert(item, ['owner@example.com'])
+        self.queue.queue_stock_alert(self.items[0], ['owner@example.com', 'buyer@example.com'])
+        restocked = self.items[2]
+        restocked.quantity = 50
+        restocked.save()
+
+        self.assertEqual(self.queue.process_due()['sent'], 2)
+        subjects = {message.to[0]: message.subject for message in mail.outbox}
+        self.assertIn('2 items need restocking', subjects['owner@example.com'])
+        self.assertIn('Digest Item 0', subjects['buyer@example.com'])
+        self.assertNotIn('Digest Item 2', mail.outbox[0].body + mail.outbox[1].body)
+
+        # A new alert within the interval waits for the next digest
+        self.queue.queue_stock_alert(self.items[1], ['owner@example.com'])
+        self.assertEqual(self.queue.process_due()['digests'], 0)
+        OutboundEmail.objects.update(created_at=timezone.now() - self.queue.digest_interval)
+        self.assertEqual(self.queue.process_due()['sent'], 1)
+
+    def test_refused_message_backs_off_then_fails(self):
+        self.queue.enqueue(['bounce@example.com'], 'Hello', 'Body')
+        before = timezone.now()
+        self.assertEqual(self.queue.process_due()['retrying'], 1)
+        message = OutboundEmail.objects.get()
+        self.assertEqual((message.status, message.attempts), ('QUEUED', 1))
+        delay = (message.next_attempt_at - before).total_seconds()
+        self.assertTrue(48 <= delay <= 73, delay)
+
+        OutboundEmail.objects.update(next_attempt_at=timezone.now())
+        self.assertEqual(self.queue.process_due()['failed'], 1)
+        message.refresh_from_db()
+        self.assertEqual((message.status, message.attempts, message.next_attempt_at), ('FAILED', 2, None))
+
+    def test_batch_reuses_one_connection_after_a_failure(self):
+        recipients = ['a@example.com', 'bounce@example.com', 'b@example.com', 'c@example.com', 'd@example.com']
+        for recipient in recipients:
+            self.queue.enqueue([recipient], 'Hello', 'Body')
+
+        summary = self.queue.process_due()
+        self.assertEqual((summary['sent'], summary['retrying']), (4, 1))
+        self.assertEqual(sorted(message.to[0] for message in mail.outbox),
+                         ['a@example.com', 'b@example.com', 'c@example.com', 'd@example.com'])
+        self.assertEqual(_BouncingMailBackend.opened, 2)   # the first connection and one reconnect
+
+
+class _StubWebhookHandler(BaseHTTPRequestHandler):
+    """Webhook receiver that fails the first `failures` POSTs."""
+
+    failures = 0
+    received = []
+
+    def do_POST(self):
+        self.received.append(self.rfile.read(int(self.headers['Content-Length'])))
+        status = 500 if len(self.received) <= self.failures else 204
+        self.send_response(status)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+
+@override_settings(EMAIL_QUEUE_IN_PROCESS_WORKER=False, REORDER_SNAPSHOT_IN_PROCESS_WORKER=False,
+                   STOCK_ALERT_RECIPIENTS=[])
+class StockEventTests(TestCase):
+    """
+    Each threshold transition raises exactly one event after commit, a
+    rolled-back change raises none, webhook retries wait outside the pool,
+    and alert recipients are looked up once until a user changes.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('event_admin', 'event@example.com', 'password')
+
+    def setUp(self):
+        from inventory.stock_events import stock_events
+
+        self.events = []
+        stock_events.subscribe(self.events.append, name='test_collector')
+        self.addCleanup(stock_events.unsubscribe, 'test_collector')
+        self.item = Item.objects.create(name='Event Kettle', sku='EVENT-1', quantity=20, reorder_level=5,
+                                        price=Decimal('9.00'), cost_price=Decimal('5.00'))
+
+    def move(self, transaction_type, quantity):
+        with self.captureOnCommitCallbacks(execute=True):
+            Transaction.objects.create(item=self.item, transaction_type=transaction_type, quantity=quantity,
+                                       unit_price=Decimal('5.00'), payment_status='PAID', payment_method='CASH',
+                                       performed_by=self.admin)
+
+    def test_one_event_per_transition_and_none_on_rollback(self):
+        steps = [('SALE', 16, ['LOW_STOCK']), ('SALE', 1, []), ('SALE', 3, ['OUT_OF_STOCK']),
+                 ('PURCHASE', 10, ['RESTOCKED']), ('PURCHASE', 5, [])]
+        for transaction_type, quantity, expected in steps:
+            with self.subTest(transaction_type=transaction_type, quantity=quantity):
+                self.events.clear()
+                self.move(transaction_type, quantity)
+                self.assertEqual([event['type'] for event in self.events], expected)
+
+        self.events.clear()
+        with self.captureOnCommitCallbacks(execute=True):
+            try:
+                with db_transaction.atomic():
+                    Transaction.objects.create(item=self.item, transaction_type='SALE', quantity=15,
+                                               unit_price=Decimal('9.00'), payment_status='PAID',
+                                               payment_method='CASH', performed_by=self.admin)
+                    raise RuntimeError('payment capture failed')
+            except RuntimeError:
+                pass
+        self.assertEqual(self.events, [])
+        self.assertEqual(Item.objects.get(pk=self.item.pk).quantity, 15)
+
+    def test_webhook_retry_is_scheduled_not_slept(self):
+        from inventory.stock_events import WebhookNotifier
+
+        server = ThreadingHTTPServer(('127.0.0.1', 0), _StubWebhookHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        _StubWebhookHandler.failures, _StubWebhookHandler.received = 1, []
+        url = f'http://127.0.0.1:{server.server_address[1]}/hook'
+
+        notifier = WebhookNotifier(retry_base_seconds=0.5)
+        started = time.monotonic()
+        self.assertFalse(notifier.deliver(url, b'{}'))
+        self.assertLess(time.monotonic() - started, 0.5)
+
+        deadline = time.monotonic() + 5
+        while len(_StubWebhookHandler.received) < 2 and time.monotonic() < deadline:
+            time.sleep(0.05)
+        self.assertEqual(_StubWebhookHandler.received, [b'{}', b'{}'])
+
+    def test_alert_recipients_are_cached_until_a_user_changes(self):
+        from inventory.stock_events import alert_recipients
+
+        cache.clear()
+        self.assertEqual(alert_recipients(), ['event@example.com'])
+        with self.assertNumQueries(0):
+            alert_recipients()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            User.objects.create_superuser('event_owner', 'owner@example.com', 'password')
+        self.assertEqual(sorted(alert_recipients()), ['event@example.com', 'owner@example.com'])
+
+
+class NotificationInboxTests(TestCase):
+    """
+    A stock event writes one notification for everybody; read state is per
+    user, and a newer event supersedes the item's alert for everyone
+    without marking it read.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('inbox_admin', 'inbox@example.com', 'password')
+        cls.other = User.objects.create_superuser('inbox_other', 'other@example.com', 'password')
+        cls.item = Item.objects.create(name='Inbox Toaster', sku='INBOX-1', quantity=3, reorder_level=5,
+                                       price=Decimal('20.00'))
+
+    def notify(self, event_type, quantity):
+        from inventory.notifications import notification_manager
+
+        return notification_manager.notify_stock_event({
+            'type': event_type, 'item_id': self.item.pk, 'item_name': self.item.name, 'quantity': quantity,
+            'reorder_level': 5, 'lead_time_days': 7, 'days_until_stockout': None,
+        })
+
+    def unread(self, user):
+        self.client.force_login(user)
+        return self.client.get(reverse('inventory:notification_unread_count')).json()['unread']
+
+    def test_inbox_read_state_is_per_user(self):
+        with self.assertNumQueries(2):
+            self.assertEqual(self.notify('LOW_STOCK', 3), 1)
+        self.assertEqual(Notification.objects.count(), 1)
+        self.assertEqual((self.unread(self.admin), self.unread(self.other)), (1, 1))
+
+        self.client.force_login(self.admin)
+        response = self.client.post(reverse('inventory:notification_read_all'))
+        self.assertRedirects(response, reverse('inventory:notification_list'))
+        self.assertEqual((self.unread(self.admin), self.unread(self.other)), (0, 1))
+
+        # The next state supersedes the old alert for everyone
+        self.notify('OUT_OF_STOCK', 0)
+        self.assertEqual((self.unread(self.admin), self.unread(self.other)), (1, 1))
+        self.client.force_login(self.other)
+        inbox = self.client.get(reverse('users:dashboard')).context['inbox']
+        self.assertEqual([n.event_type for n in inbox['notifications']], ['OUT_OF_STOCK'])
+
+        self.assertEqual(self.notify('RESTOCKED', 12), 0)
+        self.assertEqual((self.unread(self.admin), self.unread(self.other)), (0, 0))
+        response = self.client.get(reverse('inventory:notification_list'))
+        rows = list(response.context['notifications'])
+        self.assertEqual([(n.superseded, n.is_read) for n in rows], [(True, False), (True, False)])
+        self.assertContains(response, 'resolved', count=2)
+
+        # Someone who joins later starts with an empty inbox
+        newcomer = User.objects.create_superuser('inbox_new', 'new@example.com', 'password')
+        self.notify('LOW_STOCK', 4)
+        self.assertEqual(self.unread(newcomer), 1)
+        self.client.force_login(newcomer)
+        self.assertEqual(len(self.client.get(reverse('inventory:notification_list')).context['notifications']), 1)
+
+
+@override_settings(REORDER_SNAPSHOT_IN_PROCESS_WORKER=False)
+class LiveFeedTests(TestCase):
+    """
+    Sales publish live feed events after commit, and a feed failure never
+    surfaces in the save that triggered it.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('feed_admin', 'feed@example.com', 'password')
+        cls.item = Item.objects.create(name='Feed Item', sku='FEED-1', quantity=10, price=Decimal('12.50'),
+                                       cost_price=Decimal('8.00'))
+
+    def last_event(self):
+        from inventory.live_feed import live_feed
+
+        frame = live_feed._history[-1][1] if live_feed._history else ''
+        return json.loads(frame.split('data: ', 1)[1]) if frame else None
+
+    def test_float_unit_price_sale_is_published(self):
+        # The transaction form passes unit_price as a float
+        with self.captureOnCommitCallbacks(execute=True):
+            sale = Transaction.objects.create(item=self.item, transaction_type='SALE', quantity=2, unit_price=12.5,
+                                              payment_status='PAID', payment_method='CASH', performed_by=self.admin)
+        event = self.last_event()
+        self.assertEqual((event['id'], event['profit']), (sale.pk, '9.00'))
+
+    def test_failed_event_is_logged_not_raised(self):
+        from inventory.live_feed import live_feed
+
+        def broken():
+            raise TypeError('unsupported operand')
+
+        before = self.last_event()
+        with self.assertLogs('inventory.live_feed', 'ERROR'):
+            with self.captureOnCommitCallbacks(execute=True) as callbacks:
+                live_feed.publish('transaction', broken)
+        self.assertEqual(callbacks, [])
+        self.assertEqual(self.last_event(), before)
+
+
+class KhaltiCallbackTests(TestCase):
+    """
+    The async Khalti callback against the mock gateway: verified, rejected
+    and replayed callbacks, with stock deducted exactly once.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('khalti_admin', 'khalti@example.com', 'password')
+        cls.item = Item.objects.create(name='Khalti Item', sku='KHALTI-1', quantity=10, price=Decimal('25.00'),
+                                       cost_price=Decimal('15.00'))
+
+    def setUp(self):
+        from inventory.mock_gateway import MockGatewayServer
+
+        self.gateway = MockGatewayServer().start()
+        self.addCleanup(self.gateway.stop)
+        gateway_settings = override_settings(KHALTI_SECRET_KEY='test_secret_key', **self.gateway.urls)
+        gateway_settings.enable()
+        self.addCleanup(gateway_settings.disable)
+
+    def pending_sale(self, quantity=2):
+        return Transaction.objects.create(item=self.item, transaction_type='SALE', quantity=quantity,
+                                          unit_price=Decimal('25.00'), payment_status='PENDING',
+                                          payment_method='KHALTI', performed_by=self.admin)
+
+    async def callback(self, sale, token):
+        return await self.async_client.get(reverse('inventory:verify_khalti_payment'), {
+            'token': token, 'amount': str(int(sale.total_amount * 100)), 'product_identity': str(sale.pk),
+        })
+
+    async def test_verified_callback_marks_paid_once(self):
+        from inventory.payment_gateways import apply_verification
+
+        await self.async_client.aforce_login(self.admin)
+        sale = await sync_to_async(self.pending_sale)()
+
+        response = await self.callback(sale, 'token-ok')
+        self.assertRedirects(response, reverse('inventory:payment_success', args=[sale.pk]),
+                             fetch_redirect_response=False)
+        await sale.arefresh_from_db()
+        await self.item.arefresh_from_db()
+        self.assertEqual(sale.payment_status, 'PAID')
+        self.assertTrue(sale.payment_reference.startswith('MOCK'))
+        self.assertEqual(self.item.quantity, 8)
+
+        # Replayed callback (refresh, back button): no second verification or deduction
+        response = await self.callback(sale, 'token-ok')
+        self.assertRedirects(response, reverse('inventory:payment_success', args=[sale.pk]),
+                             fetch_redirect_response=False)
+        _, changed = await sync_to_async(apply_verification)(sale.pk, True, 'MOCK-REPLAY')
+        self.assertFalse(changed)
+        await self.item.arefresh_from_db()
+        self.assertEqual(self.item.quantity, 8)
+        self.assertEqual(self.gateway.counts['khalti_verify'], 1)
+
+    async def test_rejected_callback_marks_failed(self):
+        await self.async_client.aforce_login(self.admin)
+        sale = await sync_to_async(self.pending_sale)()
+
+        response = await self.callback(sale, 'fail-token')
+        self.assertRedirects(response, reverse('inventory:payment_failure', args=[sale.pk]),
+                             fetch_redirect_response=False)
+        await sale.arefresh_from_db()
+        await self.item.arefresh_from_db()
+        self.assertEqual(sale.payment_status, 'FAILED')
+        self.assertEqual(self.item.quantity, 10)
+
+
+@override_settings(PAYMENT_SIMULATION_MODE=True)
+class PaymentReconcilerTests(TestCase):
+    """
+    The payment reconciler against PaymentSimulator lookups: each gateway
+    outcome settles a stale PENDING sale once, and a payment that can no
+    longer be filled is reported instead of applied.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('reconcile_admin', 'reconcile@example.com', 'password')
+        cls.item = Item.objects.create(name='Reconcile Item', sku='RECONCILE-1', quantity=20,
+                                       price=Decimal('30.00'), cost_price=Decimal('18.00'))
+
+    def setUp(self):
+        from inventory.payment_simulation import PaymentSimulator
+
+        self.addCleanup(PaymentSimulator.lookup_outcomes.clear)
+
+    def stale_sale(self, outcome, age=timedelta(hours=1), quantity=2):
+        from inventory.payment_simulation import PaymentSimulator
+
+        sale = Transaction.objects.create(item=self.item, transaction_type='SALE', quantity=quantity,
+                                          unit_price=Decimal('30.00'), payment_status='PENDING',
+                                          payment_method='KHALTI', performed_by=self.admin)
+        Transaction.objects.filter(pk=sale.pk).update(timestamp=timezone.now() - age)
+        if outcome:
+            PaymentSimulator.set_lookup_outcome(sale.pk, outcome)
+        return sale
+
+    def test_outcomes_are_settled_once(self):
+        from inventory.payment_reconciler import payment_reconciler
+
+        paid = self.stale_sale('PAID')
+        failed = self.stale_sale('FAILED')
+        expired = self.stale_sale(None, age=timedelta(hours=30))   # NOT_FOUND for longer than the expiry
+        pending = self.stale_sale('PENDING')
+        self.stale_sale('PAID', age=timedelta(minutes=1))          # too recent to reconcile
+
+        summary = payment_reconciler.reconcile(min_age_minutes=15, expire_after_hours=24)
+        self.assertEqual(summary, {'checked': 4, 'paid': 1, 'failed': 1, 'expired': 1, 'pending': 1,
+                                   'skipped': 0, 'errors': 0})
+        statuses = dict(Transaction.objects.filter(
+            pk__in=[paid.pk, failed.pk, expired.pk, pending.pk],
+        ).values_list('pk', 'payment_status'))
+        self.assertEqual(statuses, {paid.pk: 'PAID', failed.pk: 'FAILED', expired.pk: 'FAILED', pending.pk: 'PENDING'})
+        self.item.refresh_from_db()
+        self.assertEqual(self.item.quantity, 18)
+
+        # A callback settled the sale after the reconciler read it: nothing to apply
+        self.assertEqual(payment_reconciler.apply(paid, {'status': 'PAID', 'reference': 'LATE'}, timezone.now()),
+                         'skipped')
+        self.assertEqual(payment_reconciler.apply(failed, {'status': 'FAILED'}, timezone.now()), 'skipped')
+        self.item.refresh_from_db()
+        self.assertEqual(self.item.quantity, 18)
+        self.assertEqual(payment_reconciler.reconcile(min_age_minutes=15)['paid'], 0)
+
+    def test_paid_without_stock_is_reported(self):
+        from inventory.payment_reconciler import payment_reconciler
+
+        sale = self.stale_sale('PAID', quantity=5)
+        Item.objects.filter(pk=self.item.pk).update(quantity=3)
+
+        with self.assertLogs('inventory.payment_reconciler', 'ERROR'):
+            summary = payment_reconciler.reconcile(min_age_minutes=15)
+        self.assertEqual((summary['checked'], summary['errors'], summary['paid']), (1, 1, 0))
+        sale.refresh_from_db()
+        self.item.refresh_from_db()
+        self.assertEqual((sale.payment_status, self.item.quantity), ('PENDING', 3))
+
+
+class AccessRevocationTests(TestCase):
+    """
+    Cached roles are checked against the access version on the user's
+    profile, so rejections and demotions apply on the next request even
+    where another process still holds the old cache entry.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        from users.utils import UserRoleManager
+
+        cls.admin = User.objects.create_superuser('access_admin', 'access@example.com', 'password')
+        cls.manager = User.objects.create_user('access_manager', 'manager@example.com', 'password')
+        cls.manager.userprofile.is_approved = True
+        cls.manager.userprofile.approval_status = 'approved'
+        cls.manager.userprofile.save()
+        UserRoleManager.assign_role(cls.manager, 'manager')
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.manager)
+
+    def get_suppliers(self):
+        return self.client.get(reverse('inventory:supplier_list'))
+
+    def test_reject_user_denies_a_cached_user(self):
+        self.assertEqual(self.get_suppliers().status_code, 200)
+        with CaptureQueriesContext(connection) as warm:
+            self.assertEqual(self.get_suppliers().status_code, 200)
+        self.assertFalse([q for q in warm if 'auth_group' in q['sql']])   # roles came from the cache
+
+        admin_client = self.client_class()
+        admin_client.force_login(self.admin)
+        admin_client.post(reverse('users:reject_user', args=[self.manager.pk]))
+
+        response = self.client.get(reverse('users:dashboard'))
+        self.assertRedirects(response, reverse('users:login'), fetch_redirect_response=False)
+
+    def test_demotion_outlives_a_stale_cache_entry(self):
+        from users.access import access_cache
+        from users.utils import UserRoleManager
+
+        self.assertEqual(self.get_suppliers().status_code, 200)
+        stale = cache.get(access_cache._key(self.manager.pk))
+
+        UserRoleManager.assign_role(User.objects.get(pk=self.manager.pk), 'staff')
+        cache.set(access_cache._key(self.manager.pk), stale)   # as another worker process still has it
+
+        self.assertNotEqual(self.get_suppliers().status_code, 200)
+        self.assertEqual(cache.get(access_cache._key(self.manager.pk))['groups'], ['Staff'])
+
+
+class HierarchicalForecastTests(TestCase):
+    """
+    Supplier-pooled forecasts: every level of the hierarchy sums up,
+    sparse items lean on their supplier, and only sales and supplier
+    assignment invalidate the snapshot.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('hierarchy_admin', 'hierarchy@example.com', 'password')
+        cls.cables = Supplier.objects.create(name='Hierarchy Cables')
+        cls.screens = Supplier.objects.create(name='Hierarchy Screens')
+
+        def item(n, supplier):
+            return Item.objects.create(name=f'Hierarchy Item {n}', sku=f'HIERARCHY-{n}', quantity=1000,
+                                       price=Decimal('10.00'), cost_price=Decimal('5.00'), supplier=supplier)
+
+        cls.busy, cls.sparse, cls.screen, cls.loose = (
+            item(1, cls.cables), item(2, cls.cables), item(3, cls.screens), item(4, None),
+        )
+        for days_ago in range(20):
+            cls.sell(cls.busy, 6, days_ago)
+            if days_ago % 2:
+                cls.sell(cls.screen, 3, days_ago)
+        cls.sell(cls.sparse, 1, 3)
+        cls.sell(cls.loose, 2, 1)
+
+    @classmethod
+    def sell(cls, item, quantity, days_ago=0):
+        sale = Transaction.objects.create(item=item, transaction_type='SALE', quantity=quantity,
+                                          unit_price=Decimal('10.00'), payment_status='PAID',
+                                          payment_method='CASH', performed_by=cls.admin)
+        Transaction.objects.filter(pk=sale.pk).update(timestamp=timezone.now() - timedelta(days=days_ago))
+
+    def test_levels_are_coherent(self):
+        from inventory.hierarchical_forecast import HierarchicalForecaster
+
+        snapshot = HierarchicalForecaster().forecast()
+        items, suppliers = snapshot['items'], snapshot['suppliers']
+        for supplier_id, members in [(self.cables.pk, [self.busy, self.sparse]),
+                                     (self.screens.pk, [self.screen]), (None, [self.loose])]:
+            self.assertAlmostEqual(sum(items[item.pk] for item in members), suppliers[supplier_id])
+        self.assertAlmostEqual(sum(suppliers.values()), snapshot['catalogue'])
+        self.assertAlmostEqual(sum(items.values()), snapshot['catalogue'])
+
+    def test_sparse_item_is_pooled_with_its_supplier(self):
+        from inventory.hierarchical_forecast import HierarchicalForecaster
+
+        forecaster = HierarchicalForecaster()
+        snapshot = forecaster.forecast()
+        self.assertEqual(snapshot['selling_days'][self.sparse.pk], 1)
+        # Its own history alone: one unit, three days ago
+        weights = [0.5 ** (age / forecaster.half_life_days) for age in range(forecaster.days_history)]
+        own_base = weights[3] / sum(weights)
+        self.assertGreater(snapshot['items'][self.sparse.pk], own_base)
+        self.assertLess(snapshot['items'][self.sparse.pk], snapshot['items'][self.busy.pk])
+
+        forecast = InventoryDemandPredictor().predict_future_demand(self.sparse, 7)
+        self.assertEqual(forecast['method'], 'hierarchical')
+        self.assertAlmostEqual(forecast['summary']['avg_daily_demand'],
+                               round(snapshot['items'][self.sparse.pk], 2), places=2)
+
+    def test_version_follows_sales_and_suppliers_only(self):
+        from inventory.hierarchical_forecast import HierarchicalForecaster
+
+        forecaster = HierarchicalForecaster()
+        version = forecaster.current_version()
+
+        self.busy.quantity = 10
+        self.busy.price = Decimal('12.00')
+        self.busy.save()
+        self.assertEqual(forecaster.current_version(), version)
+
+        self.sell(self.screen, 1)
+        after_sale = forecaster.current_version()
+        self.assertNotEqual(after_sale, version)
+
+        self.sparse.supplier = self.screens
+        self.sparse.save()
+        self.assertNotEqual(forecaster.current_version(), after_sale)
+
+
+class MetricsTests(TestCase):
+    """
+    The Prometheus exposition format, who may read /metrics, and query
+    counting for requests served by async views.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('metrics_admin', 'metrics@example.com', 'password')
+        cls.clerk = User.objects.create_user('metrics_clerk', 'clerk@example.com', 'password')
+
+    def test_histogram_buckets_are_cumulative(self):
+        from inventory.metrics import MetricsRegistry
+
+        registry = MetricsRegistry()
+        latency = registry.histogram('test_latency_seconds', 'Test latency', ['view'], buckets=(1, 5))
+        hits = registry.counter('test_hits_total', 'Test hits', ['view'])
+        for seconds in (0.5, 3, 3, 10):
+            latency.observe(seconds, view='home')
+        hits.inc(view='home')
+        hits.inc(2, view='home')
+
+        lines = registry.render().splitlines()
+        self.assertIn('# TYPE test_latency_seconds histogram', lines)
+        expected = [
+            'test_latency_seconds_bucket{view="home",le="1"} 1',
+            'test_latency_seconds_bucket{view="home",le="5"} 3',
+            'test_latency_seconds_bucket{view="home",le="+Inf"} 4',
+            'test_latency_seconds_sum{view="home"} 16.5',
+            'test_latency_seconds_count{view="home"} 4',
+        ]
+        start = lines.index(expected[0])
+        self.assertEqual(lines[start:start + len(expected)], expected)
+        self.assertIn('test_hits_total{view="home"} 3', lines)
+        with self.assertRaises(ValueError):
+            hits.inc(page='home')
+
+    @override_settings(METRICS_ALLOWED_IPS=[], METRICS_TOKEN='scrape-secret')
+    def test_endpoint_access(self):
+        url = reverse('metrics')
+        self.assertEqual(self.client.get(url).status_code, 403)
+        self.assertEqual(self.client.get(url, headers={'Authorization': 'Bearer wrong'}).status_code, 403)
+
+        response = self.client.get(url, headers={'Authorization': 'Bearer scrape-secret'})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        self.assertIn(b'# TYPE inventory_http_requests_total counter', response.content)
+
+        with self.settings(METRICS_ALLOWED_IPS=['127.0.0.1']):
+            self.assertEqual(self.client.get(url).status_code, 200)
+        with self.settings(METRICS_TOKEN=''):
+            self.assertEqual(self.client.get(url, headers={'Authorization': 'Bearer '}).status_code, 403)
+
+        self.client.force_login(self.clerk)
+        self.assertEqual(self.client.get(url).status_code, 403)
+        self.client.force_login(self.admin)
+        self.assertEqual(self.client.get(url).status_code, 200)
+
+    async def test_async_view_queries_are_counted(self):
+        from inventory.metrics import REQUEST_QUERIES
+
+        view = 'inventory:verify_khalti_payment'
+
+        def observed():
+            state = REQUEST_QUERIES.values.get((view,), {'sum': 0.0, 'count': 0})
+            return state['sum'], state['count']
+
+        queries_before, count_before = observed()
+        await self.async_client.aforce_login(self.admin)
+        # Missing callback data: the view only redirects, after the session
+        # and user lookups have run in sync_to_async threads
+        response = await self.async_client.get(reverse(view))
+        self.assertEqual(response.status_code, 302)
+
+        queries_after, count_after = observed()
+        self.assertEqual(count_after, count_before + 1)
+        self.assertGreater(queries_after, queries_before)
+
+
+@override_settings(REORDER_SNAPSHOT_IN_PROCESS_WORKER=False)
+class ProfilingMiddlewareTests(TestCase):
+    """
+    ?_profile=1 is honoured for admins only, stored profiles are pruned to
+    PROFILE_KEEP, and profile ids are checked before touching the disk.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        from users.utils import UserRoleManager
+
+        cls.admin = User.objects.create_superuser('profile_admin', 'profile@example.com', 'password')
+        cls.manager = User.objects.create_user('profile_manager', 'pmanager@example.com', 'password')
+        cls.manager.userprofile.is_approved = True
+        cls.manager.userprofile.approval_status = 'approved'
+        cls.manager.userprofile.save()
+        UserRoleManager.assign_role(cls.manager, 'manager')
+
+    def setUp(self):
+        self.profile_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.profile_dir, ignore_errors=True)
+        profile_settings = override_settings(PROFILE_DIR=self.profile_dir, PROFILE_KEEP=2)
+        profile_settings.enable()
+        self.addCleanup(profile_settings.disable)
+
+    def stored(self):
+        return sorted(os.listdir(self.profile_dir))
+
+    def test_non_admins_cannot_profile(self):
+        url = reverse('inventory:supplier_list')
+        self.client.force_login(self.manager)
+        response = self.client.get(url, {'_profile': '1'})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('X-Profile-Id', response)
+        response = self.client.get(url, headers={'X-Profile': 'cprofile'})
+        self.assertNotIn('X-Profile-Id', response)
+
+        self.client.logout()
+        self.assertNotIn('X-Profile-Id', self.client.get(reverse('users:login'), {'_profile': '1'}))
+        self.assertEqual(self.stored(), [])
+
+    def test_profiles_are_pruned_to_profile_keep(self):
+        self.client.force_login(self.admin)
+        ids = []
+        for mode in ('1', 'cprofile', '1'):
+            response = self.client.get(reverse('inventory:supplier_list'), {'_profile': mode})
+            self.assertEqual(response['X-Profile-URL'], f"/inventory/profiles/{response['X-Profile-Id']}/")
+            ids.append(response['X-Profile-Id'])
+            # Distinct mtimes, so "newest" is well defined on coarse clocks
+            summary = os.path.join(self.profile_dir, f'{ids[-1]}.json')
+            os.utime(summary, (time.time() - 100 + len(ids),) * 2)
+
+        stems = {name.split('.', 1)[0] for name in self.stored()}
+        self.assertEqual(stems, set(ids[1:]))
+        self.assertIn(f'{ids[1]}.pstats', self.stored())
+
+        summary = json.loads(open(os.path.join(self.profile_dir, f'{ids[2]}.json')).read())
+        self.assertEqual((summary['mode'], summary['view']), ('sample', 'inventory:supplier_list'))
+        response = self.client.get(reverse('inventory:profile_download', args=[ids[2]]))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(b''.join(response.streaming_content))['profiles'][0]['type'], 'sampled')
+
+    def test_download_rejects_ids_that_are_not_profile_ids(self):
+        # A summary-shaped file whose name is not a profile id is never served
+        with open(os.path.join(self.profile_dir, 'notes.json'), 'w') as f:
+            json.dump({'file': 'notes.json'}, f)
+        self.client.force_login(self.admin)
+        for profile_id in ('notes', 'ABCDEF' + '0' * 26, '0' * 31, '..'):
+            with self.subTest(profile_id=profile_id):
+                url = reverse('inventory:profile_download', args=[profile_id])
+                self.assertEqual(self.client.get(url).status_code, 404)
+
+
+@override_settings(
+    EMAIL_QUEUE_IN_PROCESS_WORKER=False,
+    IMAGE_FETCH_IN_PROCESS_WORKER=False,
+    REORDER_SNAPSHOT_IN_PROCESS_WORKER=False,
+    PAYMENT_SIMULATION_MODE=True,
+)
+class LoadToolingSmokeTests(LiveServerTestCase):
+    """
+    seed_load_dataset, run_load_test and run_benchmarks run end to end on
+    a tiny dataset and write their JSON reports.
+    """
+
+    def setUp(self):
+        self.output_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.output_dir, ignore_errors=True)
+
+    def test_seed_and_load_test(self):
+        call_command('seed_load_dataset', items=12, days=5, tx_per_day=8, users=1, seed=3, stdout=StringIO())
+        self.assertEqual(Item.objects.filter(sku__startswith='LOAD-').count(), 12)
+        self.assertTrue(User.objects.filter(username='loadtest_1').exists())
+
+        report = os.path.join(self.output_dir, 'load.json')
+        call_command(
+            'run_load_test', base_url=self.live_server_url, users=1, accounts=1, iterations=4,
+            think_time=0, ramp_up=0, seed=5, json=report, stdout=StringIO(),
+        )
+        with open(report) as f:
+            summary = json.load(f)
+        self.assertEqual(summary['options']['iterations'], 4)
+        self.assertGreater(summary['requests'], 0)
+        self.assertEqual(summary['errors'], 0, summary.get('error_examples'))
+        self.assertIn('p95', next(iter(summary['endpoints'].values())))
+
+    def test_run_benchmarks(self):
+        # Its own process: the command creates and drops a test database of its own
+        output = os.path.join(self.output_dir, 'bench.json')
+        result = subprocess.run(
+            [sys.executable, 'manage.py', 'run_benchmarks', f"--settings={os.environ['DJANGO_SETTINGS_MODULE']}",
+             '--items', '12', '--days', '5', '--tx-per-day', '8',
+             '--min-rounds', '1', '--min-time', '0', '--max-time', '0', '--output', output],
+            cwd=settings.BASE_DIR, capture_output=True, text=True, timeout=600,
+        )
+        self.assertEqual(result.returncode, 0, result.stderr)
+        with open(output) as f:
+            results = json.load(f)
+        self.assertEqual(results['dataset']['items'], 12)
+        self.assertEqual(set(results['benchmarks']), {bench.name for bench in benchmarks.select([])})
+        self.assertTrue(all(stats['rounds'] >= 1 for stats in results['benchmarks'].values()))
@@ -12,6 +12,8 @@ urlpatterns = [
     path("export/csv/", views.export_csv, name="export_csv"),
     path("adjust/<int:item_id>/", views.stock_adjustment, name="stock_adjustment"),
     path("purchase-order/<int:item_id>/", views.create_purchase_order, name="create_purchase_order"),
+    path("purchase-planning/", views.purchase_planning, name="purchase_planning"),
+    path("purchase-orders/<int:order_id>/update/", views.purchase_order_update, name="purchase_order_update"),
 
     # Supplier URLs
     path("suppliers/", views.supplier_list, name="supplier_list"),
@@ -30,11 +32,21 @@ urlpatterns = [
     path("ai/models/", views.ai_model_management, name="ai_model_management"),
     path("ai/forecast/<int:item_id>/", views.ai_demand_forecast, name="ai_demand_forecast"),
 
+    # Notification inbox
+    path("notifications/", views.notification_list, name="notification_list"),
+    path("notifications/<int:notification_id>/read/", views.notification_read, name="notification_read"),
+    path("notifications/read-all/", views.notification_read_all, name="notification_read_all"),
+
     # Analytics URLs
     path("analytics/", views.analytics_dashboard, name="analytics_dashboard"),
     path("analytics/item/<int:item_id>/", views.item_analytics, name="item_analytics"),
     path("reports/monthly/", views.monthly_report, name="monthly_report"),
 
+    # Request profiler (admins add ?_profile=1 to any page)
+    path("profiles/", views.profile_list, name="profile_list"),
+    path("profiles/<str:profile_id>/", views.profile_detail, name="profile_detail"),
+    path("profiles/<str:profile_id>/download/", views.profile_download, name="profile_download"),
+
     # Transaction URLs
     path("transactions/", views.transaction_list, name="transaction_list"),
     path("transactions/create/", views.transaction_create, name="transaction_create"),
@@ -57,5 +69,8 @@ urlpatterns = [
 
     # AJAX URLs
     path("api/item-price/", views.get_item_price, name="get_item_price"),
+    path("api/search/", views.search_api, name="search_api"),
+    path("api/notifications/unread-count/", views.notification_unread_count, name="notification_unread_count"),
+    path("api/live/", views.live_feed_stream, name="live_feed"),
     path("api/chatbot/", views.chatbot_api, name="chatbot_api"),
 ]
\ No newline at end of file
@@ -1,14 +1,16 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
-from django.db.models import Q, Sum, F, Count
+from django.db.models import Q, Sum, F, Count, Case, When
 from django.db.models.functions import TruncDate, TruncMonth
 from django.contrib import messages
 from django.http import HttpResponse, JsonResponse
 from django.core.paginator import Paginator
 from django.core.exceptions import ValidationError
 from django.utils import timezone
+from django.utils.http import url_has_allowed_host_and_scheme
 from django.conf import settings
 from datetime import datetime, timedelta
+from decimal import Decimal, InvalidOperation
 import csv
 import io
 import uuid
@@ -26,23 +28,118 @@ from users.utils import UserRoleManager
 logger = logging.getLogger(__name__)
 
 
+ITEM_LIST_PAGE_SIZE = 50
+SEARCH_RESULT_LIMIT = 200
+# Items listed in the transaction form before the user searches (search_api fills in the rest)
+TRANSACTION_ITEM_CHOICES = 15
+
+
+def _ranked_search(queryset, kind, query, limit=SEARCH_RESULT_LIMIT):
+    """Restrict a queryset to search index hits, best match first."""
+    from .search_index import search_index
+
+    ranked = search_index.search_ids(kind, query, limit=limit)
+    if not ranked:
+        return queryset.none()
+    return queryset.filter(pk__in=ranked).order_by(
+        Case(*[When(pk=pk, then=position) for position, pk in enumerate(ranked)])
+    )
+
+
+def _keyset_page(queryset, params, page_size):
+    """
+    Keyset (seek) pagination over (name, id).
+
+    ?after=<item id> returns the page following that item and ?before=<item id>
+    the page preceding it. Every page is a single range scan on the
+    (name, id) index, however deep into the catalogue it is.
+
+    Returns:
+        tuple: (items on the page, previous-page cursor or None, next-page cursor or None)
+    """
+    after, before = params.get('after', ''), params.get('before', '')
+    cursor = after or before
+    anchor = None
+    if cursor.isdigit():
+        anchor = Item.all_objects.filter(pk=cursor).values_list('name', 'id').first()
+
+    if anchor and after:
+        name, pk = anchor
+        rows = list(
+            queryset.filter(Q(name__gt=name) | Q(name=name, id__gt=pk))
+            .order_by('name', 'id')[:page_size + 1]
+        )
+        has_prev, has_next = True, len(rows) > page_size
+        rows = rows[:page_size]
+    elif anchor and before:
+        name, pk = anchor
+        rows = list(
+            queryset.filter(Q(name__lt=name) | Q(name=name, id__lt=pk))
+            .order_by('-name', '-id')[:page_size + 1]
+        )
+        has_prev, has_next = len(rows) > page_size, True
+        rows = rows[:page_size][::-1]
+    else:
+        rows = list(queryset.order_by('name', 'id')[:page_size + 1])
+        has_prev, has_next = False, len(rows) > page_size
+        rows = rows[:page_size]
+
+    prev_cursor = rows[0].id if has_prev and rows else None
+    next_cursor = rows[-1].id if has_next and rows else None
+    return rows, prev_cursor, next_cursor
+
+
+def _ranked_page(queryset, ranked, params, page_size):
+    """
+    Pagination over search hits in rank order, with the same ?after= and
+    ?before= item id cursors as _keyset_page().
+
+    `ranked` is the search index's ranked primary keys; hits the queryset
+    filters out are skipped. Two queries: the matching ids, then the page.
+
+    Returns:
+        tuple: (items on the page, previous-page cursor or None, next-page cursor or None)
+    """
+    matching = set(queryset.filter(pk__in=ranked).values_list('pk', flat=True))
+    ordered = [pk for pk in ranked if pk in matching]
+
+    after, before = params.get('after', ''), params.get('before', '')
+    start = 0
+    if after.isdigit() and int(after) in matching:
+        start = ordered.index(int(after)) + 1
+    elif before.isdigit() and int(before) in matching:
+        start = max(0, ordered.index(int(before)) - page_size)
+    page_ids = ordered[start:start + page_size]
+
+    by_pk = queryset.in_bulk(page_ids)
+    rows = [by_pk[pk] for pk in page_ids if pk in by_pk]
+    prev_cursor = rows[0].id if start > 0 and rows else None
+    next_cursor = rows[-1].id if start + page_size < len(ordered) and rows else None
+    return rows, prev_cursor, next_cursor
+
+
 @approved_user_required
 def item_list(request):
-    """List all inventory items with search, filter, and AI-powered notifications"""
+    """
+    List inventory items with indexed search, status filters, keyset pagination
+    and AI-powered notifications.
+
+    Counters come from the maintained StockCounters row and reorder status
+    from the stored snapshot (Item.reorder_*), so the page does the same
+    amount of work whatever the size of the catalogue.
+    """
+    from urllib.parse import urlencode
     from .notifications import notification_manager
-    
-    # Add smart notifications based on AI predictions
-    notification_manager.add_inventory_page_notifications(request)
-    
+
+    # All counters, stock and AI, from one single-row read
+    notification_summary = notification_manager.get_snapshot_summary()
+
+    # Add smart notifications based on the stored AI snapshot
+    notification_manager.add_inventory_page_notifications(request, notification_summary)
+
     items = Item.objects.all()
-    
-    # Handle search
-    search_query = request.GET.get('search', '')
-    if search_query:
-        items = items.filter(
-            Q(name__icontains=search_query)
-        )
-    
+    search_query = request.GET.get('search', '').strip()
+
     # Handle filter
     filter_type = request.GET.get('status', '')
     if filter_type == 'low-stock':
@@ -52,48 +149,48 @@ def item_list(request):
     elif filter_type == 'in-stock':
         items = items.filter(quantity__gt=F('reorder_level'))
     elif filter_type == 'reorder-suggested':
-        # Filter items that need reordering based on AI logic
-        reorder_items = []
-        for item in items:
-            if item.needs_reorder:
-                reorder_items.append(item.id)
-        items = items.filter(id__in=reorder_items)
+        items = items.filter(reorder_needed=True)
     elif filter_type == 'ai-critical':
-        # New filter: AI Critical alerts
-        ai_alerts = notification_manager.get_ai_stock_alerts()
-        critical_item_ids = [a['item'].id for a in ai_alerts if a['urgency'] == 'CRITICAL']
-        items = items.filter(id__in=critical_item_ids)
+        items = items.filter(reorder_needed=True, reorder_urgency='CRITICAL')
 
-    # Calculate summary statistics
-    total_items = Item.objects.count()
-    low_stock_count = Item.objects.filter(quantity__lte=F('reorder_level'), quantity__gt=0).count()
-    out_of_stock_count = Item.objects.filter(quantity=0).count()
-    in_stock_count = Item.objects.filter(quantity__gt=F('reorder_level')).count()
-    
-    # Get AI-powered reorder suggestions
-    reorder_suggestions = []
-    for item in Item.objects.all():
-        if item.needs_reorder:
-            reorder_suggestions.append(item)
-    
-    reorder_count = len(reorder_suggestions)
-    
-    # Get notification summary for template
-    notification_summary = notification_manager.get_notification_summary()
+    # Handle search (SKU prefix and fuzzy name match via the search index):
+    # results stay in rank order, other listings page by name
+    search_capped = False
+    if search_query:
+        from .search_index import search_index
+
+        ranked = search_index.search_ids('items', search_query, limit=SEARCH_RESULT_LIMIT)
+        search_capped = len(ranked) >= SEARCH_RESULT_LIMIT
+        page_items, prev_cursor, next_cursor = _ranked_page(items, ranked, request.GET, ITEM_LIST_PAGE_SIZE)
+    else:
+        page_items, prev_cursor, next_cursor = _keyset_page(items, request.GET, ITEM_LIST_PAGE_SIZE)
+
+    base_params = {k: v for k, v in (('search', search_query), ('status', filter_type)) if v}
+    prev_query = urlencode({**base_params, 'before': prev_cursor}) if prev_cursor else None
+    next_query = urlencode({**base_params, 'after': next_cursor}) if next_cursor else None
+
+    # Most urgent reorder suggestions, straight from the snapshot index
+    reorder_suggestions = Item.objects.filter(reorder_needed=True).order_by(
+        'reorder_rank', '-reorder_shortage_risk'
+    )[:5]
 
     # Get role context using utility
     context = UserRoleManager.get_context_for_user(request.user)
     context.update({
-        "items": items,
+        "items": page_items,
         "search_query": search_query,
+        "search_capped": search_capped,
+        "search_result_limit": SEARCH_RESULT_LIMIT,
         "filter_type": filter_type,
-        "total_items": total_items,
-        "low_stock_count": low_stock_count,
-        "out_of_stock_count": out_of_stock_count,
-        "in_stock_count": in_stock_count,
-        "reorder_count": reorder_count,
-        "reorder_suggestions": reorder_suggestions[:5],  # Show top 5 in sidebar
+        "total_items": notification_summary['total_items'],
+        "low_stock_count": notification_summary['low_stock_count'],
+        "out_of_stock_count": notification_summary['out_of_stock_count'],
+        "in_stock_count": notification_summary['in_stock_count'],
+        "reorder_count": notification_summary['total_alerts'],
+        "reorder_suggestions": reorder_suggestions,  # Top 5 for the sidebar
         "notification_summary": notification_summary,  # AI notification data
+        "prev_query": prev_query,
+        "next_query": next_query,
     })
 
     return render(request, "inventory/list.html", context)
@@ -178,13 +275,19 @@ def export_csv(request):
         'Days Until Stockout', 'Shortage Risk (Units)'
     ])
     
+    # AI data for the whole catalogue in one pass (a fixed number of queries)
+    from .ml_predictor import ml_predictor
+    items = list(Item.objects.all())
+    recommendations = ml_predictor.calculate_reorder_recommendations(items, whole_catalogue=True)
+    forecasts = ml_predictor.forecast_many(items, forecast_days=7, whole_catalogue=True)
+
     # Write data with AI insights
-    for item in Item.objects.all():
+    for item in items:
         stock_value = float(item.price) * item.quantity
         
         # Get AI prediction data
-        ai_reorder_info = item.ai_reorder_info
-        forecast_result = item.get_ai_demand_forecast(days=7)
+        ai_reorder_info = recommendations[item.id]
+        forecast_result = forecasts[item.id]
         
         # Extract AI data safely
         ai_available = ai_reorder_info.get('ai_powered', False)
@@ -220,15 +323,14 @@ def export_csv(request):
     writer.writerow(['AI SYSTEM SUMMARY'])
     
     # Calculate AI coverage and performance
-    total_items = Item.objects.count()
-    items_with_ai = sum(1 for item in Item.objects.all() if item.ai_reorder_info.get('ai_powered', False))
+    total_items = len(items)
+    items_with_ai = sum(1 for rec in recommendations.values() if rec.get('ai_powered', False))
     ai_coverage = (items_with_ai / total_items * 100) if total_items > 0 else 0
     
-    # Get AI reorder suggestions
-    from .ml_predictor import get_ai_reorder_suggestions
-    ai_suggestions = get_ai_reorder_suggestions()
-    critical_alerts = sum(1 for s in ai_suggestions if s['recommendation'].get('urgency') == 'CRITICAL')
-    high_alerts = sum(1 for s in ai_suggestions if s['recommendation'].get('urgency') == 'HIGH')
+    # AI reorder suggestions, from the recommendations above
+    ai_suggestions = [rec for rec in recommendations.values() if rec['needs_reorder']]
+    critical_alerts = sum(1 for rec in ai_suggestions if rec.get('urgency') == 'CRITICAL')
+    high_alerts = sum(1 for rec in ai_suggestions if rec.get('urgency') == 'HIGH')
     
     writer.writerow(['Total Items', total_items])
     writer.writerow(['Items with AI Models', items_with_ai])
@@ -238,7 +340,7 @@ def export_csv(request):
     writer.writerow(['High Priority AI Alerts', high_alerts])
     
     # Calculate total inventory value
-    total_value = sum(float(item.price) * item.quantity for item in Item.objects.all())
+    total_value = sum(float(item.price) * item.quantity for item in items)
     writer.writerow(['Total Inventory Value (Rs.)', f"{total_value:.2f}"])
     
     return response
@@ -271,10 +373,8 @@ def item_add(request):
                 messages.error(request, "All values must be non-negative (lead time must be at least 1 day).")
                 return render(request, "inventory/add.html")
             
-            # Create item - automatic image fetching happens in model's save() method
-            # If user uploaded image: uses uploaded image
-            # If no image uploaded: automatically fetches from Unsplash API
-            # If API fails: uses placeholder (system remains stable)
+            # Create item - if no image was uploaded, save() queues a
+            # background fetch from Unsplash (never blocks this request)
             item = Item.objects.create(
                 name=name,
                 sku=sku,
@@ -289,12 +389,14 @@ def item_add(request):
             # Show appropriate success message
             if image:
                 messages.success(request, f"Item '{name}' has been added successfully with your uploaded image.")
-            elif item.image:
+            else:
                 # Check if Unsplash is configured
-                from django.conf import settings
                 unsplash_key = getattr(settings, 'UNSPLASH_ACCESS_KEY', None)
                 if unsplash_key and unsplash_key != 'YOUR_UNSPLASH_ACCESS_KEY_HERE':
-                    messages.success(request, f"Item '{name}' has been added with product image from Unsplash.")
+                    messages.success(
+                        request,
+                        f"Item '{name}' has been added. A product image is being fetched from Unsplash in the background."
+                    )
                 else:
                     messages.warning(
                         request,
@@ -302,8 +404,6 @@ def item_add(request):
                         f"For product-specific images, configure Unsplash API key in settings. "
                         f"See GET_UNSPLASH_KEY_QUICK.md for instructions."
                     )
-            else:
-                messages.success(request, f"Item '{name}' has been added successfully.")
             
             return redirect("inventory:item_list")
             
@@ -352,6 +452,7 @@ def item_edit(request, item_id):
             item.price = price
             item.reorder_level = reorder_level
             item.lead_time_days = lead_time_days
+            item.min_order_quantity = max(1, int(request.POST.get("min_order_quantity") or item.min_order_quantity))
             
             # Update image if new one is uploaded
             if image:
@@ -498,23 +599,13 @@ def transaction_create(request):
             # Validate inputs
             if quantity <= 0:
                 messages.error(request, "Quantity must be greater than 0.")
-                context = UserRoleManager.get_context_for_user(request.user)
-                context.update({
-                    'items': Item.objects.all().order_by('name'),
-                    'suppliers': Supplier.objects.all().order_by('name'),
-                    'customers': Customer.objects.all().order_by('name'),
-                })
-                return render(request, 'inventory/transaction_create.html', context)
+                return render(request, 'inventory/transaction_create.html',
+                              _transaction_form_context(request, item))
             
             if unit_price <= 0:
                 messages.error(request, "Unit price must be greater than 0.")
-                context = UserRoleManager.get_context_for_user(request.user)
-                context.update({
-                    'items': Item.objects.all().order_by('name'),
-                    'suppliers': Supplier.objects.all().order_by('name'),
-                    'customers': Customer.objects.all().order_by('name'),
-                })
-                return render(request, 'inventory/transaction_create.html', context)
+                return render(request, 'inventory/transaction_create.html',
+                              _transaction_form_context(request, item))
             
             # Create transaction with PENDING status
             # For SALE transactions with Khalti/eSewa, user will complete payment separately
@@ -577,14 +668,30 @@ def transaction_create(request):
         except Exception as e:
             messages.error(request, f"Error creating transaction: {str(e)}")
     
+    # Keep the chosen item after a failed POST; ?item=<id> preselects one
+    selected_id = request.POST.get('item') or request.GET.get('item') or ''
+    selected = Item.objects.filter(pk=selected_id).first() if selected_id.isdigit() else None
+    return render(request, 'inventory/transaction_create.html', _transaction_form_context(request, selected))
+
+
+def _transaction_form_context(request, selected=None):
+    """
+    Context for the transaction form. Only the most urgent reorder items
+    (plus the selected one) are rendered into the item <select>; the search
+    box pulls any other item from search_api.
+    """
+    items = list(Item.objects.order_by('reorder_rank', '-reorder_shortage_risk', 'name')[:TRANSACTION_ITEM_CHOICES])
+    if selected is not None and selected not in items:
+        items.insert(0, selected)
+
     context = UserRoleManager.get_context_for_user(request.user)
     context.update({
-        'items': Item.objects.all().order_by('name'),
+        'items': items,
+        'selected_item_id': selected.pk if selected else None,
         'suppliers': Supplier.objects.all().order_by('name'),
         'customers': Customer.objects.all().order_by('name'),
     })
-    
-    return render(request, 'inventory/transaction_create.html', context)
+    return context
 
 
 @approved_user_required
@@ -649,6 +756,151 @@ def get_item_price(request):
     return JsonResponse({'error': 'Item not found'}, status=404)
 
 
+@approved_user_required
+def notification_list(request):
+    """The user's notification inbox, newest first."""
+    from .notifications import notification_manager
+
+    notifications = Paginator(
+        notification_manager.inbox(request.user).select_related('item'), 25,
+    ).get_page(request.GET.get('page'))
+
+    context = UserRoleManager.get_context_for_user(request.user)
+    context.update({'notifications': notifications})
+    return render(request, 'inventory/notifications.html', context)
+
+
+@approved_user_required
+def notification_read(request, notification_id):
+    """Mark one notification read (POST) and follow its link."""
+    from .models import Notification
+    from .notifications import notification_manager
+
+    notification = get_object_or_404(Notification, id=notification_id)
+    if request.method == 'POST':
+        notification_manager.mark_read(request.user, [notification.id])
+    return redirect(notification.link or 'inventory:notification_list')
+
+
+@approved_user_required
+def notification_read_all(request):
+    """Mark every notification read (POST)."""
+    from .notifications import notification_manager
+
+    if request.method == 'POST':
+        count = notification_manager.mark_read(request.user)
+        messages.success(request, f'{count} notification(s) marked as read.')
+    next_url = request.POST.get('next', '')
+    if url_has_allowed_host_and_scheme(next_url, allowed_hosts={request.get_host()}):
+        return redirect(next_url)
+    return redirect('inventory:notification_list')
+
+
+@approved_user_required
+def notification_unread_count(request):
+    """Unread notification count for the navbar badge: {"unread": n}."""
+    from .notifications import notification_manager
+    return JsonResponse({'unread': notification_manager.unread_count(request.user)})
+
+
+@approved_user_required
+def live_feed_stream(request):
+    """
+    Server-sent events stream of stock changes, transactions and alerts.
+
+    Resumes from the Last-Event-ID header (sent by the browser on
+    reconnect) or ?last_event_id= (the cursor rendered into the page).
+    """
+    from django.core.handlers.asgi import ASGIRequest
+    from django.http import StreamingHttpResponse
+    from .live_feed import live_feed
+
+    last_event_id = request.headers.get('Last-Event-ID') or request.GET.get('last_event_id')
+    if isinstance(request, ASGIRequest):
+        stream = live_feed.stream(last_event_id)
+    else:
+        stream = live_feed.stream_sync(last_event_id)
+
+    response = StreamingHttpResponse(stream, content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'   # Stop nginx from buffering the stream
+    return response
+
+
+def metrics_endpoint(request):
+    """
+    This process's metrics in the Prometheus text format (GET /metrics).
+
+    Open to METRICS_ALLOWED_IPS, to requests carrying
+    "Authorization: Bearer <METRICS_TOKEN>" when a token is set, and to
+    logged-in superusers; everyone else gets 403.
+    """
+    from django.utils.crypto import constant_time_compare
+    from .metrics import metrics
+
+    token = getattr(settings, 'METRICS_TOKEN', '')
+    auth = request.headers.get('Authorization', '')
+    allowed = (
+        request.META.get('REMOTE_ADDR') in getattr(settings, 'METRICS_ALLOWED_IPS', ())
+        or (token and constant_time_compare(auth, f'Bearer {token}'))
+        or request.user.is_superuser
+    )
+    if not allowed:
+        return HttpResponse('Forbidden', status=403, content_type='text/plain')
+
+    response = HttpResponse(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+    response['Cache-Control'] = 'no-store'
+    return response
+
+
+@approved_user_required
+def search_api(request):
+    """
+    AJAX typeahead over the in-process search index.
+
+    GET ?q=<text>&type=items|suppliers|customers&limit=<1-25>
+    Results are ranked best first; item rows carry live price and stock.
+    """
+    from .search_index import search_index
+
+    kind = request.GET.get('type', 'items')
+    query = request.GET.get('q', '').strip()
+    try:
+        limit = min(max(int(request.GET.get('limit', 10)), 1), 25)
+    except ValueError:
+        limit = 10
+
+    if kind not in search_index.sources:
+        return JsonResponse({'error': 'Unknown search type'}, status=400)
+    if kind != 'items' and not UserRoleManager.is_manager_or_admin(request.user):
+        return JsonResponse({'error': 'Permission denied'}, status=403)
+
+    ranked = search_index.search(kind, query, limit) if query else []
+    model = search_index.sources[kind][0]
+    rows = model.objects.in_bulk([pk for pk, _ in ranked])
+
+    results = []
+    for pk, score in ranked:
+        obj = rows.get(pk)
+        if obj is None:
+            continue
+        entry = {'id': pk, 'name': obj.name, 'score': round(score, 3)}
+        if kind == 'items':
+            entry.update({
+                'sku': obj.sku,
+                'price': str(obj.price),
+                'cost_price': str(obj.cost_price),
+                'quantity': obj.quantity,
+                'stock_status': obj.stock_status,
+                'needs_reorder': obj.reorder_needed,
+            })
+        else:
+            entry['email'] = obj.email or ''
+        results.append(entry)
+
+    return JsonResponse({'query': query, 'type': kind, 'results': results})
+
+
 @manager_or_admin_required
 def ai_model_management(request):
     """Manage AI models for demand forecasting"""
@@ -687,17 +939,17 @@ def ai_model_management(request):
             except Item.DoesNotExist:
                 messages.error(request, "Item not found.")
     
-    # Get model status for all items
+    # Get model status for all items, with recent sales counted in the same query
     items_status = []
-    for item in Item.objects.all():
+    items = Item.objects.annotate(recent_sales_count=Count(
+        'transactions',
+        filter=Q(transactions__transaction_type='SALE',
+                 transactions__is_active=True,
+                 transactions__timestamp__gte=timezone.now() - timedelta(days=90)),
+    ))
+    for item in items:
         model_info = ml_predictor.get_model_info(item)
-        
-        # Get recent transaction count
-        recent_sales = Transaction.objects.filter(
-            item=item,
-            transaction_type='SALE',
-            timestamp__gte=timezone.now() - timedelta(days=90)
-        ).count()
+        recent_sales = item.recent_sales_count
         
         items_status.append({
             'item': item,
@@ -924,11 +1176,11 @@ def transaction_export_csv(request):
     
     # Write transaction data with AI insights
     for transaction in Transaction.objects.select_related('item', 'performed_by').all():
-        # Get AI insights for the item
-        ai_reorder_info = transaction.item.ai_reorder_info
-        ai_powered = ai_reorder_info.get('ai_powered', False)
-        ai_reorder_needed = 'Yes' if ai_reorder_info.get('needs_reorder', False) else 'No'
-        ai_urgency = ai_reorder_info.get('urgency', 'N/A') if ai_powered else 'N/A'
+        # AI insights for the item, from its stored reorder snapshot
+        item = transaction.item
+        ai_powered = item.reorder_ai_powered
+        ai_reorder_needed = 'Yes' if item.reorder_needed else 'No'
+        ai_urgency = (item.reorder_urgency or 'LOW') if ai_powered else 'N/A'
         
         writer.writerow([
             transaction.timestamp.strftime('%Y-%m-%d'),
@@ -1048,7 +1300,7 @@ def initiate_khalti_payment(request, transaction_id):
 
 
 @manager_or_admin_required
-def verify_khalti_payment(request):
+async def verify_khalti_payment(request):
     """
     Verify Khalti payment after user completes payment
     
@@ -1062,9 +1314,12 @@ def verify_khalti_payment(request):
     - Never trust client-side data alone
     - Always verify with gateway's API
     - Use atomic transactions for database updates
+
+    The view is async: the gateway call runs on the verification pool
+    while this request waits, without holding a web worker.
     """
-    from .payment_gateways import KhaltiPaymentGateway
-    from django.db import transaction as db_transaction
+    from asgiref.sync import sync_to_async
+    from .payment_gateways import KhaltiPaymentGateway, apply_verification
     
     # Get payment data from Khalti callback
     token = request.GET.get('token')
@@ -1076,30 +1331,28 @@ def verify_khalti_payment(request):
         return redirect('inventory:transaction_list')
     
     try:
-        transaction_obj = Transaction.objects.get(id=transaction_id)
+        transaction_obj = await Transaction.objects.aget(id=transaction_id)
+        if transaction_obj.payment_status == 'PAID':
+            # Callback replayed (refresh, back button): nothing left to verify
+            return redirect('inventory:payment_success', transaction_id=transaction_obj.id)
         
         # Verify payment with Khalti API
         khalti = KhaltiPaymentGateway()
-        verification_result = khalti.verify_payment(token, amount)
+        verification_result = await khalti.averify_payment(token, amount)
         
-        if verification_result['success']:
+        transaction_obj, _ = await sync_to_async(apply_verification)(
+            transaction_obj.id, verification_result['success'], verification_result.get('transaction_id'),
+        )
+        if transaction_obj.payment_status == 'PAID':
             # Payment verified successfully
-            with db_transaction.atomic():
-                transaction_obj.payment_status = 'PAID'
-                transaction_obj.payment_reference = verification_result['transaction_id']
-                transaction_obj.save()
-            
             messages.success(
                 request,
                 f"Payment successful! Transaction #{transaction_obj.id} has been completed. "
-                f"Reference: {verification_result['transaction_id']}"
+                f"Reference: {transaction_obj.payment_reference}"
             )
             return redirect('inventory:payment_success', transaction_id=transaction_obj.id)
         else:
             # Payment verification failed
-            transaction_obj.payment_status = 'FAILED'
-            transaction_obj.save()
-            
             messages.error(
                 request,
                 f"Payment verification failed: {verification_result.get('error', 'Unknown error')}"
@@ -1174,7 +1427,7 @@ def initiate_esewa_payment(request, transaction_id):
 
 
 @manager_or_admin_required
-def verify_esewa_payment(request):
+async def verify_esewa_payment(request):
     """
     Verify eSewa payment after successful payment
     
@@ -1188,9 +1441,12 @@ def verify_esewa_payment(request):
     - Verify all parameters with eSewa API
     - Use atomic transactions
     - Log all verification attempts
+
+    The view is async: the gateway call runs on the verification pool
+    while this request waits, without holding a web worker.
     """
-    from .payment_gateways import EsewaPaymentGateway
-    from django.db import transaction as db_transaction
+    from asgiref.sync import sync_to_async
+    from .payment_gateways import EsewaPaymentGateway, apply_verification
     
     # Get payment data from eSewa callback
     ref_id = request.GET.get('refId')
@@ -1204,30 +1460,28 @@ def verify_esewa_payment(request):
     try:
         # Extract transaction ID from oid (format: TXN123 -> 123)
         transaction_id = oid.replace('TXN', '')
-        transaction_obj = Transaction.objects.get(id=transaction_id)
+        transaction_obj = await Transaction.objects.aget(id=transaction_id)
+        if transaction_obj.payment_status == 'PAID':
+            # Callback replayed (refresh, back button): nothing left to verify
+            return redirect('inventory:payment_success', transaction_id=transaction_obj.id)
         
         # Verify payment with eSewa API
         esewa = EsewaPaymentGateway()
-        verification_result = esewa.verify_payment(oid, ref_id, amt)
+        verification_result = await esewa.averify_payment(oid, ref_id, amt)
         
-        if verification_result['success']:
+        transaction_obj, _ = await sync_to_async(apply_verification)(
+            transaction_obj.id, verification_result['success'], ref_id,
+        )
+        if transaction_obj.payment_status == 'PAID':
             # Payment verified successfully
-            with db_transaction.atomic():
-                transaction_obj.payment_status = 'PAID'
-                transaction_obj.payment_reference = ref_id
-                transaction_obj.save()
-            
             messages.success(
                 request,
                 f"Payment successful! Transaction #{transaction_obj.id} has been completed. "
-                f"Reference: {ref_id}"
+                f"Reference: {transaction_obj.payment_reference}"
             )
             return redirect('inventory:payment_success', transaction_id=transaction_obj.id)
         else:
             # Payment verification failed
-            transaction_obj.payment_status = 'FAILED'
-            transaction_obj.save()
-            
             messages.error(
                 request,
                 f"Payment verification failed: {verification_result.get('error', 'Unknown error')}"
@@ -1468,13 +1722,24 @@ def chatbot_api(request):
     return JsonResponse(response)
 # ==================== SUPPLIER VIEWS ====================
 
+def _supplier_planning_fields(request):
+    """Parse optional lead time and order budget from a supplier form"""
+    lead_time = request.POST.get('lead_time_days', '').strip()
+    budget    = request.POST.get('order_budget', '').strip()
+    lead_time = int(lead_time) if lead_time else None
+    budget    = Decimal(budget) if budget else None
+    if (lead_time is not None and lead_time < 1) or (budget is not None and budget < 0):
+        raise ValueError
+    return lead_time, budget
+
+
 @manager_or_admin_required
 def supplier_list(request):
     """List all suppliers"""
     suppliers = Supplier.objects.all()
-    search = request.GET.get('search', '')
+    search = request.GET.get('search', '').strip()
     if search:
-        suppliers = suppliers.filter(Q(name__icontains=search) | Q(email__icontains=search))
+        suppliers = _ranked_search(suppliers, 'suppliers', search)
     context = UserRoleManager.get_context_for_user(request.user)
     context.update({'suppliers': suppliers, 'search_query': search})
     return render(request, 'inventory/supplier_list.html', context)
@@ -1491,9 +1756,15 @@ def supplier_add(request):
         if not name:
             messages.error(request, 'Supplier name is required.')
             return render(request, 'inventory/supplier_form.html', UserRoleManager.get_context_for_user(request.user))
+        try:
+            lead_time_days, order_budget = _supplier_planning_fields(request)
+        except (ValueError, InvalidOperation):
+            messages.error(request, 'Please enter a valid lead time and budget.')
+            return render(request, 'inventory/supplier_form.html', UserRoleManager.get_context_for_user(request.user))
         Supplier.objects.create(
             name=name, email=email or None, phone=phone or None,
-            address=address or None, created_by=request.user
+            address=address or None, created_by=request.user,
+            lead_time_days=lead_time_days, order_budget=order_budget,
         )
         messages.success(request, f"Supplier '{name}' added successfully.")
         return redirect('inventory:supplier_list')
@@ -1515,6 +1786,13 @@ def supplier_edit(request, supplier_id):
             context = UserRoleManager.get_context_for_user(request.user)
             context['supplier'] = supplier
             return render(request, 'inventory/supplier_form.html', context)
+        try:
+            supplier.lead_time_days, supplier.order_budget = _supplier_planning_fields(request)
+        except (ValueError, InvalidOperation):
+            messages.error(request, 'Please enter a valid lead time and budget.')
+            context = UserRoleManager.get_context_for_user(request.user)
+            context['supplier'] = supplier
+            return render(request, 'inventory/supplier_form.html', context)
         supplier.save()
         messages.success(request, f"Supplier '{supplier.name}' updated successfully.")
         return redirect('inventory:supplier_list')
@@ -1540,9 +1818,9 @@ def supplier_delete(request, supplier_id):
 def customer_list(request):
     """List all customers"""
     customers = Customer.objects.all()
-    search = request.GET.get('search', '')
+    search = request.GET.get('search', '').strip()
     if search:
-        customers = customers.filter(Q(name__icontains=search) | Q(email__icontains=search))
+        customers = _ranked_search(customers, 'customers', search)
     context = UserRoleManager.get_context_for_user(request.user)
     context.update({'customers': customers, 'search_query': search})
     return render(request, 'inventory/customer_list.html', context)
@@ -1708,4 +1986,127 @@ def create_purchase_order(request, item_id):
         'default_supplier': item.supplier,
         'default_price': item.cost_price if item.cost_price > 0 else item.price * 0.6,
     })
-    return render(request, 'inventory/create_purchase_order.html', context)
\ No newline at end of file
+    return render(request, 'inventory/create_purchase_order.html', context)
+
+
+@manager_or_admin_required
+def purchase_planning(request):
+    """Plan one multi-line purchase order per supplier from AI reorder suggestions"""
+    from .purchase_planner import purchase_planner
+    from .models import PurchaseOrder
+
+    budget_param = (request.POST if request.method == 'POST' else request.GET).get('budget', '').strip()
+    budget = None
+    if budget_param:
+        try:
+            budget = Decimal(budget_param)
+            if budget < 0:
+                raise InvalidOperation
+        except InvalidOperation:
+            messages.error(request, 'Please enter a valid budget.')
+            budget_param = ''
+            budget = None
+
+    plan = purchase_planner.build_plan(budget)
+
+    if request.method == 'POST':
+        orders = purchase_planner.create_drafts(plan, request.user)
+        if orders:
+            messages.success(request, f'✅ {len(orders)} draft purchase order(s) created.')
+        else:
+            messages.info(request, 'Nothing to order — no draft purchase orders created.')
+        return redirect('inventory:purchase_planning')
+
+    drafts = (
+        PurchaseOrder.objects.filter(status='DRAFT')
+        .select_related('supplier')
+        .prefetch_related('lines__item')
+    )
+
+    context = UserRoleManager.get_context_for_user(request.user)
+    context.update({
+        'plan': plan,
+        'budget_param': budget_param,
+        'drafts': drafts,
+    })
+    return render(request, 'inventory/purchase_planning.html', context)
+
+
+@manager_or_admin_required
+def purchase_order_update(request, order_id):
+    """Place or cancel a draft purchase order"""
+    from .models import PurchaseOrder
+
+    order = get_object_or_404(PurchaseOrder, id=order_id)
+    if request.method != 'POST':
+        return redirect('inventory:purchase_planning')
+
+    action = request.POST.get('action')
+    if action == 'place':
+        try:
+            order.place(request.user)
+            messages.success(request, f'✅ Purchase order #{order.id} placed. Stock has been updated.')
+        except ValidationError as e:
+            error_message = str(e.messages[0]) if hasattr(e, 'messages') else str(e)
+            messages.error(request, f'Purchase order #{order.id} could not be placed: {error_message}')
+    elif action == 'cancel' and order.status == 'DRAFT':
+        # Conditional update: a concurrent place() wins over the cancel
+        if PurchaseOrder.objects.filter(pk=order.pk, status='DRAFT').update(
+            status='CANCELLED', updated_at=timezone.now(),
+        ):
+            messages.warning(request, f'Purchase order #{order.id} cancelled.')
+        else:
+            messages.error(request, f'Purchase order #{order.id} is no longer a draft.')
+    else:
+        messages.error(request, 'Invalid action.')
+
+    return redirect('inventory:purchase_planning')
+
+# ==================== PROFILER VIEWS ====================
+
+@admin_required
+def profile_list(request):
+    """Recent request profiles (add ?_profile=1 to any page to record one) - Admin only"""
+    from .profiler import request_profiler
+
+    profiles = request_profiler.recent()
+    for profile in profiles:
+        profile['created'] = datetime.fromisoformat(profile['created'])
+
+    context = UserRoleManager.get_context_for_user(request.user)
+    context['profiles'] = profiles
+    context['keep'] = request_profiler.keep
+    return render(request, 'inventory/profile_list.html', context)
+
+
+@admin_required
+def profile_detail(request, profile_id):
+    """Where one profiled request spent its time - Admin only"""
+    from django.http import Http404
+    from .profiler import request_profiler
+
+    profile = request_profiler.get(profile_id)
+    if profile is None:
+        raise Http404('Profile not found')
+    profile['created'] = datetime.fromisoformat(profile['created'])
+    total = profile['duration'] or 1
+    profile['by_package'] = [
+        {'package': package, 'seconds': seconds, 'percent': seconds / total * 100}
+        for package, seconds in profile['by_package']
+    ]
+
+    context = UserRoleManager.get_context_for_user(request.user)
+    context['profile'] = profile
+    return render(request, 'inventory/profile_detail.html', context)
+
+
+@admin_required
+def profile_download(request, profile_id):
+    """Download the speedscope / pstats file of a profile - Admin only"""
+    from django.http import FileResponse, Http404
+    from .profiler import request_profiler
+
+    profile = request_profiler.get(profile_id)
+    if profile is None or not request_profiler.file_path(profile).exists():
+        raise Http404('Profile not found')
+    return FileResponse(open(request_profiler.file_path(profile), 'rb'), as_attachment=True, filename=profile['file'])
@@ -29,6 +29,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'inventory.metrics.MetricsMiddleware',   # first, so it times the whole stack
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -37,6 +38,7 @@ MIDDLEWARE = [
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'allauth.account.middleware.AccountMiddleware',
+    'inventory.profiler.ProfilingMiddleware',   # after auth: only admins can trigger it
 ]
 
 ROOT_URLCONF = 'inventory_system.urls'
@@ -59,6 +61,7 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'inventory_system.wsgi.application'
+ASGI_APPLICATION = 'inventory_system.asgi.application'
 
 DATABASES = {
     'default': {
@@ -91,6 +94,30 @@ MEDIA_ROOT = BASE_DIR / 'media'
 
 LOGIN_URL = '/users/login/'
 
+# Resolved user roles are cached (users/access.py) under an access version
+# stored on the user's profile, so a role change or rejection takes effect
+# on the next request in every worker process, whatever the cache backend.
+ACCESS_CACHE_SECONDS = 300
+
+# Chatbot data answers (inventory/chatbot.py) are cached until an item or
+# transaction changes; this is only the backstop expiry.
+CHATBOT_CACHE_SECONDS = 300
+
+# Ad-hoc chatbot sales questions ("revenue by supplier in March") read the
+# daily sales rollups; longer ranges are cut to their last this-many days.
+CHATBOT_QUERY_MAX_DAYS = 366
+
+# Budgeted purchase plans (inventory/purchase_planner.py) give the MILP
+# solver this many seconds before falling back to the greedy allocation.
+PURCHASE_PLANNER_TIME_LIMIT = 5
+
+# Stock changes mark an item's reorder snapshot stale; a background worker
+# (inventory/reorder_queue.py) recomputes it in batches after this delay.
+# Set REORDER_SNAPSHOT_IN_PROCESS_WORKER = False to refresh only with
+# `python manage.py process_reorder_queue` instead of a web-process thread.
+REORDER_SNAPSHOT_IN_PROCESS_WORKER = True
+REORDER_SNAPSHOT_DELAY_SECONDS = 5
+
 # ── Email ─────────────────────────────────────────────────────────────────────
 _email_user = os.getenv('EMAIL_HOST_USER', '')
 _email_pass = os.getenv('EMAIL_HOST_PASSWORD', '')
@@ -108,25 +135,103 @@ else:
     EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
     DEFAULT_FROM_EMAIL = 'Inventory System <noreply@inventorysystem.com>'
 
+# Outgoing email is queued (inventory/mail_queue.py) and sent by a worker
+# thread, or by `python manage.py process_mail_queue` when
+# EMAIL_QUEUE_IN_PROCESS_WORKER = False. Stock alerts are digested.
+EMAIL_QUEUE_IN_PROCESS_WORKER = True
+EMAIL_QUEUE_BATCH_SIZE = 50            # messages sent per SMTP connection
+EMAIL_QUEUE_MAX_ATTEMPTS = 5
+EMAIL_QUEUE_RETRY_BASE_SECONDS = 60
+EMAIL_DIGEST_INTERVAL_MINUTES = 60     # at most one stock alert digest per recipient per hour
+
+# Stock threshold events (inventory/stock_events.py). Alerts are emailed to
+# managers and admins unless STOCK_ALERT_RECIPIENTS lists other addresses,
+# and POSTed as signed JSON to every URL in STOCK_ALERT_WEBHOOKS.
+STOCK_ALERT_EMAIL = True
+STOCK_ALERT_RECIPIENTS = [e.strip() for e in os.getenv('STOCK_ALERT_RECIPIENTS', '').split(',') if e.strip()]
+STOCK_ALERT_RECIPIENTS_CACHE_SECONDS = 300   # backstop; user and group changes clear it at once
+STOCK_ALERT_WEBHOOKS = [u.strip() for u in os.getenv('STOCK_ALERT_WEBHOOKS', '').split(',') if u.strip()]
+STOCK_ALERT_WEBHOOK_SECRET = os.getenv('STOCK_ALERT_WEBHOOK_SECRET', '')
+
+# Live page updates over server-sent events (inventory/live_feed.py). Serve
+# inventory_system.asgi:application with one worker process so every open
+# page sees every write; under WSGI each open page holds a thread.
+LIVE_FEED_HEARTBEAT_SECONDS = 15
+LIVE_FEED_MAX_SECONDS = 300            # connections are recycled; browsers resume via Last-Event-ID
+LIVE_FEED_RETRY_MS = 3000
+
 # ── Unsplash ──────────────────────────────────────────────────────────────────
 UNSPLASH_ACCESS_KEY = os.getenv('UNSPLASH_ACCESS_KEY', '')
 UNSPLASH_API_URL = 'https://api.unsplash.com/search/photos'
 
+# Product images are fetched off the request path (inventory/image_queue.py).
+# Set IMAGE_FETCH_IN_PROCESS_WORKER = False to drain the queue only with
+# `python manage.py process_image_queue` instead of a web-process thread.
+IMAGE_FETCH_IN_PROCESS_WORKER = True
+IMAGE_FETCH_MAX_ATTEMPTS = 5
+IMAGE_FETCH_RETRY_BASE_SECONDS = 60
+IMAGE_FETCH_POOL_SIZE = 10            # pooled HTTP connections per process
+IMAGE_FETCH_RATE_PER_HOUR = int(os.getenv('IMAGE_FETCH_RATE_PER_HOUR', '50'))  # Unsplash demo-app quota
+IMAGE_CACHE_MISS_TTL_HOURS = 168      # re-search "no match" names after a week
+IMAGE_CACHE_ERROR_TTL_MINUTES = 15    # don't hammer the API after a failure
+IMAGE_VARIANT_WIDTHS = (64, 128, 320)  # thumbnail widths (px) rendered as WebP + JPEG
+
 # ── Payment Gateways ──────────────────────────────────────────────────────────
 KHALTI_PUBLIC_KEY = None
 KHALTI_SECRET_KEY = None
-KHALTI_VERIFY_URL = 'https://khalti.com/api/v2/payment/verify/'
+KHALTI_VERIFY_URL = os.getenv('KHALTI_VERIFY_URL', 'https://khalti.com/api/v2/payment/verify/')
+KHALTI_LOOKUP_URL = os.getenv('KHALTI_LOOKUP_URL', 'https://khalti.com/api/v2/merchant-transaction/')
 KHALTI_ENABLED = False
 
 ESEWA_MERCHANT_ID = 'EPAYTEST'
 ESEWA_SUCCESS_URL = 'http://127.0.0.1:8000/inventory/payment/esewa/verify/'
 ESEWA_FAILURE_URL = 'http://127.0.0.1:8000/inventory/payment/esewa/failure/'
 ESEWA_PAYMENT_URL = 'https://uat.esewa.com.np/epay/main'
-ESEWA_VERIFY_URL = 'https://uat.esewa.com.np/epay/transrec'
+ESEWA_VERIFY_URL = os.getenv('ESEWA_VERIFY_URL', 'https://uat.esewa.com.np/epay/transrec')
+ESEWA_STATUS_URL = os.getenv('ESEWA_STATUS_URL', 'https://uat.esewa.com.np/api/epay/transaction/status/')
 ESEWA_ENABLED = False
 
 PAYMENT_SIMULATION_MODE = True
 
+# Gateway verification (inventory/payment_gateways.py): pooled keep-alive
+# connections, (connect, read) timeouts per gateway, and the number of
+# verifications the async callback views run at once per process.
+# `python manage.py run_mock_gateway` serves both APIs locally for testing.
+PAYMENT_GATEWAY_TIMEOUTS = {'KHALTI': (3.05, 10), 'ESEWA': (3.05, 10)}
+PAYMENT_GATEWAY_POOL_SIZE = 20
+PAYMENT_VERIFY_CONCURRENCY = 20
+
+# Pending-payment reconciliation (inventory/payment_reconciler.py): gateway
+# payments still PENDING after PAYMENT_RECONCILE_AFTER_MINUTES (callback lost,
+# browser closed) are looked up with the gateway and settled; ones nobody
+# paid for are marked FAILED after PAYMENT_PENDING_EXPIRY_HOURS.
+# Run `python manage.py reconcile_payments` as a worker or from cron.
+PAYMENT_RECONCILE_AFTER_MINUTES = 15
+PAYMENT_PENDING_EXPIRY_HOURS = 24
+PAYMENT_RECONCILE_CONCURRENCY = 8     # gateway lookups in flight at once
+PAYMENT_RECONCILE_BATCH_SIZE = 100
+
+# ── Metrics ───────────────────────────────────────────────────────────────────
+# GET /metrics serves this process's counters and histograms in the
+# Prometheus text format (inventory/metrics.py). It is open to these
+# addresses, to "Authorization: Bearer <METRICS_TOKEN>" and to superusers.
+METRICS_ALLOWED_IPS = [ip.strip() for ip in os.getenv('METRICS_ALLOWED_IPS', '127.0.0.1,::1').split(',') if ip.strip()]
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+
+# ── Request profiler ──────────────────────────────────────────────────────────
+# Admins add ?_profile=1 (sampling flamegraph, speedscope) or
+# ?_profile=cprofile (pstats) to any page; results are browsable at
+# /inventory/profiles/ (inventory/profiler.py).
+PROFILE_DIR = BASE_DIR / 'profiles'
+PROFILE_KEEP = 50                     # newest profiles kept on disk
+PROFILE_SAMPLE_INTERVAL_MS = 1
+PROFILE_MAX_QUERIES = 500             # queries captured with SQL text and stack
+
+# ── Benchmarks ────────────────────────────────────────────────────────────────
+# `manage.py run_benchmarks` writes one JSON result file per run here
+# (inventory/benchmarks.py); compare runs with --compare.
+BENCHMARK_DIR = BASE_DIR / 'benchmarks'
+
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 # ── Allauth / Google OAuth ────────────────────────────────────────────────────
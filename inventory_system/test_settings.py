@@ -0,0 +1,27 @@
+"""
+Settings for the test suite: the production settings on SQLite.
+
+  python manage.py test --settings=inventory_system.test_settings
+
+The MySQL server and credentials from .env are not needed; Django runs the
+tests against an in-memory SQLite database.
+"""
+
+from .settings import *  # noqa: F401,F403
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'test_db.sqlite3',
+        'OPTIONS': {'timeout': 20},
+    }
+}
+
+# Tests drain the queues themselves (or through the management commands);
+# web-process worker threads would race them for the SQLite write lock.
+EMAIL_QUEUE_IN_PROCESS_WORKER = False
+IMAGE_FETCH_IN_PROCESS_WORKER = False
+REORDER_SNAPSHOT_IN_PROCESS_WORKER = False
+
+STOCK_ALERT_WEBHOOKS = []
+PASSWORD_HASHERS = ['django.contrib.auth.hashers.MD5PasswordHasher']
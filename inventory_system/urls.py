@@ -3,10 +3,12 @@ from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
 from users.views import landing_view
+from inventory.views import metrics_endpoint
 
 urlpatterns = [
     path("", landing_view, name="landing"),
     path("admin/", admin.site.urls),
+    path("metrics", metrics_endpoint, name="metrics"),
     path("users/", include("users.urls")),
     path("inventory/", include("inventory.urls")),
     path("accounts/", include("allauth.urls")),
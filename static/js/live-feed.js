@@ -0,0 +1,73 @@
+/*
+ * Live feed client (see inventory/live_feed.py).
+ *
+ * Load with {% live_feed_script %}. Opens one EventSource and re-dispatches
+ * each server event on document as a DOM event with the JSON payload in
+ * event.detail:
+ *   live:stock        an item's quantity or reorder level changed
+ *   live:transaction  a transaction was created or its payment status changed
+ *   live:alert        a stock threshold alert (low / out of stock / restocked)
+ *
+ * Pages mark figures they want kept current with
+ *   data-live-stat="<name>" data-live-value="<raw number>" data-live-format="count|int|rupees|rupees_int"
+ * and adjust them with LiveFeed.bump(name, delta).
+ */
+(function () {
+  if (!window.EventSource) return;
+
+  var script = document.currentScript;
+  var url = script.dataset.url + '?last_event_id=' + encodeURIComponent(script.dataset.lastEventId || '');
+
+  function format(value, kind) {
+    switch (kind) {
+      case 'rupees':
+        return 'Rs. ' + value.toLocaleString('en-US', {minimumFractionDigits: 2, maximumFractionDigits: 2});
+      case 'rupees_int':
+        return 'Rs. ' + Math.trunc(value).toLocaleString('en-US');
+      case 'int':
+        return String(Math.round(value));
+      default:
+        return value.toLocaleString('en-US');
+    }
+  }
+
+  window.LiveFeed = {
+    bump: function (name, delta) {
+      if (!delta) return;
+      document.querySelectorAll('[data-live-stat="' + name + '"]').forEach(function (el) {
+        var value = (parseFloat(el.dataset.liveValue) || 0) + delta;
+        el.dataset.liveValue = value;
+        el.textContent = format(value, el.dataset.liveFormat);
+        el.classList.remove('live-flash');
+        void el.offsetWidth;   // restart the highlight animation
+        el.classList.add('live-flash');
+      });
+    },
+    // +1 when a transaction starts counting towards "paid" totals, -1 when it stops
+    paidChange: function (t) {
+      return (t.payment_status === 'PAID') - (t.previous_payment_status === 'PAID');
+    },
+    // 'out', 'low' or 'ok', as counted by the dashboard
+    stockState: function (quantity, reorderLevel) {
+      return quantity <= 0 ? 'out' : (quantity <= reorderLevel ? 'low' : 'ok');
+    },
+    format: format
+  };
+
+  var style = document.createElement('style');
+  style.textContent = '@keyframes live-flash{from{background:rgba(250,204,21,.45)}to{background:transparent}}' +
+                      '.live-flash{animation:live-flash 1.5s ease-out;border-radius:4px}';
+  document.head.appendChild(style);
+
+  var source = new EventSource(url);
+  ['stock', 'transaction', 'alert'].forEach(function (type) {
+    source.addEventListener(type, function (e) {
+      document.dispatchEvent(new CustomEvent('live:' + type, {detail: JSON.parse(e.data)}));
+    });
+  });
+  // Updates were missed (server restarted or we fell too far behind): start over
+  source.addEventListener('resync', function () {
+    source.close();
+    window.location.reload();
+  });
+})();
@@ -0,0 +1,129 @@
+"""
+Access Cache
+============
+
+Resolves a user's roles and approval once instead of querying auth_group
+and the user's profile for every decorator, UserRoleManager call and
+template filter, so authorization adds one primary-key lookup to a
+typical request.
+
+How it works:
+1. access_cache.state(user) reads the user's approval flag and access version
+   from their profile (one primary-key lookup) and keeps the result on
+   the user object. request.user is one object per request, so every
+   check in the request (including per-row template filters) shares it
+2. Group names are stored in Django's cache under the user's id together
+   with the access version they were read under, so later requests - from
+   any of the user's sessions - skip the auth_group query
+3. The access version lives in the database (UserProfile.access_version).
+   Every profile save (approve_user, reject_user, admin) and every change
+   to a user's groups (assign_role, admin, shell) writes a new one with an
+   UPDATE, so a cached entry from before the change - in any worker
+   process, whatever its cache backend - no longer matches. Approval is
+   never cached at all: revocation takes effect on the user's next request
+4. Entries also expire after ACCESS_CACHE_SECONDS
+"""
+
+import uuid
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db.models.signals import m2m_changed, post_save
+from django.dispatch import receiver
+
+import logging
+logger = logging.getLogger(__name__)
+
+from inventory.metrics import CACHE_REQUESTS
+
+from .models import UserProfile
+
+
+class AccessCache:
+    """
+    Per-request and cross-request cache of each user's resolved roles.
+    """
+
+    def __init__(self):
+        self.timeout = getattr(settings, 'ACCESS_CACHE_SECONDS', 300)
+
+    @staticmethod
+    def _key(user_id):
+        return f"users:access:{user_id}"
+
+    def state(self, user):
+        """
+        Resolved access state for `user`:
+        {'groups': frozenset of group names, 'approved': bool}.
+        Superusers are always approved.
+        """
+        if not user.is_authenticated:
+            return {'groups': frozenset(), 'approved': False}
+        state = getattr(user, '_access_state', None)
+        if state is not None:
+            return state
+
+        version, approved = UserProfile.objects.filter(user_id=user.pk).values_list(
+            'access_version', 'is_approved',
+        ).first() or ('', False)
+        entry = cache.get(self._key(user.pk)) if version else None
+
+        if entry is not None and entry['version'] == version:
+            CACHE_REQUESTS.inc(cache='access', result='hit')
+            groups = frozenset(entry['groups'])
+        else:
+            CACHE_REQUESTS.inc(cache='access', result='miss')
+            groups = frozenset(user.groups.values_list('name', flat=True))
+            if version:
+                cache.set(self._key(user.pk), {'version': version, 'groups': sorted(groups)}, self.timeout)
+
+        state = {'groups': groups, 'approved': approved or user.is_superuser}
+        user._access_state = state
+        return state
+
+    def groups(self, user):
+        return self.state(user)['groups']
+
+    def is_approved(self, user):
+        return self.state(user)['approved']
+
+    def bump(self, user_id):
+        """Move the user to a new access version, orphaning every cached entry."""
+        UserProfile.objects.filter(user_id=user_id).update(access_version=uuid.uuid4().hex)
+
+    def invalidate(self, user):
+        """Forget `user`'s cached access in this request and in every session."""
+        self.bump(user.pk)
+        if getattr(user, '_access_state', None) is not None:
+            del user._access_state
+
+
+# Module-level singleton
+access_cache = AccessCache()
+
+
+@receiver(post_save, sender=UserProfile)
+def invalidate_on_profile_save(sender, instance, **kwargs):
+    """Approval may have changed: move the user to a new access version."""
+    access_cache.bump(instance.user_id)
+
+
+@receiver(m2m_changed, sender=User.groups.through)
+def invalidate_on_group_change(sender, instance, action, reverse, pk_set, **kwargs):
+    """Group membership changed (from either side): drop the affected users' cached roles."""
+    if not reverse:
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            access_cache.invalidate(instance)
+        return
+
+    # instance is a Group; pk_set holds user ids (not given for clear())
+    if action == 'pre_clear':
+        instance._cleared_user_ids = list(instance.user_set.values_list('pk', flat=True))
+        return
+    if action == 'post_clear':
+        pk_set = instance.__dict__.pop('_cleared_user_ids', [])
+    elif action not in ('post_add', 'post_remove'):
+        return
+    for user_id in pk_set:
+        access_cache.bump(user_id)
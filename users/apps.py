@@ -3,3 +3,7 @@ from django.apps import AppConfig
 
 class UsersConfig(AppConfig):
     name = 'users'
+
+    def ready(self):
+        # Register the access cache's invalidation signal handlers
+        from . import access  # noqa: F401
@@ -2,6 +2,7 @@
 Security decorators and utilities for role-based access control
 """
 from functools import wraps
+from asgiref.sync import iscoroutinefunction, sync_to_async
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.core.exceptions import PermissionDenied
 from django.shortcuts import redirect
@@ -9,21 +10,15 @@ from django.contrib import messages
 from django.http import HttpResponseForbidden
 from django.template.loader import render_to_string
 
+from .access import access_cache
+from .utils import UserRoleManager
+
 
 def user_is_approved(user):
     """Check if user is approved to access the system"""
-    if not user.is_authenticated:
-        return False
-    
-    # Superusers are always approved
-    if user.is_superuser:
-        return True
-    
-    # Check if user has profile and is approved
-    if hasattr(user, 'userprofile'):
-        return user.userprofile.is_approved
-    
-    return False
+    # Superusers are always approved; others need an approved profile
+    # (cached, see users/access.py)
+    return access_cache.is_approved(user)
 
 
 def user_is_admin(user):
@@ -37,7 +32,7 @@ def user_is_manager_or_admin(user):
         return False
     
     return (user.is_superuser or 
-            user.groups.filter(name='Manager').exists())
+            'Manager' in access_cache.groups(user))
 
 
 def user_is_staff_or_above(user):
@@ -46,13 +41,25 @@ def user_is_staff_or_above(user):
         return False
     
     return (user.is_superuser or 
-            user.groups.filter(name__in=['Manager', 'Staff']).exists())
+            not access_cache.groups(user).isdisjoint({'Manager', 'Staff'}))
 
 
 def approved_user_required(view_func):
     """
     Decorator that ensures user is approved before accessing the view
+    (works on both sync and async views)
     """
+    if iscoroutinefunction(view_func):
+        @wraps(view_func)
+        @login_required
+        async def _async_wrapped_view(request, *args, **kwargs):
+            user = await request.auser()
+            if not await sync_to_async(user_is_approved)(user):
+                messages.error(request, 'Your account is pending approval. Please contact an administrator.')
+                return redirect('users:login')
+            return await view_func(request, *args, **kwargs)
+        return _async_wrapped_view
+
     @wraps(view_func)
     @login_required
     def _wrapped_view(request, *args, **kwargs):
@@ -78,7 +85,14 @@ def admin_required(view_func):
 def manager_or_admin_required(view_func):
     """
     Decorator that requires manager or admin access
+    (works on both sync and async views)
     """
+    if iscoroutinefunction(view_func):
+        # login_required / user_passes_test already wrap async views
+        return approved_user_required(
+            user_passes_test(user_is_manager_or_admin, login_url='users:login')(view_func)
+        )
+
     @wraps(view_func)
     @approved_user_required
     @user_passes_test(user_is_manager_or_admin, login_url='users:login')
@@ -108,17 +122,7 @@ def role_required(*allowed_roles):
         @wraps(view_func)
         @approved_user_required
         def _wrapped_view(request, *args, **kwargs):
-            user = request.user
-            user_roles = []
-            
-            if user.is_superuser:
-                user_roles.append('admin')
-            
-            if user.groups.filter(name='Manager').exists():
-                user_roles.append('manager')
-            
-            if user.groups.filter(name='Staff').exists():
-                user_roles.append('staff')
+            user_roles = UserRoleManager.get_user_roles(request.user)
             
             if not any(role in user_roles for role in allowed_roles):
                 raise PermissionDenied("You don't have permission to access this resource.")
@@ -151,18 +155,7 @@ class RoleRequiredMixin:
     
     def get_user_roles(self, user):
         """Get list of user's roles"""
-        roles = []
-        
-        if user.is_superuser:
-            roles.append('admin')
-        
-        if user.groups.filter(name='Manager').exists():
-            roles.append('manager')
-        
-        if user.groups.filter(name='Staff').exists():
-            roles.append('staff')
-        
-        return roles
+        return UserRoleManager.get_user_roles(user)
 
 
 class AdminRequiredMixin(RoleRequiredMixin):
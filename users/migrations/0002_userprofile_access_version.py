@@ -0,0 +1,28 @@
+# Generated by Django 6.0 on 2026-10-19 09:56
+
+import uuid
+
+from django.db import migrations, models
+
+
+def assign_access_versions(apps, schema_editor):
+    """Give every existing profile its own starting version."""
+    UserProfile = apps.get_model('users', 'UserProfile')
+    for profile in UserProfile.objects.only('pk').iterator():
+        UserProfile.objects.filter(pk=profile.pk).update(access_version=uuid.uuid4().hex)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userprofile',
+            name='access_version',
+            field=models.CharField(blank=True, editable=False, max_length=32),
+        ),
+        migrations.RunPython(assign_access_versions, migrations.RunPython.noop),
+    ]
@@ -27,6 +27,8 @@ class UserProfile(models.Model):
         blank=True,
         related_name='approved_users'
     )
+    # Changes whenever the user's approval or groups change (users/access.py)
+    access_version = models.CharField(max_length=32, blank=True, editable=False)
 
     def __str__(self):
         return f"{self.user.username} - {self.approval_status}"
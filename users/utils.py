@@ -3,6 +3,8 @@ Utility functions for user roles and permissions
 """
 from django.contrib.auth.models import Group
 
+from .access import access_cache
+
 
 class UserRoleManager:
     """
@@ -21,10 +23,12 @@ class UserRoleManager:
         if user.is_superuser:
             return 'admin'
         
-        if user.groups.filter(name='Manager').exists():
+        groups = access_cache.groups(user)
+        
+        if 'Manager' in groups:
             return 'manager'
         
-        if user.groups.filter(name='Staff').exists():
+        if 'Staff' in groups:
             return 'staff'
         
         return None
@@ -43,7 +47,7 @@ class UserRoleManager:
         if user.is_superuser:
             roles.append('admin')
         
-        user_groups = user.groups.values_list('name', flat=True)
+        user_groups = access_cache.groups(user)
         
         if 'Manager' in user_groups:
             roles.append('manager')
@@ -62,13 +66,13 @@ class UserRoleManager:
     def is_manager(user):
         """Check if user is manager"""
         return (user.is_authenticated and 
-                user.groups.filter(name='Manager').exists())
+                'Manager' in access_cache.groups(user))
     
     @staticmethod
     def is_staff(user):
         """Check if user is staff"""
         return (user.is_authenticated and 
-                user.groups.filter(name='Staff').exists())
+                'Staff' in access_cache.groups(user))
     
     @staticmethod
     def is_manager_or_admin(user):
@@ -86,18 +90,8 @@ class UserRoleManager:
     @staticmethod
     def is_approved(user):
         """Check if user is approved to access the system"""
-        if not user.is_authenticated:
-            return False
-        
-        # Superusers are always approved
-        if user.is_superuser:
-            return True
-        
-        # Check if user has profile and is approved
-        if hasattr(user, 'userprofile'):
-            return user.userprofile.is_approved
-        
-        return False
+        # Superusers are always approved; others need an approved profile
+        return access_cache.is_approved(user)
     
     @staticmethod
     def get_role_display_name(role):
@@ -135,7 +129,7 @@ class UserRoleManager:
     
     @staticmethod
     def assign_role(user, role):
-        """Assign a role to a user"""
+        """Assign a role to a user (drops the user's cached roles everywhere)"""
         # Remove existing roles first
         user.groups.clear()
         
@@ -146,6 +140,7 @@ class UserRoleManager:
             group, created = Group.objects.get_or_create(name='Staff')
             user.groups.add(group)
         # Admin role is handled by is_superuser flag
+        access_cache.invalidate(user)
     
     @staticmethod
     def get_context_for_user(user):
@@ -12,7 +12,7 @@ from .forms import CustomUserCreationForm, CustomPasswordResetForm
 from .models import UserProfile
 from .decorators import approved_user_required, admin_required, role_required
 from .utils import UserRoleManager
-from django.db.models import F
+from django.db.models import F, Sum
 
 
 def login_view(request):
@@ -121,6 +121,7 @@ def reject_user(request, user_id):
     """Reject a user"""
     user_profile = get_object_or_404(UserProfile, user_id=user_id)
     user_profile.approval_status = 'rejected'
+    user_profile.is_approved = False
     user_profile.save()
     messages.warning(request, f'User {user_profile.user.username} has been rejected.')
     return redirect('users:user_management')
@@ -130,23 +131,23 @@ def reject_user(request, user_id):
 def dashboard(request):
     """Main dashboard view with role-based content and AI notifications"""
     from inventory.notifications import notification_manager
-    notification_manager.add_dashboard_notifications(request)
 
     role = UserRoleManager.get_user_role(request.user)
     context = UserRoleManager.get_context_for_user(request.user)
 
     from inventory.models import Item
-    total_items = Item.objects.count()
+    # Stock counters, stock value and AI alert counts from the maintained StockCounters row
+    notification_summary = notification_manager.get_snapshot_summary()
+    total_items = notification_summary['total_items']
     low_stock_items = Item.objects.filter(quantity__lte=F('reorder_level'), quantity__gt=0)
-    low_stock_count = low_stock_items.count()
-    out_of_stock_count = Item.objects.filter(quantity=0).count()
+    low_stock_count = notification_summary['low_stock_count']
+    out_of_stock_count = notification_summary['out_of_stock_count']
 
-    total_value = sum(item.price * item.quantity for item in Item.objects.all())
+    total_value = notification_summary['total_value']
     recent_items = Item.objects.order_by('-id')[:5]
-    notification_summary = notification_manager.get_notification_summary()
+    inbox = notification_manager.get_inbox(request.user)
 
     import json
-    from django.db.models import Sum
     from django.db.models.functions import TruncDate
     from inventory.models import Transaction
 
@@ -182,9 +183,11 @@ def dashboard(request):
         'low_stock_items': low_stock_count,
         'out_of_stock_items': out_of_stock_count,
         'total_value': total_value,
+        'total_cost': notification_summary['total_cost'],
         'recent_items': recent_items,
         'low_stock_items_list': low_stock_items[:5],
         'notification_summary': notification_summary,
+        'inbox': inbox,
         'mini_labels': json.dumps(mini_labels),
         'mini_data': json.dumps(mini_data),
         'recent_sales_total': recent_sales_total,